@@ -0,0 +1 @@
+"""Mind map API benchmarks."""
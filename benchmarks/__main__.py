@@ -0,0 +1,183 @@
+"""
+Run the mind map benchmarks.
+
+    python -m benchmarks --output results.json --baseline baseline.json
+"""
+import argparse
+import os
+import sys
+import tempfile
+from typing import List, Optional
+
+from benchmarks.comparisons import COMPARISONS, bench_comparisons
+from benchmarks.data import generate_apps
+from benchmarks.loads import bench_http, load_apps, start_server, \
+    stop_server
+from benchmarks.operations import PROVIDERS, bench_providers
+from benchmarks.reports import COMPARED_STAT, compare, read_report, report, \
+    write_report
+from benchmarks.restarts import bench_restarts
+from benchmarks.workers import bench_workers
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark mind map providers, use cases and API.")
+    parser.add_argument("--apps", type=int, default=10,
+                        help="number of generated apps")
+    parser.add_argument("--leaves", type=int, default=1000,
+                        help="number of leaves of an app")
+    parser.add_argument("--depth", type=int, default=4,
+                        help="number of path segments of a leaf")
+    parser.add_argument("--fan-out", type=int, default=8,
+                        help="number of children of a branch, at most")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the generated apps")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="number of calls of a provider operation")
+    parser.add_argument("--providers", nargs="*", default=list(PROVIDERS),
+                        choices=PROVIDERS,
+                        help="providers to benchmark")
+    parser.add_argument("--comparisons", nargs="*",
+                        default=list(COMPARISONS), choices=COMPARISONS,
+                        help="optimizations to time against what they "
+                             "replaced, on apps of --leaves leaves")
+    parser.add_argument("--http-provider", default="memory",
+                        choices=PROVIDERS,
+                        help="provider of the API under load")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="number of requests to an endpoint, 0 to "
+                             "skip the load benchmark")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="number of concurrent HTTP clients")
+    parser.add_argument("--workers", type=int, nargs="*", default=[],
+                        help="numbers of API worker processes sharing a "
+                             "store process, none to skip the workers "
+                             "benchmark")
+    parser.add_argument("--restart-leaves", type=int, default=0,
+                        help="number of leaves of all apps restarted from "
+                             "a snapshot, 0 to skip the restart benchmark")
+    parser.add_argument("--url",
+                        help="URL of a running API, one is started "
+                             "otherwise")
+    parser.add_argument("--output", default="benchmarks.json",
+                        help="JSON report file")
+    parser.add_argument("--baseline",
+                        help="JSON report of a previous run to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown ratio above which an operation "
+                             "regressed")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the benchmarks, write and compare their report.
+
+    Returns:
+        The exit status, 1 if an operation regressed
+    """
+    args = parse_args(argv)
+    parameters = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "baseline")}
+    data = report(parameters)
+    apps = generate_apps(
+        apps=args.apps,
+        leaves=args.leaves,
+        depth=args.depth,
+        fan_out=args.fan_out,
+        seed=args.seed)
+    ids = [app["id"] for app in apps]
+
+    with tempfile.TemporaryDirectory() as directory:
+        data["results"].update(bench_providers(
+            names=args.providers,
+            directory=directory,
+            apps=apps,
+            repeat=args.repeat))
+
+        data["results"].update(bench_comparisons(
+            names=args.comparisons,
+            directory=os.path.join(directory, "comparisons"),
+            leaves=args.leaves,
+            repeat=args.repeat))
+
+        if args.restart_leaves:
+            data["results"].update(bench_restarts(
+                directory=os.path.join(directory, "restarts"),
+                apps=generate_apps(
+                    apps=args.apps,
+                    leaves=max(args.restart_leaves // args.apps, 1),
+                    depth=args.depth,
+                    fan_out=args.fan_out,
+                    seed=args.seed)))
+
+        if args.workers and args.requests:
+            data["results"].update(bench_workers(
+                directory=os.path.join(directory, "workers"),
+                apps=apps,
+                counts=args.workers,
+                count=args.requests,
+                concurrency=args.concurrency))
+
+        if args.requests:
+            process = None
+            url = args.url
+            name = "external"
+            if url is None:
+                name = args.http_provider
+                process, url = start_server(env={
+                    "MIND_MAP_DB_PROVIDER": args.http_provider,
+                    "MIND_MAP_DB_PATH": os.path.join(directory, "http.db"),
+                    "MIND_MAP_DB_LOG_PATH": os.path.join(directory, "http"),
+                })
+            try:
+                load_apps(url, apps)
+                data["results"]["http"] = {
+                    name: bench_http(
+                        url=url,
+                        ids=ids,
+                        count=args.requests,
+                        concurrency=args.concurrency)}
+            finally:
+                if process is not None:
+                    stop_server(process)
+
+    write_report(data, args.output)
+    for group, names in data["results"].items():
+        for name, operations in names.items():
+            for operation, stats in operations.items():
+                if "bytes_per_leaf" in stats:
+                    print(
+                        f"{group:<11} {name:<8} {operation:<36} "
+                        f"{stats['bytes_per_leaf']:9.1f} B/leaf")
+                    continue
+                print(
+                    f"{group:<11} {name:<8} {operation:<36} "
+                    f"p50 {stats['p50_ms']:9.3f} ms  "
+                    f"p95 {stats['p95_ms']:9.3f} ms  "
+                    f"p99 {stats['p99_ms']:9.3f} ms  "
+                    f"{stats['per_second']:10.1f}/s")
+    print(f"Report written to {args.output}")
+
+    if args.baseline is None:
+        return 0
+    comparisons = compare(
+        data, read_report(args.baseline), tolerance=args.tolerance)
+    regressions = [item for item in comparisons if item["regression"]]
+    for item in regressions:
+        print(
+            f"Regression {item['operation']}: {COMPARED_STAT} "
+            f"{item['baseline_ms']:.3f} ms -> {item['ms']:.3f} ms "
+            f"(x{item['ratio']:.2f})")
+    print(f"{len(regressions)} regression(s) in {len(comparisons)} "
+          f"operation(s) compared to {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
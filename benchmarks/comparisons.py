@@ -0,0 +1,422 @@
+"""Mind map benchmarks of optimizations, against what they replaced."""
+import asyncio
+import copy
+import os
+import threading
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.data import generate_leaves
+from benchmarks.operations import measure
+from src.columns import MindMapLeafColumns, MindMapSegmentTable
+from src.interfaces import MindMapAppDBInterface
+from src.metrics import MindMapCounter, MindMapHistogram, \
+    MindMapMetricsMiddleware
+from src.models import MindMapApp, MindMapLeaf
+from src.providers import MindMapDBProvider, MindMapIndexedDBProvider, \
+    MindMapTimedDBProvider, MindMapSQLiteDBProvider, \
+    MindMapCachedDBProvider, MindMapCompactDBProvider
+from src.responses import MindMapJSONResponse
+
+# Summaries of the timings by variant, "before" variants first
+Comparison = Callable[[str, int, int], Dict[str, Dict[str, float]]]
+# Number of threads writing while reads are timed
+WRITERS = 4
+
+
+def bench_app(leaves: int) -> List[Dict[str, Any]]:
+    """The apps of a comparison, a single app of generated leaves."""
+    return [{"id": "bench", "data": generate_leaves(count=leaves)}]
+
+
+def list_provider(leaves: int) -> MindMapDBProvider:
+    """The list provider, searched and updated by scans."""
+    db_provider = MindMapDBProvider()
+    db_provider.db = copy.deepcopy(bench_app(leaves))
+    return db_provider
+
+
+def bench_reads(
+        directory: str,
+        leaves: int,
+        repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time responses of an app, validated or dumped as stored.
+
+    Args:
+        directory: A directory for provider files, unused
+        leaves: Number of leaves of the app read
+        repeat: Number of calls of a variant
+
+    Returns:
+        Summaries of the timings by variant
+    """
+    before = list_provider(leaves)
+    after = MindMapIndexedDBProvider(data=bench_app(leaves))
+
+    def read_before(index: int):
+        # Build the app, validate it as response model and serialize
+        mind_map_app = before.read_mind_map_app(id="bench")
+        JSONResponse(jsonable_encoder(MindMapApp(**mind_map_app.dict())))
+
+    def read_after(index: int):
+        MindMapJSONResponse(after.dump_mind_map_app(id="bench"))
+
+    return {
+        "validated": measure(read_before, repeat=repeat),
+        "dumped": measure(read_after, repeat=repeat),
+    }
+
+
+def bench_search(
+        directory: str,
+        leaves: int,
+        repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time a search of a rare word, by a scan or an inverted index.
+
+    Args:
+        directory: A directory for provider files, unused
+        leaves: Number of leaves of the app searched
+        repeat: Number of calls of a variant
+
+    Returns:
+        Summaries of the timings by variant
+    """
+    before = list_provider(leaves)
+    after = MindMapIndexedDBProvider(data=bench_app(leaves))
+    needle = MindMapLeaf(path="a/needle", text="")
+    for db_provider in (before, after):
+        db_provider.add_mind_map_leaf(id="bench", mind_map_leaf=needle)
+
+    return {
+        "scan": measure(
+            lambda i: MindMapAppDBInterface.search_mind_map_leaves(
+                before, query="needle"),
+            repeat=repeat),
+        "index": measure(
+            lambda i: after.search_mind_map_leaves(query="needle"),
+            repeat=repeat),
+    }
+
+
+def bench_upserts(
+        directory: str,
+        leaves: int,
+        repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time upserts at the paths of an app, by a scan or a path index.
+
+    Args:
+        directory: A directory for provider files, unused
+        leaves: Number of leaves of the app updated
+        repeat: Number of calls of a variant
+
+    Returns:
+        Summaries of the timings by variant
+    """
+    paths = [leaf["path"] for leaf in bench_app(leaves)[0]["data"]]
+    before = list_provider(leaves)
+    after = MindMapIndexedDBProvider(data=bench_app(leaves))
+    # The path index is built by the first update
+    after.dedup_mind_map_app(id="bench")
+
+    def upsert(db_provider: MindMapAppDBInterface) -> Callable[[int], Any]:
+        return lambda i: db_provider.upsert_mind_map_leaf(
+            id="bench",
+            mind_map_leaf=MindMapLeaf(path=paths[i % len(paths)]))
+
+    return {
+        "scan": measure(upsert(before), repeat=repeat),
+        "path_index": measure(upsert(after), repeat=repeat),
+    }
+
+
+def bench_stats(
+        directory: str,
+        leaves: int,
+        repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time branch stats, computed from all leaves or kept as they change.
+
+    Args:
+        directory: A directory for the SQLite database
+        leaves: Number of leaves of the app read
+        repeat: Number of calls of a variant
+
+    Returns:
+        Summaries of the timings by variant
+    """
+    db_provider = MindMapIndexedDBProvider(data=bench_app(leaves))
+    os.makedirs(directory, exist_ok=True)
+    sqlite = MindMapSQLiteDBProvider(path=os.path.join(directory, "stats.db"))
+    try:
+        sqlite.create_mind_map_app(mind_map_app=MindMapApp(
+            **bench_app(leaves)[0]))
+        return {
+            "scan": measure(
+                lambda i: MindMapAppDBInterface.read_mind_map_stats(
+                    db_provider, id="bench", depth=2),
+                repeat=repeat),
+            "trie": measure(
+                lambda i: db_provider.read_mind_map_stats(
+                    id="bench", depth=2),
+                repeat=repeat),
+            "sqlite": measure(
+                lambda i: sqlite.read_mind_map_stats(id="bench", depth=2),
+                repeat=repeat),
+        }
+    finally:
+        sqlite.close()
+
+
+def traced_size(build: Callable[[], Any]) -> int:
+    """Size in bytes of the memory allocated by a build, kept until done."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        value = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del value
+    return size
+
+
+def bench_memory(
+        directory: str,
+        leaves: int,
+        repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Measure the memory of leaves, as a list of dict or in columns.
+
+    Args:
+        directory: A directory for provider files, unused
+        leaves: Number of leaves
+        repeat: Number of calls of a variant, unused
+
+    Returns:
+        Bytes per leaf by variant
+    """
+    # New strings for each leaf, as read from a request
+    before = traced_size(lambda: [
+        MindMapLeaf(**leaf).dict()
+        for leaf in generate_leaves(count=leaves)])
+    after = traced_size(lambda: MindMapLeafColumns(
+        table=MindMapSegmentTable(), leaves=generate_leaves(count=leaves)))
+    return {
+        "dicts": {"bytes_per_leaf": before / leaves},
+        "columns": {"bytes_per_leaf": after / leaves},
+    }
+
+
+def bench_cache(
+        directory: str,
+        leaves: int,
+        repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time SQLite reads of an app, without and with the provider cache.
+
+    Args:
+        directory: A directory for the SQLite database
+        leaves: Number of leaves of the app read
+        repeat: Number of calls of a variant
+
+    Returns:
+        Summaries of the timings by variant
+    """
+    os.makedirs(directory, exist_ok=True)
+    backend = MindMapSQLiteDBProvider(path=os.path.join(directory, "cache.db"))
+    try:
+        backend.create_mind_map_app(mind_map_app=MindMapApp(
+            **bench_app(leaves)[0]))
+        cached = MindMapCachedDBProvider(db_provider=backend)
+        cached.dump_mind_map_app(id="bench")
+        return {
+            "sqlite": measure(
+                lambda i: backend.dump_mind_map_app(id="bench"),
+                repeat=repeat),
+            "cached": measure(
+                lambda i: cached.dump_mind_map_app(id="bench"),
+                repeat=repeat),
+        }
+    finally:
+        backend.close()
+
+
+def bench_metrics(
+        directory: str,
+        leaves: int,
+        repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time provider calls and requests, without and with metrics.
+
+    Args:
+        directory: A directory for provider files, unused
+        leaves: Number of leaves of the app read
+        repeat: Number of calls of a variant
+
+    Returns:
+        Summaries of the timings by variant
+    """
+    db_provider = MindMapIndexedDBProvider(data=[{
+        "id": "bench", "data": generate_leaves(count=leaves)}])
+    timed = MindMapTimedDBProvider(
+        db_provider=db_provider,
+        histogram=MindMapHistogram("seconds", "", labels=("method",)),
+        errors=MindMapCounter("errors", "", labels=("method",)))
+
+    async def endpoint(
+            scope: Dict[str, Any],
+            receive: Callable[[], Awaitable[Dict[str, Any]]],
+            send: Callable[[Dict[str, Any]], Awaitable[None]]):
+        await send({"type": "http.response.start", "status": 200})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def nothing(message: Dict[str, Any]):
+        pass
+
+    scope = {"type": "http", "method": "GET"}
+    middleware = MindMapMetricsMiddleware(
+        endpoint, histogram=MindMapHistogram(
+            "seconds", "", labels=("method", "route", "status")))
+    loop = asyncio.new_event_loop()
+    try:
+        return {
+            "provider_call": measure(
+                lambda i: db_provider.read_mind_map_app_version(id="bench"),
+                repeat=repeat),
+            "provider_call.timed": measure(
+                lambda i: timed.read_mind_map_app_version(id="bench"),
+                repeat=repeat),
+            "request": measure(
+                lambda i: loop.run_until_complete(
+                    endpoint(scope, None, nothing)),
+                repeat=repeat),
+            "request.metrics": measure(
+                lambda i: loop.run_until_complete(
+                    middleware(scope, None, nothing)),
+                repeat=repeat),
+        }
+    finally:
+        loop.close()
+
+
+def reads_during_writes(
+        db_provider: MindMapAppDBInterface,
+        leaves: int,
+        repeat: int
+) -> Dict[str, float]:
+    """
+    Time reads of all apps while WRITERS threads upsert leaves.
+
+    Each writer upserts the leaves of its own app, which keeps
+    `leaves` paths, until the reads are timed.
+
+    Args:
+        db_provider: A provider
+        leaves: Number of paths of an app written
+        repeat: Number of reads
+
+    Returns:
+        A summary of the timings of the reads
+    """
+    done = threading.Event()
+
+    def write(writer: int):
+        id = f"writer-{writer}"
+        db_provider.create_mind_map_app(mind_map_app=MindMapApp(id=id))
+        index = 0
+        while not done.is_set():
+            db_provider.upsert_mind_map_leaf(
+                id=id,
+                mind_map_leaf=MindMapLeaf(
+                    path=f"x/{index % leaves}", text=str(index)))
+            index += 1
+
+    writers = [
+        threading.Thread(target=write, args=(writer,))
+        for writer in range(WRITERS)]
+    for thread in writers:
+        thread.start()
+    try:
+        return measure(
+            lambda i: db_provider.dump_mind_map_apps(), repeat=repeat)
+    finally:
+        done.set()
+        for thread in writers:
+            thread.join()
+
+
+def bench_concurrency(
+        directory: str,
+        leaves: int,
+        repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time snapshot reads of all apps during writes, by provider.
+
+    Args:
+        directory: A directory for provider files, unused
+        leaves: Number of leaves of the app read
+        repeat: Number of calls of a variant
+
+    Returns:
+        Summaries of the timings by variant
+    """
+    return {
+        "indexed": reads_during_writes(
+            MindMapIndexedDBProvider(data=bench_app(leaves)),
+            leaves=leaves,
+            repeat=repeat),
+        "compact": reads_during_writes(
+            MindMapCompactDBProvider(data=bench_app(leaves)),
+            leaves=leaves,
+            repeat=repeat),
+    }
+
+
+COMPARISONS: Dict[str, Comparison] = {
+    "reads": bench_reads,
+    "search": bench_search,
+    "upserts": bench_upserts,
+    "stats": bench_stats,
+    "memory": bench_memory,
+    "cache": bench_cache,
+    "metrics": bench_metrics,
+    "concurrency": bench_concurrency,
+}
+
+
+def bench_comparisons(
+        names: List[str],
+        directory: str,
+        leaves: int,
+        repeat: int
+) -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+    """
+    Run comparisons of optimizations.
+
+    Args:
+        names: Comparison names, see COMPARISONS
+        directory: A directory for provider files
+        leaves: Number of leaves of the compared apps
+        repeat: Number of calls of a variant
+
+    Returns:
+        Summaries of the timings by comparison and variant, in the
+        comparisons group, or bytes per leaf for the memory comparison
+    """
+    return {"comparisons": {
+        name: COMPARISONS[name](os.path.join(directory, name), leaves, repeat)
+        for name in names}}
@@ -0,0 +1,86 @@
+"""Mind map benchmark data."""
+import random
+from typing import Any, Dict, List
+
+# Words of the generated leaf texts, searched by the benchmarks
+WORDS = (
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf",
+    "hotel", "india", "juliett", "kilo", "lima", "mike", "november",
+    "oscar", "papa", "quebec", "romeo", "sierra", "tango",
+)
+
+
+def generate_path(rng: random.Random, depth: int, fan_out: int) -> str:
+    """
+    Generate a leaf path.
+
+    Args:
+        rng: A random generator
+        depth: Number of path segments
+        fan_out: Number of distinct segments at each level
+
+    Returns:
+        A path, e.g. "n3/n0/n7"
+    """
+    return "/".join(f"n{rng.randrange(fan_out)}" for _ in range(depth))
+
+
+def generate_leaves(
+        count: int,
+        depth: int = 4,
+        fan_out: int = 8,
+        words: int = 3,
+        seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Generate leaves as a dict.
+
+    Args:
+        count: Number of leaves
+        depth: Number of path segments of a leaf
+        fan_out: Number of children of a branch, at most
+        words: Number of words of a leaf text
+        seed: Seed of the random generator, same seed same leaves
+
+    Returns:
+        A list of leaves as a dict
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            "path": generate_path(rng, depth=depth, fan_out=fan_out),
+            "text": " ".join(rng.choice(WORDS) for _ in range(words)),
+        }
+        for _ in range(count)]
+
+
+def generate_apps(
+        apps: int,
+        leaves: int,
+        depth: int = 4,
+        fan_out: int = 8,
+        seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Generate apps as a dict.
+
+    Args:
+        apps: Number of apps
+        leaves: Number of leaves of an app
+        depth: Number of path segments of a leaf
+        fan_out: Number of children of a branch, at most
+        seed: Seed of the random generator, same seed same apps
+
+    Returns:
+        A list of apps as a dict, ids are "map-0", "map-1"...
+    """
+    return [
+        {
+            "id": f"map-{index}",
+            "data": generate_leaves(
+                count=leaves,
+                depth=depth,
+                fan_out=fan_out,
+                seed=seed * apps + index),
+        }
+        for index in range(apps)]
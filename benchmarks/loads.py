@@ -0,0 +1,169 @@
+"""Mind map HTTP load benchmarks."""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from benchmarks.reports import summarize
+from src.models import MindMapApp
+from src.transfers import export_lines
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# An endpoint: method, path and JSON body, "{id}" is an app id
+Endpoint = Tuple[str, str, Optional[Dict[str, Any]]]
+
+ENDPOINTS: Dict[str, Endpoint] = {
+    "GET /": ("GET", "/", None),
+    "GET /apps": ("GET", "/apps", None),
+    "GET /apps/{id}": ("GET", "/apps/{id}", None),
+    "PUT /apps/{id}": (
+        "PUT", "/apps/{id}", {"path": "bench/leaf", "text": "bravo"}),
+}
+
+
+def free_port() -> int:
+    """A free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(
+        env: Dict[str, str],
+        timeout: float = 20,
+        workers: int = 1
+) -> Tuple[subprocess.Popen, str]:
+    """
+    Start an API process and wait until it answers.
+
+    Args:
+        env: Environment variables added to the current ones, e.g.
+            MIND_MAP_DB_PROVIDER
+        timeout: Max number of seconds to wait
+        workers: Number of API worker processes
+
+    Returns:
+        The API process and its URL
+    """
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app",
+         "--port", str(port), "--log-level", "warning",
+         "--workers", str(workers)],
+        cwd=ROOT, env={**os.environ, **env},
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(process.stdout.read())
+        try:
+            requests.get(f"{url}/apps", params={"limit": 1}, timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    stop_server(process)
+    raise TimeoutError(f"API not ready at {url}")
+
+
+def stop_server(process: subprocess.Popen):
+    """
+    Stop an API process.
+
+    Args:
+        process: An API process
+    """
+    process.terminate()
+    process.wait(timeout=10)
+    process.stdout.close()
+
+
+def load_apps(url: str, apps: List[Dict[str, Any]]):
+    """
+    Import apps through the API.
+
+    Args:
+        url: The API URL
+        apps: Apps as a dict
+    """
+    body = "".join(export_lines(MindMapApp(**app)) for app in apps)
+    response = requests.post(f"{url}/import", data=body.encode())
+    response.raise_for_status()
+
+
+def drive(
+        url: str,
+        endpoint: Endpoint,
+        ids: List[str],
+        count: int,
+        concurrency: int
+) -> Dict[str, float]:
+    """
+    Send requests to an endpoint from concurrent clients.
+
+    Args:
+        url: The API URL
+        endpoint: The endpoint
+        ids: App ids, used in turn
+        count: Number of requests
+        concurrency: Number of clients, each with its own connection
+
+    Returns:
+        A summary of the latencies of the requests
+    """
+    method, path, body = endpoint
+    timings: List[float] = []
+    lock = threading.Lock()
+
+    def client(worker: int):
+        latencies = []
+        with requests.Session() as session:
+            for index in range(worker, count, concurrency):
+                target = url + path.format(id=ids[index % len(ids)])
+                start = time.perf_counter()
+                response = session.request(method, target, json=body)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+        with lock:
+            timings.extend(latencies)
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    return summarize(timings, time.perf_counter() - started_at)
+
+
+def bench_http(
+        url: str,
+        ids: List[str],
+        count: int,
+        concurrency: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Load each endpoint in turn, reads first.
+
+    Args:
+        url: The API URL
+        ids: Ids of the loaded apps
+        count: Number of requests to an endpoint
+        concurrency: Number of concurrent clients
+
+    Returns:
+        Summaries of the latencies by endpoint
+    """
+    return {
+        name: drive(
+            url=url,
+            endpoint=endpoint,
+            ids=ids,
+            count=count,
+            concurrency=concurrency)
+        for name, endpoint in ENDPOINTS.items()}
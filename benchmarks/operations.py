@@ -0,0 +1,303 @@
+"""Mind map provider and use case benchmarks."""
+import asyncio
+import contextlib
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+import jinja2
+
+from benchmarks.data import generate_leaves
+from benchmarks.reports import summarize
+from src.applications import ReadMindMapApps, ReadMindMapAppsPage, \
+    IterMindMapApps, ReadMindMapApp, DumpMindMapApps, DumpMindMapAppsPage, \
+    DumpMindMapApp, ReadMindMapAppTree, SearchMindMapLeaves, \
+    IterMindMapAppTrees, AsyncIterMindMapAppTrees, CreateMindMapApp, \
+    AddMindMapLeaf, AddMindMapLeaves, ExportMindMapApps, ImportMindMapApps, \
+    UpsertMindMapLeaf
+from src.interfaces import MindMapAppDBInterface, MindMapAppAsyncDBInterface
+from src.models import MindMapApp, MindMapLeaf
+from src.providers import get_db_provider, MindMapAsyncDBProvider
+from src.responses import render_chunks
+from src.settings import Settings
+from src.transfers import export_lines
+
+# Providers benchmarked by default, the remote one needs a store
+PROVIDERS = ("memory", "compact", "sqlite", "log")
+# Number of leaves of a write
+BATCH_SIZE = 10
+
+# An operation, called with its iteration number
+Operation = Callable[[int], Any]
+# Templates of the pages, rendered as served
+TEMPLATES = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "templates")),
+    autoescape=True,
+    enable_async=True)
+
+
+def measure(operation: Operation, repeat: int) -> Dict[str, float]:
+    """
+    Time an operation.
+
+    Args:
+        operation: An operation
+        repeat: Number of calls
+
+    Returns:
+        A summary of the timings of the calls
+    """
+    timings = []
+    started_at = time.perf_counter()
+    for index in range(repeat):
+        start = time.perf_counter()
+        operation(index)
+        timings.append(time.perf_counter() - start)
+    return summarize(timings, time.perf_counter() - started_at)
+
+
+def make_provider(
+        name: str,
+        directory: str,
+        apps: List[Dict[str, Any]]
+) -> MindMapAppDBInterface:
+    """
+    Create a provider and load apps.
+
+    Args:
+        name: A provider name, as for MIND_MAP_DB_PROVIDER
+        directory: A directory for the provider files
+        apps: Apps as a dict
+
+    Returns:
+        A provider
+    """
+    db_provider = get_db_provider(settings=Settings(
+        db_provider=name,
+        db_path=os.path.join(directory, f"{name}.db"),
+        db_log_path=os.path.join(directory, f"{name}_data")))
+    for app in apps:
+        db_provider.create_mind_map_app(mind_map_app=MindMapApp(**app))
+    return db_provider
+
+
+def new_apps(repeat: int, prefix: str) -> List[MindMapApp]:
+    """Apps to create, one per call."""
+    leaves = generate_leaves(count=BATCH_SIZE, seed=repeat)
+    return [
+        MindMapApp(id=f"{prefix}-{index}", data=leaves)
+        for index in range(repeat)]
+
+
+def provider_operations(
+        db_provider: MindMapAppDBInterface,
+        ids: List[str],
+        repeat: int,
+        stack: contextlib.ExitStack
+) -> Dict[str, Operation]:
+    """
+    Operations of each provider method, reads first.
+
+    Args:
+        db_provider: A provider
+        ids: Ids of the loaded apps
+        repeat: Number of calls of an operation
+        stack: Resources released once the operations are run, unused
+
+    Returns:
+        Operations by method name
+    """
+    leaves = [
+        MindMapLeaf(**leaf)
+        for leaf in generate_leaves(count=BATCH_SIZE, seed=repeat)]
+    apps = new_apps(repeat, prefix="provider")
+
+    def id(index: int) -> str:
+        return ids[index % len(ids)]
+
+    return {
+        "read_mind_map_apps": lambda i: db_provider.read_mind_map_apps(),
+        "read_mind_map_apps_page":
+            lambda i: db_provider.read_mind_map_apps_page(limit=10),
+        "iter_mind_map_apps":
+            lambda i: list(db_provider.iter_mind_map_apps()),
+        "read_mind_map_app":
+            lambda i: db_provider.read_mind_map_app(id=id(i)),
+        "dump_mind_map_apps": lambda i: db_provider.dump_mind_map_apps(),
+        "dump_mind_map_apps_page":
+            lambda i: db_provider.dump_mind_map_apps_page(limit=10),
+        "dump_mind_map_app":
+            lambda i: db_provider.dump_mind_map_app(id=id(i)),
+        "read_mind_map_apps_version":
+            lambda i: db_provider.read_mind_map_apps_version(),
+        "read_mind_map_app_version":
+            lambda i: db_provider.read_mind_map_app_version(id=id(i)),
+        "read_mind_map_tree":
+            lambda i: db_provider.read_mind_map_tree(id=id(i), prefix="n0"),
+        "search_mind_map_leaves":
+            lambda i: db_provider.search_mind_map_leaves(query="alpha"),
+        "create_mind_map_app":
+            lambda i: db_provider.create_mind_map_app(mind_map_app=apps[i]),
+        "add_mind_map_leaf": lambda i: db_provider.add_mind_map_leaf(
+            id=id(i), mind_map_leaf=leaves[i % BATCH_SIZE]),
+        "add_mind_map_leaves": lambda i: db_provider.add_mind_map_leaves(
+            id=id(i), mind_map_leaves=leaves),
+        "upsert_mind_map_leaf": lambda i: db_provider.upsert_mind_map_leaf(
+            id=id(i), mind_map_leaf=leaves[i % BATCH_SIZE]),
+    }
+
+
+async def render_root(db_provider: MindMapAppAsyncDBInterface) -> int:
+    """
+    Render the root page as served, an app at a time.
+
+    Args:
+        db_provider: An async provider
+
+    Returns:
+        Size in bytes of the page
+    """
+    size = 0
+    async for chunk in render_chunks(
+            TEMPLATES.get_template("index.html"),
+            apps=AsyncIterMindMapAppTrees(db_provider=db_provider)(depth=1)):
+        size += len(chunk)
+    return size
+
+
+def use_case_operations(
+        db_provider: MindMapAppDBInterface,
+        ids: List[str],
+        repeat: int,
+        stack: contextlib.ExitStack
+) -> Dict[str, Operation]:
+    """
+    Operations of each use case, reads first.
+
+    Args:
+        db_provider: A provider
+        ids: Ids of the loaded apps
+        repeat: Number of calls of an operation
+        stack: Resources released once the operations are run, the
+            event loop and async provider of the root page
+
+    Returns:
+        Operations by use case name
+    """
+    leaves = [
+        MindMapLeaf(**leaf)
+        for leaf in generate_leaves(count=BATCH_SIZE, seed=repeat)]
+    apps = new_apps(repeat, prefix="use-case")
+    imports = [
+        export_lines(app).encode()
+        for app in new_apps(repeat, prefix="import")]
+    loop = asyncio.new_event_loop()
+    stack.callback(loop.close)
+    async_provider = MindMapAsyncDBProvider(db_provider=db_provider)
+    stack.callback(async_provider.close)
+
+    read_apps = ReadMindMapApps(db_provider=db_provider)
+    read_apps_page = ReadMindMapAppsPage(db_provider=db_provider)
+    iter_apps = IterMindMapApps(db_provider=db_provider)
+    read_app = ReadMindMapApp(db_provider=db_provider)
+    dump_apps = DumpMindMapApps(db_provider=db_provider)
+    dump_apps_page = DumpMindMapAppsPage(db_provider=db_provider)
+    dump_app = DumpMindMapApp(db_provider=db_provider)
+    read_tree = ReadMindMapAppTree(db_provider=db_provider)
+    search = SearchMindMapLeaves(db_provider=db_provider)
+    iter_trees = IterMindMapAppTrees(db_provider=db_provider)
+    export_apps = ExportMindMapApps(db_provider=db_provider)
+    create_app = CreateMindMapApp(db_provider=db_provider)
+    add_leaf = AddMindMapLeaf(db_provider=db_provider)
+    add_leaves = AddMindMapLeaves(db_provider=db_provider)
+    upsert_leaf = UpsertMindMapLeaf(db_provider=db_provider)
+    import_apps = ImportMindMapApps(db_provider=db_provider)
+
+    def id(index: int) -> str:
+        return ids[index % len(ids)]
+
+    return {
+        "ReadMindMapApps": lambda i: read_apps(),
+        "ReadMindMapAppsPage": lambda i: read_apps_page(limit=10),
+        "IterMindMapApps": lambda i: list(iter_apps()),
+        "ReadMindMapApp": lambda i: read_app(id=id(i)),
+        "DumpMindMapApps": lambda i: dump_apps(),
+        "DumpMindMapAppsPage": lambda i: dump_apps_page(limit=10),
+        "DumpMindMapApp": lambda i: dump_app(id=id(i)),
+        "ReadMindMapAppTree": lambda i: read_tree(id=id(i), prefix="n0"),
+        "SearchMindMapLeaves": lambda i: search(query="alpha"),
+        "IterMindMapAppTrees": lambda i: list(iter_trees(depth=1)),
+        "AsyncIterMindMapAppTrees.render":
+            lambda i: loop.run_until_complete(render_root(async_provider)),
+        "ExportMindMapApps": lambda i: list(export_apps()),
+        "CreateMindMapApp": lambda i: create_app(mind_map_app=apps[i]),
+        "AddMindMapLeaf":
+            lambda i: add_leaf(id=id(i), mind_map_leaf=leaves[i % BATCH_SIZE]),
+        "AddMindMapLeaves":
+            lambda i: add_leaves(id=id(i), mind_map_leaves=leaves),
+        "UpsertMindMapLeaf": lambda i: upsert_leaf(
+            id=id(i), mind_map_leaf=leaves[i % BATCH_SIZE]),
+        "ImportMindMapApps": lambda i: import_apps(chunks=[imports[i]]),
+    }
+
+
+def run_operations(
+        operations: Dict[str, Operation],
+        repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time operations one after the other.
+
+    Args:
+        operations: Operations by name
+        repeat: Number of calls of an operation
+
+    Returns:
+        Summaries of the timings by operation name
+    """
+    return {
+        name: measure(operation, repeat=repeat)
+        for name, operation in operations.items()}
+
+
+def bench_providers(
+        names: List[str],
+        directory: str,
+        apps: List[Dict[str, Any]],
+        repeat: int
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Benchmark provider methods and use cases, for each provider.
+
+    A provider is loaded with the apps before each of both benchmarks,
+    so that use cases do not read the writes of methods.
+
+    Args:
+        names: Provider names, as for MIND_MAP_DB_PROVIDER
+        directory: A directory for the provider files
+        apps: Apps as a dict
+        repeat: Number of calls of an operation
+
+    Returns:
+        Results of the "providers" and "use_cases" groups, by provider
+        name then operation name
+    """
+    ids = [app["id"] for app in apps]
+    results: Dict[str, Dict[str, Dict[str, float]]] = {
+        "providers": {}, "use_cases": {}}
+    for name in names:
+        for group, operations in (
+                ("providers", provider_operations),
+                ("use_cases", use_case_operations)):
+            path = os.path.join(directory, group)
+            os.makedirs(path, exist_ok=True)
+            db_provider = make_provider(name=name, directory=path, apps=apps)
+            with contextlib.ExitStack() as stack:
+                stack.callback(db_provider.close)
+                results[group][name] = run_operations(
+                    operations(
+                        db_provider, ids=ids, repeat=repeat, stack=stack),
+                    repeat=repeat)
+    return results
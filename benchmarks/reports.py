@@ -0,0 +1,142 @@
+"""Mind map benchmark reports."""
+import json
+import math
+import platform
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Stat compared against a baseline
+COMPARED_STAT = "p50"
+
+
+def percentile(timings: List[float], q: float) -> float:
+    """
+    Read a percentile, by nearest rank.
+
+    Args:
+        timings: Sorted timings
+        q: A percentile, between 0 and 100
+
+    Returns:
+        The timing at the percentile, 0.0 without timings
+    """
+    if not timings:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(timings)), 1)
+    return timings[rank - 1]
+
+
+def summarize(timings: List[float], elapsed: float) -> Dict[str, float]:
+    """
+    Summarize timings.
+
+    Args:
+        timings: Timings of the operations, in seconds
+        elapsed: Wall time of all operations, in seconds, operations
+            may overlap
+
+    Returns:
+        Count, mean and percentiles in milliseconds, and operations
+        per second
+    """
+    timings = sorted(timings)
+    count = len(timings)
+    return {
+        "count": count,
+        "mean_ms": sum(timings) / count * 1000 if count else 0.0,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "per_second": count / elapsed if elapsed else 0.0,
+    }
+
+
+def report(parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Start a report.
+
+    Args:
+        parameters: Parameters of the run
+
+    Returns:
+        An empty report, with the run environment and parameters
+    """
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "results": {},
+    }
+
+
+def write_report(data: Dict[str, Any], path: str):
+    """
+    Write a report as JSON.
+
+    Args:
+        data: A report
+        path: A file path
+    """
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def read_report(path: str) -> Dict[str, Any]:
+    """
+    Read a report written as JSON.
+
+    Args:
+        path: A file path
+
+    Returns:
+        A report
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+def flatten(results: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    """Compared stats of a report, by "group/name/operation", timed only."""
+    for group, names in sorted(results.items()):
+        for name, operations in sorted(names.items()):
+            for operation, stats in sorted(operations.items()):
+                if f"{COMPARED_STAT}_ms" not in stats:
+                    continue
+                yield (
+                    f"{group}/{name}/{operation}",
+                    stats[f"{COMPARED_STAT}_ms"])
+
+
+def compare(
+        data: Dict[str, Any],
+        baseline: Dict[str, Any],
+        tolerance: float = 0.2
+) -> List[Dict[str, Any]]:
+    """
+    Compare a report against a baseline.
+
+    Args:
+        data: A report
+        baseline: A report of a previous run
+        tolerance: Slowdown ratio above which an operation regressed
+
+    Returns:
+        A list of comparisons of the operations of both reports, with
+        their ratio to the baseline
+    """
+    before = dict(flatten(baseline["results"]))
+    comparisons = []
+    for key, value in flatten(data["results"]):
+        if key not in before:
+            continue
+        ratio = value / before[key] if before[key] else 1.0
+        comparisons.append({
+            "operation": key,
+            "baseline_ms": before[key],
+            "ms": value,
+            "ratio": ratio,
+            "regression": ratio > 1 + tolerance,
+        })
+    return comparisons
@@ -0,0 +1,71 @@
+"""Mind map log provider restart benchmarks."""
+import gc
+import os
+import time
+from typing import Any, Dict, List
+
+from benchmarks.reports import summarize
+from src.providers import MindMapLogDBProvider
+from src.storages import write_binary_snapshot, write_snapshot
+
+# Snapshot file of the first generation of a log provider
+SNAPSHOT_FILE = "snapshot-0000000001"
+
+
+def write_snapshots(directory: str, apps: List[Dict[str, Any]]):
+    """
+    Write the same apps as a JSON and as a binary snapshot.
+
+    Args:
+        directory: A directory, with a data directory per format
+        apps: Apps as a dict
+    """
+    json_path = os.path.join(directory, "json")
+    binary_path = os.path.join(directory, "binary")
+    for path in (json_path, binary_path):
+        os.makedirs(path, exist_ok=True)
+    write_snapshot(
+        os.path.join(json_path, SNAPSHOT_FILE),
+        ({"op": "create", **app} for app in apps))
+    write_binary_snapshot(
+        os.path.join(binary_path, SNAPSHOT_FILE),
+        ((app["id"], app["data"]) for app in apps))
+
+
+def bench_restarts(
+        directory: str,
+        apps: List[Dict[str, Any]]
+) -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+    """
+    Time log provider restarts from a JSON and from a binary snapshot.
+
+    A restart is timed until the provider is ready, then until its first
+    app is read, then until all apps are read.
+
+    Args:
+        directory: A directory for the snapshot files
+        apps: Apps as a dict
+
+    Returns:
+        Timing summaries by format and step, in the restarts group
+    """
+    write_snapshots(directory, apps)
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for name in ("json", "binary"):
+        start = time.perf_counter()
+        provider = MindMapLogDBProvider(path=os.path.join(directory, name))
+        ready = time.perf_counter() - start
+        provider.dump_mind_map_app(id=apps[0]["id"])
+        first_read = time.perf_counter() - start
+        provider.dump_mind_map_apps()
+        all_read = time.perf_counter() - start
+        provider.close()
+        # Not to time the release of this provider in the next restart
+        del provider
+        gc.collect()
+
+        results[name] = {
+            "ready": summarize([ready], ready),
+            "first_read": summarize([first_read], first_read),
+            "all_read": summarize([all_read], all_read)}
+    return {"restarts": results}
@@ -0,0 +1,88 @@
+"""Mind map multi-process worker benchmarks."""
+import os
+import secrets
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+from benchmarks.loads import ENDPOINTS, ROOT, drive, load_apps, \
+    start_server, stop_server
+
+# Endpoints loaded for each number of workers, reads only
+WORKER_ENDPOINTS = ("GET /apps", "GET /apps/{id}")
+
+
+def start_store(env: Dict[str, str]) -> subprocess.Popen:
+    """
+    Start a store process and wait until it listens.
+
+    Args:
+        env: Environment variables added to the current ones, with
+            MIND_MAP_DB_ADDRESS and MIND_MAP_DB_AUTHKEY
+
+    Returns:
+        The store process
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "src.stores"],
+        cwd=ROOT, env={**os.environ, **env},
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    line = process.stdout.readline()
+    if "listening" not in line:
+        stop_server(process)
+        raise RuntimeError(line)
+    return process
+
+
+def bench_workers(
+        directory: str,
+        apps: List[Dict[str, Any]],
+        counts: List[int],
+        count: int,
+        concurrency: int
+) -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+    """
+    Load API processes of several workers sharing a store process.
+
+    The same store serves every number of workers, its apps are loaded
+    once.
+
+    Args:
+        directory: A directory for the store socket
+        apps: Apps as a dict
+        counts: Numbers of API worker processes
+        count: Number of requests to an endpoint
+        concurrency: Number of concurrent clients
+
+    Returns:
+        Summaries of the latencies by number of workers and endpoint,
+        in the workers group
+    """
+    env = {
+        "MIND_MAP_DB_PROVIDER": "remote",
+        "MIND_MAP_DB_ADDRESS": os.path.join(directory, "store.sock"),
+        "MIND_MAP_DB_AUTHKEY": secrets.token_hex(16),
+    }
+    os.makedirs(directory, exist_ok=True)
+    ids = [app["id"] for app in apps]
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    store = start_store(env)
+    try:
+        for index, workers in enumerate(counts):
+            process, url = start_server(env=env, workers=workers)
+            try:
+                if not index:
+                    load_apps(url, apps)
+                results[f"remote-{workers}"] = {
+                    name: drive(
+                        url=url,
+                        endpoint=ENDPOINTS[name],
+                        ids=ids,
+                        count=count,
+                        concurrency=concurrency)
+                    for name in WORKER_ENDPOINTS}
+            finally:
+                stop_server(process)
+    finally:
+        stop_server(store)
+    return {"workers": results}
@@ -1,20 +1,117 @@
 """Main Mind map leaf API."""
-from typing import List
+import asyncio
+import time
+from typing import List, Optional, AsyncIterator, Dict, Any, Hashable, \
+    Union
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+import jinja2
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import HTMLResponse, StreamingResponse, \
+    PlainTextResponse
 
-from src.applications import ReadMindMapApps, ReadMindMapApp, \
-    CreateMindMapApp, ReadMindMapAppsPrettyFormat, AddMindMapLeaf
+from src.applications import AsyncCreateMindMapApp, \
+    AsyncAddMindMapLeaf, \
+    AsyncReadMindMapAppTree, AsyncIterMindMapApps, AsyncDumpMindMapApps, \
+    AsyncDumpMindMapAppsPage, AsyncDumpMindMapApp, AsyncAddMindMapLeaves, \
+    AsyncExportMindMapApps, AsyncImportMindMapApps, AsyncSearchMindMapLeaves, \
+    AsyncReadMindMapChanges, AsyncReadMindMapAppStats, \
+    AsyncUpsertMindMapLeaf, AsyncDeleteMindMapLeaves, AsyncDedupMindMapApp, \
+    AsyncIterMindMapAppTrees
+from src.caches import LRUCache
+from src.changes import MindMapChangeFeed
+from src.metrics import MindMapMetricsRegistry, MindMapHistogram, \
+    MindMapCounter, MindMapGauge, MindMapMetricsMiddleware, \
+    PROMETHEUS_MEDIA_TYPE
 from src.models import MindMapApp, MindMapLeaf, MindMapAppCreateError, \
-    MindMapAppAddError
-from src.providers import MindMapDBProvider
+    MindMapAppAddError, MindMapTreeNode, MindMapLeavesSummary, \
+    MindMapAppExceptions, MindMapImportSummary, MindMapSearchHit, \
+    MindMapChanges, MindMapBranchStats, MindMapAppUpdateError
+from src.profiles import MindMapProfileStore, MindMapProfilingMiddleware, \
+    PROFILE_SORTS
+from src.providers import get_db_provider, MindMapAsyncDBProvider, \
+    MindMapTimedDBProvider, MindMapProfiledAsyncDBProvider, \
+    MindMapCachedDBProvider, MindMapChangesDBProvider
+from src.responses import MindMapJSONResponse, render_chunks, \
+    RENDER_CHUNK_SIZE
+from src.settings import Settings
 
+SETTINGS = Settings()
+# Metrics served by /metrics
+METRICS = MindMapMetricsRegistry()
+REQUEST_SECONDS = METRICS.register(MindMapHistogram(
+    "mind_map_http_request_duration_seconds",
+    "Duration of HTTP requests.",
+    labels=("method", "route", "status")))
+PROVIDER_SECONDS = METRICS.register(MindMapHistogram(
+    "mind_map_provider_call_duration_seconds",
+    "Duration of provider calls.",
+    labels=("method",)))
+PROVIDER_ERRORS = METRICS.register(MindMapCounter(
+    "mind_map_provider_call_errors_total",
+    "Number of failed provider calls.",
+    labels=("method",)))
+RENDER_SECONDS = METRICS.register(MindMapHistogram(
+    "mind_map_template_render_duration_seconds",
+    "Duration of template renders.",
+    labels=("template",)))
+STORE_APPS = METRICS.register(MindMapGauge(
+    "mind_map_store_apps",
+    "Number of stored apps."))
+STORE_LEAVES = METRICS.register(MindMapGauge(
+    "mind_map_store_leaves",
+    "Number of stored leaves."))
+CACHE_HITS = METRICS.register(MindMapGauge(
+    "mind_map_cache_hits",
+    "Number of cache hits.",
+    labels=("cache",)))
+CACHE_MISSES = METRICS.register(MindMapGauge(
+    "mind_map_cache_misses",
+    "Number of cache misses.",
+    labels=("cache",)))
+CACHE_EVICTIONS = METRICS.register(MindMapGauge(
+    "mind_map_cache_evictions",
+    "Number of cache evictions.",
+    labels=("cache",)))
+CACHE_HIT_RATIO = METRICS.register(MindMapGauge(
+    "mind_map_cache_hit_ratio",
+    "Ratio of cache hits to cache reads.",
+    labels=("cache",)))
 # Define provider for dependency injection
-DB_PROVIDER = MindMapDBProvider()
-# Define jinja template directory
-templates = Jinja2Templates(directory="templates")
+DB_PROVIDER = get_db_provider(settings=SETTINGS)
+# Changes of apps, None when kept by the store process of the remote
+# provider, whose changes are then polled
+CHANGES = None
+CHANGES_DB_PROVIDER = DB_PROVIDER
+if SETTINGS.db_provider != "remote":
+    CHANGES = MindMapChangeFeed(retain=SETTINGS.changes_retain)
+    CHANGES_DB_PROVIDER = MindMapChangesDBProvider(
+        db_provider=DB_PROVIDER, feed=CHANGES)
+# Profiles of requests, None when profiling is disabled
+PROFILES = None
+AsyncDBProvider = MindMapAsyncDBProvider
+if SETTINGS.profiling:
+    PROFILES = MindMapProfileStore(max_size=SETTINGS.profile_history)
+    AsyncDBProvider = MindMapProfiledAsyncDBProvider
+# Run the provider in a thread pool, out of the event loop
+ASYNC_DB_PROVIDER = AsyncDBProvider(
+    db_provider=MindMapTimedDBProvider(
+        db_provider=CHANGES_DB_PROVIDER,
+        histogram=PROVIDER_SECONDS,
+        errors=PROVIDER_ERRORS),
+    max_workers=SETTINGS.db_workers)
+# Media type of the streamed apps, one JSON app per line
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Media type of the streamed changes, server-sent events
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+# Comment sent on an idle change stream, so that proxies keep it open
+KEEPALIVE_EVENT = ": keepalive\n\n"
+# Rendered pages, by version of the apps
+RENDER_CACHE = LRUCache(max_size=SETTINGS.render_cache_size)
+# Define jinja template directory, templates are rendered by chunks
+templates = jinja2.Environment(
+    loader=jinja2.FileSystemLoader("templates"),
+    autoescape=True,
+    enable_async=True)
 
 tags_metadata = [
     {
@@ -46,40 +143,502 @@ app = FastAPI(
     },
     openapi_tags=tags_metadata,
 )
+app.add_middleware(MindMapMetricsMiddleware, histogram=REQUEST_SECONDS)
+if PROFILES is not None:
+    app.add_middleware(
+        MindMapProfilingMiddleware,
+        profiles=PROFILES,
+        hosts=SETTINGS.profile_hosts)
+
+
+@app.on_event("shutdown")
+def shutdown():
+    """Release provider resources."""
+    ASYNC_DB_PROVIDER.close()
+    DB_PROVIDER.close()
+
+
+async def render_root(key: Hashable) -> AsyncIterator[bytes]:
+    """
+    Render the root page as the apps are read, an app at a time.
+
+    The page is kept in the render cache if it is small enough.
+
+    Args:
+        key: The render cache key of the page
+    """
+    start = time.perf_counter()
+    page: Optional[List[bytes]] = []
+    page_size = 0
+    async for chunk in render_chunks(
+            templates.get_template("index.html"),
+            chunk_size=RENDER_CHUNK_SIZE,
+            apps=AsyncIterMindMapAppTrees(db_provider=ASYNC_DB_PROVIDER)(
+                depth=1)):
+        if page is not None:
+            page_size += len(chunk)
+            if page_size <= SETTINGS.render_cache_page_size:
+                page.append(chunk)
+            else:
+                page = None
+        yield chunk
+
+    RENDER_SECONDS.observe(time.perf_counter() - start, "index.html")
+    if page is not None:
+        RENDER_CACHE.set(key, b"".join(page), size=page_size)
 
 
 @app.get("/", response_class=HTMLResponse)
-async def read_root(request: Request):
-    """Read all apps in html."""
-    mind_map_items = ReadMindMapAppsPrettyFormat(db_provider=DB_PROVIDER)()
+async def read_root(request: Request) -> Response:
+    """
+    Read all apps in html.
+
+    Each app is rendered with its first level branches, a branch is
+    read from /apps/{app_id}/fragment when expanded. The page is
+    streamed as it is rendered, an app at a time, and kept in the
+    render cache until the next write if it is not bigger than
+    MIND_MAP_RENDER_CACHE_PAGE_SIZE.
+    """
+    version = await ASYNC_DB_PROVIDER.read_mind_map_apps_version()
+    key = ("index.html", version)
+    html = RENDER_CACHE.get(key)
+    if html is not None:
+        return HTMLResponse(html)
+    return StreamingResponse(render_root(key), media_type="text/html")
+
+
+@app.get("/caches", tags=["caches"])
+async def read_caches() -> Dict[str, Dict[str, int]]:
+    """Read cache statistics, of the provider cache if enabled."""
+    caches = {"render": RENDER_CACHE.stats()}
+    if isinstance(DB_PROVIDER, MindMapCachedDBProvider):
+        caches["db"] = DB_PROVIDER.cache.stats()
+    return caches
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["metrics"])
+async def read_metrics() -> Response:
+    """
+    Read metrics in the Prometheus text format.
+
+    Requests and provider calls are recorded as they run, store sizes
+    and cache statistics are read when scraped.
+    """
+    count = await ASYNC_DB_PROVIDER.count_mind_map_apps()
+    STORE_APPS.set(count.apps)
+    STORE_LEAVES.set(count.leaves)
+    for name, stats in (await read_caches()).items():
+        reads = stats["hits"] + stats["misses"]
+        CACHE_HITS.set(stats["hits"], name)
+        CACHE_MISSES.set(stats["misses"], name)
+        CACHE_EVICTIONS.set(stats["evictions"], name)
+        CACHE_HIT_RATIO.set(stats["hits"] / reads if reads else 0.0, name)
+    return Response(METRICS.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+def read_profile_store(request: Request) -> MindMapProfileStore:
+    """Get the profiles, for an allowed client when profiling is on."""
+    if PROFILES is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    if request.client is None or \
+            request.client.host not in SETTINGS.profile_hosts:
+        raise HTTPException(status_code=403, detail="Host not allowed.")
+    return PROFILES
+
+
+@app.get("/debug/profiles", tags=["debug"])
+async def read_profiles(request: Request) -> List[Dict[str, Any]]:
+    """
+    Read the summaries of recent request profiles, most recent first.
+
+    A request is profiled with the `X-Profile: 1` header or the
+    `profile=1` query parameter, when profiling is enabled.
+    """
+    return read_profile_store(request).summaries()
+
+
+@app.get(
+    "/debug/profiles/{profile_id}",
+    response_class=PlainTextResponse,
+    tags=["debug"])
+async def read_profile(
+        request: Request,
+        profile_id: str,
+        sort: str = Query("cumulative", regex="^({})$".format(
+            "|".join(PROFILE_SORTS))),
+        limit: int = Query(50, ge=1)
+) -> PlainTextResponse:
+    """Read the stats of a request profile, as printed by pstats."""
+    profile = read_profile_store(request).get(id=profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Profile with id: {profile_id} does not exist.")
+    return PlainTextResponse(profile.stats(sort=sort, limit=limit))
+
+
+async def make_etag(version: int, kind: str = "json") -> str:
+    """
+    Make a strong ETag from a version and a representation.
+
+    The ETag is prefixed by the epoch of the provider versions, so that
+    a version counted again from zero never matches a response cached
+    before. The epoch is read after the version.
+    """
+    epoch = await ASYNC_DB_PROVIDER.read_mind_map_apps_epoch()
+    return f'"{epoch[:16]}-{version}-{kind}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether an ETag matches the If-None-Match header of a request."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for value in header.split(","):
+        value = value.strip()
+        if value == "*" or value.replace("W/", "", 1) == etag:
+            return True
+    return False
+
 
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,
-            "apps": mind_map_items,
-        }
-    )
+def not_modified(etag: str) -> Response:
+    """Make a 304 Not Modified response."""
+    return Response(status_code=304, headers={"ETag": etag})
 
 
-@app.get("/apps", response_model=List[MindMapApp], tags=["items"])
-async def read_apps() -> List[MindMapApp]:
-    """Read mind map apps and leaves."""
-    mind_map_items = ReadMindMapApps(db_provider=DB_PROVIDER)()
-    return mind_map_items
+async def ndjson_lines(
+        mind_map_apps: AsyncIterator[MindMapApp],
+        limit: Optional[int] = None
+) -> AsyncIterator[str]:
+    """Format apps as JSON lines, up to `limit` apps."""
+    try:
+        count = 0
+        async for mind_map_app in mind_map_apps:
+            yield mind_map_app.json() + "\n"
+            count += 1
+            # Stop before the iterator reads a page past the limit
+            if limit is not None and count >= limit:
+                break
+    finally:
+        await mind_map_apps.aclose()
+
+
+@app.get(
+    "/apps",
+    response_model=List[MindMapApp],
+    tags=["items"],
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}})
+async def read_apps(
+        request: Request,
+        limit: Optional[int] = Query(None, ge=1),
+        after: Optional[str] = None
+) -> Response:
+    """
+    Read mind map apps and leaves.
+
+    Apps are paginated by `limit`, starting after the app id `after`,
+    the next page is given by the Link header. Apps are streamed one
+    per line with `Accept: application/x-ndjson`, read from the
+    provider by pages of at most `limit` apps; the Link header of a
+    stream comes from the ids of its page, read before streaming.
+
+    Apps are serialized as stored by the provider, without validation.
+    The ETag is the version of all apps, a matching If-None-Match
+    returns 304 before reading any app.
+    """
+    ndjson = NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+    etag = await make_etag(
+        await ASYNC_DB_PROVIDER.read_mind_map_apps_version(),
+        kind="ndjson" if ndjson else "json")
+    headers = {"ETag": etag, "Vary": "Accept"}
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    if ndjson:
+        page_size = 100
+        if limit is not None:
+            page_size = min(limit, page_size)
+            ids = await ASYNC_DB_PROVIDER.read_mind_map_app_ids_page(
+                limit=limit, after=after)
+            if len(ids) == limit:
+                next_url = request.url.include_query_params(
+                    limit=limit, after=ids[-1])
+                headers["Link"] = f'<{next_url}>; rel="next"'
+        mind_map_apps = AsyncIterMindMapApps(
+            db_provider=ASYNC_DB_PROVIDER)(after=after, page_size=page_size)
+        return StreamingResponse(
+            ndjson_lines(mind_map_apps, limit=limit),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=headers)
+
+    if limit is None and after is None:
+        mind_map_items = await AsyncDumpMindMapApps(
+            db_provider=ASYNC_DB_PROVIDER)()
+        return MindMapJSONResponse(mind_map_items, headers=headers)
+
+    limit = limit or 100
+    mind_map_items = await AsyncDumpMindMapAppsPage(
+        db_provider=ASYNC_DB_PROVIDER)(limit=limit, after=after)
+    response = MindMapJSONResponse(mind_map_items, headers=headers)
+    if len(mind_map_items) == limit:
+        next_url = request.url.include_query_params(
+            limit=limit, after=mind_map_items[-1]["id"])
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
 
 
 @app.get("/apps/{app_id}", response_model=MindMapApp, tags=["items"])
-async def read_app(app_id: str) -> MindMapApp:
-    """Read an app by id."""
-    return ReadMindMapApp(db_provider=DB_PROVIDER)(id=app_id)
+async def read_app(request: Request, app_id: str) -> Response:
+    """
+    Read an app by id, serialized without validation.
+
+    The ETag is the version of the app, a matching If-None-Match
+    returns 304 before reading the app.
+    """
+    version = await ASYNC_DB_PROVIDER.read_mind_map_app_version(id=app_id)
+    if version is None:
+        return MindMapJSONResponse(None)
+
+    etag = await make_etag(version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    return MindMapJSONResponse(
+        await AsyncDumpMindMapApp(db_provider=ASYNC_DB_PROVIDER)(id=app_id),
+        headers={"ETag": etag})
+
+
+@app.get(
+    "/apps/{app_id}/tree",
+    response_model=MindMapTreeNode,
+    tags=["items"])
+async def read_app_tree(
+        app_id: str,
+        prefix: str = "",
+        depth: Optional[int] = Query(None, ge=0)
+) -> MindMapTreeNode:
+    """Read a branch of an app by path prefix."""
+    mind_map_tree = await AsyncReadMindMapAppTree(
+        db_provider=ASYNC_DB_PROVIDER)(
+        id=app_id,
+        prefix=prefix,
+        depth=depth)
+
+    if mind_map_tree is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"App with id: {app_id} has no path: {prefix}")
+    return mind_map_tree
+
+
+@app.get(
+    "/apps/{app_id}/fragment",
+    response_class=HTMLResponse,
+    tags=["items"])
+async def read_app_fragment(app_id: str, prefix: str = "") -> Response:
+    """
+    Read a branch of an app in html, to expand it in the root page.
+
+    Only the branch and its children are read, through the path index,
+    and rendered: the cost does not depend on the size of the app.
+    """
+    mind_map_tree = await AsyncReadMindMapAppTree(
+        db_provider=ASYNC_DB_PROVIDER)(
+        id=app_id,
+        prefix=prefix,
+        depth=1)
+
+    if mind_map_tree is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"App with id: {app_id} has no path: {prefix}")
+    start = time.perf_counter()
+    html = await templates.get_template("fragment.html").render_async(
+        app_id=app_id, node=mind_map_tree)
+    RENDER_SECONDS.observe(time.perf_counter() - start, "fragment.html")
+    return HTMLResponse(html)
+
+
+@app.get(
+    "/apps/{app_id}/stats",
+    response_model=MindMapBranchStats,
+    tags=["items"])
+async def read_app_stats(
+        request: Request,
+        response: Response,
+        app_id: str,
+        prefix: str = "",
+        depth: Optional[int] = Query(None, ge=0)
+) -> Union[MindMapBranchStats, Response]:
+    """
+    Read the stats of the branches of an app by path prefix.
+
+    Each branch has its number of leaves, the max depth of its leaves
+    and the version of the app after its last change, with its children
+    up to `depth` levels below the prefix. Versions are a counter of the
+    store, not a date: the ETag is the version of the app, a matching
+    If-None-Match returns 304 before reading the stats.
+    """
+    version = await ASYNC_DB_PROVIDER.read_mind_map_app_version(id=app_id)
+    if version is not None:
+        etag = await make_etag(version, kind="stats")
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+
+    mind_map_stats = await AsyncReadMindMapAppStats(
+        db_provider=ASYNC_DB_PROVIDER)(
+        id=app_id,
+        prefix=prefix,
+        depth=depth)
+
+    if mind_map_stats is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"App with id: {app_id} has no path: {prefix}")
+    return mind_map_stats
+
+
+@app.get(
+    "/apps/{app_id}/changes",
+    response_model=MindMapChanges,
+    tags=["items"])
+async def read_app_changes(
+        app_id: str,
+        since: Optional[int] = Query(None, ge=0),
+        limit: int = Query(1000, ge=1, le=1000)
+) -> MindMapChanges:
+    """
+    Read the changes of an app since the sequence number `since`.
+
+    Changes are numbered per app, `seq` is the number to read the next
+    changes from. Without `since`, or when the changes after it are no
+    longer kept, the response is a resync: `resync` is true and `data`
+    has all the leaves of the app instead of `changes`.
+    """
+    mind_map_changes = await AsyncReadMindMapChanges(
+        db_provider=ASYNC_DB_PROVIDER)(
+        id=app_id,
+        since=since,
+        limit=limit)
+
+    if mind_map_changes is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"App with id: {app_id} does not exist.")
+    return mind_map_changes
+
+
+def change_event(seq: int, event: str, data: str) -> str:
+    """Format a server-sent event."""
+    return f"id: {seq}\nevent: {event}\ndata: {data}\n\n"
+
+
+async def change_events(
+        app_id: str,
+        since: Optional[int] = None
+) -> AsyncIterator[str]:
+    """
+    Stream the changes of an app as server-sent events, until closed.
+
+    Changes kept by this process are sent as serialized once by the
+    feed, a publish only wakes the streams up. Changes of a store are
+    polled. A `resync` event is sent instead of changes no longer kept.
+    """
+    seq = since
+    quiet = 0.0
+    while True:
+        changes = None
+        if CHANGES is not None and seq is not None:
+            changes = CHANGES.since(app_id, seq)
+        if changes is not None:
+            for change, text in changes:
+                yield change_event(change.seq, "change", text)
+                seq = change.seq
+        else:
+            mind_map_changes = await AsyncReadMindMapChanges(
+                db_provider=ASYNC_DB_PROVIDER)(id=app_id, since=seq)
+            if mind_map_changes is None:
+                return
+            if mind_map_changes.resync:
+                yield change_event(
+                    mind_map_changes.seq, "resync", mind_map_changes.json())
+            for change in mind_map_changes.changes:
+                yield change_event(change.seq, "change", change.json())
+            if mind_map_changes.resync or mind_map_changes.changes:
+                quiet = 0.0
+            seq = mind_map_changes.seq
+
+        if CHANGES is not None:
+            if not await CHANGES.wait(
+                    app_id, seq, timeout=SETTINGS.changes_keepalive):
+                yield KEEPALIVE_EVENT
+        else:
+            await asyncio.sleep(SETTINGS.changes_poll)
+            quiet += SETTINGS.changes_poll
+            if quiet >= SETTINGS.changes_keepalive:
+                quiet = 0.0
+                yield KEEPALIVE_EVENT
+
+
+@app.get(
+    "/apps/{app_id}/changes/stream",
+    response_class=StreamingResponse,
+    tags=["items"],
+    responses={200: {"content": {EVENT_STREAM_MEDIA_TYPE: {}}}})
+async def stream_app_changes(
+        request: Request,
+        app_id: str,
+        since: Optional[int] = Query(None, ge=0)
+) -> StreamingResponse:
+    """
+    Stream the changes of an app as server-sent events.
+
+    Each change is a `change` event with its sequence number as id, so
+    a reconnecting client resumes after it with the Last-Event-ID
+    header. Without `since`, or when the changes after it are no longer
+    kept, a `resync` event first sends the app as by GET changes.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if since is None and last_event_id.isdigit():
+        since = int(last_event_id)
+    if await ASYNC_DB_PROVIDER.read_mind_map_app_version(id=app_id) is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"App with id: {app_id} does not exist.")
+
+    return StreamingResponse(
+        change_events(app_id=app_id, since=since),
+        media_type=EVENT_STREAM_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get(
+    "/search",
+    response_model=List[MindMapSearchHit],
+    tags=["items"])
+async def search_leaves(
+        q: str = Query(..., min_length=1),
+        app_id: Optional[str] = None,
+        limit: int = Query(10, ge=1, le=1000)
+) -> List[MindMapSearchHit]:
+    """
+    Search leaves by words of their text or path.
+
+    A leaf matches any word of `q`, leaves matching more words rank
+    first. Search all apps, or only `app_id`.
+    """
+    return await AsyncSearchMindMapLeaves(db_provider=ASYNC_DB_PROVIDER)(
+        query=q,
+        id=app_id,
+        limit=limit)
 
 
 @app.post("/apps/", response_model=MindMapApp, tags=["items"])
 async def create_app(mind_map_app: MindMapApp) -> MindMapApp:
     """Create an app."""
     try:
-        return CreateMindMapApp(db_provider=DB_PROVIDER)(
+        return await AsyncCreateMindMapApp(db_provider=ASYNC_DB_PROVIDER)(
             mind_map_app=mind_map_app)
 
     except MindMapAppCreateError as exc:
@@ -93,7 +652,7 @@ async def create_app(mind_map_app: MindMapApp) -> MindMapApp:
 async def add_leaf(app_id: str, mind_map_leaf: MindMapLeaf) -> MindMapApp:
     """Add a leaf in app."""
     try:
-        return AddMindMapLeaf(db_provider=DB_PROVIDER)(
+        return await AsyncAddMindMapLeaf(db_provider=ASYNC_DB_PROVIDER)(
             id=app_id,
             mind_map_leaf=mind_map_leaf)
 
@@ -102,3 +661,121 @@ async def add_leaf(app_id: str, mind_map_leaf: MindMapLeaf) -> MindMapApp:
 
     except Exception as exc:
         raise HTTPException(status_code=404, detail=str(exc))
+
+
+@app.post(
+    "/apps/{app_id}/leaves:batch",
+    response_model=MindMapLeavesSummary,
+    tags=["items"])
+async def add_leaves(
+        app_id: str,
+        mind_map_leaves: List[MindMapLeaf]
+) -> MindMapLeavesSummary:
+    """Add leaves in app, all or nothing."""
+    try:
+        return await AsyncAddMindMapLeaves(db_provider=ASYNC_DB_PROVIDER)(
+            id=app_id,
+            mind_map_leaves=mind_map_leaves)
+
+    except MindMapAppAddError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    except Exception as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+
+
+@app.put(
+    "/apps/{app_id}/leaves",
+    response_model=MindMapLeavesSummary,
+    tags=["items"])
+async def upsert_leaf(
+        app_id: str,
+        mind_map_leaf: MindMapLeaf
+) -> MindMapLeavesSummary:
+    """
+    Upsert a leaf in app by path.
+
+    The leaves of the app at the path of the leaf are replaced by the
+    leaf, added last.
+    """
+    try:
+        return await AsyncUpsertMindMapLeaf(db_provider=ASYNC_DB_PROVIDER)(
+            id=app_id,
+            mind_map_leaf=mind_map_leaf)
+
+    except MindMapAppUpdateError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.delete(
+    "/apps/{app_id}/leaves",
+    response_model=MindMapLeavesSummary,
+    tags=["items"])
+async def delete_leaves(app_id: str, path: str) -> MindMapLeavesSummary:
+    """Delete the leaves of an app at a path."""
+    try:
+        summary = await AsyncDeleteMindMapLeaves(
+            db_provider=ASYNC_DB_PROVIDER)(id=app_id, path=path)
+
+    except MindMapAppUpdateError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if not summary.removed:
+        raise HTTPException(
+            status_code=404,
+            detail=f"App with id: {app_id} has no path: {path}")
+    return summary
+
+
+@app.post(
+    "/apps/{app_id}/leaves:dedup",
+    response_model=MindMapLeavesSummary,
+    tags=["items"])
+async def dedup_app(app_id: str) -> MindMapLeavesSummary:
+    """Keep only the last leaf of an app at each path."""
+    try:
+        return await AsyncDedupMindMapApp(db_provider=ASYNC_DB_PROVIDER)(
+            id=app_id)
+
+    except MindMapAppUpdateError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.get(
+    "/export",
+    tags=["transfers"],
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}})
+async def export_apps() -> StreamingResponse:
+    """
+    Export all mind map apps.
+
+    Apps are streamed a page of leaves at a time, one JSON record per
+    line: an app record `{"type": "app", "id": ...}` followed by one
+    leaf record `{"type": "leaf", "id": ..., "path": ..., "text": ...}`
+    per leaf.
+    """
+    return StreamingResponse(
+        AsyncExportMindMapApps(db_provider=ASYNC_DB_PROVIDER)(),
+        media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.post(
+    "/import",
+    response_model=MindMapImportSummary,
+    tags=["transfers"])
+async def import_apps(request: Request) -> MindMapImportSummary:
+    """
+    Import mind map apps, in the format of GET /export.
+
+    The request body is read and written incrementally, in chunks of
+    leaves. An invalid record or an existing app stops the import, the
+    records before it are kept.
+    """
+    try:
+        return await AsyncImportMindMapApps(
+            db_provider=ASYNC_DB_PROVIDER,
+            chunk_size=SETTINGS.import_chunk_size)(request.stream())
+
+    except MindMapAppExceptions as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
@@ -2,6 +2,20 @@
 
 PATH_APPS="."
 APPS="main:app"
+WORKERS="${WORKERS:-1}"
 
-echo "uvicorn --app-dir ${PATH_APPS} ${APPS}"
-uvicorn --app-dir ${PATH_APPS} ${APPS}
+if [ "${WORKERS}" -gt 1 ]; then
+    # Workers share the apps of a store process, with a secret of the run
+    if [ -z "${MIND_MAP_DB_AUTHKEY}" ]; then
+        MIND_MAP_DB_AUTHKEY="$(python -c 'import secrets; print(secrets.token_hex(32))')"
+        export MIND_MAP_DB_AUTHKEY
+    fi
+    echo "python -m src.stores"
+    python -m src.stores &
+    STORE_PID=$!
+    trap 'kill ${STORE_PID}' EXIT
+    export MIND_MAP_DB_PROVIDER=remote
+fi
+
+echo "uvicorn --app-dir ${PATH_APPS} ${APPS} --workers ${WORKERS}"
+uvicorn --app-dir ${PATH_APPS} ${APPS} --workers ${WORKERS}
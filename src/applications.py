@@ -1,9 +1,17 @@
 """Mind map leaf applications."""
+import asyncio
+import time
+from typing import List, Optional, Dict, Iterator, AsyncIterator, Any, \
+    Iterable
 
-from typing import List, Optional, Dict
-
-from src.interfaces import MindMapAppDBInterface
-from src.models import MindMapApp, MindMapLeaf
+from src.caches import LRUCache
+from src.interfaces import MindMapAppDBInterface, \
+    MindMapAppAsyncDBInterface
+from src.models import MindMapApp, MindMapLeaf, MindMapTreeNode, \
+    MindMapLeavesSummary, MindMapImportSummary, MindMapSearchHit, \
+    MindMapChanges, MindMapBranchStats
+from src.transfers import MindMapRecordReader, MindMapImporter, \
+    Operation, export_page_lines
 
 
 class ReadMindMapApps:
@@ -26,6 +34,59 @@ class ReadMindMapApps:
         return self.db_provider.read_mind_map_apps()
 
 
+class ReadMindMapAppsPage:
+    """Read a page of mind map apps."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[MindMapApp]:
+        """
+        Read a page of mind map apps.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of MindMapApp DTO.
+        """
+        return self.db_provider.read_mind_map_apps_page(
+            limit=limit,
+            after=after)
+
+
+class IterMindMapApps:
+    """Iterate over all mind map apps."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(self, after: Optional[str] = None) -> Iterator[MindMapApp]:
+        """
+        Iterate over all mind map apps.
+
+        Args:
+            after: Id of the app preceding the first app, None for all
+
+        Returns:
+            An iterator of MindMapApp DTO.
+        """
+        return self.db_provider.iter_mind_map_apps(after=after)
+
+
 class ReadMindMapApp:
     """Read an app by app id."""
 
@@ -49,8 +110,180 @@ class ReadMindMapApp:
         return self.db_provider.read_mind_map_app(id=id)
 
 
-class ReadMindMapAppsPrettyFormat:
-    """Read all mind map apps for a pretty format output."""
+class DumpMindMapApps:
+    """Read all mind map apps as JSON ready dicts."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(self) -> List[Dict[str, Any]]:
+        """
+        Read all mind map apps as JSON ready dicts.
+
+        Returns:
+            A list of apps as a dict
+        """
+        return self.db_provider.dump_mind_map_apps()
+
+
+class DumpMindMapAppsPage:
+    """Read a page of mind map apps as JSON ready dicts."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Read a page of mind map apps as JSON ready dicts.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of apps as a dict
+        """
+        return self.db_provider.dump_mind_map_apps_page(
+            limit=limit,
+            after=after)
+
+
+class DumpMindMapApp:
+    """Read an app by app id as a JSON ready dict."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(self, id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read an app by app id as a JSON ready dict.
+
+        Args:
+            id: An app id
+
+        Returns:
+            An app as a dict or None
+        """
+        return self.db_provider.dump_mind_map_app(id=id)
+
+
+class ReadMindMapAppTree:
+    """Read a branch of an app by path prefix."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapTreeNode]:
+        """
+        Read a branch of an app by path prefix.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapTreeNode or None
+        """
+        return self.db_provider.read_mind_map_tree(
+            id=id,
+            prefix=prefix,
+            depth=depth)
+
+
+class ReadMindMapAppStats:
+    """Read the stats of the branches of an app by path prefix."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapBranchStats]:
+        """
+        Read the stats of the branches of an app by path prefix.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapBranchStats or None
+        """
+        return self.db_provider.read_mind_map_stats(
+            id=id,
+            prefix=prefix,
+            depth=depth)
+
+
+class SearchMindMapLeaves:
+    """Search leaves by words of their text or path."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(
+            self,
+            query: str,
+            id: Optional[str] = None,
+            limit: int = 10
+    ) -> List[MindMapSearchHit]:
+        """
+        Search leaves by words of their text or path.
+
+        Args:
+            query: Words to search, a leaf matches any of them
+            id: An app id, None for all apps
+            limit: Max number of hits
+
+        Returns:
+            A list of MindMapSearchHit, best first
+        """
+        return self.db_provider.search_mind_map_leaves(
+            query=query,
+            id=id,
+            limit=limit)
+
+
+class ReadMindMapChanges:
+    """Read the changes of an app since a sequence number."""
 
     def __init__(
             self,
@@ -59,7 +292,77 @@ class ReadMindMapAppsPrettyFormat:
         """Init."""
         self.db_provider = db_provider
 
-    def __call__(self) -> List[Dict[str, str]]:
+    def __call__(
+            self,
+            id: str,
+            since: Optional[int] = None,
+            limit: int = 1000
+    ) -> Optional[MindMapChanges]:
+        """
+        Read the changes of an app since a sequence number.
+
+        Args:
+            id: An app id
+            since: The sequence number of the last change read, None for
+                a resync
+            limit: Max number of changes
+
+        Returns:
+            A MindMapChanges DTO or None if the app does not exist
+        """
+        return self.db_provider.read_mind_map_changes(
+            id=id,
+            since=since,
+            limit=limit)
+
+
+def pretty_format(apps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Convert apps for a pretty format output.
+
+    Split the path string in order to get a tree view in html view.
+    Apps are left unchanged.
+
+    Args:
+        apps: A list of apps as a dict
+
+    Returns:
+        A list of apps as a dict
+    """
+    apps_tree = []
+
+    for app in apps:
+        apps_tree.append({
+            "id": app["id"],
+            "data": [
+                {"path": d["path"].lstrip("/").split('/'), "text": d["text"]}
+                for d in app["data"]]})
+
+    return apps_tree
+
+
+class ReadMindMapAppsPrettyFormat:
+    """
+    Read all mind map apps for a pretty format output.
+
+    With a cache, the output is kept by version of the apps, the
+    version is read before the apps so that a cached output is never
+    older than its version.
+
+    Deprecated, kept for existing callers: the root page is rendered
+    from the app trees of IterMindMapAppTrees.
+    """
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface,
+            cache: Optional[LRUCache] = None
+    ):
+        """Init."""
+        self.db_provider = db_provider
+        self.cache = cache
+
+    def __call__(self) -> List[Dict[str, Any]]:
         """
         Read all mind map apps for a pretty format output.
 
@@ -68,18 +371,59 @@ class ReadMindMapAppsPrettyFormat:
         Returns:
             A list of apps as a dict
         """
-        result = self.db_provider.read_mind_map_apps()
-        apps_tree = []
-
-        for app in result:
-            for d in app.data:
-                d.path = d.path.lstrip("/").split('/')
-            app_tree = app.dict()
-            apps_tree.append(app_tree)
+        if self.cache is None:
+            return pretty_format(self.db_provider.dump_mind_map_apps())
 
+        key = ("pretty_format", self.db_provider.read_mind_map_apps_version())
+        apps_tree = self.cache.get(key)
+        if apps_tree is None:
+            apps_tree = pretty_format(self.db_provider.dump_mind_map_apps())
+            self.cache.set(key, apps_tree)
         return apps_tree
 
 
+class IterMindMapAppTrees:
+    """Iterate over the trees of all mind map apps."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(
+            self,
+            depth: Optional[int] = None,
+            page_size: int = 100
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the trees of all mind map apps.
+
+        App ids are read page by page, then the tree of each app down
+        to a depth, a path segment shared by leaves once: only a page of
+        ids and one tree are held in memory at a time.
+
+        Args:
+            depth: Max number of levels of a tree, None for all
+            page_size: Number of app ids read at a time
+
+        Returns:
+            An iterator of app ids and MindMapTreeNode
+        """
+        after = None
+        while True:
+            ids = self.db_provider.read_mind_map_app_ids_page(
+                limit=page_size, after=after)
+            for id in ids:
+                tree = self.db_provider.read_mind_map_tree(id=id, depth=depth)
+                if tree is not None:
+                    yield {"id": id, "tree": tree}
+            if len(ids) < page_size:
+                return
+            after = ids[-1]
+
+
 class CreateMindMapApp:
     """Create a mind map app."""
 
@@ -132,3 +476,894 @@ class AddMindMapLeaf:
         return self.db_provider.add_mind_map_leaf(
             id=id,
             mind_map_leaf=mind_map_leaf)
+
+
+class AddMindMapLeaves:
+    """Add leaves to a mind map app."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(
+            self,
+            id: str,
+            mind_map_leaves: List[MindMapLeaf]
+    ) -> MindMapLeavesSummary:
+        """
+        Add leaves to a mind map app, all or nothing.
+
+        Args:
+            id: An app id
+            mind_map_leaves: A list of MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        return self.db_provider.add_mind_map_leaves(
+            id=id,
+            mind_map_leaves=mind_map_leaves)
+
+
+class UpsertMindMapLeaf:
+    """Upsert a leaf in a mind map app by path."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapLeavesSummary:
+        """
+        Replace the leaves of a mind map app at the path of a leaf.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        return self.db_provider.upsert_mind_map_leaf(
+            id=id,
+            mind_map_leaf=mind_map_leaf)
+
+
+class DeleteMindMapLeaves:
+    """Delete the leaves of a mind map app by path."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(
+            self,
+            id: str,
+            path: Optional[str]
+    ) -> MindMapLeavesSummary:
+        """
+        Remove the leaves of a mind map app at a path.
+
+        Args:
+            id: An app id
+            path: A leaf path
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        return self.db_provider.delete_mind_map_leaves(id=id, path=path)
+
+
+class DedupMindMapApp:
+    """Remove the duplicate leaves of a mind map app."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(self, id: str) -> MindMapLeavesSummary:
+        """
+        Keep only the last leaf of a mind map app at each path.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        return self.db_provider.dedup_mind_map_app(id=id)
+
+
+class ExportMindMapApps:
+    """Export all mind map apps as transfer records."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(
+            self,
+            page_size: int = 100,
+            leaves_page_size: int = 1000
+    ) -> Iterator[str]:
+        """
+        Export all mind map apps, a page of leaves at a time.
+
+        App ids are read page by page, then the leaves of each app page
+        by page: only a page of ids and a page of leaves are held in
+        memory at a time, whatever the size of an app.
+
+        Args:
+            page_size: Number of app ids read at a time
+            leaves_page_size: Number of leaves read at a time
+
+        Returns:
+            An iterator of JSON lines, one record per app or leaf, by
+            page of leaves
+        """
+        after = None
+        while True:
+            ids = self.db_provider.read_mind_map_app_ids_page(
+                limit=page_size, after=after)
+            for id in ids:
+                cursor = None
+                while True:
+                    page = self.db_provider.dump_mind_map_leaves_page(
+                        id=id, limit=leaves_page_size, after=cursor)
+                    if page is None:
+                        break
+                    yield export_page_lines(page, first=cursor is None)
+                    cursor = page["next"]
+                    if cursor is None:
+                        break
+            if len(ids) < page_size:
+                return
+            after = ids[-1]
+
+
+def import_summary(
+        importer: MindMapImporter,
+        started_at: float
+) -> MindMapImportSummary:
+    """Summarize an import and its throughput."""
+    seconds = time.perf_counter() - started_at
+    return MindMapImportSummary(
+        apps=importer.apps,
+        leaves=importer.leaves,
+        records=importer.records,
+        seconds=seconds,
+        records_per_second=importer.records / seconds if seconds else 0.0)
+
+
+class ImportMindMapApps:
+    """Import mind map apps from transfer records."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface,
+            chunk_size: int = 1000
+    ):
+        """
+        Init.
+
+        Args:
+            db_provider: A provider
+            chunk_size: Max number of leaves added at a time
+        """
+        self.db_provider = db_provider
+        self.chunk_size = chunk_size
+
+    def __call__(self, chunks: Iterable[bytes]) -> MindMapImportSummary:
+        """
+        Import mind map apps, chunk by chunk.
+
+        Records are written as they are read, an invalid record stops
+        the import and the records before it are kept.
+
+        Args:
+            chunks: A stream of JSON lines, one record per app or leaf
+
+        Returns:
+            A MindMapImportSummary DTO.
+        """
+        started_at = time.perf_counter()
+        reader = MindMapRecordReader()
+        importer = MindMapImporter(chunk_size=self.chunk_size)
+
+        for chunk in chunks:
+            for line, record in reader.feed(chunk):
+                self._run(importer.feed(record, line=line))
+        for line, record in reader.close():
+            self._run(importer.feed(record, line=line))
+        self._run(importer.flush())
+
+        return import_summary(importer, started_at)
+
+    def _run(self, operations: List[Operation]):
+        """Run import operations."""
+        for operation in operations:
+            if operation[0] == "create":
+                self.db_provider.create_mind_map_app(
+                    mind_map_app=operation[1])
+            else:
+                self.db_provider.add_mind_map_leaves(
+                    id=operation[1],
+                    mind_map_leaves=operation[2])
+
+
+class AsyncReadMindMapApps:
+    """Read all mind map apps, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(self) -> List[MindMapApp]:
+        """
+        Read all mind map apps.
+
+        Returns:
+            A list of MindMapApp DTO.
+        """
+        return await self.db_provider.read_mind_map_apps()
+
+
+class AsyncReadMindMapAppsPage:
+    """Read a page of mind map apps, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[MindMapApp]:
+        """
+        Read a page of mind map apps.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of MindMapApp DTO.
+        """
+        return await self.db_provider.read_mind_map_apps_page(
+            limit=limit,
+            after=after)
+
+
+class AsyncIterMindMapApps:
+    """Iterate over all mind map apps, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    def __call__(
+            self,
+            after: Optional[str] = None,
+            page_size: int = 100
+    ) -> AsyncIterator[MindMapApp]:
+        """
+        Iterate over all mind map apps.
+
+        Args:
+            after: Id of the app preceding the first app, None for all
+            page_size: Number of apps read at a time
+
+        Returns:
+            An async iterator of MindMapApp DTO.
+        """
+        return self.db_provider.iter_mind_map_apps(
+            after=after, page_size=page_size)
+
+
+class AsyncReadMindMapApp:
+    """Read an app by app id, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(self, id: str) -> Optional[MindMapApp]:
+        """
+        Read an app by app id.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapApp or None
+        """
+        return await self.db_provider.read_mind_map_app(id=id)
+
+
+class AsyncDumpMindMapApps:
+    """Read all mind map apps as JSON ready dicts, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(self) -> List[Dict[str, Any]]:
+        """
+        Read all mind map apps as JSON ready dicts.
+
+        Returns:
+            A list of apps as a dict
+        """
+        return await self.db_provider.dump_mind_map_apps()
+
+
+class AsyncDumpMindMapAppsPage:
+    """Read a page of mind map apps as JSON ready dicts, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Read a page of mind map apps as JSON ready dicts.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of apps as a dict
+        """
+        return await self.db_provider.dump_mind_map_apps_page(
+            limit=limit,
+            after=after)
+
+
+class AsyncDumpMindMapApp:
+    """Read an app by app id as a JSON ready dict, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(self, id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read an app by app id as a JSON ready dict.
+
+        Args:
+            id: An app id
+
+        Returns:
+            An app as a dict or None
+        """
+        return await self.db_provider.dump_mind_map_app(id=id)
+
+
+class AsyncReadMindMapAppTree:
+    """Read a branch of an app by path prefix, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapTreeNode]:
+        """
+        Read a branch of an app by path prefix.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapTreeNode or None
+        """
+        return await self.db_provider.read_mind_map_tree(
+            id=id,
+            prefix=prefix,
+            depth=depth)
+
+
+class AsyncReadMindMapAppStats:
+    """Read the stats of the branches of an app by prefix, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapBranchStats]:
+        """
+        Read the stats of the branches of an app by path prefix.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapBranchStats or None
+        """
+        return await self.db_provider.read_mind_map_stats(
+            id=id,
+            prefix=prefix,
+            depth=depth)
+
+
+class AsyncSearchMindMapLeaves:
+    """Search leaves by words of their text or path, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            query: str,
+            id: Optional[str] = None,
+            limit: int = 10
+    ) -> List[MindMapSearchHit]:
+        """
+        Search leaves by words of their text or path.
+
+        Args:
+            query: Words to search, a leaf matches any of them
+            id: An app id, None for all apps
+            limit: Max number of hits
+
+        Returns:
+            A list of MindMapSearchHit, best first
+        """
+        return await self.db_provider.search_mind_map_leaves(
+            query=query,
+            id=id,
+            limit=limit)
+
+
+class AsyncReadMindMapChanges:
+    """Read the changes of an app since a sequence number, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            id: str,
+            since: Optional[int] = None,
+            limit: int = 1000
+    ) -> Optional[MindMapChanges]:
+        """
+        Read the changes of an app since a sequence number.
+
+        Args:
+            id: An app id
+            since: The sequence number of the last change read, None for
+                a resync
+            limit: Max number of changes
+
+        Returns:
+            A MindMapChanges DTO or None if the app does not exist
+        """
+        return await self.db_provider.read_mind_map_changes(
+            id=id,
+            since=since,
+            limit=limit)
+
+
+class AsyncReadMindMapAppsPrettyFormat:
+    """
+    Read all mind map apps for a pretty format output, from async code.
+
+    Deprecated, kept for existing callers: the root page is rendered
+    from the app trees of AsyncIterMindMapAppTrees.
+    """
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface,
+            cache: Optional[LRUCache] = None
+    ):
+        """Init."""
+        self.db_provider = db_provider
+        self.cache = cache
+
+    async def __call__(self) -> List[Dict[str, Any]]:
+        """
+        Read all mind map apps for a pretty format output.
+
+        Returns:
+            A list of apps as a dict
+        """
+        if self.cache is None:
+            return pretty_format(await self.db_provider.dump_mind_map_apps())
+
+        version = await self.db_provider.read_mind_map_apps_version()
+        key = ("pretty_format", version)
+        apps_tree = self.cache.get(key)
+        if apps_tree is None:
+            apps_tree = pretty_format(
+                await self.db_provider.dump_mind_map_apps())
+            self.cache.set(key, apps_tree)
+        return apps_tree
+
+
+class AsyncIterMindMapAppTrees:
+    """Iterate over the trees of all mind map apps, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            depth: Optional[int] = None,
+            page_size: int = 100
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Iterate over the trees of all mind map apps.
+
+        The trees of a page of apps are read concurrently.
+
+        Args:
+            depth: Max number of levels of a tree, None for all
+            page_size: Number of app ids read at a time
+
+        Returns:
+            An async iterator of app ids and MindMapTreeNode
+        """
+        after = None
+        while True:
+            ids = await self.db_provider.read_mind_map_app_ids_page(
+                limit=page_size, after=after)
+            trees = await asyncio.gather(*(
+                self.db_provider.read_mind_map_tree(id=id, depth=depth)
+                for id in ids))
+            for id, tree in zip(ids, trees):
+                if tree is not None:
+                    yield {"id": id, "tree": tree}
+            if len(ids) < page_size:
+                return
+            after = ids[-1]
+
+
+class AsyncCreateMindMapApp:
+    """Create a mind map app, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(self, mind_map_app: MindMapApp) -> MindMapApp:
+        """
+        Create a mind map app.
+
+        Args:
+            mind_map_app: A MindMapApp DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        return await self.db_provider.create_mind_map_app(
+            mind_map_app=mind_map_app)
+
+
+class AsyncAddMindMapLeaf:
+    """Add a leaf to a mind map app, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapApp:
+        """
+        Add a leaf to a mind map app.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        return await self.db_provider.add_mind_map_leaf(
+            id=id,
+            mind_map_leaf=mind_map_leaf)
+
+
+class AsyncAddMindMapLeaves:
+    """Add leaves to a mind map app, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            id: str,
+            mind_map_leaves: List[MindMapLeaf]
+    ) -> MindMapLeavesSummary:
+        """
+        Add leaves to a mind map app, all or nothing.
+
+        Args:
+            id: An app id
+            mind_map_leaves: A list of MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        return await self.db_provider.add_mind_map_leaves(
+            id=id,
+            mind_map_leaves=mind_map_leaves)
+
+
+class AsyncUpsertMindMapLeaf:
+    """Upsert a leaf in a mind map app by path, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapLeavesSummary:
+        """
+        Replace the leaves of a mind map app at the path of a leaf.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        return await self.db_provider.upsert_mind_map_leaf(
+            id=id,
+            mind_map_leaf=mind_map_leaf)
+
+
+class AsyncDeleteMindMapLeaves:
+    """Delete the leaves of a mind map app by path, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            id: str,
+            path: Optional[str]
+    ) -> MindMapLeavesSummary:
+        """
+        Remove the leaves of a mind map app at a path.
+
+        Args:
+            id: An app id
+            path: A leaf path
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        return await self.db_provider.delete_mind_map_leaves(id=id, path=path)
+
+
+class AsyncDedupMindMapApp:
+    """Remove the duplicate leaves of a mind map app, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(self, id: str) -> MindMapLeavesSummary:
+        """
+        Keep only the last leaf of a mind map app at each path.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        return await self.db_provider.dedup_mind_map_app(id=id)
+
+
+class AsyncExportMindMapApps:
+    """Export all mind map apps as transfer records, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface
+    ):
+        """Init."""
+        self.db_provider = db_provider
+
+    async def __call__(
+            self,
+            page_size: int = 100,
+            leaves_page_size: int = 1000
+    ) -> AsyncIterator[str]:
+        """
+        Export all mind map apps, a page of leaves at a time.
+
+        Only a page of ids and a page of leaves are held in memory at a
+        time, whatever the size of an app.
+
+        Args:
+            page_size: Number of app ids read at a time
+            leaves_page_size: Number of leaves read at a time
+
+        Returns:
+            An async iterator of JSON lines, one record per app or leaf,
+            by page of leaves
+        """
+        after = None
+        while True:
+            ids = await self.db_provider.read_mind_map_app_ids_page(
+                limit=page_size, after=after)
+            for id in ids:
+                cursor = None
+                while True:
+                    page = await self.db_provider.dump_mind_map_leaves_page(
+                        id=id, limit=leaves_page_size, after=cursor)
+                    if page is None:
+                        break
+                    yield export_page_lines(page, first=cursor is None)
+                    cursor = page["next"]
+                    if cursor is None:
+                        break
+            if len(ids) < page_size:
+                return
+            after = ids[-1]
+
+
+class AsyncImportMindMapApps:
+    """Import mind map apps from transfer records, from async code."""
+
+    def __init__(
+            self,
+            db_provider: MindMapAppAsyncDBInterface,
+            chunk_size: int = 1000
+    ):
+        """
+        Init.
+
+        Args:
+            db_provider: A provider
+            chunk_size: Max number of leaves added at a time
+        """
+        self.db_provider = db_provider
+        self.chunk_size = chunk_size
+
+    async def __call__(
+            self,
+            chunks: AsyncIterator[bytes]
+    ) -> MindMapImportSummary:
+        """
+        Import mind map apps, chunk by chunk.
+
+        Records are written as they are read, an invalid record stops
+        the import and the records before it are kept.
+
+        Args:
+            chunks: A stream of JSON lines, one record per app or leaf
+
+        Returns:
+            A MindMapImportSummary DTO.
+        """
+        started_at = time.perf_counter()
+        reader = MindMapRecordReader()
+        importer = MindMapImporter(chunk_size=self.chunk_size)
+
+        async for chunk in chunks:
+            for line, record in reader.feed(chunk):
+                await self._run(importer.feed(record, line=line))
+        for line, record in reader.close():
+            await self._run(importer.feed(record, line=line))
+        await self._run(importer.flush())
+
+        return import_summary(importer, started_at)
+
+    async def _run(self, operations: List[Operation]):
+        """Run import operations."""
+        for operation in operations:
+            if operation[0] == "create":
+                await self.db_provider.create_mind_map_app(
+                    mind_map_app=operation[1])
+            else:
+                await self.db_provider.add_mind_map_leaves(
+                    id=operation[1],
+                    mind_map_leaves=operation[2])
@@ -0,0 +1,228 @@
+"""Mind map leaf caches."""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    A cache bounded in number of entries, and optionally in bytes.
+
+    The least recently used entries are evicted when the cache is full.
+    The size in bytes of an entry is given when it is set, an entry
+    larger than the byte bound is not kept and evicts nothing, it only
+    replaces a previous entry of its key. Hits, misses and evictions
+    are counted.
+    """
+
+    def __init__(self, max_size: int = 128, max_bytes: int = 0):
+        """
+        Init.
+
+        Args:
+            max_size: Max number of entries
+            max_bytes: Max size in bytes of all entries, 0 for no bound
+        """
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of entries."""
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get an entry and mark it as recently used.
+
+        Args:
+            key: An entry key
+
+        Returns:
+            The entry value or None
+        """
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, size: int = 0):
+        """
+        Set an entry, evict the least recently used ones if full.
+
+        Args:
+            key: An entry key
+            value: An entry value
+            size: The entry size in bytes
+        """
+        with self._lock:
+            if self.max_bytes and size > self.max_bytes:
+                # Not kept, without evicting the entries that fit
+                if self._entries.pop(key, None) is not None:
+                    self.bytes -= self._sizes.pop(key)
+                return
+            self.bytes += size - self._sizes.get(key, 0)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._entries.move_to_end(key)
+            while self._entries and (
+                    len(self._entries) > self.max_size
+                    or self.max_bytes and self.bytes > self.max_bytes):
+                evicted, _ = self._entries.popitem(last=False)
+                self.bytes -= self._sizes.pop(evicted)
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        """
+        Remove an entry, if any.
+
+        Args:
+            key: An entry key
+        """
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.bytes -= self._sizes.pop(key)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Cache statistics.
+
+        Returns:
+            Size, max size, bytes, max bytes, hits, misses and evictions
+        """
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class CacheLoad:
+    """A load of a missing entry, awaited by concurrent readers."""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        """Init."""
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ReadThroughCache:
+    """
+    A LRU cache loading missing entries.
+
+    Concurrent misses of a key are coalesced: the first reader loads
+    the entry, the others wait for its value. An invalidated key is
+    removed and its running load is detached, so that the load does
+    not store an outdated value and later readers load it again.
+    None values are not kept.
+    """
+
+    def __init__(self, max_size: int = 1024, max_bytes: int = 0):
+        """
+        Init.
+
+        Args:
+            max_size: Max number of entries
+            max_bytes: Max size in bytes of all entries, 0 for no bound
+        """
+        self.cache = LRUCache(max_size=max_size, max_bytes=max_bytes)
+        self.coalesced = 0
+        self._loads: Dict[Hashable, CacheLoad] = {}
+        self._lock = threading.Lock()
+
+    def get(
+            self,
+            key: Hashable,
+            load: Callable[[], Any],
+            size: Callable[[Any], int] = lambda value: 0
+    ) -> Any:
+        """
+        Get an entry, loaded on a miss.
+
+        Args:
+            key: An entry key
+            load: Load the entry value
+            size: Size in bytes of a value
+
+        Returns:
+            The entry value
+        """
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            pending = self._loads.get(key)
+            if pending is None:
+                pending = self._loads[key] = CacheLoad()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = load()
+        except BaseException as exc:
+            pending.error = exc
+            raise
+        finally:
+            with self._lock:
+                if self._loads.get(key) is pending:
+                    del self._loads[key]
+                    if pending.error is None and pending.value is not None:
+                        self.cache.set(
+                            key, pending.value, size=size(pending.value))
+            pending.done.set()
+        return pending.value
+
+    def invalidate(self, *keys: Hashable):
+        """
+        Remove entries and detach their running loads.
+
+        Args:
+            keys: Entry keys
+        """
+        with self._lock:
+            for key in keys:
+                self._loads.pop(key, None)
+                self.cache.delete(key)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Cache statistics.
+
+        Returns:
+            The LRU cache statistics and the number of coalesced misses
+        """
+        return {**self.cache.stats(), "coalesced": self.coalesced}
@@ -0,0 +1,212 @@
+"""Mind map leaf changes."""
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from src.models import MindMapChange, MindMapLeaf
+
+# Change types
+CHANGE_CREATED = "created"
+CHANGE_ADDED = "added"
+CHANGE_UPSERTED = "upserted"
+CHANGE_DELETED = "deleted"
+CHANGE_DEDUPED = "deduped"
+
+# A waiting subscriber: its event loop and the future it awaits
+Waiter = Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]
+
+
+class MindMapChangeLog:
+    """
+    The last changes of an app.
+
+    Changes are numbered from 1 in the order of the writes, only the
+    last `retain` changes are kept. A change is kept with its JSON, so
+    that it is serialized once whatever the number of readers.
+    """
+
+    __slots__ = ("seq", "changes")
+
+    def __init__(self, retain: int):
+        """
+        Init.
+
+        Args:
+            retain: Max number of changes kept
+        """
+        self.seq = 0
+        self.changes: Deque[Tuple[MindMapChange, str]] = deque(maxlen=retain)
+
+    @property
+    def first(self) -> int:
+        """Sequence number of the oldest change kept."""
+        return self.seq - len(self.changes) + 1
+
+    def append(self, type: str, data: List[MindMapLeaf]) -> MindMapChange:
+        """
+        Append a change.
+
+        Args:
+            type: The change type
+            data: The leaves of the change
+
+        Returns:
+            A MindMapChange DTO.
+        """
+        self.seq += 1
+        change = MindMapChange.construct(seq=self.seq, type=type, data=data)
+        self.changes.append((change, json.dumps(
+            {"seq": self.seq,
+             "type": type,
+             "data": [leaf.dict() for leaf in data]},
+            ensure_ascii=False,
+            separators=(",", ":"))))
+        return change
+
+    def since(
+            self,
+            seq: int,
+            limit: int
+    ) -> Optional[List[Tuple[MindMapChange, str]]]:
+        """
+        Read the changes after a sequence number.
+
+        Args:
+            seq: A sequence number
+            limit: Max number of changes
+
+        Returns:
+            A list of changes and their JSON, None if the changes after
+            `seq` are no longer kept or `seq` is unknown
+        """
+        if seq > self.seq or seq < self.first - 1:
+            return None
+        start = seq - self.first + 1
+        return list(itertools.islice(self.changes, start, start + limit))
+
+
+class MindMapChangeFeed:
+    """
+    The change logs of all apps, and their subscribers.
+
+    Writers publish changes from any thread. Subscribers wait in an
+    event loop for the changes of an app after a sequence number, then
+    read them from the shared log: a change is never copied per
+    subscriber, a publish only wakes the waiting subscribers up.
+    """
+
+    def __init__(self, retain: int = 1000):
+        """
+        Init.
+
+        Args:
+            retain: Max number of changes kept by app
+        """
+        self.retain = retain
+        self._logs: Dict[str, MindMapChangeLog] = {}
+        self._waiters: Dict[str, Set[Waiter]] = {}
+        self._lock = threading.Lock()
+
+    def seq(self, id: str) -> int:
+        """
+        Read the sequence number of the last change of an app.
+
+        Args:
+            id: An app id
+
+        Returns:
+            The sequence number, 0 without changes
+        """
+        log = self._logs.get(id)
+        return 0 if log is None else log.seq
+
+    def publish(
+            self,
+            id: str,
+            type: str,
+            data: List[MindMapLeaf]
+    ) -> MindMapChange:
+        """
+        Append a change to the log of an app and wake its subscribers.
+
+        Args:
+            id: An app id
+            type: The change type
+            data: The leaves of the change
+
+        Returns:
+            A MindMapChange DTO.
+        """
+        with self._lock:
+            log = self._logs.get(id)
+            if log is None:
+                log = self._logs[id] = MindMapChangeLog(retain=self.retain)
+            change = log.append(type=type, data=data)
+            waiters = self._waiters.pop(id, ())
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(wake, future)
+        return change
+
+    def since(
+            self,
+            id: str,
+            seq: int,
+            limit: int = 1000
+    ) -> Optional[List[Tuple[MindMapChange, str]]]:
+        """
+        Read the changes of an app after a sequence number.
+
+        Args:
+            id: An app id
+            seq: A sequence number
+            limit: Max number of changes
+
+        Returns:
+            A list of changes and their JSON, None if the changes after
+            `seq` are no longer kept or `seq` is unknown
+        """
+        with self._lock:
+            log = self._logs.get(id)
+            if log is None:
+                return [] if seq == 0 else None
+            return log.since(seq=seq, limit=limit)
+
+    async def wait(self, id: str, seq: int, timeout: float) -> bool:
+        """
+        Wait for a change of an app after a sequence number.
+
+        Args:
+            id: An app id
+            seq: A sequence number
+            timeout: Max number of seconds to wait
+
+        Returns:
+            False if no change was published before the timeout
+        """
+        loop = asyncio.get_running_loop()
+        waiter: Waiter = (loop, loop.create_future())
+        with self._lock:
+            if self.seq(id) != seq:
+                return True
+            self._waiters.setdefault(id, set()).add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(id)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[id]
+
+
+def wake(future: "asyncio.Future[None]"):
+    """Wake a subscriber up, unless it stopped waiting."""
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,150 @@
+"""Mind map leaf columns."""
+import threading
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+
+class MindMapSegmentTable:
+    """
+    Interned path segments.
+
+    Each distinct segment is stored once and referred to by its id, a
+    path is stored as a sequence of segment ids.
+    """
+
+    __slots__ = ("ids", "segments", "_lock")
+
+    def __init__(self):
+        """Init."""
+        self.ids: Dict[str, int] = {}
+        self.segments: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of distinct segments."""
+        return len(self.segments)
+
+    def encode(self, path: str) -> List[int]:
+        """
+        Convert a path to segment ids, new segments are added.
+
+        Args:
+            path: A leaf path
+
+        Returns:
+            A list of segment ids
+        """
+        ids = []
+        for segment in path.split("/"):
+            id = self.ids.get(segment)
+            if id is None:
+                with self._lock:
+                    id = self.ids.get(segment)
+                    if id is None:
+                        id = len(self.segments)
+                        self.segments.append(segment)
+                        self.ids[segment] = id
+            ids.append(id)
+        return ids
+
+    def decode(self, ids: Iterable[int]) -> str:
+        """
+        Convert segment ids to a path.
+
+        Args:
+            ids: A sequence of segment ids
+
+        Returns:
+            A leaf path
+        """
+        segments = self.segments
+        return "/".join([segments[id] for id in ids])
+
+
+class MindMapLeafColumns:
+    """
+    A compact list of leaves.
+
+    Leaves are stored in columns: the segment ids of all paths in one
+    array, the end offset of each path in another, and the texts in a
+    list. A None path has no segment, an empty path has one empty
+    segment. Leaves are read as dicts, built on the fly.
+
+    Leaves are only appended, the end offset is appended last so that
+    a reader never sees a partial leaf.
+    """
+
+    __slots__ = ("table", "segments", "ends", "texts")
+
+    def __init__(
+            self,
+            table: MindMapSegmentTable,
+            leaves: Iterable[Dict[str, Any]] = ()
+    ):
+        """
+        Init.
+
+        Args:
+            table: The segment table shared by apps
+            leaves: Leaves as a dict
+        """
+        self.table = table
+        self.segments = array("I")
+        self.ends = array("Q")
+        self.texts: List[Optional[str]] = []
+        self.extend(leaves)
+
+    def __len__(self) -> int:
+        """Number of leaves."""
+        return len(self.ends)
+
+    def append(self, leaf: Dict[str, Any]):
+        """
+        Append a leaf.
+
+        Args:
+            leaf: A leaf as a dict
+        """
+        path = leaf["path"]
+        if path is not None:
+            self.segments.extend(self.table.encode(path))
+        self.texts.append(leaf["text"])
+        self.ends.append(len(self.segments))
+
+    def extend(self, leaves: Iterable[Dict[str, Any]]):
+        """
+        Append leaves.
+
+        Args:
+            leaves: Leaves as a dict
+        """
+        for leaf in leaves:
+            self.append(leaf)
+
+    def _leaf(self, index: int) -> Dict[str, Any]:
+        """Build the dict of a leaf."""
+        start = self.ends[index - 1] if index else 0
+        end = self.ends[index]
+        if start == end:
+            path = None
+        else:
+            path = self.table.decode(self.segments[start:end])
+        return {"path": path, "text": self.texts[index]}
+
+    def __getitem__(
+            self,
+            index: Union[int, slice]
+    ) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        """A leaf, or a list of leaves for a slice, as a dict."""
+        if isinstance(index, slice):
+            return [self._leaf(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("leaf index out of range")
+        return self._leaf(index)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over the leaves, up to the last complete leaf."""
+        for index in range(len(self)):
+            yield self._leaf(index)
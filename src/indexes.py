@@ -0,0 +1,439 @@
+"""Mind map leaf indexes."""
+import heapq
+import math
+import re
+import threading
+from array import array
+from typing import Dict, List, Optional, Set, Tuple, Hashable, Iterable
+
+from src.models import MindMapTreeNode, MindMapBranchStats
+
+# A search token, words are compared in lower case
+TOKEN = re.compile(r"\w+")
+
+
+def split_path(path: Optional[str]) -> List[str]:
+    """
+    Split a leaf path into segments.
+
+    Args:
+        path: A leaf path, leading "/" is ignored
+
+    Returns:
+        A list of path segments
+    """
+    if not path:
+        return []
+    return path.lstrip("/").split("/")
+
+
+def norm_path(path: Optional[str]) -> str:
+    """
+    Normalize a leaf path, the key of the leaves at a path.
+
+    Args:
+        path: A leaf path
+
+    Returns:
+        The path segments joined by "/"
+    """
+    return "/".join(split_path(path))
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """
+    Split a leaf text or path into search tokens.
+
+    Args:
+        value: A leaf text or path
+
+    Returns:
+        A list of lower case words
+    """
+    if not value:
+        return []
+    return TOKEN.findall(value.lower())
+
+
+class MindMapPathTrieNode:
+    """A node of the path trie, with the stats of its subtree."""
+
+    __slots__ = ("children", "texts", "leaves", "max_depth", "version")
+
+    def __init__(self):
+        """Init."""
+        self.children: Dict[str, "MindMapPathTrieNode"] = {}
+        self.texts: List[Optional[str]] = []
+        self.leaves = 0
+        self.max_depth = 0
+        self.version = 0
+
+
+class MindMapPathTrie:
+    """
+    A prefix tree of leaf path segments.
+
+    Each leaf is stored on the node of its last path segment, so a
+    subtree only holds the leaves below its prefix.
+
+    Each node also keeps the stats of its subtree, updated on the way
+    down when a leaf is added and on the way up when it is removed:
+    reading the stats of a branch does not depend on its number of
+    leaves.
+    """
+
+    def __init__(self, created: int = 0):
+        """
+        Init.
+
+        Args:
+            created: The version of the leaves added without a version
+        """
+        self.root = MindMapPathTrieNode()
+        self.created = created
+
+    def add(self, path: Optional[str], text: Optional[str], version: int = 0):
+        """
+        Add a leaf in the trie.
+
+        Args:
+            path: A leaf path
+            text: A leaf text
+            version: The version of the app with the leaf
+        """
+        segments = split_path(path)
+        depth = len(segments)
+        node = self.root
+        node.leaves += 1
+        node.max_depth = max(node.max_depth, depth)
+        node.version = max(node.version, version)
+        for segment in segments:
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = MindMapPathTrieNode()
+            node = child
+            depth -= 1
+            node.leaves += 1
+            node.max_depth = max(node.max_depth, depth)
+            node.version = max(node.version, version)
+        node.texts.append(text)
+
+    def remove(
+            self,
+            path: Optional[str],
+            text: Optional[str],
+            version: int = 0
+    ):
+        """
+        Remove a leaf from the trie.
+
+        The nodes left without leaves are removed, the max depth of the
+        others is computed again from their children.
+
+        Args:
+            path: A leaf path
+            text: A leaf text
+            version: The version of the app without the leaf
+        """
+        segments = split_path(path)
+        nodes = [self.root]
+        for segment in segments:
+            node = nodes[-1].children.get(segment)
+            if node is None:
+                return
+            nodes.append(node)
+        if text not in nodes[-1].texts:
+            return
+
+        nodes[-1].texts.remove(text)
+        changed = True
+        for level in range(len(nodes) - 1, -1, -1):
+            node = nodes[level]
+            node.leaves -= 1
+            node.version = max(node.version, version)
+            if level and not node.leaves:
+                del nodes[level - 1].children[segments[level - 1]]
+                continue
+            if changed:
+                max_depth = node.max_depth
+                node.max_depth = self._max_depth(node)
+                changed = node.max_depth != max_depth
+
+    @staticmethod
+    def _max_depth(node: MindMapPathTrieNode) -> int:
+        """The max depth of a node, after a leaf is removed below it."""
+        # Usually another child is as deep, no need to scan them all
+        for child in node.children.values():
+            if child.max_depth + 1 == node.max_depth:
+                return node.max_depth
+        return max(
+            (child.max_depth + 1 for child in node.children.values()),
+            default=0)
+
+    def find(self, segments: List[str]) -> Optional[MindMapPathTrieNode]:
+        """
+        Find the node of a prefix.
+
+        Args:
+            segments: The prefix path segments
+
+        Returns:
+            A MindMapPathTrieNode or None
+        """
+        node = self.root
+        for segment in segments:
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node
+
+    def read(
+            self,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapTreeNode]:
+        """
+        Read the subtree under a prefix.
+
+        Args:
+            prefix: A path prefix, empty for the whole tree
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapTreeNode or None if the prefix does not exist
+        """
+        segments = split_path(prefix)
+        node = self.find(segments)
+        if node is None:
+            return None
+        name = segments[-1] if segments else ""
+        return self._to_model(node, name, "/".join(segments), depth)
+
+    def _to_model(
+            self,
+            node: MindMapPathTrieNode,
+            name: str,
+            path: str,
+            depth: Optional[int]
+    ) -> MindMapTreeNode:
+        """Convert a trie node and its children to a DTO."""
+        children = []
+        if depth is None or depth > 0:
+            next_depth = None if depth is None else depth - 1
+            # A copy, the trie may grow while it is read
+            for segment, child in list(node.children.items()):
+                child_path = f"{path}/{segment}" if path else segment
+                children.append(
+                    self._to_model(child, segment, child_path, next_depth))
+
+        return MindMapTreeNode.construct(
+            name=name,
+            path=path,
+            texts=list(node.texts),
+            has_children=bool(node.children),
+            children=children)
+
+    def stats(
+            self,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapBranchStats]:
+        """
+        Read the stats of the branches under a prefix.
+
+        Args:
+            prefix: A path prefix, empty for the whole tree
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapBranchStats or None if the prefix does not exist
+        """
+        segments = split_path(prefix)
+        node = self.find(segments)
+        if node is None:
+            return None
+        name = segments[-1] if segments else ""
+        return self._to_stats(node, name, "/".join(segments), depth)
+
+    def _to_stats(
+            self,
+            node: MindMapPathTrieNode,
+            name: str,
+            path: str,
+            depth: Optional[int]
+    ) -> MindMapBranchStats:
+        """Convert the stats of a trie node and its children to a DTO."""
+        children = []
+        if depth is None or depth > 0:
+            next_depth = None if depth is None else depth - 1
+            # A copy, the trie may grow while it is read
+            for segment, child in list(node.children.items()):
+                child_path = f"{path}/{segment}" if path else segment
+                children.append(
+                    self._to_stats(child, segment, child_path, next_depth))
+
+        return MindMapBranchStats.construct(
+            name=name,
+            path=path,
+            leaves=node.leaves,
+            max_depth=node.max_depth,
+            version=max(node.version, self.created),
+            has_children=bool(node.children),
+            children=children)
+
+
+class MindMapInvertedIndex:
+    """
+    An inverted index of leaf text and path tokens.
+
+    Each token maps, per app, to the positions of the leaves holding
+    it, once per occurrence. A search only reads the postings of the
+    query tokens. Postings are only appended, a removed leaf is skipped
+    by searches: writers hold a lock, a search reads without it.
+
+    Apps are keyed by any hashable, their id or their record, all the
+    postings of an app are dropped at once when it is rebuilt.
+    """
+
+    def __init__(self):
+        """Init."""
+        self.leaves = 0
+        self._postings: Dict[str, Dict[Hashable, "array[int]"]] = {}
+        self._counts: Dict[str, int] = {}
+        self._removed: Dict[Hashable, Set[int]] = {}
+        self._lock = threading.Lock()
+
+    def add(
+            self,
+            id: Hashable,
+            index: int,
+            path: Optional[str],
+            text: Optional[str]
+    ):
+        """
+        Add a leaf in the index.
+
+        Args:
+            id: The app id of the leaf
+            index: The leaf position in the app
+            path: A leaf path
+            text: A leaf text
+        """
+        tokens = tokenize(path) + tokenize(text)
+        with self._lock:
+            for token in tokens:
+                self._counts[token] = self._counts.get(token, 0) + 1
+                apps = self._postings.get(token)
+                if apps is None:
+                    apps = self._postings[token] = {}
+                positions = apps.get(id)
+                if positions is None:
+                    positions = apps[id] = array("I")
+                positions.append(index)
+            self.leaves += 1
+
+    def remove(
+            self,
+            id: Hashable,
+            index: int,
+            path: Optional[str],
+            text: Optional[str]
+    ):
+        """
+        Remove a leaf from the index.
+
+        Args:
+            id: The app id of the leaf
+            index: The leaf position in the app
+            path: The leaf path
+            text: The leaf text
+        """
+        tokens = tokenize(path) + tokenize(text)
+        with self._lock:
+            for token in tokens:
+                self._counts[token] -= 1
+            self._removed.setdefault(id, set()).add(index)
+            self.leaves -= 1
+
+    def drop(
+            self,
+            id: Hashable,
+            leaves: Iterable[Tuple[Optional[str], Optional[str]]]
+    ):
+        """
+        Remove all leaves of an app from the index, and their removals.
+
+        Args:
+            id: The app id of the leaves
+            leaves: The paths and texts of all leaves added to the app,
+                even removed, by position
+        """
+        with self._lock:
+            removed = self._removed.get(id, set())
+            tokens: Set[str] = set()
+            for index, (path, text) in enumerate(leaves):
+                leaf_tokens = tokenize(path) + tokenize(text)
+                tokens.update(leaf_tokens)
+                if index not in removed:
+                    for token in leaf_tokens:
+                        self._counts[token] -= 1
+                    self.leaves -= 1
+            for token in tokens:
+                apps = self._postings.get(token)
+                if apps is not None:
+                    apps.pop(id, None)
+                    if not apps:
+                        del self._postings[token]
+                        del self._counts[token]
+            self._removed.pop(id, None)
+
+    def search(
+            self,
+            query: str,
+            id: Optional[Hashable] = None,
+            limit: int = 10
+    ) -> List[Tuple[float, str, int]]:
+        """
+        Search leaves matching any token of a query.
+
+        Leaves are ranked by number of matching tokens, then by score:
+        the sum of the occurrences of each token weighted by its
+        rarity.
+
+        Args:
+            query: Words to search
+            id: An app key, None for all apps
+            limit: Max number of hits
+
+        Returns:
+            A list of scores, app keys and leaf positions, best first
+        """
+        hits: Dict[Tuple[Hashable, int], List[float]] = {}
+        for token in set(tokenize(query)):
+            apps = self._postings.get(token)
+            count = self._counts.get(token)
+            if apps is None or not count:
+                continue
+            weight = math.log(1 + self.leaves / count)
+            if id is None:
+                postings = list(apps.items())
+            else:
+                postings = [(id, apps[id])] if id in apps else []
+            for app_id, positions in postings:
+                matched = set()
+                removed = self._removed.get(app_id, ())
+                for index in positions:
+                    if index in removed:
+                        continue
+                    hit = hits.get((app_id, index))
+                    if hit is None:
+                        hit = hits[(app_id, index)] = [0, 0.0]
+                    if index not in matched:
+                        matched.add(index)
+                        hit[0] += 1
+                    hit[1] += weight
+
+        best = heapq.nlargest(limit, hits.items(), key=lambda item: (
+            item[1][0], item[1][1], -item[0][1]))
+        return [(score, app_id, index)
+                for (app_id, index), (_, score) in best]
@@ -1,8 +1,14 @@
 """Mind map leaf interfaces."""
 import abc
-from typing import List, Optional
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, \
+    Optional
 
-from src.models import MindMapApp, MindMapLeaf
+from src.indexes import MindMapPathTrie, MindMapInvertedIndex, norm_path
+from src.models import MindMapApp, MindMapLeaf, MindMapTreeNode, \
+    MindMapLeavesSummary, MindMapAppAddError, MindMapSearchHit, \
+    MindMapAppsCount, MindMapChanges, MindMapBranchStats, \
+    MindMapAppUpdateError
 
 
 class MindMapAppDBInterface(abc.ABC):
@@ -61,3 +67,887 @@ class MindMapAppDBInterface(abc.ABC):
             A MindMapApp DTO.
         """
         raise NotImplementedError
+
+    def replace_mind_map_leaves(
+            self,
+            id: str,
+            mind_map_leaves: List[MindMapLeaf]
+    ) -> MindMapApp:
+        """
+        Replace all the leaves of a mind map app.
+
+        Providers should override it to remove leaves, this default
+        cannot write anything but added leaves.
+
+        Args:
+            id: An app id
+            mind_map_leaves: A list of MindMapLeaf DTO.
+
+        Returns:
+            A MindMapApp DTO.
+
+        Raises:
+            NotImplementedError: The provider cannot remove leaves
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} cannot remove leaves.")
+
+    def _update_mind_map_leaves(
+            self,
+            id: str,
+            keep: Callable[[List[MindMapLeaf]], List[MindMapLeaf]],
+            added: Optional[MindMapLeaf] = None
+    ) -> MindMapLeavesSummary:
+        """Read an app, keep some of its leaves, then add one."""
+        mind_map_app = self.read_mind_map_app(id=id)
+        if mind_map_app is None:
+            raise MindMapAppUpdateError(
+                f"App with id: {id} does not exist in database.")
+
+        data = keep(mind_map_app.data)
+        removed = len(mind_map_app.data) - len(data)
+        if removed:
+            if added is not None:
+                data.append(added)
+            mind_map_app = self.replace_mind_map_leaves(
+                id=id, mind_map_leaves=data)
+        elif added is not None:
+            mind_map_app = self.add_mind_map_leaf(
+                id=id, mind_map_leaf=added)
+        return MindMapLeavesSummary(
+            id=id,
+            added=0 if added is None else 1,
+            removed=removed,
+            total=len(mind_map_app.data))
+
+    def upsert_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapLeavesSummary:
+        """
+        Replace the leaves of a mind map app at the path of a leaf.
+
+        The leaves at the same path, once split into segments, are
+        removed and the leaf is added last.
+
+        Providers should override it, this default reads the app then
+        adds the leaf, or replaces the leaves if some are removed.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        key = norm_path(mind_map_leaf.path)
+        return self._update_mind_map_leaves(
+            id=id,
+            keep=lambda data: [
+                leaf for leaf in data if norm_path(leaf.path) != key],
+            added=mind_map_leaf)
+
+    def delete_mind_map_leaves(
+            self,
+            id: str,
+            path: Optional[str]
+    ) -> MindMapLeavesSummary:
+        """
+        Remove the leaves of a mind map app at a path.
+
+        Providers should override it, this default reads the app then
+        replaces its leaves if some are removed.
+
+        Args:
+            id: An app id
+            path: A leaf path
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        key = norm_path(path)
+        return self._update_mind_map_leaves(id=id, keep=lambda data: [
+            leaf for leaf in data if norm_path(leaf.path) != key])
+
+    def dedup_mind_map_app(self, id: str) -> MindMapLeavesSummary:
+        """
+        Keep only the last leaf of a mind map app at each path.
+
+        The app is the same as if each leaf had been upserted.
+
+        Providers should override it, this default reads the app then
+        replaces its leaves if some are removed.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        def keep(data: List[MindMapLeaf]) -> List[MindMapLeaf]:
+            last = {
+                norm_path(leaf.path): position
+                for position, leaf in enumerate(data)}
+            return [
+                leaf for position, leaf in enumerate(data)
+                if last[norm_path(leaf.path)] == position]
+
+        return self._update_mind_map_leaves(id=id, keep=keep)
+
+    def dump_mind_map_apps(self) -> List[Dict[str, Any]]:
+        """
+        Read all mind map apps as JSON ready dicts.
+
+        Providers should override it to skip building DTOs.
+
+        Returns:
+            A list of apps as a dict
+        """
+        return [app.dict() for app in self.read_mind_map_apps()]
+
+    def dump_mind_map_app(self, id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read an app by app id as a JSON ready dict.
+
+        Providers should override it to skip building a DTO.
+
+        Args:
+            id: An app id
+
+        Returns:
+            An app as a dict or None
+        """
+        mind_map_app = self.read_mind_map_app(id=id)
+        return None if mind_map_app is None else mind_map_app.dict()
+
+    def dump_mind_map_apps_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Read a page of mind map apps as JSON ready dicts.
+
+        Providers should override it to skip building DTOs.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of apps as a dict, empty if `after` is not an app id
+        """
+        return [
+            app.dict()
+            for app in self.read_mind_map_apps_page(limit=limit, after=after)]
+
+    def dump_mind_map_leaves_page(
+            self,
+            id: str,
+            limit: int,
+            after: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Read a page of the leaves of an app as a JSON ready dict.
+
+        Leaves are paged by a cursor, so that an app of any size is read
+        a page at a time. Providers should override it to skip reading
+        the whole app for each page.
+
+        Args:
+            id: An app id
+            limit: Max number of leaves
+            after: The `next` cursor of the previous page, None for the
+                first
+
+        Returns:
+            The app id, the leaves of the page in "data" and the cursor
+            of the next page in "next", None after the last page, or
+            None if the app does not exist
+        """
+        item = self.dump_mind_map_app(id=id)
+        if item is None:
+            return None
+        start = after or 0
+        data = item["data"][start:start + limit]
+        stop = start + len(data)
+        return {
+            "id": id,
+            "data": data,
+            "next": stop if stop < len(item["data"]) else None}
+
+    def read_mind_map_app_ids_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[str]:
+        """
+        Read the ids of a page of mind map apps.
+
+        Providers should override it to skip reading leaves.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of app ids, empty if `after` is not an app id
+        """
+        return [
+            app.id
+            for app in self.read_mind_map_apps_page(limit=limit, after=after)]
+
+    @abc.abstractmethod
+    def read_mind_map_apps_version(self) -> int:
+        """
+        Read the version of all apps.
+
+        The version is increased by every write, it changes whenever
+        any app changes.
+
+        Returns:
+            The version of all apps
+        """
+        raise NotImplementedError
+
+    def read_mind_map_app_version(self, id: str) -> Optional[int]:
+        """
+        Read the version of an app.
+
+        The version changes whenever the app changes. Default to the
+        version of all apps, which also changes with other apps.
+
+        Args:
+            id: An app id
+
+        Returns:
+            The version of the app or None
+        """
+        version = self.read_mind_map_apps_version()
+        if self.read_mind_map_app(id=id) is None:
+            return None
+        return version
+
+    def read_mind_map_apps_epoch(self) -> str:
+        """
+        Read the epoch of the versions.
+
+        Versions are only compared within an epoch: versions that may be
+        counted again from zero, e.g. after a restart, have a new epoch.
+        Default to an epoch of the provider instance, for providers in
+        memory.
+
+        Returns:
+            The epoch of the versions
+        """
+        return self.__dict__.setdefault("_versions_epoch", uuid.uuid4().hex)
+
+    def add_mind_map_leaves(
+            self,
+            id: str,
+            mind_map_leaves: List[MindMapLeaf]
+    ) -> MindMapLeavesSummary:
+        """
+        Add leaves to a mind map app, all or nothing.
+
+        Providers should override it, this default adds leaves one by
+        one.
+
+        Args:
+            id: An app id
+            mind_map_leaves: A list of MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        mind_map_app = self.read_mind_map_app(id=id)
+        if mind_map_app is None:
+            raise MindMapAppAddError(
+                f"App with id: {id} does not exist in database.")
+
+        for mind_map_leaf in mind_map_leaves:
+            mind_map_app = self.add_mind_map_leaf(
+                id=id,
+                mind_map_leaf=mind_map_leaf)
+
+        return MindMapLeavesSummary(
+            id=id,
+            added=len(mind_map_leaves),
+            total=len(mind_map_app.data))
+
+    def read_mind_map_tree(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapTreeNode]:
+        """
+        Read the branch of an app under a path prefix.
+
+        Providers should override it with an index, this default
+        builds a trie from the whole app.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapTreeNode or None if the app or prefix does not exist
+        """
+        mind_map_app = self.read_mind_map_app(id=id)
+        if mind_map_app is None:
+            return None
+
+        trie = MindMapPathTrie()
+        for leaf in mind_map_app.data:
+            trie.add(path=leaf.path, text=leaf.text)
+        return trie.read(prefix=prefix, depth=depth)
+
+    def read_mind_map_stats(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapBranchStats]:
+        """
+        Read the stats of the branches of an app under a path prefix.
+
+        Providers should keep stats as leaves are added, this default
+        builds a trie from the whole app, every branch then has the
+        version of the app.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapBranchStats or None if the app or prefix does not
+            exist
+        """
+        mind_map_app = self.read_mind_map_app(id=id)
+        if mind_map_app is None:
+            return None
+        trie = MindMapPathTrie(
+            created=self.read_mind_map_app_version(id=id) or 0)
+        for leaf in mind_map_app.data:
+            trie.add(path=leaf.path, text=leaf.text)
+        return trie.stats(prefix=prefix, depth=depth)
+
+    def search_mind_map_leaves(
+            self,
+            query: str,
+            id: Optional[str] = None,
+            limit: int = 10
+    ) -> List[MindMapSearchHit]:
+        """
+        Search leaves by words of their text or path.
+
+        Providers should override it with an index, this default
+        builds an inverted index from all apps.
+
+        Args:
+            query: Words to search, a leaf matches any of them
+            id: An app id, None for all apps
+            limit: Max number of hits
+
+        Returns:
+            A list of MindMapSearchHit, best first
+        """
+        if id is None:
+            mind_map_apps = self.read_mind_map_apps()
+        else:
+            mind_map_app = self.read_mind_map_app(id=id)
+            mind_map_apps = [] if mind_map_app is None else [mind_map_app]
+
+        index = MindMapInvertedIndex()
+        leaves = {}
+        for mind_map_app in mind_map_apps:
+            for position, leaf in enumerate(mind_map_app.data):
+                index.add(mind_map_app.id, position, leaf.path, leaf.text)
+                leaves[(mind_map_app.id, position)] = leaf
+
+        return [
+            MindMapSearchHit(
+                id=app_id,
+                path=leaves[(app_id, position)].path,
+                text=leaves[(app_id, position)].text,
+                score=score)
+            for score, app_id, position in index.search(
+                query=query, limit=limit)]
+
+    def read_mind_map_apps_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[MindMapApp]:
+        """
+        Read a page of mind map apps.
+
+        Providers should override it, this default reads all apps.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of MindMapApp, empty if `after` is not an app id
+        """
+        apps = self.read_mind_map_apps()
+        start = 0
+        if after is not None:
+            ids = [app.id for app in apps]
+            if after not in ids:
+                return []
+            start = ids.index(after) + 1
+        return apps[start:start + limit]
+
+    def iter_mind_map_apps(
+            self,
+            after: Optional[str] = None,
+            page_size: int = 100
+    ) -> Iterator[MindMapApp]:
+        """
+        Iterate over mind map apps, page by page.
+
+        Only one page is held in memory at a time.
+
+        Args:
+            after: Id of the app preceding the first app, None for all
+            page_size: Number of apps read at a time
+
+        Returns:
+            An iterator of MindMapApp
+        """
+        while True:
+            page = self.read_mind_map_apps_page(limit=page_size, after=after)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = page[-1].id
+
+    def count_mind_map_apps(self) -> MindMapAppsCount:
+        """
+        Count the stored apps and leaves.
+
+        Default to reading all apps.
+
+        Returns:
+            A MindMapAppsCount DTO.
+        """
+        apps = self.dump_mind_map_apps()
+        return MindMapAppsCount(
+            apps=len(apps),
+            leaves=sum(len(app["data"]) for app in apps))
+
+    def read_mind_map_changes(
+            self,
+            id: str,
+            since: Optional[int] = None,
+            limit: int = 1000
+    ) -> Optional[MindMapChanges]:
+        """
+        Read the changes of an app since a sequence number.
+
+        Default to a resync, without a change feed every read has all
+        the leaves of the app.
+
+        Args:
+            id: An app id
+            since: The sequence number of the last change read, None for
+                a resync
+            limit: Max number of changes
+
+        Returns:
+            A MindMapChanges DTO or None if the app does not exist
+        """
+        mind_map_app = self.read_mind_map_app(id=id)
+        if mind_map_app is None:
+            return None
+        return MindMapChanges(id=id, resync=True, data=mind_map_app.data)
+
+    def close(self):
+        """Release resources held by the provider, like connections."""
+
+
+class MindMapAppAsyncDBInterface(abc.ABC):
+    """Abstract class for MindMapApp, for use in async code."""
+
+    @abc.abstractmethod
+    async def read_mind_map_apps(self) -> List[MindMapApp]:
+        """
+        Read all mind map apps.
+
+        Returns:
+            A list of MindMapApp
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def read_mind_map_app(self, id: str) -> Optional[MindMapApp]:
+        """
+        Read an app by app id.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapApp or None
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def create_mind_map_app(
+            self,
+            mind_map_app: MindMapApp
+    ) -> MindMapApp:
+        """
+        Create a mind map app.
+
+        Args:
+            mind_map_app: A MindMapApp DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def add_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapApp:
+        """
+        Add a leaf to a mind map app.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def upsert_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapLeavesSummary:
+        """
+        Replace the leaves of a mind map app at the path of a leaf.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def delete_mind_map_leaves(
+            self,
+            id: str,
+            path: Optional[str]
+    ) -> MindMapLeavesSummary:
+        """
+        Remove the leaves of a mind map app at a path.
+
+        Args:
+            id: An app id
+            path: A leaf path
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def dedup_mind_map_app(self, id: str) -> MindMapLeavesSummary:
+        """
+        Keep only the last leaf of a mind map app at each path.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def dump_mind_map_apps(self) -> List[Dict[str, Any]]:
+        """
+        Read all mind map apps as JSON ready dicts.
+
+        Returns:
+            A list of apps as a dict
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def dump_mind_map_app(self, id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read an app by app id as a JSON ready dict.
+
+        Args:
+            id: An app id
+
+        Returns:
+            An app as a dict or None
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def dump_mind_map_apps_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Read a page of mind map apps as JSON ready dicts.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of apps as a dict, empty if `after` is not an app id
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def dump_mind_map_leaves_page(
+            self,
+            id: str,
+            limit: int,
+            after: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Read a page of the leaves of an app as a JSON ready dict.
+
+        Args:
+            id: An app id
+            limit: Max number of leaves
+            after: The `next` cursor of the previous page, None for the
+                first
+
+        Returns:
+            The app id, the leaves of the page in "data" and the cursor
+            of the next page in "next", None after the last page, or
+            None if the app does not exist
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def read_mind_map_app_ids_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[str]:
+        """
+        Read the ids of a page of mind map apps.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of app ids, empty if `after` is not an app id
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def read_mind_map_apps_version(self) -> int:
+        """
+        Read the version of all apps.
+
+        The version is increased by every write, it changes whenever
+        any app changes.
+
+        Returns:
+            The version of all apps
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def read_mind_map_app_version(self, id: str) -> Optional[int]:
+        """
+        Read the version of an app.
+
+        The version changes whenever the app changes.
+
+        Args:
+            id: An app id
+
+        Returns:
+            The version of the app or None
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def read_mind_map_apps_epoch(self) -> str:
+        """
+        Read the epoch of the versions.
+
+        Versions are only compared within an epoch.
+
+        Returns:
+            The epoch of the versions
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def add_mind_map_leaves(
+            self,
+            id: str,
+            mind_map_leaves: List[MindMapLeaf]
+    ) -> MindMapLeavesSummary:
+        """
+        Add leaves to a mind map app, all or nothing.
+
+        Args:
+            id: An app id
+            mind_map_leaves: A list of MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def read_mind_map_tree(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapTreeNode]:
+        """
+        Read the branch of an app under a path prefix.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapTreeNode or None if the app or prefix does not exist
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def read_mind_map_stats(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapBranchStats]:
+        """
+        Read the stats of the branches of an app under a path prefix.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapBranchStats or None if the app or prefix does not
+            exist
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def search_mind_map_leaves(
+            self,
+            query: str,
+            id: Optional[str] = None,
+            limit: int = 10
+    ) -> List[MindMapSearchHit]:
+        """
+        Search leaves by words of their text or path.
+
+        Args:
+            query: Words to search, a leaf matches any of them
+            id: An app id, None for all apps
+            limit: Max number of hits
+
+        Returns:
+            A list of MindMapSearchHit, best first
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def read_mind_map_apps_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[MindMapApp]:
+        """
+        Read a page of mind map apps.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of MindMapApp, empty if `after` is not an app id
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def iter_mind_map_apps(
+            self,
+            after: Optional[str] = None,
+            page_size: int = 100
+    ) -> AsyncIterator[MindMapApp]:
+        """
+        Iterate over mind map apps, page by page.
+
+        Args:
+            after: Id of the app preceding the first app, None for all
+            page_size: Number of apps read at a time
+
+        Returns:
+            An async iterator of MindMapApp
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def count_mind_map_apps(self) -> MindMapAppsCount:
+        """
+        Count the stored apps and leaves.
+
+        Returns:
+            A MindMapAppsCount DTO.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def read_mind_map_changes(
+            self,
+            id: str,
+            since: Optional[int] = None,
+            limit: int = 1000
+    ) -> Optional[MindMapChanges]:
+        """
+        Read the changes of an app since a sequence number.
+
+        Args:
+            id: An app id
+            since: The sequence number of the last change read, None for
+                a resync
+            limit: Max number of changes
+
+        Returns:
+            A MindMapChanges DTO or None if the app does not exist
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release resources held by the provider, like threads."""
@@ -0,0 +1,331 @@
+"""Mind map leaf metrics."""
+import bisect
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, \
+    Optional, Sequence, Tuple
+
+# Media type of the Prometheus text format
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4"
+# Latency buckets in seconds, from 1 ms to 10 s
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+    5.0, 10.0)
+# Route label of the requests not matching a route
+UNMATCHED_ROUTE = "unmatched"
+
+Labels = Tuple[str, ...]
+
+
+def format_value(value: float) -> str:
+    """Format a sample value."""
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Format sample labels, empty without labels."""
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value)
+                         .replace("\\", "\\\\")
+                         .replace("\n", "\\n")
+                         .replace('"', '\\"'))
+        for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class MindMapMetric:
+    """
+    A metric with a value per set of labels.
+
+    Label values are given by position, in the order of the label
+    names. A value is created on first use, under a lock, then updated
+    under its own lock.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        """
+        Init.
+
+        Args:
+            name: The metric name
+            help: The metric description
+            labels: The label names
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+
+    def _value(self, labels: Labels) -> Any:
+        """The value of a set of labels, created if missing."""
+        value = self._values.get(labels)
+        if value is None:
+            with self._lock:
+                value = self._values.get(labels)
+                if value is None:
+                    value = self._values[labels] = self._new()
+        return value
+
+    def _new(self) -> Any:
+        """A new value."""
+        raise NotImplementedError
+
+    def _items(self) -> List[Tuple[Labels, Any]]:
+        """Values by set of labels, sorted, copied to allow writes."""
+        return sorted(list(self._values.items()), key=lambda item: item[0])
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Samples as suffix, formatted labels and value."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """
+        Format the metric in the Prometheus text format.
+
+        Returns:
+            The metric lines
+        """
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{labels} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MindMapCounter(MindMapMetric):
+    """A counter, a value that only increases."""
+
+    type = "counter"
+
+    def _new(self) -> List[Any]:
+        """A new value, a list to update in place."""
+        return [0, threading.Lock()]
+
+    def inc(self, *labels: str, amount: float = 1):
+        """
+        Increase the value of a set of labels.
+
+        Args:
+            labels: The label values
+            amount: The increase
+        """
+        value = self._value(labels)
+        with value[1]:
+            value[0] += amount
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Samples as suffix, formatted labels and value."""
+        for labels, value in self._items():
+            yield "", format_labels(self.labels, labels), value[0]
+
+
+class MindMapGauge(MindMapMetric):
+    """A gauge, a value set at any time, e.g. when scraped."""
+
+    type = "gauge"
+
+    def _new(self) -> List[float]:
+        """A new value, a list to update in place."""
+        return [0]
+
+    def set(self, value: float, *labels: str):
+        """
+        Set the value of a set of labels.
+
+        Args:
+            value: The value
+            labels: The label values
+        """
+        self._value(labels)[0] = value
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Samples as suffix, formatted labels and value."""
+        for labels, value in self._items():
+            yield "", format_labels(self.labels, labels), value[0]
+
+
+class MindMapHistogramValue:
+    """Observations of a histogram for a set of labels."""
+
+    __slots__ = ("counts", "sum", "lock")
+
+    def __init__(self, buckets: int):
+        """Init."""
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+
+class MindMapHistogram(MindMapMetric):
+    """
+    A histogram, observations counted by bucket.
+
+    An observation increments the count of a single bucket, counts are
+    only made cumulative when rendered.
+    """
+
+    type = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            help: str,
+            labels: Sequence[str] = (),
+            buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        """
+        Init.
+
+        Args:
+            name: The metric name
+            help: The metric description
+            labels: The label names
+            buckets: Sorted upper bounds of the buckets
+        """
+        super().__init__(name=name, help=help, labels=labels)
+        self.buckets = tuple(buckets)
+
+    def _new(self) -> MindMapHistogramValue:
+        """A new value."""
+        return MindMapHistogramValue(len(self.buckets))
+
+    def observe(self, amount: float, *labels: str):
+        """
+        Add an observation to a set of labels.
+
+        Args:
+            amount: The observed amount, e.g. a duration in seconds
+            labels: The label values
+        """
+        value = self._value(labels)
+        index = bisect.bisect_left(self.buckets, amount)
+        with value.lock:
+            value.counts[index] += 1
+            value.sum += amount
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Samples as suffix, formatted labels and value."""
+        names = self.labels + ("le",)
+        for labels, value in self._items():
+            with value.lock:
+                counts = value.counts[:]
+                total = value.sum
+            count = 0
+            for bound, bucket in zip(
+                    self.buckets + (float("inf"),), counts):
+                count += bucket
+                yield (
+                    "_bucket",
+                    format_labels(names, labels + (format_value(bound),)),
+                    count)
+            formatted = format_labels(self.labels, labels)
+            yield "_sum", formatted, total
+            yield "_count", formatted, count
+
+
+class MindMapMetricsRegistry:
+    """Metrics rendered together."""
+
+    def __init__(self):
+        """Init."""
+        self.metrics: List[MindMapMetric] = []
+
+    def register(self, metric: MindMapMetric) -> Any:
+        """
+        Register a metric.
+
+        Args:
+            metric: A metric
+
+        Returns:
+            The metric
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Format all metrics in the Prometheus text format.
+
+        Returns:
+            The metrics text
+        """
+        return "".join(metric.render() for metric in self.metrics)
+
+
+class MindMapMetricsMiddleware:
+    """
+    An ASGI middleware counting and timing HTTP requests.
+
+    Requests are labelled by route path rather than URL, so that the
+    number of labels stays bounded, and by response status. A request
+    is timed until its response is sent, streamed bodies included.
+    """
+
+    def __init__(
+            self,
+            app: Callable[..., Awaitable[None]],
+            histogram: MindMapHistogram
+    ):
+        """
+        Init.
+
+        Args:
+            app: The ASGI app
+            histogram: The request durations, by method, route and status
+        """
+        self.app = app
+        self.histogram = histogram
+        self._routes: Dict[Any, str] = {}
+
+    def _route(self, scope: Dict[str, Any]) -> str:
+        """The route path of a request, from its matched endpoint."""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        route = self._routes.get(endpoint)
+        if route is None:
+            self._routes = {
+                getattr(item, "endpoint", None): item.path
+                for item in scope["app"].routes}
+            route = self._routes.get(endpoint, UNMATCHED_ROUTE)
+        return route
+
+    async def __call__(
+            self,
+            scope: Dict[str, Any],
+            receive: Callable[[], Awaitable[Dict[str, Any]]],
+            send: Callable[[Dict[str, Any]], Awaitable[None]]
+    ):
+        """Run a request, then record it."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status: List[Optional[int]] = [None]
+
+        async def send_status(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            self.histogram.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                self._route(scope),
+                str(status[0] or 500))
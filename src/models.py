@@ -18,6 +18,101 @@ class MindMapApp(BaseModel):
     data: List[MindMapLeaf] = Field(default_factory=list)
 
 
+class MindMapLeavesSummary(BaseModel):
+    """A MindMapLeavesSummary DTO, the result of a write of leaves."""
+
+    id: str
+    added: int
+    total: int
+    removed: int = 0
+
+
+class MindMapAppsCount(BaseModel):
+    """A MindMapAppsCount DTO, the size of the stored apps."""
+
+    apps: int = 0
+    leaves: int = 0
+
+
+class MindMapImportSummary(BaseModel):
+    """A MindMapImportSummary DTO, the result of an import."""
+
+    apps: int = 0
+    leaves: int = 0
+    records: int = 0
+    seconds: float = 0.0
+    records_per_second: float = 0.0
+
+
+class MindMapSearchHit(BaseModel):
+    """A MindMapSearchHit DTO, a leaf matching a search."""
+
+    id: str
+    path: Optional[str] = None
+    text: Optional[str] = None
+    score: float = 0.0
+
+
+class MindMapTreeNode(BaseModel):
+    """A MindMapTreeNode DTO, a branch of a mind map app."""
+
+    name: str = ""
+    path: str = ""
+    texts: List[Optional[str]] = Field(default_factory=list)
+    has_children: bool = False
+    children: List["MindMapTreeNode"] = Field(default_factory=list)
+
+
+MindMapTreeNode.update_forward_refs()
+
+
+class MindMapBranchStats(BaseModel):
+    """
+    A MindMapBranchStats DTO, the size of a branch of a mind map app.
+
+    `leaves` counts the leaves under the branch path, its own included,
+    `max_depth` is the max number of path segments of a leaf below it,
+    and `version` the version of the app after the last leaf added to
+    it, a counter of the store to compare with other versions, not a
+    date.
+    """
+
+    name: str = ""
+    path: str = ""
+    leaves: int = 0
+    max_depth: int = 0
+    version: int = 0
+    has_children: bool = False
+    children: List["MindMapBranchStats"] = Field(default_factory=list)
+
+
+MindMapBranchStats.update_forward_refs()
+
+
+class MindMapChange(BaseModel):
+    """A MindMapChange DTO, an event of the change feed of an app."""
+
+    seq: int
+    type: str
+    data: List[MindMapLeaf] = Field(default_factory=list)
+
+
+class MindMapChanges(BaseModel):
+    """
+    A MindMapChanges DTO, the changes of an app since a sequence number.
+
+    `seq` is the sequence number to read the next changes from. With
+    `resync`, the changes asked for are no longer kept and `data` has
+    all the leaves of the app at `seq` instead.
+    """
+
+    id: str
+    seq: int = 0
+    resync: bool = False
+    data: List[MindMapLeaf] = Field(default_factory=list)
+    changes: List[MindMapChange] = Field(default_factory=list)
+
+
 class MindMapAppExceptions(Exception):
     """Base exceptions for MindMapItem."""
 
@@ -28,3 +123,11 @@ class MindMapAppCreateError(MindMapAppExceptions):
 
 class MindMapAppAddError(MindMapAppExceptions):
     """Raise when trying to add a leaf in database."""
+
+
+class MindMapAppUpdateError(MindMapAppExceptions):
+    """Raise when trying to update or delete leaves in database."""
+
+
+class MindMapImportError(MindMapAppExceptions):
+    """Raise when an import record is invalid."""
@@ -0,0 +1,275 @@
+"""Mind map leaf profiles."""
+import cProfile
+import io
+import pstats
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, \
+    Sequence, TypeVar
+from urllib.parse import parse_qs
+
+T = TypeVar("T")
+
+# Request header asking for a profile, e.g. "X-Profile: 1"
+PROFILE_HEADER = b"x-profile"
+# Query parameter asking for a profile, e.g. "?profile=1"
+PROFILE_PARAM = "profile"
+# Response header giving the id of the stored profile
+PROFILE_ID_HEADER = b"x-profile-id"
+# Sort keys of the profile stats
+PROFILE_SORTS = ("cumulative", "tottime", "calls")
+
+# Profile of the request being served, None when not profiled
+CURRENT_PROFILE: "ContextVar[Optional[MindMapProfile]]" = ContextVar(
+    "mind_map_profile", default=None)
+
+
+class MindMapProfile:
+    """
+    A profile of a request.
+
+    A request runs in the event loop thread and its provider calls in
+    worker threads, each thread is profiled by its own profiler and
+    their stats are merged when read.
+    """
+
+    def __init__(self, method: str, path: str):
+        """
+        Init.
+
+        Args:
+            method: The request method
+            path: The request path
+        """
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.created = time.time()
+        self.seconds = 0.0
+        self.status: Optional[int] = None
+        self._profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add(self, profiler: cProfile.Profile):
+        """
+        Add a profiler to merge.
+
+        Args:
+            profiler: A profiler of a part of the request
+        """
+        with self._lock:
+            self._profilers.append(profiler)
+
+    def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run and profile a function in the current thread.
+
+        The function runs without its own profiler if another one is
+        active, which then profiles it.
+
+        Returns:
+            The function result
+        """
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            self.add(profiler)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Describe the profile.
+
+        Returns:
+            Id, request, response status, duration and creation time
+        """
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "seconds": self.seconds,
+            "created": self.created,
+        }
+
+    def stats(self, sort: str = "cumulative", limit: int = 50) -> str:
+        """
+        Format the profile stats.
+
+        Args:
+            sort: A sort key, see PROFILE_SORTS
+            limit: Max number of functions
+
+        Returns:
+            The stats as text, as printed by pstats
+        """
+        stream = io.StringIO()
+        with self._lock:
+            profilers = self._profilers[:]
+        if not profilers:
+            return ""
+        stats = pstats.Stats(*profilers, stream=stream)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class MindMapProfileStore:
+    """The most recent profiles, older ones are dropped."""
+
+    def __init__(self, max_size: int = 20):
+        """
+        Init.
+
+        Args:
+            max_size: Max number of profiles
+        """
+        self.max_size = max_size
+        self._profiles: Deque[MindMapProfile] = deque(maxlen=max_size)
+
+    def add(self, profile: MindMapProfile):
+        """
+        Store a profile.
+
+        Args:
+            profile: A profile
+        """
+        self._profiles.append(profile)
+
+    def get(self, id: str) -> Optional[MindMapProfile]:
+        """
+        Read a profile by id.
+
+        Args:
+            id: A profile id
+
+        Returns:
+            A profile or None
+        """
+        for profile in list(self._profiles):
+            if profile.id == id:
+                return profile
+        return None
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """
+        Describe the profiles.
+
+        Returns:
+            A list of profile summaries, most recent first
+        """
+        return [profile.summary() for profile in reversed(self._profiles)]
+
+
+def profile_requested(scope: Dict[str, Any]) -> bool:
+    """
+    Check whether a request asks for a profile.
+
+    Args:
+        scope: An ASGI HTTP scope
+
+    Returns:
+        True with a truthy profile header or query parameter
+    """
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value not in (b"", b"0", b"false")
+    query = scope.get("query_string", b"")
+    if PROFILE_PARAM.encode() not in query:
+        return False
+    values = parse_qs(query.decode("latin-1")).get(PROFILE_PARAM, [])
+    return any(value not in ("", "0", "false") for value in values)
+
+
+class MindMapProfilingMiddleware:
+    """
+    An ASGI middleware profiling the requests asking for it.
+
+    A request is profiled when it has the X-Profile header or the
+    profile query parameter, and comes from an allowed host. Profiles
+    are stored, the response gives the profile id in the X-Profile-Id
+    header.
+
+    The event loop thread is profiled for the whole request, so other
+    requests served meanwhile are part of the profile. One request is
+    profiled at a time, others run as usual. Without the middleware,
+    nothing is profiled nor checked.
+    """
+
+    def __init__(
+            self,
+            app: Callable[..., Awaitable[None]],
+            profiles: MindMapProfileStore,
+            hosts: Sequence[str]
+    ):
+        """
+        Init.
+
+        Args:
+            app: The ASGI app
+            profiles: The profile store
+            hosts: Client hosts allowed to ask for a profile
+        """
+        self.app = app
+        self.profiles = profiles
+        self.hosts = frozenset(hosts)
+        self._active = False
+
+    def _profiled(self, scope: Dict[str, Any]) -> bool:
+        """Check whether to profile a request."""
+        if scope["type"] != "http" or self._active:
+            return False
+        client = scope.get("client")
+        if client is None or client[0] not in self.hosts:
+            return False
+        return profile_requested(scope)
+
+    async def __call__(
+            self,
+            scope: Dict[str, Any],
+            receive: Callable[[], Awaitable[Dict[str, Any]]],
+            send: Callable[[Dict[str, Any]], Awaitable[None]]
+    ):
+        """Run a request, profiled if asked for."""
+        if not self._profiled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = MindMapProfile(method=scope["method"], path=scope["path"])
+
+        async def send_profile_id(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [
+                        (PROFILE_ID_HEADER, profile.id.encode())]}
+            await send(message)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active, e.g. the process is profiled
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        token = CURRENT_PROFILE.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_profile_id)
+        finally:
+            profiler.disable()
+            profile.seconds = time.perf_counter() - start
+            profile.add(profiler)
+            CURRENT_PROFILE.reset(token)
+            self._active = False
+            self.profiles.add(profile)
@@ -1,10 +1,41 @@
 """Mind map leaf provider."""
-from typing import List, Optional, Dict, Any
+import asyncio
+import bisect
+import contextlib
+import functools
+import inspect
+import os
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import List, Optional, Dict, Any, Iterator, Callable, \
+    TypeVar, AsyncIterator, Tuple, Iterable, Type
 
-from src.interfaces import MindMapAppDBInterface
+from src.caches import ReadThroughCache
+from src.changes import MindMapChangeFeed, CHANGE_CREATED, CHANGE_ADDED, \
+    CHANGE_UPSERTED, CHANGE_DELETED, CHANGE_DEDUPED
+from src.columns import MindMapSegmentTable, MindMapLeafColumns
+from src.indexes import MindMapPathTrie, MindMapInvertedIndex, \
+    split_path, tokenize, norm_path
+from src.interfaces import MindMapAppDBInterface, \
+    MindMapAppAsyncDBInterface
+from src.metrics import MindMapCounter, MindMapHistogram
 from src.models import MindMapAppCreateError, \
-    MindMapApp, MindMapLeaf, MindMapAppAddError
+    MindMapApp, MindMapLeaf, MindMapAppAddError, MindMapTreeNode, \
+    MindMapLeavesSummary, MindMapSearchHit, MindMapAppsCount, \
+    MindMapChanges, MindMapBranchStats, MindMapAppUpdateError
+from src.profiles import CURRENT_PROFILE
+from src.settings import Settings
+from src.storages import MindMapLog, MindMapSnapshot, iter_records, \
+    write_binary_snapshot, is_binary_snapshot
+from src.stores import connect, store_authkey, STORE_METHODS, \
+    STORE_WRITES
 
+T = TypeVar("T")
 
 db = [
     {
@@ -37,12 +68,57 @@ db = [
 ]
 
 
+def construct_mind_map_app(item: Dict[str, Any]) -> MindMapApp:
+    """
+    Build an app from data validated on write, without validation.
+
+    Args:
+        item: An app as a dict
+
+    Returns:
+        A MindMapApp DTO.
+    """
+    return MindMapApp.construct(
+        id=item["id"],
+        data=[MindMapLeaf.construct(**leaf) for leaf in item["data"]])
+
+
+# Estimated sizes in bytes of an app and of a leaf, without their strings
+APP_SIZE = 200
+LEAF_SIZE = 250
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estimate the memory size of apps, without walking every object.
+
+    Args:
+        value: An app or a list of apps, as a MindMapApp or a dict
+
+    Returns:
+        A size in bytes
+    """
+    if value is None:
+        return 0
+    if isinstance(value, list):
+        return sum(estimate_size(item) for item in value)
+    if isinstance(value, MindMapApp):
+        value = {"id": value.id, "data": value.data}
+    size = APP_SIZE + len(value["id"])
+    for leaf in value["data"]:
+        if not isinstance(leaf, dict):
+            leaf = leaf.__dict__
+        size += LEAF_SIZE + len(leaf["path"] or "") + len(leaf["text"] or "")
+    return size
+
+
 class MindMapDBProvider(MindMapAppDBInterface):
     """Mind map providers for data."""
 
     def __init__(self):
         """Init DB."""
         self.db: List[Dict[str, Any]] = db
+        self._version = 0
 
     def read_mind_map_apps(self) -> List[MindMapApp]:
         """
@@ -85,6 +161,7 @@ class MindMapDBProvider(MindMapAppDBInterface):
                     f"already exists in database.")
 
         self.db.append(mind_map_app.dict())
+        self._version += 1
         return mind_map_app
 
     def add_mind_map_leaf(
@@ -105,7 +182,3098 @@ class MindMapDBProvider(MindMapAppDBInterface):
         for item in self.db:
             if item['id'] == id:
                 item['data'].append(mind_map_leaf.dict())
+                self._version += 1
                 return self.read_mind_map_app(id=id)
 
         raise MindMapAppAddError(
             f"App with id: {id} does not exist in database.")
+
+    def replace_mind_map_leaves(
+            self,
+            id: str,
+            mind_map_leaves: List[MindMapLeaf]
+    ) -> MindMapApp:
+        """
+        Replace all the leaves of a mind map app.
+
+        Upserts, deletes and dedups are the interface defaults over it.
+
+        Args:
+            id: An app id
+            mind_map_leaves: A list of MindMapLeaf DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        for item in self.db:
+            if item['id'] == id:
+                item['data'] = [leaf.dict() for leaf in mind_map_leaves]
+                self._version += 1
+                return self.read_mind_map_app(id=id)
+
+        raise MindMapAppUpdateError(
+            f"App with id: {id} does not exist in database.")
+
+    def read_mind_map_apps_version(self) -> int:
+        """
+        Read the version of all apps.
+
+        Returns:
+            The version of all apps
+        """
+        return self._version
+
+
+class MindMapAppRecord:
+    """
+    The stored state of an app.
+
+    Leaves are only appended, each with the version of the write that
+    added it. The app at a version is a prefix of its leaves, so a
+    reader never copies or locks anything to see a consistent app.
+
+    A removed leaf stays in place: its position is appended to the
+    removals with the version of the write that removed it, and is
+    skipped by the readers at this version or after it. Once removed
+    leaves are more than half of the leaves, the app is rebuilt into a
+    new record without them, see MindMapIndexedDBProvider._rebuild.
+
+    An app restored from a snapshot has a loader instead of leaves
+    until its first access, see MindMapIndexedDBProvider._load.
+    """
+
+    __slots__ = ("id", "data", "versions", "removed", "removed_versions",
+                 "paths", "created", "rebuilt", "loader", "lock")
+
+    def __init__(self, id: str, data: Any):
+        """
+        Init.
+
+        Args:
+            id: An app id
+            data: The stored leaves, a list of dict or columns
+        """
+        self.id = id
+        self.data = data
+        self.versions = array("Q")
+        self.removed = array("Q")
+        self.removed_versions = array("Q")
+        self.paths: Optional[Dict[str, List[int]]] = None
+        self.created = 0
+        self.rebuilt = 0
+        self.loader: Optional[Callable[[], List[Dict[str, Any]]]] = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _before(versions: "array[int]", version: Optional[int]) -> int:
+        """Number of versions up to a version, None for all."""
+        size = len(versions)
+        if version is None or not size or versions[size - 1] <= version:
+            return size
+        return bisect.bisect_right(versions, version, 0, size)
+
+    def size(self, version: Optional[int] = None) -> int:
+        """
+        Number of leaves added to the app at a version, even removed.
+
+        Args:
+            version: A version of all apps, None for the last one
+
+        Returns:
+            The number of leaves
+        """
+        return self._before(self.versions, version)
+
+    def removals(self, version: Optional[int] = None) -> "array[int]":
+        """
+        Positions of the leaves removed from the app at a version.
+
+        Args:
+            version: A version of all apps, None for the last one
+
+        Returns:
+            An array of leaf positions
+        """
+        return self.removed[:self._before(self.removed_versions, version)]
+
+    def count(self, version: Optional[int] = None) -> int:
+        """
+        Number of leaves of the app at a version.
+
+        Args:
+            version: A version of all apps, None for the last one
+
+        Returns:
+            The number of leaves
+        """
+        return self.size(version) - self._before(
+            self.removed_versions, version)
+
+    def wasteful(self) -> bool:
+        """Whether removed leaves are more than half of the leaves."""
+        return len(self.removed) * 2 > self.size()
+
+    def dump(self, size: int, version: Optional[int] = None) -> Dict[str, Any]:
+        """Copy the app at a version with its first leaves, shared."""
+        loader = self.loader
+        if loader is not None:
+            return {"id": self.id, "data": loader()[:size]}
+        removed = self.removals(version)
+        if not removed:
+            return {"id": self.id, "data": self.data[:size]}
+        skipped = set(removed)
+        return {"id": self.id, "data": [
+            leaf for position, leaf in enumerate(self.data[:size])
+            if position not in skipped]}
+
+    def page(
+            self,
+            start: int,
+            limit: int,
+            size: int,
+            version: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Copy leaves of the app at a version, from a position.
+
+        Args:
+            start: The position of the first leaf, removed or not
+            limit: Max number of leaves
+            size: Number of leaves added at the version, even removed
+            version: A version of all apps, None for the last one
+
+        Returns:
+            The leaves and the position of the next leaves, None if
+            there is none
+        """
+        data = self.data if self.loader is None else self.loader()
+        removed = self.removals(version)
+        if not removed:
+            stop = min(start + limit, size)
+            return data[start:stop], stop if stop < size else None
+        skipped = set(removed)
+        leaves = []
+        position = start
+        while position < size and len(leaves) < limit:
+            if position not in skipped:
+                leaves.append(data[position])
+            position += 1
+        return leaves, position if position < size else None
+
+
+class MindMapIndexedDBProvider(MindMapAppDBInterface):
+    """
+    Mind map providers for data indexed by app id.
+
+    Apps are kept in a dict keyed by app id, so lookup, duplicate
+    detection and leaf append do not depend on the number of apps.
+    Each app has a path trie, maintained on add, to read a branch
+    without a full scan, and leaves of all apps are in an inverted
+    index to search them.
+
+    Apps are stored as dicts validated on write: they are read without
+    validation, and dumped as is. Leaves are never modified once
+    stored, a dump only copies the list of leaves.
+
+    Upserts and deletes find the leaves at a path through a per-app
+    index of positions by normalized path, built on the first update of
+    the app and kept up to date by every write of it. Removed leaves
+    are reclaimed by rebuilding the app once they are the majority.
+
+    Reads see a snapshot of all apps, without locks: writers append
+    leaves, then publish them by stamping them with a new version of
+    all apps, and a read only sees the leaves stamped up to the version
+    it started at. Writers of an app hold its lock, writers of
+    different apps only share the short stamp.
+
+    The version of an app is the version of all apps after its last
+    write, so it is unique across apps and across a rebuild.
+
+    Apps restored from a snapshot are only counted until their first
+    access, which decodes their leaves and indexes them.
+    """
+
+    def __init__(self, data: Optional[List[Dict[str, Any]]] = None):
+        """
+        Init DB.
+
+        Args:
+            data: A list of apps as a dict, default to the sample db.
+        """
+        self._apps: Dict[str, MindMapAppRecord] = {}
+        self._trees: Dict[str, MindMapPathTrie] = {}
+        self._order: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._app_versions: Dict[str, int] = {}
+        self._search = MindMapInvertedIndex()
+        self._commit_lock = threading.Lock()
+        self._version = 0
+        self.db = db if data is None else data
+
+    @property
+    def db(self) -> List[Dict[str, Any]]:
+        """All apps as a list of dict, in insertion order."""
+        return self.dump_mind_map_apps()
+
+    @db.setter
+    def db(self, data: List[Dict[str, Any]]):
+        """Replace all apps and rebuild the index, not concurrently."""
+        self._apps = {}
+        self._trees = {}
+        self._order = []
+        self._positions = {}
+        self._app_versions = {}
+        self._search = MindMapInvertedIndex()
+        self._version += 1
+        for item in data:
+            self.create_mind_map_app(mind_map_app=MindMapApp(**item))
+
+    def _snapshot(
+            self,
+            ids: Optional[List[str]] = None,
+            load: bool = True
+    ) -> List[Tuple[MindMapAppRecord, int, int]]:
+        """Apps, their number of leaves and the current version."""
+        if ids is None:
+            ids = self._order[:]
+        while True:
+            version = self._version
+            snapshot = []
+            for id in ids:
+                record = self._apps.get(id)
+                if record is None or record.created > version:
+                    continue
+                if record.rebuilt > version:
+                    # Rebuilt after the version was read, read it again
+                    break
+                if load and record.loader is not None:
+                    self._load(record)
+                snapshot.append((record, record.size(version), version))
+            else:
+                return snapshot
+
+    def _loaded(self, id: str) -> Optional[MindMapAppRecord]:
+        """The record of an app, its leaves loaded."""
+        record = self._apps.get(id)
+        if record is not None and record.loader is not None:
+            self._load(record)
+        return record
+
+    def _load(self, record: MindMapAppRecord):
+        """Decode and index the leaves of an app restored from a snapshot."""
+        with record.lock:
+            loader = record.loader
+            if loader is None:
+                return
+            leaves = loader()
+            trie = MindMapPathTrie(created=record.created)
+            for position, leaf in enumerate(leaves):
+                trie.add(path=leaf["path"], text=leaf["text"])
+                self._search.add(
+                    record, position, leaf["path"], leaf["text"])
+            record.data = self._store(leaves)
+            self._trees[record.id] = trie
+            # Last, readers skip the loader once the leaves are there
+            record.loader = None
+
+    def _restore(
+            self,
+            id: str,
+            size: int,
+            loader: Callable[[], List[Dict[str, Any]]]
+    ):
+        """
+        Add an app restored from a snapshot, without reading its leaves.
+
+        Args:
+            id: An app id
+            size: Its number of leaves
+            loader: Decodes its leaves as a dict, on first access
+        """
+        record = MindMapAppRecord(id=id, data=self._store([]))
+        record.loader = loader
+        with self._commit_lock:
+            if id in self._apps:
+                raise MindMapAppCreateError(
+                    f"App with id: {id} already exists in database.")
+
+            version = self._version + 1
+            record.created = version
+            record.versions.extend(array("Q", [version]) * size)
+            self._apps[id] = record
+            self._positions[id] = len(self._order)
+            self._order.append(id)
+            self._app_versions[id] = version
+            self._version = version
+
+    def read_mind_map_apps(self) -> List[MindMapApp]:
+        """
+        Read all mind map apps.
+
+        Returns:
+            A list of MindMapApp
+        """
+        return [
+            construct_mind_map_app(record.dump(size, version))
+            for record, size, version in self._snapshot()]
+
+    def _page(self, limit: int, after: Optional[str]) -> List[str]:
+        """Ids of a page of apps."""
+        start = 0
+        if after is not None:
+            if after not in self._positions:
+                return []
+            start = self._positions[after] + 1
+        return self._order[start:start + limit]
+
+    def read_mind_map_apps_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[MindMapApp]:
+        """
+        Read a page of mind map apps.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of MindMapApp, empty if `after` is not an app id
+        """
+        return [
+            construct_mind_map_app(record.dump(size, version))
+            for record, size, version in self._snapshot(
+                ids=self._page(limit=limit, after=after))]
+
+    def read_mind_map_app(self, id: str) -> Optional[MindMapApp]:
+        """
+        Read an app by app id.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapApp or None
+        """
+        item = self.dump_mind_map_app(id=id)
+        if item is None:
+            return None
+        return construct_mind_map_app(item)
+
+    def _store(self, leaves: Iterable[Dict[str, Any]]) -> Any:
+        """Convert the leaves of an app to their stored form."""
+        return list(leaves)
+
+    def _commit(
+            self,
+            record: MindMapAppRecord,
+            added: int,
+            removed: Iterable[int] = ()
+    ) -> int:
+        """Publish the leaves added to and removed from an app."""
+        removed = array("Q", removed)
+        with self._commit_lock:
+            version = self._version + 1
+            record.versions.extend(array("Q", [version]) * added)
+            if removed:
+                record.removed.extend(removed)
+                record.removed_versions.extend(
+                    array("Q", [version]) * len(removed))
+            self._app_versions[record.id] = version
+            self._version = version
+        return version
+
+    def create_mind_map_app(self, mind_map_app: MindMapApp) -> MindMapApp:
+        """
+        Create a mind map app.
+
+        Args:
+            mind_map_app: A MindMapApp DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        record = MindMapAppRecord(
+            id=mind_map_app.id,
+            data=self._store(leaf.dict() for leaf in mind_map_app.data))
+        trie = MindMapPathTrie()
+        for leaf in mind_map_app.data:
+            trie.add(path=leaf.path, text=leaf.text)
+
+        with record.lock:
+            with self._commit_lock:
+                if mind_map_app.id in self._apps:
+                    raise MindMapAppCreateError(
+                        f"App with id: {mind_map_app.id} "
+                        f"already exists in database.")
+
+                version = self._version + 1
+                record.created = version
+                trie.created = version
+                record.versions.extend(
+                    array("Q", [version]) * len(mind_map_app.data))
+                self._apps[mind_map_app.id] = record
+                self._trees[mind_map_app.id] = trie
+                self._positions[mind_map_app.id] = len(self._order)
+                self._order.append(mind_map_app.id)
+                self._app_versions[mind_map_app.id] = version
+                self._version = version
+
+            for position, leaf in enumerate(mind_map_app.data):
+                self._search.add(record, position, leaf.path, leaf.text)
+        return mind_map_app
+
+    def add_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapApp:
+        """
+        Add a leaf to a mind map app.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        record = self._loaded(id)
+        if record is None:
+            raise MindMapAppAddError(
+                f"App with id: {id} does not exist in database.")
+
+        with record.lock:
+            record = self._apps[id]
+            record.data.append(mind_map_leaf.dict())
+            version = self._commit(record, added=1)
+            size = record.size()
+            self._index(record, size - 1, mind_map_leaf, version)
+        return construct_mind_map_app(record.dump(size, version))
+
+    def add_mind_map_leaves(
+            self,
+            id: str,
+            mind_map_leaves: List[MindMapLeaf]
+    ) -> MindMapLeavesSummary:
+        """
+        Add leaves to a mind map app, all or nothing.
+
+        Args:
+            id: An app id
+            mind_map_leaves: A list of MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        record = self._loaded(id)
+        if record is None:
+            raise MindMapAppAddError(
+                f"App with id: {id} does not exist in database.")
+
+        with record.lock:
+            record = self._apps[id]
+            start = record.size()
+            record.data.extend(leaf.dict() for leaf in mind_map_leaves)
+            version = self._commit(record, added=len(mind_map_leaves))
+            for position, leaf in enumerate(mind_map_leaves, start):
+                self._index(record, position, leaf, version)
+            total = record.count()
+
+        return MindMapLeavesSummary(
+            id=id,
+            added=len(mind_map_leaves),
+            total=total)
+
+    def _index(
+            self,
+            record: MindMapAppRecord,
+            position: int,
+            mind_map_leaf: MindMapLeaf,
+            version: int
+    ):
+        """Index a leaf added to an app, holding its lock."""
+        self._trees[record.id].add(
+            path=mind_map_leaf.path,
+            text=mind_map_leaf.text,
+            version=version)
+        self._search.add(
+            record, position, mind_map_leaf.path, mind_map_leaf.text)
+        if record.paths is not None:
+            record.paths.setdefault(
+                norm_path(mind_map_leaf.path), []).append(position)
+
+    def _unindex(
+            self,
+            record: MindMapAppRecord,
+            positions: List[int],
+            version: int
+    ):
+        """Unindex leaves removed from an app, holding its lock."""
+        trie = self._trees[record.id]
+        for position in positions:
+            leaf = record.data[position]
+            trie.remove(path=leaf["path"], text=leaf["text"], version=version)
+            self._search.remove(
+                record, position, leaf["path"], leaf["text"])
+
+    def _paths(self, record: MindMapAppRecord) -> Dict[str, List[int]]:
+        """The positions of the leaves of an app by normalized path."""
+        if record.paths is None:
+            paths: Dict[str, List[int]] = {}
+            removed = set(record.removals())
+            for position, leaf in enumerate(record.data[:record.size()]):
+                if position not in removed:
+                    paths.setdefault(
+                        norm_path(leaf["path"]), []).append(position)
+            record.paths = paths
+        return record.paths
+
+    def _record(self, id: str) -> MindMapAppRecord:
+        """The record of an app to update."""
+        record = self._loaded(id)
+        if record is None:
+            raise MindMapAppUpdateError(
+                f"App with id: {id} does not exist in database.")
+        return record
+
+    def _rebuild(self, record: MindMapAppRecord) -> MindMapAppRecord:
+        """
+        Rebuild an app without its removed leaves, holding its lock.
+
+        The rebuilt record shares the lock of the app, its leaves keep
+        the version of their write. It replaces the record at once, a
+        read of a version older than the rebuild reads it again, see
+        _snapshot, and a search only reads the leaves of current
+        records.
+
+        Args:
+            record: The current record of the app
+
+        Returns:
+            The rebuilt record
+        """
+        size = record.size()
+        removed = set(record.removals())
+        kept = [
+            position for position in range(size) if position not in removed]
+        rebuilt = MindMapAppRecord(
+            id=record.id,
+            data=self._store(record.data[position] for position in kept))
+        rebuilt.versions = array(
+            "Q", (record.versions[position] for position in kept))
+        rebuilt.created = record.created
+        rebuilt.lock = record.lock
+        rebuilt.paths = {}
+        for position, leaf in enumerate(rebuilt.data[:len(kept)]):
+            rebuilt.paths.setdefault(
+                norm_path(leaf["path"]), []).append(position)
+            self._search.add(rebuilt, position, leaf["path"], leaf["text"])
+
+        with self._commit_lock:
+            rebuilt.rebuilt = self._version
+            self._apps[record.id] = rebuilt
+        self._search.drop(record, (
+            (leaf["path"], leaf["text"]) for leaf in record.data[:size]))
+        return rebuilt
+
+    def upsert_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapLeavesSummary:
+        """
+        Replace the leaves of a mind map app at the path of a leaf.
+
+        The leaves at the path are found through the path index, the
+        cost does not depend on the number of leaves of the app.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        record = self._record(id)
+        with record.lock:
+            record = self._apps[id]
+            removed = self._paths(record).pop(
+                norm_path(mind_map_leaf.path), [])
+            record.data.append(mind_map_leaf.dict())
+            version = self._commit(record, added=1, removed=removed)
+            self._unindex(record, removed, version)
+            self._index(record, record.size() - 1, mind_map_leaf, version)
+            if record.wasteful():
+                record = self._rebuild(record)
+            total = record.count()
+
+        return MindMapLeavesSummary(
+            id=id,
+            added=1,
+            removed=len(removed),
+            total=total)
+
+    def delete_mind_map_leaves(
+            self,
+            id: str,
+            path: Optional[str]
+    ) -> MindMapLeavesSummary:
+        """
+        Remove the leaves of a mind map app at a path.
+
+        Args:
+            id: An app id
+            path: A leaf path
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        record = self._record(id)
+        with record.lock:
+            record = self._apps[id]
+            removed = self._paths(record).pop(norm_path(path), [])
+            if removed:
+                version = self._commit(record, added=0, removed=removed)
+                self._unindex(record, removed, version)
+                if record.wasteful():
+                    record = self._rebuild(record)
+            total = record.count()
+
+        return MindMapLeavesSummary(
+            id=id,
+            added=0,
+            removed=len(removed),
+            total=total)
+
+    def dedup_mind_map_app(self, id: str) -> MindMapLeavesSummary:
+        """
+        Keep only the last leaf of a mind map app at each path.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        record = self._record(id)
+        with record.lock:
+            record = self._apps[id]
+            removed = []
+            for positions in self._paths(record).values():
+                if len(positions) > 1:
+                    removed.extend(positions[:-1])
+                    del positions[:-1]
+            removed.sort()
+            if removed:
+                version = self._commit(record, added=0, removed=removed)
+                self._unindex(record, removed, version)
+                if record.wasteful():
+                    record = self._rebuild(record)
+            total = record.count()
+
+        return MindMapLeavesSummary(
+            id=id,
+            added=0,
+            removed=len(removed),
+            total=total)
+
+    def dump_mind_map_apps(self) -> List[Dict[str, Any]]:
+        """
+        Read all mind map apps as JSON ready dicts.
+
+        Returns:
+            A list of apps as a dict
+        """
+        return [
+            record.dump(size, version)
+            for record, size, version in self._snapshot()]
+
+    def dump_mind_map_app(self, id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read an app by app id as a JSON ready dict.
+
+        Args:
+            id: An app id
+
+        Returns:
+            An app as a dict or None
+        """
+        snapshot = self._snapshot(ids=[id])
+        if not snapshot:
+            return None
+        record, size, version = snapshot[0]
+        return record.dump(size, version)
+
+    def dump_mind_map_apps_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Read a page of mind map apps as JSON ready dicts.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of apps as a dict, empty if `after` is not an app id
+        """
+        return [
+            record.dump(size, version)
+            for record, size, version in self._snapshot(
+                ids=self._page(limit=limit, after=after))]
+
+    def dump_mind_map_leaves_page(
+            self,
+            id: str,
+            limit: int,
+            after: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Read a page of the leaves of an app as a JSON ready dict.
+
+        The cursor is the position of the next leaf in the record,
+        removed leaves included, so a page is read without copying the
+        leaves before it.
+
+        Args:
+            id: An app id
+            limit: Max number of leaves
+            after: The `next` cursor of the previous page, None for the
+                first
+
+        Returns:
+            The app id, the leaves of the page in "data" and the cursor
+            of the next page in "next", None after the last page, or
+            None if the app does not exist
+        """
+        snapshot = self._snapshot(ids=[id])
+        if not snapshot:
+            return None
+        record, size, version = snapshot[0]
+        data, cursor = record.page(after or 0, limit, size, version)
+        return {"id": id, "data": data, "next": cursor}
+
+    def read_mind_map_app_ids_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[str]:
+        """
+        Read the ids of a page of mind map apps.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of app ids, empty if `after` is not an app id
+        """
+        return [
+            record.id
+            for record, _, _ in self._snapshot(
+                ids=self._page(limit=limit, after=after), load=False)]
+
+    def read_mind_map_apps_version(self) -> int:
+        """
+        Read the version of all apps.
+
+        Returns:
+            The version of all apps
+        """
+        return self._version
+
+    def read_mind_map_app_version(self, id: str) -> Optional[int]:
+        """
+        Read the version of an app.
+
+        Args:
+            id: An app id
+
+        Returns:
+            The version of the app or None
+        """
+        return self._app_versions.get(id)
+
+    def read_mind_map_tree(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapTreeNode]:
+        """
+        Read the branch of an app under a path prefix.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapTreeNode or None if the app or prefix does not exist
+        """
+        if self._loaded(id) is None:
+            return None
+        trie = self._trees[id]
+        return trie.read(prefix=prefix, depth=depth)
+
+    def read_mind_map_stats(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapBranchStats]:
+        """
+        Read the stats of the branches of an app under a path prefix.
+
+        Stats are kept by the path trie of the app as leaves are added.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapBranchStats or None if the app or prefix does not
+            exist
+        """
+        if self._loaded(id) is None:
+            return None
+        trie = self._trees[id]
+        return trie.stats(prefix=prefix, depth=depth)
+
+    def search_mind_map_leaves(
+            self,
+            query: str,
+            id: Optional[str] = None,
+            limit: int = 10
+    ) -> List[MindMapSearchHit]:
+        """
+        Search leaves by words of their text or path.
+
+        Args:
+            query: Words to search, a leaf matches any of them
+            id: An app id, None for all apps
+            limit: Max number of hits
+
+        Returns:
+            A list of MindMapSearchHit, best first
+        """
+        key = None
+        if id is None:
+            for record in list(self._apps.values()):
+                if record.loader is not None:
+                    self._load(record)
+        else:
+            key = self._loaded(id)
+            if key is None:
+                return []
+
+        hits = []
+        # Leaves are indexed by record, a record replaced by a rebuild
+        # is skipped
+        for score, record, position in self._search.search(
+                query=query, id=key, limit=limit):
+            if self._apps.get(record.id) is not record:
+                continue
+            leaf = record.data[position]
+            hits.append(MindMapSearchHit.construct(
+                id=record.id, path=leaf["path"], text=leaf["text"],
+                score=score))
+        return hits
+
+    def count_mind_map_apps(self) -> MindMapAppsCount:
+        """
+        Count the stored apps and leaves, from the current snapshot.
+
+        Returns:
+            A MindMapAppsCount DTO.
+        """
+        snapshot = self._snapshot(load=False)
+        return MindMapAppsCount(
+            apps=len(snapshot),
+            leaves=sum(
+                record.count(version) for record, _, version in snapshot))
+
+
+class MindMapCompactDBProvider(MindMapIndexedDBProvider):
+    """
+    Mind map providers for data indexed by app id, in compact columns.
+
+    Leaves of an app are stored in MindMapLeafColumns rather than a
+    list of dict: path segments are interned in a table shared by all
+    apps and paths are arrays of segment ids. Leaves are built as dict
+    when read, which trades read time for memory.
+    """
+
+    def __init__(self, data: Optional[List[Dict[str, Any]]] = None):
+        """
+        Init DB.
+
+        Args:
+            data: A list of apps as a dict, default to the sample db.
+        """
+        self._segments = MindMapSegmentTable()
+        super().__init__(data=data)
+
+    def _store(self, leaves: Iterable[Dict[str, Any]]) -> Any:
+        """Convert the leaves of an app to columns."""
+        return MindMapLeafColumns(table=self._segments, leaves=leaves)
+
+
+class MindMapSQLiteDBProvider(MindMapAppDBInterface):
+    """
+    Mind map providers for data persisted in a SQLite database.
+
+    The database runs in WAL mode so readers never wait for a writer.
+    Leaves are stored in their own table, adding a leaf is a single
+    row insert. Connections are pooled and each connection keeps its
+    prepared statements in cache, SQL is kept in class constants so
+    that every call hits this cache.
+
+    Leaves are searched through a FTS5 index, maintained by a trigger,
+    when SQLite is built with FTS5.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS apps ("
+        "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "id TEXT NOT NULL UNIQUE, "
+        "version INTEGER NOT NULL DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS leaves ("
+        "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "app_seq INTEGER NOT NULL REFERENCES apps(seq), "
+        "path TEXT, "
+        "norm_path TEXT NOT NULL, "
+        "text TEXT)",
+        "CREATE INDEX IF NOT EXISTS leaves_app_seq "
+        "ON leaves(app_seq, seq)",
+        "CREATE INDEX IF NOT EXISTS leaves_app_path "
+        "ON leaves(app_seq, norm_path)",
+        "CREATE TABLE IF NOT EXISTS versions ("
+        "name TEXT PRIMARY KEY, "
+        "version INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO versions (name, version) VALUES ('apps', 0)",
+        # A random epoch of the versions, kept as long as the database
+        "INSERT OR IGNORE INTO versions (name, version) "
+        "VALUES ('epoch', random())",
+        "CREATE TABLE IF NOT EXISTS branches ("
+        "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "app_seq INTEGER NOT NULL REFERENCES apps(seq), "
+        "level INTEGER NOT NULL, "
+        "prefix TEXT NOT NULL, "
+        "leaves INTEGER NOT NULL, "
+        "max_depth INTEGER NOT NULL, "
+        "version INTEGER NOT NULL, "
+        "UNIQUE (app_seq, level, prefix))",
+    )
+    SELECT_APPS = (
+        "SELECT apps.id, leaves.seq, leaves.path, leaves.text FROM apps "
+        "LEFT JOIN leaves ON leaves.app_seq = apps.seq "
+        "ORDER BY apps.seq, leaves.seq")
+    SELECT_APPS_PAGE = (
+        "SELECT seq, id FROM apps WHERE seq > ? ORDER BY seq LIMIT ?")
+    SELECT_APP = "SELECT seq FROM apps WHERE id = ?"
+    SELECT_LEAVES_RANGE = (
+        "SELECT app_seq, path, text FROM leaves "
+        "WHERE app_seq BETWEEN ? AND ? ORDER BY app_seq, seq")
+    SELECT_LEAVES = (
+        "SELECT path, text FROM leaves WHERE app_seq = ? ORDER BY seq")
+    SELECT_LEAVES_PAGE = (
+        "SELECT seq, path, text FROM leaves WHERE app_seq = ? AND seq > ? "
+        "ORDER BY seq LIMIT ?")
+    SELECT_BRANCH = (
+        "SELECT path, text FROM leaves WHERE app_seq = ? "
+        "AND (norm_path = ? OR (norm_path >= ? AND norm_path < ?)) "
+        "ORDER BY seq")
+    COUNT_LEAVES = "SELECT COUNT(*) FROM leaves WHERE app_seq = ?"
+    COUNT_APPS = (
+        "SELECT (SELECT COUNT(*) FROM apps), (SELECT COUNT(*) FROM leaves)")
+    SELECT_VERSION = "SELECT version FROM versions WHERE name = 'apps'"
+    SELECT_EPOCH = "SELECT version FROM versions WHERE name = 'epoch'"
+    UPDATE_VERSION = (
+        "UPDATE versions SET version = version + 1 WHERE name = 'apps'")
+    # Databases created before app versions
+    ADD_APP_VERSION = (
+        "ALTER TABLE apps ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    SELECT_APP_VERSION = "SELECT version FROM apps WHERE id = ?"
+    UPDATE_APP_VERSION = (
+        "UPDATE apps SET version = "
+        "(SELECT version FROM versions WHERE name = 'apps') WHERE id = ?")
+    SEARCH_SCHEMA = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS leaves_search USING fts5("
+        "path, text, content='leaves', content_rowid='seq')",
+        "CREATE TRIGGER IF NOT EXISTS leaves_search_insert "
+        "AFTER INSERT ON leaves BEGIN "
+        "INSERT INTO leaves_search (rowid, path, text) "
+        "VALUES (new.seq, new.path, new.text); END",
+        "CREATE TRIGGER IF NOT EXISTS leaves_search_delete "
+        "AFTER DELETE ON leaves BEGIN "
+        "INSERT INTO leaves_search (leaves_search, rowid, path, text) "
+        "VALUES ('delete', old.seq, old.path, old.text); END",
+    )
+    SELECT_SEARCH_TABLE = (
+        "SELECT name FROM sqlite_master WHERE name = 'leaves_search'")
+    REBUILD_SEARCH = (
+        "INSERT INTO leaves_search (leaves_search) VALUES ('rebuild')")
+    SEARCH_LEAVES = (
+        "SELECT apps.id, leaves.path, leaves.text, -leaves_search.rank "
+        "FROM leaves_search "
+        "JOIN leaves ON leaves.seq = leaves_search.rowid "
+        "JOIN apps ON apps.seq = leaves.app_seq "
+        "WHERE leaves_search MATCH ? ORDER BY leaves_search.rank LIMIT ?")
+    SEARCH_APP_LEAVES = (
+        "SELECT apps.id, leaves.path, leaves.text, -leaves_search.rank "
+        "FROM leaves_search "
+        "JOIN leaves ON leaves.seq = leaves_search.rowid "
+        "JOIN apps ON apps.seq = leaves.app_seq "
+        "WHERE leaves_search MATCH ? AND apps.id = ? "
+        "ORDER BY leaves_search.rank LIMIT ?")
+    SELECT_APP_SEQ_VERSION = "SELECT seq, version FROM apps WHERE id = ?"
+    SELECT_BRANCH_STATS = (
+        "SELECT prefix, leaves, max_depth, version FROM branches "
+        "WHERE app_seq = ? AND level = ? AND prefix = ?")
+    SELECT_LEVEL_STATS = (
+        "SELECT prefix, leaves, max_depth, version FROM branches "
+        "WHERE app_seq = ? AND level = ? ORDER BY seq")
+    SELECT_BRANCH_LEVEL_STATS = (
+        "SELECT prefix, leaves, max_depth, version FROM branches "
+        "WHERE app_seq = ? AND level = ? AND prefix >= ? AND prefix < ? "
+        "ORDER BY seq")
+    # Databases created before branch stats
+    SELECT_MISSING_STATS = (
+        "SELECT EXISTS (SELECT 1 FROM leaves) "
+        "AND NOT EXISTS (SELECT 1 FROM branches)")
+    SELECT_LEAF_PATHS = (
+        "SELECT apps.seq, apps.version, leaves.path FROM leaves "
+        "JOIN apps ON apps.seq = leaves.app_seq ORDER BY leaves.seq")
+    INSERT_BRANCH = (
+        "INSERT INTO branches "
+        "(app_seq, level, prefix, leaves, max_depth, version) "
+        "VALUES (?, ?, ?, ?, ?, ?)")
+    UPSERT_BRANCH = (
+        "INSERT INTO branches "
+        "(app_seq, level, prefix, leaves, max_depth, version) "
+        "SELECT seq, ?, ?, ?, ?, version FROM apps WHERE id = ? "
+        "ON CONFLICT (app_seq, level, prefix) DO UPDATE SET "
+        "leaves = leaves + excluded.leaves, "
+        "max_depth = max(max_depth, excluded.max_depth), "
+        "version = excluded.version")
+    REMOVE_BRANCH = (
+        "UPDATE branches SET leaves = leaves - ?, "
+        "version = (SELECT version FROM apps WHERE seq = ?) "
+        "WHERE app_seq = ? AND level = ? AND prefix = ?")
+    DELETE_EMPTY_BRANCH = (
+        "DELETE FROM branches "
+        "WHERE app_seq = ? AND level = ? AND prefix = ? AND leaves = 0")
+    UPDATE_BRANCH_DEPTH = (
+        "UPDATE branches SET max_depth = ("
+        "SELECT coalesce(max(max_depth) + 1, 0) FROM branches "
+        "WHERE app_seq = ? AND level = ? AND prefix >= ? AND prefix < ?) "
+        "WHERE app_seq = ? AND level = ? AND prefix = ?")
+    UPDATE_ROOT_DEPTH = (
+        "UPDATE branches SET max_depth = ("
+        "SELECT coalesce(max(max_depth) + 1, 0) FROM branches "
+        "WHERE app_seq = ? AND level = 1) "
+        "WHERE app_seq = ? AND level = 0")
+    SELECT_PATH_LEAVES = (
+        "SELECT path FROM leaves WHERE app_seq = ? AND norm_path = ?")
+    SELECT_PATH_TEXTS = (
+        "SELECT path, text FROM leaves WHERE app_seq = ? AND norm_path = ? "
+        "ORDER BY seq")
+    DELETE_PATH_LEAVES = (
+        "DELETE FROM leaves WHERE app_seq = ? AND norm_path = ?")
+    SELECT_DUPLICATES = (
+        "SELECT seq, path FROM leaves WHERE app_seq = ? AND seq NOT IN ("
+        "SELECT max(seq) FROM leaves WHERE app_seq = ? GROUP BY norm_path)")
+    DELETE_LEAF = "DELETE FROM leaves WHERE seq = ?"
+    INSERT_APP = "INSERT INTO apps (id) VALUES (?)"
+    INSERT_LEAF = (
+        "INSERT INTO leaves (app_seq, path, norm_path, text) "
+        "SELECT seq, ?, ?, ? FROM apps WHERE id = ?")
+
+    def __init__(self, path: str, pool_size: int = 40):
+        """
+        Init DB.
+
+        Args:
+            path: The SQLite database file
+            pool_size: Max number of pooled connections
+        """
+        self.path = path
+        self.pool_size = pool_size
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = \
+            queue.LifoQueue(maxsize=pool_size)
+        self._opened = 0
+        self._lock = threading.Lock()
+
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                for statement in self.SCHEMA:
+                    conn.execute(statement)
+                columns = [row[1] for row in
+                           conn.execute("PRAGMA table_info(apps)")]
+                if "version" not in columns:
+                    conn.execute(self.ADD_APP_VERSION)
+                if conn.execute(self.SELECT_MISSING_STATS).fetchone()[0]:
+                    self._rebuild_stats(conn)
+                epoch = conn.execute(self.SELECT_EPOCH).fetchone()[0]
+            self._fts = self._create_search(conn)
+        self._epoch = f"{epoch & 0xFFFFFFFFFFFFFFFF:016x}"
+
+    def _rebuild_stats(self, conn: sqlite3.Connection):
+        """Compute the branch stats of all apps, from their leaves."""
+        paths: Dict[Tuple[int, int], List[Optional[str]]] = {}
+        for app_seq, version, path in conn.execute(self.SELECT_LEAF_PATHS):
+            paths.setdefault((app_seq, version), []).append(path)
+        conn.executemany(self.INSERT_BRANCH, [
+            (app_seq, level, prefix, leaves, max_depth, version)
+            for (app_seq, version), app_paths in paths.items()
+            for (level, prefix), (leaves, max_depth) in
+            self._branches(app_paths).items()])
+
+    def _create_search(self, conn: sqlite3.Connection) -> bool:
+        """Create the search index, False if FTS5 is not available."""
+        try:
+            with conn:
+                exists = conn.execute(self.SELECT_SEARCH_TABLE).fetchone()
+                for statement in self.SEARCH_SCHEMA:
+                    conn.execute(statement)
+                if exists is None:
+                    conn.execute(self.REBUILD_SEARCH)
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection."""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=30,
+            check_same_thread=False,
+            cached_statements=64)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextlib.contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a connection from the pool.
+
+        A new connection is opened while the pool is not full,
+        otherwise wait for a connection to be released.
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.pool_size
+                if can_open:
+                    self._opened += 1
+            conn = self._connect() if can_open else self._pool.get()
+
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @staticmethod
+    def _norm_path(path: Optional[str]) -> str:
+        """Indexed form of a path, the one split into segments."""
+        return norm_path(path)
+
+    @staticmethod
+    def _branches(
+            paths: Iterable[Optional[str]]
+    ) -> Dict[Tuple[int, str], List[int]]:
+        """
+        Count the leaves added to each branch by leaf paths.
+
+        Args:
+            paths: Leaf paths
+
+        Returns:
+            The number of leaves and max depth by level and prefix of
+            a branch, in order of first leaf
+        """
+        branches: Dict[Tuple[int, str], List[int]] = {}
+        for path in paths:
+            segments = split_path(path)
+            for level in range(len(segments) + 1):
+                key = (level, "/".join(segments[:level]))
+                branch = branches.get(key)
+                if branch is None:
+                    branch = branches[key] = [0, 0]
+                branch[0] += 1
+                branch[1] = max(branch[1], len(segments) - level)
+        return branches
+
+    def _add_stats(
+            self,
+            conn: sqlite3.Connection,
+            id: str,
+            paths: Iterable[Optional[str]]
+    ):
+        """Add leaves to the branch stats of an app, after a write."""
+        conn.executemany(self.UPSERT_BRANCH, [
+            (level, prefix, leaves, max_depth, id)
+            for (level, prefix), (leaves, max_depth) in
+            self._branches(paths).items()])
+
+    def _remove_stats(
+            self,
+            conn: sqlite3.Connection,
+            app_seq: int,
+            paths: Iterable[Optional[str]]
+    ):
+        """Remove leaves from the branch stats of an app, after a write."""
+        branches = sorted(
+            self._branches(paths).items(), key=lambda item: -item[0][0])
+        # Deepest branches first, a max depth is computed from children
+        for (level, prefix), (leaves, _) in branches:
+            conn.execute(
+                self.REMOVE_BRANCH, (leaves, app_seq, app_seq, level, prefix))
+            if conn.execute(
+                    self.DELETE_EMPTY_BRANCH,
+                    (app_seq, level, prefix)).rowcount:
+                continue
+            if level:
+                conn.execute(self.UPDATE_BRANCH_DEPTH, (
+                    app_seq,
+                    level + 1,
+                    f"{prefix}/",
+                    # "0" is the character following "/"
+                    f"{prefix}0",
+                    app_seq,
+                    level,
+                    prefix))
+            else:
+                conn.execute(self.UPDATE_ROOT_DEPTH, (app_seq, app_seq))
+
+    def dump_mind_map_apps(self) -> List[Dict[str, Any]]:
+        """
+        Read all mind map apps as JSON ready dicts.
+
+        Returns:
+            A list of apps as a dict
+        """
+        with self._connection() as conn:
+            rows = conn.execute(self.SELECT_APPS).fetchall()
+
+        apps: Dict[str, List[Dict[str, Any]]] = {}
+        for id, leaf_seq, path, text in rows:
+            data = apps.setdefault(id, [])
+            if leaf_seq is not None:
+                data.append({"path": path, "text": text})
+        return [{"id": id, "data": data} for id, data in apps.items()]
+
+    def read_mind_map_apps(self) -> List[MindMapApp]:
+        """
+        Read all mind map apps.
+
+        Returns:
+            A list of MindMapApp
+        """
+        return [
+            construct_mind_map_app(item)
+            for item in self.dump_mind_map_apps()]
+
+    def dump_mind_map_apps_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Read a page of mind map apps as JSON ready dicts.
+
+        Apps of a page are consecutive, their leaves are read with a
+        single range scan of the leaves index.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of apps as a dict, empty if `after` is not an app id
+        """
+        with self._connection() as conn:
+            after_seq = 0
+            if after is not None:
+                row = conn.execute(self.SELECT_APP, (after,)).fetchone()
+                if row is None:
+                    return []
+                after_seq = row[0]
+
+            apps = conn.execute(
+                self.SELECT_APPS_PAGE, (after_seq, limit)).fetchall()
+            if not apps:
+                return []
+            rows = conn.execute(
+                self.SELECT_LEAVES_RANGE,
+                (apps[0][0], apps[-1][0])).fetchall()
+
+        data: Dict[int, List[Dict[str, Any]]] = {seq: [] for seq, _ in apps}
+        for app_seq, path, text in rows:
+            data[app_seq].append({"path": path, "text": text})
+        return [{"id": id, "data": data[seq]} for seq, id in apps]
+
+    def dump_mind_map_leaves_page(
+            self,
+            id: str,
+            limit: int,
+            after: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Read a page of the leaves of an app as a JSON ready dict.
+
+        The cursor is the sequence number of the last leaf read, a page
+        is a range scan of the leaves index.
+
+        Args:
+            id: An app id
+            limit: Max number of leaves
+            after: The `next` cursor of the previous page, None for the
+                first
+
+        Returns:
+            The app id, the leaves of the page in "data" and the cursor
+            of the next page in "next", None after the last page, or
+            None if the app does not exist
+        """
+        with self._connection() as conn:
+            row = conn.execute(self.SELECT_APP, (id,)).fetchone()
+            if row is None:
+                return None
+            rows = conn.execute(
+                self.SELECT_LEAVES_PAGE,
+                (row[0], after or 0, limit)).fetchall()
+
+        return {
+            "id": id,
+            "data": [{"path": path, "text": text} for _, path, text in rows],
+            "next": rows[-1][0] if len(rows) == limit else None}
+
+    def read_mind_map_app_ids_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[str]:
+        """
+        Read the ids of a page of mind map apps.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of app ids, empty if `after` is not an app id
+        """
+        with self._connection() as conn:
+            after_seq = 0
+            if after is not None:
+                row = conn.execute(self.SELECT_APP, (after,)).fetchone()
+                if row is None:
+                    return []
+                after_seq = row[0]
+            apps = conn.execute(
+                self.SELECT_APPS_PAGE, (after_seq, limit)).fetchall()
+        return [id for _, id in apps]
+
+    def read_mind_map_apps_page(
+            self,
+            limit: int,
+            after: Optional[str] = None
+    ) -> List[MindMapApp]:
+        """
+        Read a page of mind map apps.
+
+        Args:
+            limit: Max number of apps
+            after: Id of the app preceding the page, None for the first
+
+        Returns:
+            A list of MindMapApp, empty if `after` is not an app id
+        """
+        return [
+            construct_mind_map_app(item)
+            for item in self.dump_mind_map_apps_page(limit=limit, after=after)]
+
+    def dump_mind_map_app(self, id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read an app by app id as a JSON ready dict.
+
+        Args:
+            id: An app id
+
+        Returns:
+            An app as a dict or None
+        """
+        with self._connection() as conn:
+            row = conn.execute(self.SELECT_APP, (id,)).fetchone()
+            if row is None:
+                return None
+            rows = conn.execute(self.SELECT_LEAVES, row).fetchall()
+
+        return {
+            "id": id,
+            "data": [{"path": path, "text": text} for path, text in rows]}
+
+    def read_mind_map_app(self, id: str) -> Optional[MindMapApp]:
+        """
+        Read an app by app id.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapApp or None
+        """
+        item = self.dump_mind_map_app(id=id)
+        return None if item is None else construct_mind_map_app(item)
+
+    def create_mind_map_app(self, mind_map_app: MindMapApp) -> MindMapApp:
+        """
+        Create a mind map app.
+
+        Args:
+            mind_map_app: A MindMapApp DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        try:
+            with self._connection() as conn, conn:
+                conn.execute(self.INSERT_APP, (mind_map_app.id,))
+                conn.executemany(self.INSERT_LEAF, [
+                    (leaf.path, self._norm_path(leaf.path), leaf.text,
+                     mind_map_app.id)
+                    for leaf in mind_map_app.data])
+                conn.execute(self.UPDATE_VERSION)
+                conn.execute(self.UPDATE_APP_VERSION, (mind_map_app.id,))
+                self._add_stats(
+                    conn,
+                    mind_map_app.id,
+                    (leaf.path for leaf in mind_map_app.data))
+
+        except sqlite3.IntegrityError:
+            raise MindMapAppCreateError(
+                f"App with id: {mind_map_app.id} "
+                f"already exists in database.")
+
+        return mind_map_app
+
+    def add_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapApp:
+        """
+        Add a leaf to a mind map app.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        with self._connection() as conn, conn:
+            cursor = conn.execute(self.INSERT_LEAF, (
+                mind_map_leaf.path,
+                self._norm_path(mind_map_leaf.path),
+                mind_map_leaf.text,
+                id))
+            if cursor.rowcount:
+                conn.execute(self.UPDATE_VERSION)
+                conn.execute(self.UPDATE_APP_VERSION, (id,))
+                self._add_stats(conn, id, [mind_map_leaf.path])
+
+        if cursor.rowcount == 0:
+            raise MindMapAppAddError(
+                f"App with id: {id} does not exist in database.")
+
+        return self.read_mind_map_app(id=id)
+
+    def add_mind_map_leaves(
+            self,
+            id: str,
+            mind_map_leaves: List[MindMapLeaf]
+    ) -> MindMapLeavesSummary:
+        """
+        Add leaves to a mind map app, all or nothing.
+
+        Leaves are inserted in a single transaction.
+
+        Args:
+            id: An app id
+            mind_map_leaves: A list of MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        with self._connection() as conn, conn:
+            row = conn.execute(self.SELECT_APP, (id,)).fetchone()
+            if row is None:
+                raise MindMapAppAddError(
+                    f"App with id: {id} does not exist in database.")
+
+            conn.executemany(self.INSERT_LEAF, [
+                (leaf.path, self._norm_path(leaf.path), leaf.text, id)
+                for leaf in mind_map_leaves])
+            conn.execute(self.UPDATE_VERSION)
+            conn.execute(self.UPDATE_APP_VERSION, (id,))
+            self._add_stats(conn, id, (leaf.path for leaf in mind_map_leaves))
+            total = conn.execute(self.COUNT_LEAVES, row).fetchone()[0]
+
+        return MindMapLeavesSummary(
+            id=id,
+            added=len(mind_map_leaves),
+            total=total)
+
+    def _app_seq(self, conn: sqlite3.Connection, id: str) -> int:
+        """The seq of an app to update."""
+        row = conn.execute(self.SELECT_APP, (id,)).fetchone()
+        if row is None:
+            raise MindMapAppUpdateError(
+                f"App with id: {id} does not exist in database.")
+        return row[0]
+
+    def upsert_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapLeavesSummary:
+        """
+        Replace the leaves of a mind map app at the path of a leaf.
+
+        The leaves at the path are deleted through the path index and
+        the leaf inserted, in a single transaction.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        key = self._norm_path(mind_map_leaf.path)
+        with self._connection() as conn, conn:
+            app_seq = self._app_seq(conn, id)
+            removed = [leaf_path for leaf_path, in conn.execute(
+                self.SELECT_PATH_LEAVES, (app_seq, key))]
+            conn.execute(self.DELETE_PATH_LEAVES, (app_seq, key))
+            conn.execute(self.INSERT_LEAF, (
+                mind_map_leaf.path, key, mind_map_leaf.text, id))
+            conn.execute(self.UPDATE_VERSION)
+            conn.execute(self.UPDATE_APP_VERSION, (id,))
+            self._remove_stats(conn, app_seq, removed)
+            self._add_stats(conn, id, [mind_map_leaf.path])
+            total = conn.execute(self.COUNT_LEAVES, (app_seq,)).fetchone()[0]
+
+        return MindMapLeavesSummary(
+            id=id,
+            added=1,
+            removed=len(removed),
+            total=total)
+
+    def delete_mind_map_leaves(
+            self,
+            id: str,
+            path: Optional[str]
+    ) -> MindMapLeavesSummary:
+        """
+        Remove the leaves of a mind map app at a path.
+
+        Args:
+            id: An app id
+            path: A leaf path
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        key = self._norm_path(path)
+        with self._connection() as conn, conn:
+            app_seq = self._app_seq(conn, id)
+            removed = [leaf_path for leaf_path, in conn.execute(
+                self.SELECT_PATH_LEAVES, (app_seq, key))]
+            if removed:
+                conn.execute(self.DELETE_PATH_LEAVES, (app_seq, key))
+                conn.execute(self.UPDATE_VERSION)
+                conn.execute(self.UPDATE_APP_VERSION, (id,))
+                self._remove_stats(conn, app_seq, removed)
+            total = conn.execute(self.COUNT_LEAVES, (app_seq,)).fetchone()[0]
+
+        return MindMapLeavesSummary(
+            id=id,
+            added=0,
+            removed=len(removed),
+            total=total)
+
+    def dedup_mind_map_app(self, id: str) -> MindMapLeavesSummary:
+        """
+        Keep only the last leaf of a mind map app at each path.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        with self._connection() as conn, conn:
+            app_seq = self._app_seq(conn, id)
+            rows = conn.execute(
+                self.SELECT_DUPLICATES, (app_seq, app_seq)).fetchall()
+            if rows:
+                conn.executemany(
+                    self.DELETE_LEAF, [(seq,) for seq, _ in rows])
+                conn.execute(self.UPDATE_VERSION)
+                conn.execute(self.UPDATE_APP_VERSION, (id,))
+                self._remove_stats(conn, app_seq, [path for _, path in rows])
+            total = conn.execute(self.COUNT_LEAVES, (app_seq,)).fetchone()[0]
+
+        return MindMapLeavesSummary(
+            id=id,
+            added=0,
+            removed=len(rows),
+            total=total)
+
+    def read_mind_map_apps_version(self) -> int:
+        """
+        Read the version of all apps.
+
+        The version is stored in the database, it is shared by all
+        processes using it.
+
+        Returns:
+            The version of all apps
+        """
+        with self._connection() as conn:
+            return conn.execute(self.SELECT_VERSION).fetchone()[0]
+
+    def read_mind_map_apps_epoch(self) -> str:
+        """
+        Read the epoch of the versions.
+
+        Versions are stored, the epoch is stored with them when the
+        database is created: it is shared by all processes using the
+        database and kept across restarts.
+
+        Returns:
+            The epoch of the versions
+        """
+        return self._epoch
+
+    def read_mind_map_app_version(self, id: str) -> Optional[int]:
+        """
+        Read the version of an app.
+
+        Args:
+            id: An app id
+
+        Returns:
+            The version of the app or None
+        """
+        with self._connection() as conn:
+            row = conn.execute(self.SELECT_APP_VERSION, (id,)).fetchone()
+        return None if row is None else row[0]
+
+    def read_mind_map_tree(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapTreeNode]:
+        """
+        Read the branch of an app under a path prefix.
+
+        Only the leaves under the prefix are read, through the path
+        index. With a depth, only the branch stats of the levels read
+        and the leaves at their paths are read.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapTreeNode or None if the app or prefix does not exist
+        """
+        norm_prefix = self._norm_path(prefix)
+        with self._connection() as conn:
+            row = conn.execute(self.SELECT_APP, (id,)).fetchone()
+            if row is None:
+                return None
+            if depth is not None:
+                return self._read_levels(
+                    conn, row[0], split_path(prefix), depth)
+            if norm_prefix:
+                rows = conn.execute(self.SELECT_BRANCH, (
+                    row[0],
+                    norm_prefix,
+                    f"{norm_prefix}/",
+                    # "0" is the character following "/"
+                    f"{norm_prefix}0")).fetchall()
+            else:
+                rows = conn.execute(self.SELECT_LEAVES, row).fetchall()
+
+        trie = MindMapPathTrie()
+        for path, text in rows:
+            trie.add(path=path, text=text)
+        return trie.read(prefix=prefix, depth=depth)
+
+    def _read_levels(
+            self,
+            conn: sqlite3.Connection,
+            app_seq: int,
+            segments: List[str],
+            depth: int
+    ) -> Optional[MindMapTreeNode]:
+        """Read the levels of a branch from its stats and leaves at them."""
+        level = len(segments)
+        prefix = "/".join(segments)
+        row = conn.execute(
+            self.SELECT_BRANCH_STATS, (app_seq, level, prefix)).fetchone()
+        if row is None and segments:
+            return None
+
+        node = MindMapTreeNode.construct(
+            name=segments[-1] if segments else "",
+            path=prefix,
+            texts=[],
+            has_children=row is not None and row[2] > 0,
+            children=[])
+        nodes = {(level, prefix): node}
+        for child_level in range(level + 1, level + depth + 1):
+            if segments:
+                rows = conn.execute(self.SELECT_BRANCH_LEVEL_STATS, (
+                    app_seq, child_level, f"{prefix}/", f"{prefix}0"))
+            else:
+                rows = conn.execute(
+                    self.SELECT_LEVEL_STATS, (app_seq, child_level))
+            for path, _, max_depth, _ in rows.fetchall():
+                parent, _, name = path.rpartition("/")
+                child = MindMapTreeNode.construct(
+                    name=name,
+                    path=path,
+                    texts=[],
+                    has_children=max_depth > 0,
+                    children=[])
+                nodes[(child_level - 1, parent)].children.append(child)
+                nodes[(child_level, path)] = child
+
+        for (node_level, path), child in nodes.items():
+            # A path of one empty segment has the norm path of the root,
+            # its number of segments tells them apart
+            child.texts.extend(
+                text for leaf_path, text in conn.execute(
+                    self.SELECT_PATH_TEXTS, (app_seq, path))
+                if len(split_path(leaf_path)) == node_level)
+        return node
+
+    def read_mind_map_stats(
+            self,
+            id: str,
+            prefix: str = "",
+            depth: Optional[int] = None
+    ) -> Optional[MindMapBranchStats]:
+        """
+        Read the stats of the branches of an app under a path prefix.
+
+        Stats are kept in a table updated with the leaves, and read one
+        level at a time through its index: only the branches returned
+        are read.
+
+        Args:
+            id: An app id
+            prefix: A path prefix, empty for the whole app
+            depth: Max number of levels below the prefix, None for all
+
+        Returns:
+            A MindMapBranchStats or None if the app or prefix does not
+            exist
+        """
+        norm_prefix = self._norm_path(prefix)
+        level = len(split_path(prefix))
+        with self._connection() as conn:
+            row = conn.execute(self.SELECT_APP_SEQ_VERSION, (id,)).fetchone()
+            if row is None:
+                return None
+            app_seq, version = row
+            branch = conn.execute(
+                self.SELECT_BRANCH_STATS,
+                (app_seq, level, norm_prefix)).fetchone()
+            if branch is None:
+                if level:
+                    return None
+                # An app without leaves
+                branch = ("", 0, 0, version)
+
+            root = self._to_stats(*branch)
+            nodes = {(level, norm_prefix): root}
+            bottom = level + root.max_depth
+            if depth is not None:
+                bottom = min(bottom, level + depth)
+            for child_level in range(level + 1, bottom + 1):
+                if level:
+                    rows = conn.execute(self.SELECT_BRANCH_LEVEL_STATS, (
+                        app_seq,
+                        child_level,
+                        f"{norm_prefix}/",
+                        # "0" is the character following "/"
+                        f"{norm_prefix}0"))
+                else:
+                    rows = conn.execute(
+                        self.SELECT_LEVEL_STATS, (app_seq, child_level))
+                for branch in rows:
+                    parent = nodes[
+                        (child_level - 1, branch[0].rpartition("/")[0])]
+                    node = nodes[(child_level, branch[0])] = \
+                        self._to_stats(*branch)
+                    parent.children.append(node)
+        return root
+
+    @staticmethod
+    def _to_stats(
+            prefix: str,
+            leaves: int,
+            max_depth: int,
+            version: int
+    ) -> MindMapBranchStats:
+        """Convert a row of branch stats to a DTO, without children."""
+        return MindMapBranchStats.construct(
+            name=prefix.rpartition("/")[2],
+            path=prefix,
+            leaves=leaves,
+            max_depth=max_depth,
+            version=version,
+            has_children=max_depth > 0,
+            children=[])
+
+    def search_mind_map_leaves(
+            self,
+            query: str,
+            id: Optional[str] = None,
+            limit: int = 10
+    ) -> List[MindMapSearchHit]:
+        """
+        Search leaves by words of their text or path.
+
+        Hits are ranked by FTS5 bm25, without FTS5 the default scans
+        all apps.
+
+        Args:
+            query: Words to search, a leaf matches any of them
+            id: An app id, None for all apps
+            limit: Max number of hits
+
+        Returns:
+            A list of MindMapSearchHit, best first
+        """
+        if not self._fts:
+            return super().search_mind_map_leaves(
+                query=query, id=id, limit=limit)
+
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = " OR ".join(f'"{token}"' for token in tokens)
+        with self._connection() as conn:
+            if id is None:
+                rows = conn.execute(self.SEARCH_LEAVES, (match, limit))
+            else:
+                rows = conn.execute(
+                    self.SEARCH_APP_LEAVES, (match, id, limit))
+            return [
+                MindMapSearchHit.construct(
+                    id=app_id, path=path, text=text, score=score)
+                for app_id, path, text, score in rows]
+
+    def count_mind_map_apps(self) -> MindMapAppsCount:
+        """
+        Count the stored apps and leaves.
+
+        Returns:
+            A MindMapAppsCount DTO.
+        """
+        with self._connection() as conn:
+            apps, leaves = conn.execute(self.COUNT_APPS).fetchone()
+        return MindMapAppsCount(apps=apps, leaves=leaves)
+
+    def close(self):
+        """Close all pooled connections."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
+
+
+class MindMapLogDBProvider(MindMapIndexedDBProvider):
+    """
+    Mind map providers for data persisted in an append-only log.
+
+    Apps are served from memory like MindMapIndexedDBProvider, every
+    write is first appended to a log. A compaction folds the
+    log into a snapshot, in a background thread once the log reaches
+    `compact_size` bytes, so a restart only loads the last snapshot
+    and replays the log written after it.
+
+    Each compaction starts a new generation: a `log-<n>` file holds
+    the records written after the `snapshot-<n>` file.
+
+    Snapshots are binary, see MindMapSnapshot: a restart only reads
+    their app index, the leaves of an app are decoded on its first
+    access. Snapshots of JSON records, written by older versions, are
+    still replayed.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            fsync_batch: int = 64,
+            fsync_interval: float = 1.0,
+            compact_size: int = 64 * 1024 * 1024,
+            snapshot_on_close: bool = False
+    ):
+        """
+        Init DB, load the last snapshot and replay the log.
+
+        Args:
+            path: The data directory
+            fsync_batch: Max number of records waiting for a sync
+            fsync_interval: Max number of seconds waiting for a sync
+            compact_size: Log size in bytes that triggers a compaction
+            snapshot_on_close: Compact a non empty log on close
+        """
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.compact_size = compact_size
+        self.snapshot_on_close = snapshot_on_close
+        self._write_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compaction: Optional[threading.Thread] = None
+        self._snapshots: List[MindMapSnapshot] = []
+        super().__init__(data=[])
+
+        os.makedirs(path, exist_ok=True)
+        snapshots = self._generations("snapshot")
+        self._generation = snapshots[-1] if snapshots else 0
+        snapshot_path = self._file("snapshot", self._generation)
+        if is_binary_snapshot(snapshot_path):
+            snapshot = MindMapSnapshot(snapshot_path)
+            self._snapshots.append(snapshot)
+            for id, size in snapshot.apps:
+                self._restore(
+                    id=id,
+                    size=size,
+                    loader=functools.partial(snapshot.leaves, id))
+        else:
+            for record, _ in iter_records(snapshot_path):
+                self._replay(record)
+
+        size = 0
+        logs = [
+            generation for generation in self._generations("log")
+            if generation >= self._generation]
+        for generation in logs:
+            size = 0
+            for record, size in iter_records(self._file("log", generation)):
+                self._replay(record)
+        self._generation = logs[-1] if logs else self._generation
+
+        self._log = self._open_log(size=size)
+
+    def _file(self, kind: str, generation: int) -> str:
+        """Path of a snapshot or log file."""
+        return os.path.join(self.path, f"{kind}-{generation:010d}")
+
+    def _generations(self, kind: str) -> List[int]:
+        """Sorted generations of the snapshot or log files."""
+        return sorted(
+            int(name[len(kind) + 1:]) for name in os.listdir(self.path)
+            if name.startswith(f"{kind}-") and name[len(kind) + 1:].isdigit())
+
+    def _open_log(self, size: int = 0) -> MindMapLog:
+        """Open the log of the current generation."""
+        return MindMapLog(
+            path=self._file("log", self._generation),
+            size=size,
+            fsync_batch=self.fsync_batch,
+            fsync_interval=self.fsync_interval)
+
+    def _replay(self, record: Dict[str, Any]):
+        """Apply a record read from a snapshot or the log."""
+        if record["op"] == "create":
+            super().create_mind_map_app(mind_map_app=MindMapApp(
+                id=record["id"], data=record["data"]))
+        elif record["op"] == "add":
+            super().add_mind_map_leaf(
+                id=record["id"],
+                mind_map_leaf=MindMapLeaf(**record["leaf"]))
+        elif record["op"] == "add_many":
+            super().add_mind_map_leaves(
+                id=record["id"],
+                mind_map_leaves=[
+                    MindMapLeaf(**leaf) for leaf in record["leaves"]])
+        elif record["op"] == "upsert":
+            super().upsert_mind_map_leaf(
+                id=record["id"],
+                mind_map_leaf=MindMapLeaf(**record["leaf"]))
+        elif record["op"] == "delete":
+            super().delete_mind_map_leaves(
+                id=record["id"],
+                path=record["path"])
+        elif record["op"] == "dedup":
+            super().dedup_mind_map_app(id=record["id"])
+
+    def create_mind_map_app(self, mind_map_app: MindMapApp) -> MindMapApp:
+        """
+        Create a mind map app.
+
+        Args:
+            mind_map_app: A MindMapApp DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        with self._write_lock:
+            if mind_map_app.id not in self._apps:
+                self._log.append({"op": "create", **mind_map_app.dict()})
+            mind_map_app = super().create_mind_map_app(
+                mind_map_app=mind_map_app)
+
+        self._compact_if_needed()
+        return mind_map_app
+
+    def add_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapApp:
+        """
+        Add a leaf to a mind map app.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        with self._write_lock:
+            if id in self._apps:
+                self._log.append({
+                    "op": "add",
+                    "id": id,
+                    "leaf": mind_map_leaf.dict()})
+            mind_map_app = super().add_mind_map_leaf(
+                id=id,
+                mind_map_leaf=mind_map_leaf)
+
+        self._compact_if_needed()
+        return mind_map_app
+
+    def add_mind_map_leaves(
+            self,
+            id: str,
+            mind_map_leaves: List[MindMapLeaf]
+    ) -> MindMapLeavesSummary:
+        """
+        Add leaves to a mind map app, all or nothing.
+
+        Leaves are appended to the log as a single record.
+
+        Args:
+            id: An app id
+            mind_map_leaves: A list of MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        with self._write_lock:
+            if id in self._apps:
+                self._log.append({
+                    "op": "add_many",
+                    "id": id,
+                    "leaves": [leaf.dict() for leaf in mind_map_leaves]})
+            summary = super().add_mind_map_leaves(
+                id=id,
+                mind_map_leaves=mind_map_leaves)
+
+        self._compact_if_needed()
+        return summary
+
+    def upsert_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapLeavesSummary:
+        """
+        Replace the leaves of a mind map app at the path of a leaf.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        with self._write_lock:
+            if id in self._apps:
+                self._log.append({
+                    "op": "upsert",
+                    "id": id,
+                    "leaf": mind_map_leaf.dict()})
+            summary = super().upsert_mind_map_leaf(
+                id=id,
+                mind_map_leaf=mind_map_leaf)
+
+        self._compact_if_needed()
+        return summary
+
+    def delete_mind_map_leaves(
+            self,
+            id: str,
+            path: Optional[str]
+    ) -> MindMapLeavesSummary:
+        """
+        Remove the leaves of a mind map app at a path.
+
+        Args:
+            id: An app id
+            path: A leaf path
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        with self._write_lock:
+            if id in self._apps:
+                self._log.append({"op": "delete", "id": id, "path": path})
+            summary = super().delete_mind_map_leaves(id=id, path=path)
+
+        self._compact_if_needed()
+        return summary
+
+    def dedup_mind_map_app(self, id: str) -> MindMapLeavesSummary:
+        """
+        Keep only the last leaf of a mind map app at each path.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        with self._write_lock:
+            if id in self._apps:
+                self._log.append({"op": "dedup", "id": id})
+            summary = super().dedup_mind_map_app(id=id)
+
+        self._compact_if_needed()
+        return summary
+
+    def _compact_if_needed(self):
+        """Start a background compaction when the log is too big."""
+        with self._write_lock:
+            if self._log.size < self.compact_size or \
+                    self._compaction is not None:
+                return
+            self._compaction = threading.Thread(
+                target=self.compact, daemon=True)
+            self._compaction.start()
+
+    def compact(self):
+        """
+        Fold the log into a new snapshot, also to call on demand.
+
+        Writes are only blocked while switching to a new log, the
+        snapshot is then written from the apps as they were at the
+        switch, read like any snapshot of the apps. Apps not accessed
+        since the last restart are copied without being indexed, apps
+        with removed leaves are then rebuilt without them. Old snapshots
+        are closed before their files are removed, apps not loaded yet
+        load from the new one.
+        """
+        with self._compact_lock:
+            with self._write_lock:
+                self._log.close()
+                self._generation += 1
+                self._log = self._open_log()
+                generation = self._generation
+                apps = self._snapshot(load=False)
+
+            write_binary_snapshot(
+                self._file("snapshot", generation),
+                ((record.id, record.dump(size, version)["data"])
+                 for record, size, version in apps))
+            snapshot = MindMapSnapshot(self._file("snapshot", generation))
+            self._snapshots.append(snapshot)
+
+            # The snapshot has no removed leaves, neither have the apps.
+            # Apps not loaded yet now load from the new snapshot, their
+            # leaves are the same.
+            for record, _, _ in apps:
+                if record.removed:
+                    with record.lock:
+                        record = self._apps[record.id]
+                        if record.removed:
+                            self._rebuild(record)
+                elif record.loader is not None:
+                    with record.lock:
+                        if record.loader is not None:
+                            record.loader = functools.partial(
+                                snapshot.leaves, record.id)
+
+            self._retire_snapshots(keep=snapshot)
+            opened = {old.path for old in self._snapshots}
+            for kind in ("snapshot", "log"):
+                for old in self._generations(kind):
+                    path = self._file(kind, old)
+                    if old < generation and path not in opened:
+                        os.remove(path)
+
+            with self._write_lock:
+                self._compaction = None
+
+    def _retire_snapshots(self, keep: MindMapSnapshot):
+        """
+        Close the snapshots older than the one to keep.
+
+        No app loads from them once compacted, but a dump may still be
+        reading one: it is then kept open, with its file, until the
+        next compaction.
+
+        Args:
+            keep: The last snapshot
+        """
+        for snapshot in list(self._snapshots):
+            if snapshot is keep:
+                continue
+            try:
+                snapshot.close()
+            except BufferError:
+                continue
+            self._snapshots.remove(snapshot)
+
+    def close(self):
+        """Wait for the compaction, snapshot if enabled and close the log."""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+        if self.snapshot_on_close and self._log.size:
+            self.compact()
+        with self._write_lock:
+            self._log.close()
+            for snapshot in self._snapshots:
+                snapshot.close()
+
+
+def forward(cls: type, method: str) -> Callable[..., Any]:
+    """
+    A provider method calling `_call` with its name and arguments.
+
+    Positional arguments are passed by name. The method has the
+    signature and the docstring of the method it replaces, and is a
+    coroutine function if that method is.
+
+    Args:
+        cls: A provider class
+        method: A method name
+
+    Returns:
+        The forwarding method
+    """
+    replaced = getattr(cls, method)
+    names = tuple(inspect.signature(replaced).parameters)[1:]
+
+    if asyncio.iscoroutinefunction(replaced):
+        async def call(self, *args: Any, **kwargs: Any) -> Any:
+            if args:
+                kwargs.update(zip(names, args))
+            return await self._call(method, **kwargs)
+    else:
+        def call(self, *args: Any, **kwargs: Any) -> Any:
+            if args:
+                kwargs.update(zip(names, args))
+            return self._call(method, **kwargs)
+
+    # Without the __dict__ of an abstract method, the call is concrete
+    functools.update_wrapper(call, replaced, updated=())
+    call.__qualname__ = f"{cls.__qualname__}.{method}"
+    return call
+
+
+def forwarding(cls: Type[T]) -> Type[T]:
+    """
+    Forward the methods of STORE_METHODS a provider class does not define.
+
+    Args:
+        cls: A provider class, with a `_call` method
+
+    Returns:
+        The class
+    """
+    for method in STORE_METHODS:
+        if method not in vars(cls):
+            setattr(cls, method, forward(cls, method))
+    # Abstract methods are listed when the class is made, before
+    cls.__abstractmethods__ = frozenset(  # type: ignore
+        name for name in cls.__abstractmethods__  # type: ignore
+        if getattr(getattr(cls, name), "__isabstractmethod__", False))
+    return cls
+
+
+@forwarding
+class MindMapDelegatingDBProvider(MindMapAppDBInterface):
+    """
+    Mind map providers forwarding the calls to a provider.
+
+    Every method of src.stores.STORE_METHODS calls `_call` with its
+    name: a subclass wraps all calls by overriding `_call`, and only
+    overrides the methods it changes.
+    """
+
+    def __init__(self, db_provider: MindMapAppDBInterface):
+        """
+        Init.
+
+        Args:
+            db_provider: The provider to forward the calls to
+        """
+        self.db_provider = db_provider
+
+    def _call(self, method: str, **kwargs: Any) -> Any:
+        """Call a method of the provider."""
+        return getattr(self.db_provider, method)(**kwargs)
+
+    def close(self):
+        """Close the provider."""
+        self.db_provider.close()
+
+
+class MindMapRemoteDBProvider(MindMapDelegatingDBProvider):
+    """
+    Mind map providers calling a provider owned by a store process.
+
+    Every API worker process uses the same store, see
+    src.stores.MindMapStoreServer, so all workers see the same apps.
+    Connections are pooled, a call holds a connection for a round trip.
+    """
+
+    def __init__(self, address: str, authkey: str, pool_size: int = 40):
+        """
+        Init, connections are opened on first use.
+
+        Args:
+            address: The store address, host:port or a socket path
+            authkey: The store shared secret
+            pool_size: Max number of pooled connections
+
+        Raises:
+            ValueError: The secret is not set
+        """
+        store_authkey(authkey)
+        self.address = address
+        self.authkey = authkey
+        self._pool: "queue.LifoQueue[Connection]" = \
+            queue.LifoQueue(maxsize=pool_size)
+        # The store epoch, read again once a new connection is opened
+        self._epoch: Optional[str] = None
+        self._connections = 0
+
+    def _pooled(self) -> Optional[Connection]:
+        """A pooled connection still open, None if there is none."""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                return None
+            try:
+                # An idle connection has nothing to read, unless closed
+                if not conn.poll():
+                    return conn
+            except OSError:
+                pass
+            conn.close()
+
+    def _receive(self, conn: Connection) -> Tuple[bool, Any]:
+        """Receive the answer of a call and pool its connection."""
+        try:
+            answer = conn.recv()
+        except BaseException:
+            # The connection state is unknown, do not reuse it
+            conn.close()
+            raise
+
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        return answer
+
+    def _call(self, method: str, **kwargs: Any) -> Any:
+        """
+        Call a method of the store provider.
+
+        A pooled connection closed by a store restart is replaced by a
+        new one. When it is only found closed while waiting for the
+        answer, a read is sent again, a write is not: it may have been
+        applied.
+        """
+        answer = None
+        conn = self._pooled()
+        if conn is not None:
+            try:
+                conn.send((method, kwargs))
+            except OSError:
+                # Closed by a store restart, the call was not sent
+                conn.close()
+            else:
+                try:
+                    answer = self._receive(conn)
+                except (EOFError, OSError):
+                    if method in STORE_WRITES:
+                        raise
+        if answer is None:
+            # The store may have restarted, with versions counted again
+            self._connections += 1
+            self._epoch = None
+            conn = connect(address=self.address, authkey=self.authkey)
+            conn.send((method, kwargs))
+            answer = self._receive(conn)
+
+        ok, result = answer
+        if not ok:
+            raise result
+        return result
+
+    def read_mind_map_apps_epoch(self) -> str:
+        """
+        Read the epoch of the store versions.
+
+        The epoch is kept until a new connection is opened, a restarted
+        store is only reached through a new connection.
+
+        Returns:
+            The epoch of the versions
+        """
+        epoch = self._epoch
+        if epoch is None:
+            connections = self._connections
+            epoch = self._call("read_mind_map_apps_epoch")
+            if connections == self._connections:
+                self._epoch = epoch
+        return epoch
+
+    def close(self):
+        """Close the pooled connections."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class MindMapCachedDBProvider(MindMapDelegatingDBProvider):
+    """
+    Mind map providers caching the reads of a provider.
+
+    Reads of an app or of all apps are kept in a LRU cache, bounded in
+    number of reads and in bytes, and concurrent misses of a read are
+    coalesced into a single call to the provider. A write to an app
+    invalidates the reads of this app and of all apps, other apps stay
+    in cache.
+
+    Writes must go through this provider, e.g. a provider shared by
+    several processes is only cached by the store process owning it.
+    Cached apps are shared by readers and must not be modified.
+    """
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface,
+            max_size: int = 1024,
+            max_bytes: int = 64 * 1024 * 1024
+    ):
+        """
+        Init.
+
+        Args:
+            db_provider: The provider to cache
+            max_size: Max number of cached reads
+            max_bytes: Max estimated size in bytes of cached reads
+        """
+        super().__init__(db_provider=db_provider)
+        self.cache = ReadThroughCache(max_size=max_size, max_bytes=max_bytes)
+
+    def _read(self, method: str, **kwargs: Any) -> Any:
+        """Call a read method of the provider, through the cache."""
+        return self.cache.get(
+            (method, kwargs.get("id")),
+            load=lambda: self._call(method, **kwargs),
+            size=estimate_size)
+
+    def _invalidate(self, id: str):
+        """Invalidate the reads changed by a write to an app."""
+        self.cache.invalidate(
+            ("read_mind_map_app", id),
+            ("dump_mind_map_app", id),
+            ("read_mind_map_apps", None),
+            ("dump_mind_map_apps", None))
+
+    def read_mind_map_apps(self) -> List[MindMapApp]:
+        """
+        Read all mind map apps.
+
+        Returns:
+            A list of MindMapApp
+        """
+        return self._read("read_mind_map_apps")
+
+    def read_mind_map_app(self, id: str) -> Optional[MindMapApp]:
+        """
+        Read an app by app id.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapApp or None
+        """
+        return self._read("read_mind_map_app", id=id)
+
+    def create_mind_map_app(self, mind_map_app: MindMapApp) -> MindMapApp:
+        """
+        Create a mind map app.
+
+        Args:
+            mind_map_app: A MindMapApp DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        try:
+            return self._call(
+                "create_mind_map_app", mind_map_app=mind_map_app)
+        finally:
+            self._invalidate(mind_map_app.id)
+
+    def add_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapApp:
+        """
+        Add a leaf to a mind map app.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        try:
+            return self._call(
+                "add_mind_map_leaf", id=id, mind_map_leaf=mind_map_leaf)
+        finally:
+            self._invalidate(id)
+
+    def add_mind_map_leaves(
+            self,
+            id: str,
+            mind_map_leaves: List[MindMapLeaf]
+    ) -> MindMapLeavesSummary:
+        """
+        Add leaves to a mind map app, all or nothing.
+
+        Args:
+            id: An app id
+            mind_map_leaves: A list of MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        try:
+            return self._call(
+                "add_mind_map_leaves",
+                id=id,
+                mind_map_leaves=mind_map_leaves)
+        finally:
+            self._invalidate(id)
+
+    def upsert_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapLeavesSummary:
+        """
+        Replace the leaves of a mind map app at the path of a leaf.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        try:
+            return self._call(
+                "upsert_mind_map_leaf", id=id, mind_map_leaf=mind_map_leaf)
+        finally:
+            self._invalidate(id)
+
+    def delete_mind_map_leaves(
+            self,
+            id: str,
+            path: Optional[str]
+    ) -> MindMapLeavesSummary:
+        """
+        Remove the leaves of a mind map app at a path.
+
+        Args:
+            id: An app id
+            path: A leaf path
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        try:
+            return self._call("delete_mind_map_leaves", id=id, path=path)
+        finally:
+            self._invalidate(id)
+
+    def dedup_mind_map_app(self, id: str) -> MindMapLeavesSummary:
+        """
+        Keep only the last leaf of a mind map app at each path.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        try:
+            return self._call("dedup_mind_map_app", id=id)
+        finally:
+            self._invalidate(id)
+
+    def dump_mind_map_apps(self) -> List[Dict[str, Any]]:
+        """
+        Read all mind map apps as JSON ready dicts.
+
+        Returns:
+            A list of apps as a dict
+        """
+        return self._read("dump_mind_map_apps")
+
+    def dump_mind_map_app(self, id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read an app by app id as a JSON ready dict.
+
+        Args:
+            id: An app id
+
+        Returns:
+            An app as a dict or None
+        """
+        return self._read("dump_mind_map_app", id=id)
+
+
+class MindMapTimedDBProvider(MindMapDelegatingDBProvider):
+    """
+    Mind map providers timing the calls to a provider.
+
+    The duration of every call is observed in a histogram by method
+    name, failed calls are also counted by method name.
+    """
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface,
+            histogram: MindMapHistogram,
+            errors: MindMapCounter
+    ):
+        """
+        Init.
+
+        Args:
+            db_provider: The provider to time
+            histogram: The call durations, by method
+            errors: The failed calls, by method
+        """
+        super().__init__(db_provider=db_provider)
+        self.histogram = histogram
+        self.errors = errors
+
+    def _call(self, method: str, **kwargs: Any) -> Any:
+        """Call and time a method of the provider."""
+        start = time.perf_counter()
+        try:
+            return getattr(self.db_provider, method)(**kwargs)
+        except Exception:
+            self.errors.inc(method)
+            raise
+        finally:
+            self.histogram.observe(time.perf_counter() - start, method)
+
+
+class MindMapChangesDBProvider(MindMapDelegatingDBProvider):
+    """
+    Mind map providers publishing the writes to a provider.
+
+    Every write of leaves is published to a change feed, see
+    src.changes.MindMapChangeFeed, once written. Writes to an app and
+    their publishing hold a lock of the app, so changes are numbered in
+    the order of the writes and a resync reads an app consistent with
+    its sequence number.
+
+    Writes must go through this provider, like for the cache.
+    """
+
+    # Number of write locks, apps share them to bound their number
+    LOCKS = 64
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface,
+            feed: MindMapChangeFeed
+    ):
+        """
+        Init.
+
+        Args:
+            db_provider: The provider to publish the writes of
+            feed: The change feed
+        """
+        super().__init__(db_provider=db_provider)
+        self.feed = feed
+        self._locks = [threading.Lock() for _ in range(self.LOCKS)]
+
+    def _lock(self, id: str) -> threading.Lock:
+        """The write lock of an app, shared with other apps."""
+        return self._locks[hash(id) % self.LOCKS]
+
+    def create_mind_map_app(self, mind_map_app: MindMapApp) -> MindMapApp:
+        """
+        Create a mind map app, then publish it.
+
+        Args:
+            mind_map_app: A MindMapApp DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        with self._lock(mind_map_app.id):
+            mind_map_app = self._call(
+                "create_mind_map_app", mind_map_app=mind_map_app)
+            self.feed.publish(
+                mind_map_app.id, CHANGE_CREATED, list(mind_map_app.data))
+        return mind_map_app
+
+    def add_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapApp:
+        """
+        Add a leaf to a mind map app, then publish it.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapApp DTO.
+        """
+        with self._lock(id):
+            mind_map_app = self._call(
+                "add_mind_map_leaf", id=id, mind_map_leaf=mind_map_leaf)
+            self.feed.publish(id, CHANGE_ADDED, [mind_map_leaf])
+        return mind_map_app
+
+    def add_mind_map_leaves(
+            self,
+            id: str,
+            mind_map_leaves: List[MindMapLeaf]
+    ) -> MindMapLeavesSummary:
+        """
+        Add leaves to a mind map app, all or nothing, then publish them.
+
+        Args:
+            id: An app id
+            mind_map_leaves: A list of MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        with self._lock(id):
+            summary = self._call(
+                "add_mind_map_leaves",
+                id=id,
+                mind_map_leaves=mind_map_leaves)
+            self.feed.publish(id, CHANGE_ADDED, list(mind_map_leaves))
+        return summary
+
+    def upsert_mind_map_leaf(
+            self,
+            id: str,
+            mind_map_leaf: MindMapLeaf
+    ) -> MindMapLeavesSummary:
+        """
+        Upsert a leaf in a mind map app, then publish it.
+
+        Args:
+            id: An app id
+            mind_map_leaf: A MindMapLeaf DTO.
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        with self._lock(id):
+            summary = self._call(
+                "upsert_mind_map_leaf", id=id, mind_map_leaf=mind_map_leaf)
+            self.feed.publish(id, CHANGE_UPSERTED, [mind_map_leaf])
+        return summary
+
+    def delete_mind_map_leaves(
+            self,
+            id: str,
+            path: Optional[str]
+    ) -> MindMapLeavesSummary:
+        """
+        Remove the leaves of a mind map app at a path, then publish it.
+
+        Args:
+            id: An app id
+            path: A leaf path
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        with self._lock(id):
+            summary = self._call("delete_mind_map_leaves", id=id, path=path)
+            if summary.removed:
+                self.feed.publish(
+                    id, CHANGE_DELETED, [MindMapLeaf.construct(path=path)])
+        return summary
+
+    def dedup_mind_map_app(self, id: str) -> MindMapLeavesSummary:
+        """
+        Deduplicate the leaves of a mind map app, then publish it.
+
+        Args:
+            id: An app id
+
+        Returns:
+            A MindMapLeavesSummary DTO.
+        """
+        with self._lock(id):
+            summary = self._call("dedup_mind_map_app", id=id)
+            if summary.removed:
+                self.feed.publish(id, CHANGE_DEDUPED, [])
+        return summary
+
+    def read_mind_map_changes(
+            self,
+            id: str,
+            since: Optional[int] = None,
+            limit: int = 1000
+    ) -> Optional[MindMapChanges]:
+        """
+        Read the changes of an app since a sequence number.
+
+        The changes are read from the feed. Without `since`, or when
+        the changes after it are no longer kept, the app is read
+        instead, with the sequence number of its last change.
+
+        Args:
+            id: An app id
+            since: The sequence number of the last change read, None for
+                a resync
+            limit: Max number of changes
+
+        Returns:
+            A MindMapChanges DTO or None if the app does not exist
+        """
+        if since is not None:
+            changes = self.feed.since(id, since, limit=limit)
+            if changes:
+                return MindMapChanges.construct(
+                    id=id,
+                    seq=changes[-1][0].seq,
+                    resync=False,
+                    data=[],
+                    changes=[change for change, _ in changes])
+            if changes is not None:
+                if since == 0 and self._call(
+                        "read_mind_map_app_version", id=id) is None:
+                    return None
+                return MindMapChanges.construct(
+                    id=id, seq=since, resync=False, data=[], changes=[])
+
+        with self._lock(id):
+            item = self._call("dump_mind_map_app", id=id)
+            seq = self.feed.seq(id)
+        if item is None:
+            return None
+        return MindMapChanges.construct(
+            id=id,
+            seq=seq,
+            resync=True,
+            data=construct_mind_map_app(item).data,
+            changes=[])
+
+
+@forwarding
+class MindMapAsyncDBProvider(MindMapAppAsyncDBInterface):
+    """
+    Async providers running a provider in a thread pool.
+
+    Calls to the provider are offloaded to a bounded pool of threads,
+    so a slow provider never blocks the event loop. Calls beyond
+    `max_workers` wait for a free thread. Methods are forwarded through
+    `_call`, see forwarding.
+    """
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface,
+            max_workers: int = 40
+    ):
+        """
+        Init.
+
+        Args:
+            db_provider: The provider to run
+            max_workers: Max number of concurrent provider calls
+        """
+        self.db_provider = db_provider
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="mind-map-db")
+
+    async def _run(self, func: Callable[..., T], **kwargs: Any) -> T:
+        """Run a provider method in the thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, **kwargs))
+
+    async def _call(self, method: str, **kwargs: Any) -> Any:
+        """Call a method of the provider in the thread pool."""
+        return await self._run(getattr(self.db_provider, method), **kwargs)
+
+    async def iter_mind_map_apps(
+            self,
+            after: Optional[str] = None,
+            page_size: int = 100
+    ) -> AsyncIterator[MindMapApp]:
+        """
+        Iterate over mind map apps, page by page.
+
+        Each page is read in the thread pool, only one page is held in
+        memory at a time.
+
+        Args:
+            after: Id of the app preceding the first app, None for all
+            page_size: Number of apps read at a time
+
+        Returns:
+            An async iterator of MindMapApp
+        """
+        while True:
+            page = await self.read_mind_map_apps_page(
+                limit=page_size, after=after)
+            for mind_map_app in page:
+                yield mind_map_app
+            if len(page) < page_size:
+                return
+            after = page[-1].id
+
+    def close(self):
+        """Wait for running calls and stop the threads."""
+        self._executor.shutdown(wait=True)
+
+
+class MindMapProfiledAsyncDBProvider(MindMapAsyncDBProvider):
+    """
+    Async providers profiling the calls of profiled requests.
+
+    A call made while serving a profiled request, see
+    src.profiles.MindMapProfilingMiddleware, is profiled in its worker
+    thread and added to the request profile.
+    """
+
+    async def _run(self, func: Callable[..., T], **kwargs: Any) -> T:
+        """Run a provider method in the thread pool, profiled if asked."""
+        profile = CURRENT_PROFILE.get()
+        if profile is not None:
+            func = functools.partial(profile.run, func)
+        return await super()._run(func, **kwargs)
+
+
+def get_db_provider(settings: Settings) -> MindMapAppDBInterface:
+    """
+    Create the provider selected by settings, cached if enabled.
+
+    The remote provider is never cached here, other workers write to
+    the store, the store process caches its own provider instead.
+
+    Args:
+        settings: The API settings
+
+    Returns:
+        A provider
+    """
+    db_provider = make_db_provider(settings=settings)
+    if settings.db_cache_size and settings.db_provider != "remote":
+        db_provider = MindMapCachedDBProvider(
+            db_provider=db_provider,
+            max_size=settings.db_cache_size,
+            max_bytes=settings.db_cache_bytes)
+    return db_provider
+
+
+def make_db_provider(settings: Settings) -> MindMapAppDBInterface:
+    """
+    Create the provider selected by settings.
+
+    Args:
+        settings: The API settings
+
+    Returns:
+        A provider
+    """
+    if settings.db_provider == "memory":
+        return MindMapIndexedDBProvider()
+
+    if settings.db_provider == "compact":
+        return MindMapCompactDBProvider()
+
+    if settings.db_provider == "sqlite":
+        return MindMapSQLiteDBProvider(
+            path=settings.db_path,
+            pool_size=settings.db_pool_size)
+
+    if settings.db_provider == "log":
+        return MindMapLogDBProvider(
+            path=settings.db_log_path,
+            fsync_batch=settings.db_fsync_batch,
+            compact_size=settings.db_compact_size,
+            snapshot_on_close=settings.db_snapshot_on_close)
+
+    if settings.db_provider == "remote":
+        return MindMapRemoteDBProvider(
+            address=settings.db_address,
+            authkey=settings.db_authkey,
+            pool_size=settings.db_pool_size)
+
+    raise ValueError(f"Unknown provider: {settings.db_provider}")
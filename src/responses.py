@@ -0,0 +1,63 @@
+"""Mind map leaf responses."""
+import json
+from typing import Any, AsyncIterator, List
+
+import jinja2
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Min size in bytes of a chunk of a streamed page
+RENDER_CHUNK_SIZE = 64 * 1024
+
+
+class MindMapJSONResponse(JSONResponse):
+    """
+    A JSON response serialized as is, without validation.
+
+    Content must be JSON ready, like apps dumped by a provider. It is
+    serialized by orjson when installed.
+    """
+
+    def render(self, content: Any) -> bytes:
+        """Serialize content."""
+        if orjson is not None:
+            return orjson.dumps(content)
+
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+
+async def render_chunks(
+        template: jinja2.Template,
+        chunk_size: int = RENDER_CHUNK_SIZE,
+        **context: Any
+) -> AsyncIterator[bytes]:
+    """
+    Render an async template by chunks.
+
+    Args:
+        template: A template of an environment with enable_async
+        chunk_size: Min number of characters of a chunk, but the last
+        context: Variables of the template
+
+    Returns:
+        An async iterator of encoded chunks
+    """
+    buffer: List[str] = []
+    size = 0
+    async for text in template.generate_async(**context):
+        buffer.append(text)
+        size += len(text)
+        if size >= chunk_size:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    yield "".join(buffer).encode()
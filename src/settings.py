@@ -0,0 +1,63 @@
+"""Mind map leaf settings."""
+from typing import List
+
+from pydantic import BaseSettings
+
+
+class Settings(BaseSettings):
+    """
+    Mind map API settings.
+
+    Values are read from environment variables prefixed by MIND_MAP_,
+    e.g. MIND_MAP_DB_PROVIDER=sqlite.
+    """
+
+    # Provider used by the API: memory, compact, sqlite, log or remote
+    db_provider: str = "memory"
+    # SQLite database file
+    db_path: str = "mind_map.db"
+    # Number of pooled connections, sized for the FastAPI threadpool
+    db_pool_size: int = 40
+    # Max number of provider reads kept in cache, 0 to disable the cache
+    db_cache_size: int = 0
+    # Max estimated size in bytes of the provider reads kept in cache
+    db_cache_bytes: int = 64 * 1024 * 1024
+    # Max number of concurrent provider calls from the API
+    db_workers: int = 40
+    # Max number of rendered pages kept in cache
+    render_cache_size: int = 8
+    # Max size in bytes of a rendered page kept in cache
+    render_cache_page_size: int = 1024 * 1024
+    # Log provider data directory
+    db_log_path: str = "mind_map_data"
+    # Max number of log records waiting for a sync to disk
+    db_fsync_batch: int = 64
+    # Log size in bytes that triggers a compaction
+    db_compact_size: int = 64 * 1024 * 1024
+    # Fold the log into a snapshot on shutdown, for a fast restart
+    db_snapshot_on_close: bool = True
+    # Max number of leaves written at a time by an import
+    import_chunk_size: int = 1000
+    # Store address for the remote provider, host:port or a socket path
+    db_address: str = "127.0.0.1:8765"
+    # Store shared secret, required by the store and the remote provider
+    db_authkey: str = ""
+    # Provider owned by the store process: memory, compact, sqlite or log
+    store_provider: str = "memory"
+    # Profile the requests asking for it, see src.profiles
+    profiling: bool = False
+    # Client hosts allowed to ask for a profile and to read profiles
+    profile_hosts: List[str] = ["127.0.0.1", "::1"]
+    # Max number of profiles kept
+    profile_history: int = 20
+    # Max number of changes kept by app, for clients reading changes
+    changes_retain: int = 1000
+    # Seconds between keepalive comments of an idle change stream
+    changes_keepalive: float = 15.0
+    # Seconds between reads of the changes of a store, remote provider
+    changes_poll: float = 1.0
+
+    class Config:
+        """Settings config."""
+
+        env_prefix = "MIND_MAP_"
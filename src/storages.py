@@ -0,0 +1,478 @@
+"""Mind map leaf storages."""
+import contextlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, \
+    Optional, Tuple
+
+# A record is framed by its payload length and its payload crc32
+RECORD_HEADER = struct.Struct("<II")
+
+# A binary snapshot starts with a magic and its format version, and ends
+# with the offsets of its segment table and app index, then the magic
+SNAPSHOT_MAGIC = b"MINDMAP\x00"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sI")
+SNAPSHOT_TRAILER = struct.Struct("<QQ8s")
+# Number of items of a section
+COUNTS = struct.Struct("<II")
+
+
+def encode_record(record: Dict[str, Any]) -> bytes:
+    """
+    Frame a record.
+
+    Args:
+        record: A JSON serializable record
+
+    Returns:
+        The framed record
+    """
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_records(buffer: bytes) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    Decode framed records.
+
+    Decoding stops at the first incomplete or corrupted record, which
+    is what a crash in the middle of a write leaves behind.
+
+    Args:
+        buffer: A buffer of framed records, like a memory map
+
+    Returns:
+        An iterator of records and the offset following each record
+    """
+    view = memoryview(buffer)
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(view):
+        length, checksum = RECORD_HEADER.unpack_from(view, offset)
+        start = offset + RECORD_HEADER.size
+        end = start + length
+        if end > len(view):
+            return
+        payload = view[start:end]
+        if zlib.crc32(payload) != checksum:
+            return
+        yield json.loads(bytes(payload)), end
+        offset = end
+
+
+def iter_records(path: str) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    Read the valid records of a file through a memory map.
+
+    Args:
+        path: A file of framed records
+
+    Returns:
+        An iterator of records and the offset following each record
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from decode_records(buffer)
+
+
+def fsync_dir(path: str):
+    """Persist the entries of a directory, like a renamed file."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def atomic_file(path: str) -> Iterator[BinaryIO]:
+    """
+    Write a file atomically.
+
+    The file is written in a temporary file, synced and renamed, so it
+    is either complete or missing.
+
+    Args:
+        path: The file to write
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        yield file
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+def write_snapshot(path: str, records: Iterable[Dict[str, Any]]):
+    """
+    Write a snapshot file of JSON records atomically.
+
+    Args:
+        path: The snapshot file
+        records: The records to write
+    """
+    with atomic_file(path) as file:
+        for record in records:
+            file.write(encode_record(record))
+
+
+def frame(payload: bytes) -> bytes:
+    """Frame a binary payload, like a record."""
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def to_bytes(values: "array[int]") -> bytes:
+    """Bytes of an array, little-endian whatever the platform."""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_bytes(typecode: str, buffer: memoryview) -> "array[int]":
+    """Array of little-endian bytes, see to_bytes."""
+    values = array(typecode)
+    values.frombytes(buffer)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def encode_leaves(
+        leaves: Iterable[Dict[str, Any]],
+        segments: Dict[str, int]
+) -> bytes:
+    """
+    Encode the leaves of an app in columns.
+
+    The payload holds the number of leaves and of path segments, the
+    number of segments of each path, -1 for None, the segment ids of
+    all paths, the length of each text, -1 for None, then all texts.
+
+    Args:
+        leaves: Leaves as a dict
+        segments: Ids of the path segments, new segments are added
+
+    Returns:
+        The payload
+    """
+    path_lengths = array("i")
+    ids = array("I")
+    text_lengths = array("i")
+    texts = []
+    for leaf in leaves:
+        path = leaf["path"]
+        if path is None:
+            path_lengths.append(-1)
+        else:
+            parts = path.split("/")
+            path_lengths.append(len(parts))
+            for part in parts:
+                id = segments.get(part)
+                if id is None:
+                    id = segments[part] = len(segments)
+                ids.append(id)
+        text = leaf["text"]
+        if text is None:
+            text_lengths.append(-1)
+        else:
+            text_lengths.append(len(text))
+            texts.append(text)
+    return b"".join((
+        COUNTS.pack(len(path_lengths), len(ids)),
+        to_bytes(path_lengths),
+        to_bytes(ids),
+        to_bytes(text_lengths),
+        "".join(texts).encode("utf-8", "surrogatepass")))
+
+
+def decode_leaves(
+        payload: memoryview,
+        segments: List[str]
+) -> List[Dict[str, Any]]:
+    """
+    Decode the leaves of an app, see encode_leaves.
+
+    Args:
+        payload: The payload
+        segments: The path segments by id
+
+    Returns:
+        A list of leaves as a dict
+    """
+    count, total = COUNTS.unpack_from(payload)
+    start = COUNTS.size
+    path_lengths = from_bytes("i", payload[start:start + 4 * count])
+    start += 4 * count
+    ids = from_bytes("I", payload[start:start + 4 * total])
+    start += 4 * total
+    text_lengths = from_bytes("i", payload[start:start + 4 * count])
+    texts = bytes(payload[start + 4 * count:]).decode(
+        "utf-8", "surrogatepass")
+
+    leaves = []
+    id_start = text_start = 0
+    for path_length, text_length in zip(path_lengths, text_lengths):
+        path = None
+        if path_length >= 0:
+            path = "/".join([
+                segments[id]
+                for id in ids[id_start:id_start + path_length]])
+            id_start += path_length
+        text = None
+        if text_length >= 0:
+            text = texts[text_start:text_start + text_length]
+            text_start += text_length
+        leaves.append({"path": path, "text": text})
+    return leaves
+
+
+def encode_strings(values: List[str]) -> bytes:
+    """Encode strings: their number, their lengths then all strings."""
+    return b"".join((
+        COUNTS.pack(len(values), 0),
+        to_bytes(array("I", [len(value) for value in values])),
+        "".join(values).encode("utf-8", "surrogatepass")))
+
+
+def decode_strings(payload: memoryview) -> List[str]:
+    """Decode strings, see encode_strings."""
+    count, _ = COUNTS.unpack_from(payload)
+    end = COUNTS.size + 4 * count
+    lengths = from_bytes("I", payload[COUNTS.size:end])
+    text = bytes(payload[end:]).decode("utf-8", "surrogatepass")
+    values = []
+    start = 0
+    for length in lengths:
+        values.append(text[start:start + length])
+        start += length
+    return values
+
+
+def write_binary_snapshot(
+        path: str,
+        apps: Iterable[Tuple[str, Iterable[Dict[str, Any]]]]
+):
+    """
+    Write a binary snapshot file atomically.
+
+    The file has a header, the leaves of each app as a framed payload,
+    the table of all path segments, the index of the apps with the
+    offset and number of leaves of each, and a trailer with the offsets
+    of the table and of the index, see MindMapSnapshot.
+
+    Args:
+        path: The snapshot file
+        apps: App ids and their leaves as a dict
+    """
+    segments: Dict[str, int] = {}
+    ids = []
+    offsets = array("Q")
+    counts = array("I")
+    with atomic_file(path) as file:
+        offset = file.write(SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+        for id, leaves in apps:
+            payload = encode_leaves(leaves, segments)
+            ids.append(id)
+            offsets.append(offset)
+            counts.append(COUNTS.unpack_from(payload)[0])
+            offset += file.write(frame(payload))
+
+        table_offset = offset
+        offset += file.write(frame(encode_strings(list(segments))))
+        index_offset = offset
+        file.write(frame(b"".join((
+            COUNTS.pack(len(ids), 0),
+            to_bytes(offsets),
+            to_bytes(counts),
+            encode_strings(ids)))))
+        file.write(SNAPSHOT_TRAILER.pack(
+            table_offset, index_offset, SNAPSHOT_MAGIC))
+
+
+def is_binary_snapshot(path: str) -> bool:
+    """
+    Check if a snapshot file is binary rather than JSON records.
+
+    Args:
+        path: A snapshot file
+
+    Returns:
+        True for a binary snapshot
+    """
+    if not os.path.exists(path):
+        return False
+    with open(path, "rb") as file:
+        return file.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+
+class MindMapSnapshot:
+    """
+    A binary snapshot, read through a memory map.
+
+    Opening a snapshot only reads its segment table and app index, the
+    leaves of an app are decoded when they are read: the time to open a
+    snapshot depends on its number of apps and segments, not of leaves.
+    Each payload is checked against its crc32 when read.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open a snapshot.
+
+        Args:
+            path: The snapshot file
+
+        Raises:
+            ValueError: Not a snapshot of a known version, or corrupted
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self._buffer = mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._buffer)
+
+        try:
+            if len(self._view) < SNAPSHOT_HEADER.size + \
+                    SNAPSHOT_TRAILER.size:
+                raise ValueError(f"Truncated snapshot: {path}")
+            magic, version = SNAPSHOT_HEADER.unpack_from(self._view)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError(
+                    f"Unknown snapshot format: {path} version {version}")
+            table_offset, index_offset, magic = SNAPSHOT_TRAILER.unpack_from(
+                self._view, len(self._view) - SNAPSHOT_TRAILER.size)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Truncated snapshot: {path}")
+
+            self.segments = decode_strings(self._payload(table_offset))
+            index = self._payload(index_offset)
+            count, _ = COUNTS.unpack_from(index)
+            start = COUNTS.size
+            offsets = from_bytes("Q", index[start:start + 8 * count])
+            start += 8 * count
+            counts = from_bytes("I", index[start:start + 4 * count])
+            ids = decode_strings(index[start + 4 * count:])
+        except BaseException:
+            self.close()
+            raise
+
+        self.apps: List[Tuple[str, int]] = list(zip(ids, counts))
+        self._offsets: Dict[str, int] = dict(zip(ids, offsets))
+
+    def _payload(self, offset: int) -> memoryview:
+        """Read and check the framed payload at an offset."""
+        length, checksum = RECORD_HEADER.unpack_from(self._view, offset)
+        start = offset + RECORD_HEADER.size
+        payload = self._view[start:start + length]
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            raise ValueError(f"Corrupted snapshot: {self.path} at {offset}")
+        return payload
+
+    def leaves(self, id: str) -> List[Dict[str, Any]]:
+        """
+        Decode the leaves of an app.
+
+        Args:
+            id: An app id of the snapshot
+
+        Returns:
+            A list of leaves as a dict
+        """
+        return decode_leaves(self._payload(self._offsets[id]), self.segments)
+
+    def close(self):
+        """Release the memory map, the leaves can no longer be read."""
+        self._view.release()
+        self._buffer.close()
+
+
+class MindMapLog:
+    """
+    An append-only log of framed records.
+
+    Each record is handed to the OS on append, so it survives a crash
+    of the process. It is synced to disk once `fsync_batch` records
+    are pending, or on the first append `fsync_interval` seconds after
+    the last sync.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            size: Optional[int] = None,
+            fsync_batch: int = 64,
+            fsync_interval: float = 1.0
+    ):
+        """
+        Open a log for append.
+
+        Anything after the last valid record, like a record cut by a
+        crash, is discarded.
+
+        Args:
+            path: The log file
+            size: Offset following the last valid record, if known
+            fsync_batch: Max number of records waiting for a sync
+            fsync_interval: Max number of seconds waiting for a sync
+        """
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+
+        if size is None:
+            size = 0
+            for _, size in iter_records(path):
+                pass
+        self.size = size
+
+        if not os.path.exists(path):
+            open(path, "wb").close()
+            fsync_dir(os.path.dirname(os.path.abspath(path)))
+        self._file: BinaryIO = open(path, "r+b")
+        self._file.truncate(self.size)
+        self._file.seek(self.size)
+        self._pending = 0
+        self._synced_at = time.monotonic()
+
+    def append(self, record: Dict[str, Any]):
+        """
+        Append a record.
+
+        Args:
+            record: A JSON serializable record
+        """
+        frame = encode_record(record)
+        self._file.write(frame)
+        self._file.flush()
+        self.size += len(frame)
+        self._pending += 1
+
+        if self._pending >= self.fsync_batch or \
+                time.monotonic() - self._synced_at >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """Sync pending records to disk."""
+        if self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        """Sync and close the log."""
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
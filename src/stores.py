@@ -0,0 +1,211 @@
+"""Mind map leaf stores."""
+import signal
+import sys
+import threading
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, Tuple, Union
+
+from src.interfaces import MindMapAppDBInterface
+from src.settings import Settings
+
+# Provider methods callable by store clients, and forwarded by the
+# providers wrapping a provider
+STORE_METHODS = frozenset((
+    "read_mind_map_apps",
+    "read_mind_map_app",
+    "create_mind_map_app",
+    "add_mind_map_leaf",
+    "add_mind_map_leaves",
+    "upsert_mind_map_leaf",
+    "delete_mind_map_leaves",
+    "dedup_mind_map_app",
+    "read_mind_map_apps_version",
+    "read_mind_map_app_version",
+    "read_mind_map_apps_epoch",
+    "read_mind_map_apps_page",
+    "read_mind_map_app_ids_page",
+    "dump_mind_map_apps",
+    "dump_mind_map_app",
+    "dump_mind_map_apps_page",
+    "dump_mind_map_leaves_page",
+    "read_mind_map_tree",
+    "read_mind_map_stats",
+    "search_mind_map_leaves",
+    "count_mind_map_apps",
+    "read_mind_map_changes",
+))
+
+# Store methods writing apps, not sent again when their answer is lost
+STORE_WRITES = frozenset((
+    "create_mind_map_app",
+    "add_mind_map_leaf",
+    "add_mind_map_leaves",
+    "upsert_mind_map_leaf",
+    "delete_mind_map_leaves",
+    "dedup_mind_map_app",
+))
+
+Address = Union[str, Tuple[str, int]]
+
+
+def parse_address(address: str) -> Address:
+    """
+    Parse a store address.
+
+    Args:
+        address: "host:port" for TCP, a file path for a Unix socket
+
+    Returns:
+        A multiprocessing.connection address
+    """
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def store_authkey(authkey: str) -> bytes:
+    """
+    Check a store shared secret.
+
+    Store messages are pickles, anyone knowing the secret can run code
+    in the store: there is no default secret.
+
+    Args:
+        authkey: The store shared secret, MIND_MAP_DB_AUTHKEY
+
+    Returns:
+        The secret as bytes
+
+    Raises:
+        ValueError: The secret is not set
+    """
+    if not authkey:
+        raise ValueError(
+            "The store shared secret is not set, set MIND_MAP_DB_AUTHKEY "
+            "to a random value shared by the store and the API workers")
+    return authkey.encode()
+
+
+def connect(address: str, authkey: str) -> Connection:
+    """
+    Connect to a store.
+
+    Args:
+        address: The store address
+        authkey: The store shared secret
+
+    Returns:
+        A connection to the store
+    """
+    return Client(parse_address(address), authkey=store_authkey(authkey))
+
+
+class MindMapStoreServer:
+    """
+    A store process owning a provider.
+
+    API workers call the provider through the store, so they all see
+    the same apps. Each connection is served by its own thread, calls
+    run concurrently like in a single API process.
+
+    A call is a (method, kwargs) message, answered by a (True, result)
+    or (False, exception) message. Messages are pickles, only clients
+    authenticated by the shared secret are served.
+    """
+
+    def __init__(
+            self,
+            db_provider: MindMapAppDBInterface,
+            address: str,
+            authkey: str
+    ):
+        """
+        Init and listen.
+
+        Args:
+            db_provider: The provider owned by the store
+            address: The store address
+            authkey: The store shared secret
+
+        Raises:
+            ValueError: The secret is not set
+        """
+        self._listener = Listener(
+            parse_address(address), authkey=store_authkey(authkey))
+        self.db_provider = db_provider
+        self.address = self._listener.address
+        self._closed = threading.Event()
+
+    def serve_forever(self):
+        """Accept and serve connections until closed."""
+        while not self._closed.is_set():
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                if self._closed.is_set():
+                    return
+                continue
+            threading.Thread(
+                target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: Connection):
+        """Serve the calls of a connection."""
+        with conn:
+            while True:
+                try:
+                    method, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(self._call(method, kwargs))
+                except Exception as exc:
+                    # A result or an exception that can not be pickled
+                    conn.send((False, RuntimeError(repr(exc))))
+
+    def _call(self, method: str, kwargs: Dict[str, Any]) -> Tuple[bool, Any]:
+        """Call a provider method."""
+        if method not in STORE_METHODS:
+            return False, AttributeError(f"Unknown store method: {method}")
+        try:
+            return True, getattr(self.db_provider, method)(**kwargs)
+        except Exception as exc:
+            return False, exc
+
+    def close(self):
+        """Stop accepting connections."""
+        self._closed.set()
+        self._listener.close()
+
+
+def main():
+    """Run a store process with the provider selected by settings."""
+    from src.changes import MindMapChangeFeed
+    from src.providers import get_db_provider, MindMapChangesDBProvider
+
+    settings = Settings()
+    try:
+        store_authkey(settings.db_authkey)
+    except ValueError as exc:
+        sys.exit(str(exc))
+    db_provider = MindMapChangesDBProvider(
+        db_provider=get_db_provider(settings=Settings(
+            **{**settings.dict(), "db_provider": settings.store_provider})),
+        feed=MindMapChangeFeed(retain=settings.changes_retain))
+    server = MindMapStoreServer(
+        db_provider=db_provider,
+        address=settings.db_address,
+        authkey=settings.db_authkey)
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    print(f"Mind map store listening on {settings.db_address}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        db_provider.close()
+
+
+if __name__ == "__main__":
+    main()
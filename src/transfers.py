@@ -0,0 +1,219 @@
+"""Mind map leaf transfers."""
+import json
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+from pydantic import ValidationError
+
+from src.models import MindMapApp, MindMapLeaf, MindMapImportError
+
+# An import operation: ("create", app) or ("add", app id, leaves)
+Operation = Union[
+    Tuple[str, MindMapApp],
+    Tuple[str, str, List[MindMapLeaf]]]
+
+
+def export_records(mind_map_app: MindMapApp) -> Iterator[Dict[str, Any]]:
+    """
+    Split an app into transfer records.
+
+    An app record is followed by one record per leaf, so a record stays
+    small whatever the size of the app.
+
+    Args:
+        mind_map_app: A MindMapApp DTO.
+
+    Returns:
+        An iterator of records
+    """
+    yield {"type": "app", "id": mind_map_app.id}
+    for mind_map_leaf in mind_map_app.data:
+        yield {
+            "type": "leaf",
+            "id": mind_map_app.id,
+            "path": mind_map_leaf.path,
+            "text": mind_map_leaf.text,
+        }
+
+
+def record_line(record: Dict[str, Any]) -> str:
+    """Format a transfer record as a JSON line."""
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def export_lines(mind_map_app: MindMapApp) -> str:
+    """
+    Format an app as transfer records, one JSON record per line.
+
+    Args:
+        mind_map_app: A MindMapApp DTO.
+
+    Returns:
+        The JSON lines of the app records
+    """
+    return "".join(
+        record_line(record) for record in export_records(mind_map_app))
+
+
+def export_page_lines(page: Dict[str, Any], first: bool) -> str:
+    """
+    Format a page of the leaves of an app as transfer records.
+
+    Args:
+        page: A page of leaves, see dump_mind_map_leaves_page
+        first: Whether it is the first page, after the app record
+
+    Returns:
+        The JSON lines of the leaf records, after the app record for
+        the first page
+    """
+    id = page["id"]
+    lines = [record_line({"type": "app", "id": id})] if first else []
+    lines.extend(
+        record_line({
+            "type": "leaf", "id": id, "path": leaf["path"],
+            "text": leaf["text"]})
+        for leaf in page["data"])
+    return "".join(lines)
+
+
+class MindMapRecordReader:
+    """
+    An incremental reader of transfer records.
+
+    Chunks of a stream are fed as they arrive, only the incomplete last
+    line is kept between chunks.
+    """
+
+    def __init__(self):
+        """Init."""
+        self.line = 0
+        self._buffer = b""
+
+    def feed(self, chunk: bytes) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Read the records completed by a chunk.
+
+        Args:
+            chunk: The next bytes of the stream
+
+        Returns:
+            A list of line numbers and records
+        """
+        lines = (self._buffer + chunk).split(b"\n")
+        self._buffer = lines.pop()
+        return self._decode_all(lines)
+
+    def close(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Read the last record, not followed by a new line.
+
+        Returns:
+            A list of line numbers and records
+        """
+        line, self._buffer = self._buffer, b""
+        return self._decode_all([line])
+
+    def _decode_all(
+            self,
+            lines: List[bytes]
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """Decode lines, blank lines are skipped."""
+        records = []
+        for line in lines:
+            record = self._decode(line)
+            if record is not None:
+                records.append((self.line, record))
+        return records
+
+    def _decode(self, line: bytes) -> Any:
+        """Decode a line, None for a blank line."""
+        self.line += 1
+        if not line.strip():
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            raise MindMapImportError(f"Line {self.line}: {exc}")
+        if not isinstance(record, dict):
+            raise MindMapImportError(
+                f"Line {self.line}: a record must be a JSON object.")
+        return record
+
+
+class MindMapImporter:
+    """
+    Turn transfer records into provider operations.
+
+    Consecutive leaves of an app are grouped in batches of up to
+    `chunk_size` leaves, so an import writes in chunks with bounded
+    memory.
+    """
+
+    def __init__(self, chunk_size: int = 1000):
+        """
+        Init.
+
+        Args:
+            chunk_size: Max number of leaves added at a time
+        """
+        self.chunk_size = chunk_size
+        self.apps = 0
+        self.leaves = 0
+        self.records = 0
+        self._id = None
+        self._pending: List[MindMapLeaf] = []
+
+    def feed(self, record: Dict[str, Any], line: int = 0) -> List[Operation]:
+        """
+        Read a record.
+
+        Args:
+            record: A transfer record
+            line: The record line number, for errors
+
+        Returns:
+            The operations ready to run
+        """
+        operations = []
+        try:
+            if record.get("type") == "app":
+                mind_map_app = MindMapApp(id=record.get("id"))
+                operations.extend(self.flush())
+                operations.append(("create", mind_map_app))
+                self.apps += 1
+
+            elif record.get("type") == "leaf":
+                id = MindMapApp(id=record.get("id")).id
+                mind_map_leaf = MindMapLeaf(
+                    path=record.get("path"),
+                    text=record.get("text"))
+                if id != self._id:
+                    operations.extend(self.flush())
+                    self._id = id
+                self._pending.append(mind_map_leaf)
+                if len(self._pending) >= self.chunk_size:
+                    operations.extend(self.flush())
+                self.leaves += 1
+
+            else:
+                raise MindMapImportError(
+                    f"Line {line}: unknown record type {record.get('type')}")
+
+        except ValidationError as exc:
+            raise MindMapImportError(f"Line {line}: {exc}")
+
+        self.records += 1
+        return operations
+
+    def flush(self) -> List[Operation]:
+        """
+        Release the pending leaves.
+
+        Returns:
+            The operations ready to run
+        """
+        if not self._pending:
+            return []
+        operation = ("add", self._id, self._pending)
+        self._pending = []
+        return [operation]
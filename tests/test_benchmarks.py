@@ -0,0 +1,137 @@
+import json
+
+from benchmarks.__main__ import main
+from benchmarks.comparisons import COMPARISONS, bench_comparisons
+from benchmarks.data import generate_apps, generate_leaves
+from benchmarks.loads import bench_http, load_apps, start_server, \
+    stop_server
+from benchmarks.operations import bench_providers
+from benchmarks.reports import compare, percentile, summarize
+from benchmarks.restarts import bench_restarts
+from benchmarks.workers import bench_workers
+
+
+class TestMindMapBenchmarks:
+
+    def test_generate_apps(self):
+        apps = generate_apps(apps=3, leaves=20, depth=2, fan_out=4)
+        assert [app["id"] for app in apps] == ["map-0", "map-1", "map-2"]
+        assert all(len(app["data"]) == 20 for app in apps)
+        segments = {
+            segment
+            for app in apps
+            for leaf in app["data"]
+            for segment in leaf["path"].split("/")}
+        assert segments <= {"n0", "n1", "n2", "n3"}
+        assert all(
+            leaf["path"].count("/") == 1
+            for app in apps
+            for leaf in app["data"])
+        assert apps == generate_apps(apps=3, leaves=20, depth=2, fan_out=4)
+        assert generate_leaves(count=5, seed=1) != \
+            generate_leaves(count=5, seed=2)
+
+    def test_summarize(self):
+        timings = [i / 1000 for i in range(100, 0, -1)]
+        stats = summarize(timings, elapsed=2.0)
+        assert stats["count"] == 100
+        assert stats["p50_ms"] == 50.0
+        assert stats["p95_ms"] == 95.0
+        assert stats["p99_ms"] == 99.0
+        assert stats["per_second"] == 50.0
+        assert percentile([], 50) == 0.0
+        assert summarize([], elapsed=0.0)["per_second"] == 0.0
+
+    def test_compare(self):
+        def data(p50_ms):
+            return {"results": {"providers": {"memory": {
+                "read_mind_map_app": {"p50_ms": p50_ms},
+            }}}}
+
+        assert compare(data(1.1), data(1.0))[0]["regression"] is False
+        regressions = compare(data(1.5), data(1.0), tolerance=0.2)
+        assert regressions[0]["operation"] == \
+            "providers/memory/read_mind_map_app"
+        assert regressions[0]["regression"] is True
+        assert compare(data(1.0), {"results": {}}) == []
+
+    def test_bench_providers(self, tmp_path):
+        apps = generate_apps(apps=2, leaves=10)
+        results = bench_providers(
+            names=["memory", "sqlite"],
+            directory=str(tmp_path),
+            apps=apps,
+            repeat=3)
+        assert set(results["providers"]) == {"memory", "sqlite"}
+        assert results["providers"]["memory"]["read_mind_map_app"][
+            "count"] == 3
+        assert "search_mind_map_leaves" in results["providers"]["sqlite"]
+        assert "ImportMindMapApps" in results["use_cases"]["memory"]
+        assert results["use_cases"]["sqlite"][
+            "AsyncIterMindMapAppTrees.render"]["count"] == 3
+
+    def test_bench_comparisons(self, tmp_path):
+        results = bench_comparisons(
+            names=list(COMPARISONS), directory=str(tmp_path), leaves=10,
+            repeat=3)["comparisons"]
+        assert set(results) == set(COMPARISONS)
+        assert set(results["metrics"]) == {
+            "provider_call", "provider_call.timed",
+            "request", "request.metrics"}
+        assert set(results["memory"]) == {"dicts", "columns"}
+        for name, variants in results.items():
+            assert len(variants) > 1
+            for stats in variants.values():
+                if name == "memory":
+                    assert stats["bytes_per_leaf"] > 0
+                else:
+                    assert stats["count"] == 3
+        # Memory is not compared to a baseline
+        data = {"results": {"comparisons": results}}
+        assert all("memory" not in item["operation"]
+                   for item in compare(data, data))
+
+    def test_bench_restarts(self, tmp_path):
+        apps = generate_apps(apps=2, leaves=10)
+        results = bench_restarts(directory=str(tmp_path), apps=apps)
+        assert set(results["restarts"]) == {"json", "binary"}
+        for steps in results["restarts"].values():
+            assert set(steps) == {"ready", "first_read", "all_read"}
+            assert steps["ready"]["count"] == 1
+
+    def test_bench_http(self, tmp_path):
+        apps = generate_apps(apps=2, leaves=10)
+        process, url = start_server(env={"MIND_MAP_DB_PROVIDER": "memory"})
+        try:
+            load_apps(url, apps)
+            results = bench_http(
+                url=url, ids=["map-0", "map-1"], count=8, concurrency=2)
+        finally:
+            stop_server(process)
+        assert set(results) == {
+            "GET /", "GET /apps", "GET /apps/{id}", "PUT /apps/{id}"}
+        assert all(stats["count"] == 8 for stats in results.values())
+
+    def test_bench_workers(self, tmp_path):
+        apps = generate_apps(apps=2, leaves=10)
+        results = bench_workers(
+            directory=str(tmp_path), apps=apps, counts=[1, 2], count=8,
+            concurrency=2)
+        assert set(results["workers"]) == {"remote-1", "remote-2"}
+        for endpoints in results["workers"].values():
+            assert set(endpoints) == {"GET /apps", "GET /apps/{id}"}
+            assert all(stats["count"] == 8 for stats in endpoints.values())
+
+    def test_main(self, tmp_path):
+        output = str(tmp_path / "results.json")
+        argv = [
+            "--apps", "2", "--leaves", "10", "--repeat", "2",
+            "--providers", "memory", "--requests", "0",
+            "--output", output]
+        assert main(argv) == 0
+        with open(output) as file:
+            data = json.load(file)
+        assert data["parameters"]["leaves"] == 10
+        assert "http" not in data["results"]
+        assert main(argv + ["--baseline", output, "--tolerance", "100"]) \
+            == 0
@@ -1,12 +1,47 @@
+import asyncio
+import copy
+import inspect
+import json
+import random
+import sqlite3
+import threading
+import time
+
 import pytest
+from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
 
+import main
 from main import DB_PROVIDER, app
 from src.applications import ReadMindMapApps, ReadMindMapApp, \
-    CreateMindMapApp, ReadMindMapAppsPrettyFormat
+    CreateMindMapApp, ReadMindMapAppsPrettyFormat, ReadMindMapAppTree, \
+    AsyncReadMindMapApps, AsyncReadMindMapApp, AsyncCreateMindMapApp, \
+    AsyncAddMindMapLeaf, AsyncReadMindMapAppTree, \
+    AsyncReadMindMapAppsPrettyFormat, ExportMindMapApps, ImportMindMapApps, \
+    IterMindMapAppTrees, AsyncIterMindMapAppTrees, AsyncExportMindMapApps
+from src.caches import LRUCache, ReadThroughCache
+from src.changes import MindMapChangeFeed
+from src.columns import MindMapSegmentTable, MindMapLeafColumns
+from src.indexes import MindMapPathTrie, MindMapInvertedIndex, \
+    split_path, tokenize, norm_path
+from src.interfaces import MindMapAppDBInterface
+from src.metrics import MindMapHistogram, MindMapCounter, MindMapGauge, \
+    MindMapMetricsRegistry, MindMapMetricsMiddleware
 from src.models import MindMapLeaf, MindMapAppCreateError, \
-    MindMapApp
-from src.providers import MindMapDBProvider
+    MindMapApp, MindMapAppAddError, MindMapImportError, MindMapAppsCount, \
+    MindMapChange, MindMapChanges, MindMapBranchStats, \
+    MindMapAppUpdateError
+from src.providers import MindMapDBProvider, MindMapIndexedDBProvider, \
+    MindMapSQLiteDBProvider, MindMapAsyncDBProvider, get_db_provider, \
+    MindMapCompactDBProvider, MindMapAppRecord, MindMapTimedDBProvider, \
+    MindMapProfiledAsyncDBProvider, MindMapCachedDBProvider, \
+    MindMapChangesDBProvider
+from src.profiles import MindMapProfileStore, MindMapProfilingMiddleware, \
+    profile_requested
+from src.responses import MindMapJSONResponse
+from src.settings import Settings
+from src.stores import STORE_METHODS
+from src.transfers import MindMapRecordReader, MindMapImporter
 
 
 class TestMindMapModels:
@@ -160,6 +195,1891 @@ class TestMindMapProviders:
         }
 
 
+class UnscannedLeaves(list):
+    """Stored leaves failing a scan, read by position only."""
+
+    def __iter__(self):
+        raise AssertionError("Leaves scanned")
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            raise AssertionError("Leaves scanned")
+        return super().__getitem__(key)
+
+
+def unscanned(provider):
+    """Make the leaves of all apps of a provider fail a scan."""
+    for record in provider._apps.values():
+        record.data = UnscannedLeaves(record.data)
+
+
+class TestMindMapIndexedProviders:
+    sample = [
+        {
+            "id": "fake-app-0",
+            "data": [
+                {
+                    "path": "fake/i/like/potatoes",
+                    "text": "Because fake reasons"
+                },
+                {
+                    "path": "/this/is/a/path/1",
+                    "text": "This is a sample topic 1"
+                }
+            ]
+
+        },
+        {
+            "id": "fake-app-1",
+            "data": [
+                {
+                    "path": "fake/i/like/potatoes",
+                    "text": "Because fake reasons"
+                },
+                {
+                    "path": "/this/is/a/path/1",
+                    "text": "This is a sample topic 1"
+                }
+            ]
+
+        },
+    ]
+    DB = MindMapIndexedDBProvider(data=sample)
+
+    def test_read_mind_map_apps(self):
+        mind_map_apps = self.DB.read_mind_map_apps()
+        assert mind_map_apps[0].dict() == self.sample[0]
+
+    def test_read_mind_map_apps_empty_list(self):
+        mind_map_apps = MindMapIndexedDBProvider(data=[]).read_mind_map_apps()
+        assert mind_map_apps == []
+
+    def test_read_mind_map_app(self):
+        mind_map_app_ok = self.DB.read_mind_map_app(id="fake-app-0")
+        mind_map_app_none = self.DB.read_mind_map_app(id="foo")
+        assert mind_map_app_ok.dict() == self.sample[0]
+        assert mind_map_app_none is None
+
+    def test_create_mind_map_app(self):
+        new_mind_map_app = MindMapApp(id="app-3")
+        mind_map_app = self.DB.create_mind_map_app(
+            mind_map_app=new_mind_map_app)
+        assert isinstance(mind_map_app, MindMapApp)
+        assert mind_map_app.dict() == {
+            "id": "app-3",
+            "data": []
+        }
+        assert [app.id for app in self.DB.read_mind_map_apps()] == [
+            "fake-app-0", "fake-app-1", "app-3"]
+
+    def test_create_mind_map_app_already_exist(self):
+        new_mind_map_app = MindMapApp(id="fake-app-0")
+        with pytest.raises(MindMapAppCreateError):
+            self.DB.create_mind_map_app(mind_map_app=new_mind_map_app)
+
+    def test_add_mind_map_leaf(self):
+        mind_map_leaf = MindMapLeaf(
+            path="fake/i/hate/apple",
+            text="Because bad reasons")
+        mind_map_app = self.DB.add_mind_map_leaf(
+            id="fake-app-1",
+            mind_map_leaf=mind_map_leaf)
+
+        assert mind_map_app.dict() == {
+            'id': 'fake-app-1',
+            'data': self.sample[1]['data'] + [mind_map_leaf.dict()]
+        }
+
+    def test_add_mind_map_leaf_invalid_id(self):
+        with pytest.raises(MindMapAppAddError):
+            self.DB.add_mind_map_leaf(
+                id="foo",
+                mind_map_leaf=MindMapLeaf(path="a", text="b"))
+
+    def test_add_mind_map_leaves(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        version = provider.read_mind_map_apps_version()
+        leaves = [MindMapLeaf(path="a/b", text="c"),
+                  MindMapLeaf(path="a/d", text=None)]
+        summary = provider.add_mind_map_leaves(
+            id="fake-app-1",
+            mind_map_leaves=leaves)
+
+        assert summary.dict() == {
+            "id": "fake-app-1", "added": 2, "total": 4, "removed": 0}
+        assert provider.read_mind_map_app(id="fake-app-1").data[2:] == leaves
+        assert provider.read_mind_map_tree(id="fake-app-1", prefix="a") \
+            .has_children
+        assert provider.read_mind_map_apps_version() == version + 1
+
+    def test_add_mind_map_leaves_invalid_id(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        version = provider.read_mind_map_apps_version()
+        with pytest.raises(MindMapAppAddError):
+            provider.add_mind_map_leaves(
+                id="foo",
+                mind_map_leaves=[MindMapLeaf(path="a", text="b")])
+        assert provider.read_mind_map_apps_version() == version
+
+    def test_add_mind_map_leaves_same_as_default(self):
+        list_provider = MindMapDBProvider()
+        list_provider.db = copy.deepcopy(self.sample)
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        leaves = [MindMapLeaf(path=f"x/{i}", text=str(i)) for i in range(3)]
+
+        assert provider.add_mind_map_leaves(
+            id="fake-app-0", mind_map_leaves=leaves) == \
+            MindMapAppDBInterface.add_mind_map_leaves(
+                list_provider, id="fake-app-0", mind_map_leaves=leaves)
+        assert provider.read_mind_map_apps() == \
+            list_provider.read_mind_map_apps()
+        with pytest.raises(MindMapAppAddError):
+            MindMapAppDBInterface.add_mind_map_leaves(
+                list_provider, id="foo", mind_map_leaves=leaves)
+
+    def test_read_mind_map_tree(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        provider.add_mind_map_leaf(
+            id="fake-app-0",
+            mind_map_leaf=MindMapLeaf(path="this/is/b", text="b"))
+
+        tree = provider.read_mind_map_tree(
+            id="fake-app-0", prefix="/this/is", depth=1)
+        assert tree.dict() == {
+            "name": "is",
+            "path": "this/is",
+            "texts": [],
+            "has_children": True,
+            "children": [
+                {
+                    "name": "a",
+                    "path": "this/is/a",
+                    "texts": [],
+                    "has_children": True,
+                    "children": [],
+                },
+                {
+                    "name": "b",
+                    "path": "this/is/b",
+                    "texts": ["b"],
+                    "has_children": False,
+                    "children": [],
+                },
+            ],
+        }
+        assert provider.read_mind_map_tree(id="foo") is None
+        assert provider.read_mind_map_tree(
+            id="fake-app-0", prefix="no/such/path") is None
+
+    def test_read_mind_map_tree_same_as_default(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        for prefix in ("", "fake", "this/is/a", "fake/i/like/potatoes"):
+            for depth in (None, 0, 1, 2):
+                assert provider.read_mind_map_tree(
+                    id="fake-app-0", prefix=prefix, depth=depth) == \
+                    MindMapAppDBInterface.read_mind_map_tree(
+                        provider, id="fake-app-0", prefix=prefix,
+                        depth=depth)
+
+    def test_read_mind_map_apps_page(self):
+        provider = MindMapIndexedDBProvider(data=[
+            {"id": f"app-{i}", "data": [{"path": "a", "text": str(i)}]}
+            for i in range(5)])
+        apps = provider.read_mind_map_apps()
+
+        assert provider.read_mind_map_apps_page(limit=2) == apps[:2]
+        assert provider.read_mind_map_apps_page(
+            limit=2, after="app-1") == apps[2:4]
+        assert provider.read_mind_map_apps_page(
+            limit=2, after="app-4") == []
+        assert provider.read_mind_map_apps_page(limit=2, after="foo") == []
+        assert list(provider.iter_mind_map_apps(page_size=2)) == apps
+        assert list(provider.iter_mind_map_apps(
+            after="app-2", page_size=2)) == apps[3:]
+
+    def test_read_mind_map_apps_version(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        version = provider.read_mind_map_apps_version()
+        provider.create_mind_map_app(mind_map_app=MindMapApp(id="new"))
+        provider.add_mind_map_leaf(id="new", mind_map_leaf=MindMapLeaf())
+        with pytest.raises(MindMapAppAddError):
+            provider.add_mind_map_leaf(id="foo", mind_map_leaf=MindMapLeaf())
+        assert provider.read_mind_map_apps_version() == version + 2
+        provider.db = []
+        assert provider.read_mind_map_apps_version() == version + 3
+
+    def test_read_mind_map_apps_epoch(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        epoch = provider.read_mind_map_apps_epoch()
+        provider.create_mind_map_app(mind_map_app=MindMapApp(id="new"))
+        assert provider.read_mind_map_apps_epoch() == epoch
+        # Versions in memory are counted again by a new provider
+        assert MindMapIndexedDBProvider(
+            data=self.sample).read_mind_map_apps_epoch() != epoch
+
+    def test_read_mind_map_app_version(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        version_0 = provider.read_mind_map_app_version(id="fake-app-0")
+        version_1 = provider.read_mind_map_app_version(id="fake-app-1")
+        assert version_0 != version_1
+        assert provider.read_mind_map_app_version(id="foo") is None
+
+        provider.add_mind_map_leaf(
+            id="fake-app-1", mind_map_leaf=MindMapLeaf(path="a", text="b"))
+        assert provider.read_mind_map_app_version(id="fake-app-0") == \
+            version_0
+        assert provider.read_mind_map_app_version(id="fake-app-1") == \
+            provider.read_mind_map_apps_version()
+        provider.add_mind_map_leaves(
+            id="fake-app-0", mind_map_leaves=[MindMapLeaf()])
+        assert provider.read_mind_map_app_version(id="fake-app-0") > \
+            version_0
+
+        versions = [provider.read_mind_map_app_version(id=app.id)
+                    for app in provider.read_mind_map_apps()]
+        provider.db = self.sample
+        assert all(
+            provider.read_mind_map_app_version(id=app.id) not in versions
+            for app in provider.read_mind_map_apps())
+
+    def test_read_mind_map_app_version_default(self):
+        list_provider = MindMapDBProvider()
+        list_provider.db = copy.deepcopy(self.sample)
+        version = MindMapAppDBInterface.read_mind_map_app_version(
+            list_provider, id="fake-app-0")
+        list_provider.add_mind_map_leaf(
+            id="fake-app-1", mind_map_leaf=MindMapLeaf())
+        assert MindMapAppDBInterface.read_mind_map_app_version(
+            list_provider, id="fake-app-0") > version
+        assert MindMapAppDBInterface.read_mind_map_app_version(
+            list_provider, id="foo") is None
+
+    def test_search_mind_map_leaves(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        provider.add_mind_map_leaf(
+            id="fake-app-1",
+            mind_map_leaf=MindMapLeaf(path="food/potatoes", text="Fries"))
+        hits = provider.search_mind_map_leaves(query="potatoes")
+        assert [(hit.id, hit.path) for hit in hits] == [
+            ("fake-app-0", "fake/i/like/potatoes"),
+            ("fake-app-1", "fake/i/like/potatoes"),
+            ("fake-app-1", "food/potatoes")]
+        hits = provider.search_mind_map_leaves(
+            query="fries potatoes", id="fake-app-1", limit=1)
+        assert [(hit.id, hit.text) for hit in hits] == [
+            ("fake-app-1", "Fries")]
+        assert provider.search_mind_map_leaves(query="potatoes", id="foo") \
+            == []
+
+    def test_search_mind_map_leaves_same_as_default(self):
+        list_provider = MindMapDBProvider()
+        list_provider.db = copy.deepcopy(self.sample)
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        for query, id in (("sample topic", None), ("fake", "fake-app-1")):
+            assert provider.search_mind_map_leaves(query=query, id=id) == \
+                MindMapAppDBInterface.search_mind_map_leaves(
+                    list_provider, query=query, id=id)
+
+    def test_search_mind_map_leaves_index(self, monkeypatch):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        unscanned(provider)
+        for method in ("read_mind_map_apps", "dump_mind_map_apps"):
+            monkeypatch.setattr(provider, method, None)
+        # Only the leaves found in the index are read
+        assert [hit.id for hit in provider.search_mind_map_leaves(
+            query="potatoes")] == ["fake-app-0", "fake-app-1"]
+
+    def test_read_mind_map_apps_page_same_as_default(self):
+        list_provider = MindMapDBProvider()
+        list_provider.db = copy.deepcopy(self.sample)
+        indexed_provider = MindMapIndexedDBProvider(data=self.sample)
+        for after in (None, "fake-app-0", "fake-app-1", "foo"):
+            for limit in (1, 2, 3):
+                assert indexed_provider.read_mind_map_apps_page(
+                    limit=limit, after=after) == \
+                    list_provider.read_mind_map_apps_page(
+                        limit=limit, after=after)
+
+    def test_read_mind_map_app_ids_page_same_as_default(self):
+        list_provider = MindMapDBProvider()
+        list_provider.db = copy.deepcopy(self.sample)
+        indexed_provider = MindMapIndexedDBProvider(data=self.sample)
+        for after in (None, "fake-app-0", "fake-app-1", "foo"):
+            assert indexed_provider.read_mind_map_app_ids_page(
+                limit=1, after=after) == \
+                list_provider.read_mind_map_app_ids_page(
+                    limit=1, after=after)
+
+    def test_dump_mind_map_apps(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        assert provider.dump_mind_map_apps() == self.sample
+        assert provider.dump_mind_map_app(id="fake-app-1") == self.sample[1]
+        assert provider.dump_mind_map_app(id="foo") is None
+        assert provider.dump_mind_map_apps_page(
+            limit=1, after="fake-app-0") == self.sample[1:]
+
+        provider.dump_mind_map_app(id="fake-app-0")["data"].clear()
+        provider.read_mind_map_app(id="fake-app-0").data[0].path = "foo"
+        assert provider.dump_mind_map_apps() == self.sample
+
+    def test_dump_mind_map_apps_as_stored(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        stored = provider._apps["fake-app-0"].data
+        # Leaves are neither built nor validated, nor copied
+        assert all(
+            leaf is stored_leaf for leaf, stored_leaf in zip(
+                provider.dump_mind_map_app(id="fake-app-0")["data"], stored))
+
+    def test_dump_mind_map_apps_same_as_default(self):
+        list_provider = MindMapDBProvider()
+        list_provider.db = copy.deepcopy(self.sample)
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        assert provider.dump_mind_map_apps() == \
+            MindMapAppDBInterface.dump_mind_map_apps(list_provider)
+        assert provider.dump_mind_map_app(id="fake-app-0") == \
+            MindMapAppDBInterface.dump_mind_map_app(
+                list_provider, id="fake-app-0")
+        assert provider.dump_mind_map_apps_page(limit=1) == \
+            MindMapAppDBInterface.dump_mind_map_apps_page(
+                list_provider, limit=1)
+
+    def test_same_behavior_as_list_provider(self):
+        list_provider = MindMapDBProvider()
+        list_provider.db = copy.deepcopy(self.sample)
+        indexed_provider = MindMapIndexedDBProvider(data=self.sample)
+
+        for provider in (list_provider, indexed_provider):
+            provider.create_mind_map_app(mind_map_app=MindMapApp(id="new"))
+            provider.add_mind_map_leaf(
+                id="new",
+                mind_map_leaf=MindMapLeaf(path="a/b", text="c"))
+            provider.add_mind_map_leaf(
+                id="fake-app-0",
+                mind_map_leaf=MindMapLeaf(path="d/e", text="f"))
+
+        assert indexed_provider.read_mind_map_apps() == \
+            list_provider.read_mind_map_apps()
+        assert indexed_provider.read_mind_map_app(id="new") == \
+            list_provider.read_mind_map_app(id="new")
+
+
+class TestMindMapSnapshots:
+    writers = 4
+    leaves = 100
+
+    def test_record_size(self):
+        record = MindMapAppRecord(id="a", data=[])
+        record.versions.extend([2, 2, 5, 7])
+        assert record.size() == 4
+        assert record.size(version=1) == 0
+        assert record.size(version=2) == 2
+        assert record.size(version=6) == 3
+        assert record.size(version=9) == 4
+
+    @pytest.mark.parametrize(
+        "provider_class", [MindMapIndexedDBProvider, MindMapCompactDBProvider])
+    def test_concurrent_reads_and_writes(self, provider_class):
+        provider = provider_class(data=[])
+        for writer in range(self.writers):
+            for name in "ab":
+                provider.create_mind_map_app(
+                    mind_map_app=MindMapApp(id=f"{name}-{writer}"))
+        done = threading.Event()
+        errors = []
+        reads = []
+
+        def write(writer):
+            # Each leaf goes to app a, then to app b
+            for i in range(self.leaves):
+                for name in "ab":
+                    provider.add_mind_map_leaf(
+                        id=f"{name}-{writer}",
+                        mind_map_leaf=MindMapLeaf(path=f"x/{i}", text=str(i)))
+
+        def create():
+            for i in range(self.leaves):
+                if done.is_set():
+                    return
+                provider.create_mind_map_app(
+                    mind_map_app=MindMapApp(id=f"new-{i}"))
+                time.sleep(0.001)
+
+        def check(apps):
+            apps = {app["id"]: app["data"] for app in apps}
+            for writer in range(self.writers):
+                a, b = apps[f"a-{writer}"], apps[f"b-{writer}"]
+                assert len(b) <= len(a) <= len(b) + 1
+                assert [leaf["text"] for leaf in a] == [
+                    str(i) for i in range(len(a))]
+
+        def read():
+            count = 0
+            try:
+                while not done.is_set():
+                    check(provider.dump_mind_map_apps())
+                    count += 1
+            except Exception as exc:
+                errors.append(exc)
+            reads.append(count)
+
+        writers = [threading.Thread(target=write, args=(writer,))
+                   for writer in range(self.writers)]
+        others = [threading.Thread(target=create)] + [
+            threading.Thread(target=read) for _ in range(2)]
+        for thread in writers + others:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in others:
+            thread.join()
+
+        assert errors == []
+        assert all(reads)
+        check(provider.dump_mind_map_apps())
+        # One version by create and by add, and one by the db setter of
+        # the provider init
+        assert provider.read_mind_map_apps_version() == len(
+            provider.read_mind_map_apps()) + self.writers * self.leaves * 2 + 1
+        assert provider.search_mind_map_leaves(
+            query="x 0", id="a-0", limit=1)[0].text == "0"
+
+
+class TestMindMapSQLiteProviders:
+    sample = TestMindMapIndexedProviders.sample
+
+    @pytest.fixture
+    def provider(self, tmp_path):
+        provider = MindMapSQLiteDBProvider(
+            path=str(tmp_path / "mind_map.db"), pool_size=4)
+        for item in self.sample:
+            provider.create_mind_map_app(mind_map_app=MindMapApp(**item))
+        yield provider
+        provider.close()
+
+    def test_read_mind_map_apps(self, provider):
+        mind_map_apps = provider.read_mind_map_apps()
+        assert [app.dict() for app in mind_map_apps] == self.sample
+
+    def test_read_mind_map_apps_empty_list(self, tmp_path):
+        provider = MindMapSQLiteDBProvider(path=str(tmp_path / "empty.db"))
+        assert provider.read_mind_map_apps() == []
+        provider.close()
+
+    def test_read_mind_map_app(self, provider):
+        mind_map_app_ok = provider.read_mind_map_app(id="fake-app-0")
+        mind_map_app_none = provider.read_mind_map_app(id="foo")
+        assert mind_map_app_ok.dict() == self.sample[0]
+        assert mind_map_app_none is None
+
+    def test_create_mind_map_app(self, provider):
+        mind_map_app = provider.create_mind_map_app(
+            mind_map_app=MindMapApp(id="app-3"))
+        assert mind_map_app.dict() == {"id": "app-3", "data": []}
+        assert provider.read_mind_map_app(id="app-3") == mind_map_app
+        assert [app.id for app in provider.read_mind_map_apps()] == [
+            "fake-app-0", "fake-app-1", "app-3"]
+
+    def test_create_mind_map_app_already_exist(self, provider):
+        with pytest.raises(MindMapAppCreateError):
+            provider.create_mind_map_app(
+                mind_map_app=MindMapApp(id="fake-app-0"))
+
+    def test_add_mind_map_leaf(self, provider):
+        mind_map_leaf = MindMapLeaf(path=None, text=None)
+        mind_map_app = provider.add_mind_map_leaf(
+            id="fake-app-1",
+            mind_map_leaf=mind_map_leaf)
+        assert mind_map_app.dict() == {
+            'id': 'fake-app-1',
+            'data': self.sample[1]['data'] + [mind_map_leaf.dict()]
+        }
+        assert provider.read_mind_map_apps()[1] == mind_map_app
+
+    def test_add_mind_map_leaf_invalid_id(self, provider):
+        with pytest.raises(MindMapAppAddError):
+            provider.add_mind_map_leaf(
+                id="foo",
+                mind_map_leaf=MindMapLeaf(path="a", text="b"))
+
+    def test_add_mind_map_leaves(self, provider):
+        version = provider.read_mind_map_apps_version()
+        leaves = [MindMapLeaf(path="a/b", text="c"),
+                  MindMapLeaf(path=None, text=None)]
+        summary = provider.add_mind_map_leaves(
+            id="fake-app-1",
+            mind_map_leaves=leaves)
+
+        assert summary.dict() == {
+            "id": "fake-app-1", "added": 2, "total": 4, "removed": 0}
+        assert provider.read_mind_map_app(id="fake-app-1").data[2:] == leaves
+        assert provider.read_mind_map_apps_version() == version + 1
+        with pytest.raises(MindMapAppAddError):
+            provider.add_mind_map_leaves(id="foo", mind_map_leaves=leaves)
+        assert provider.read_mind_map_apps_version() == version + 1
+
+    def test_persistence(self, provider):
+        provider.add_mind_map_leaf(
+            id="fake-app-0",
+            mind_map_leaf=MindMapLeaf(path="a/b", text="c"))
+        provider.close()
+
+        reopened = MindMapSQLiteDBProvider(path=provider.path)
+        assert reopened.read_mind_map_apps() == \
+            provider.read_mind_map_apps()
+        journal_mode = sqlite3.connect(provider.path).execute(
+            "PRAGMA journal_mode").fetchone()
+        assert journal_mode == ("wal",)
+        reopened.close()
+
+    def test_read_mind_map_tree(self, provider):
+        provider.add_mind_map_leaf(
+            id="fake-app-0",
+            mind_map_leaf=MindMapLeaf(path="this/is/b", text="b"))
+        provider.add_mind_map_leaf(
+            id="fake-app-0",
+            mind_map_leaf=MindMapLeaf(path="this/is0", text="sibling"))
+
+        indexed = MindMapIndexedDBProvider(
+            data=[app.dict() for app in provider.read_mind_map_apps()])
+        for prefix in ("", "this", "/this/is", "this/is0", "fake/i"):
+            for depth in (None, 0, 1):
+                assert provider.read_mind_map_tree(
+                    id="fake-app-0", prefix=prefix, depth=depth) == \
+                    indexed.read_mind_map_tree(
+                        id="fake-app-0", prefix=prefix, depth=depth)
+        assert provider.read_mind_map_tree(id="foo") is None
+
+    def test_read_mind_map_tree_levels(self, provider):
+        paths = ["a", "a/b", "/a/b", "a/b/c", "a//b", "/", "", None, "a/b/"]
+        indexed = MindMapIndexedDBProvider(data=[{"id": "app"}])
+        provider.create_mind_map_app(mind_map_app=MindMapApp(id="app"))
+        rng = random.Random(2)
+        for i in range(200):
+            leaf = MindMapLeaf(path=rng.choice(paths), text=str(i))
+            for target in (provider, indexed):
+                if i % 5 == 4:
+                    target.delete_mind_map_leaves(id="app", path=leaf.path)
+                else:
+                    target.add_mind_map_leaf(id="app", mind_map_leaf=leaf)
+
+        # Depths read from the branch stats, as the path trie
+        for prefix in ("", "a", "a/b", "a/", "/", "a/b/c", "nope"):
+            for depth in (0, 1, 2, 5):
+                assert provider.read_mind_map_tree(
+                    id="app", prefix=prefix, depth=depth) == \
+                    indexed.read_mind_map_tree(
+                        id="app", prefix=prefix, depth=depth)
+
+    def test_read_mind_map_apps_page(self, provider):
+        provider.create_mind_map_app(mind_map_app=MindMapApp(id="empty"))
+        provider.create_mind_map_app(mind_map_app=MindMapApp(
+            id="last", data=[MindMapLeaf(path="a", text="b")]))
+        apps = provider.read_mind_map_apps()
+        assert provider.read_mind_map_app_ids_page(
+            limit=3, after="fake-app-1") == ["empty", "last"]
+        assert provider.read_mind_map_app_ids_page(limit=3, after="foo") == []
+
+        assert provider.read_mind_map_apps_page(limit=3) == apps[:3]
+        assert provider.read_mind_map_apps_page(
+            limit=3, after="fake-app-1") == apps[2:]
+        assert provider.read_mind_map_apps_page(limit=3, after="last") == []
+        assert provider.read_mind_map_apps_page(limit=3, after="foo") == []
+        assert list(provider.iter_mind_map_apps(page_size=1)) == apps
+
+    def test_read_mind_map_apps_version(self, provider):
+        version = provider.read_mind_map_apps_version()
+        provider.create_mind_map_app(mind_map_app=MindMapApp(id="new"))
+        provider.add_mind_map_leaf(id="new", mind_map_leaf=MindMapLeaf())
+        with pytest.raises(MindMapAppCreateError):
+            provider.create_mind_map_app(mind_map_app=MindMapApp(id="new"))
+        with pytest.raises(MindMapAppAddError):
+            provider.add_mind_map_leaf(id="foo", mind_map_leaf=MindMapLeaf())
+        assert provider.read_mind_map_apps_version() == version + 2
+
+        other = MindMapSQLiteDBProvider(path=provider.path)
+        assert other.read_mind_map_apps_version() == version + 2
+        other.close()
+
+    def test_read_mind_map_apps_epoch(self, provider, tmp_path):
+        epoch = provider.read_mind_map_apps_epoch()
+        assert len(epoch) == 16
+        # Kept with the versions, by every process and after a restart
+        other = MindMapSQLiteDBProvider(path=provider.path)
+        assert other.read_mind_map_apps_epoch() == epoch
+        other.close()
+        other = MindMapSQLiteDBProvider(path=str(tmp_path / "other.db"))
+        assert other.read_mind_map_apps_epoch() != epoch
+        other.close()
+
+    def test_read_mind_map_app_version(self, provider):
+        version_0 = provider.read_mind_map_app_version(id="fake-app-0")
+        provider.add_mind_map_leaf(
+            id="fake-app-1", mind_map_leaf=MindMapLeaf(path="a", text="b"))
+        provider.add_mind_map_leaves(
+            id="fake-app-1", mind_map_leaves=[MindMapLeaf()])
+        assert provider.read_mind_map_app_version(id="fake-app-0") == \
+            version_0
+        assert provider.read_mind_map_app_version(id="fake-app-1") == \
+            provider.read_mind_map_apps_version()
+        assert provider.read_mind_map_app_version(id="foo") is None
+
+    def test_read_mind_map_app_version_migration(self, tmp_path):
+        path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE apps ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "id TEXT NOT NULL UNIQUE)")
+        conn.execute("INSERT INTO apps (id) VALUES ('old')")
+        conn.commit()
+        conn.close()
+
+        provider = MindMapSQLiteDBProvider(path=path)
+        assert provider.read_mind_map_app_version(id="old") == 0
+        provider.add_mind_map_leaf(id="old", mind_map_leaf=MindMapLeaf())
+        assert provider.read_mind_map_app_version(id="old") == 1
+        provider.close()
+
+    def test_search_mind_map_leaves(self, provider):
+        provider.add_mind_map_leaf(
+            id="fake-app-1",
+            mind_map_leaf=MindMapLeaf(path="food/potatoes", text="Fries"))
+        hits = provider.search_mind_map_leaves(query="Potatoes")
+        assert sorted((hit.id, hit.path) for hit in hits) == [
+            ("fake-app-0", "fake/i/like/potatoes"),
+            ("fake-app-1", "fake/i/like/potatoes"),
+            ("fake-app-1", "food/potatoes")]
+        hits = provider.search_mind_map_leaves(
+            query="fries potatoes", id="fake-app-1", limit=1)
+        assert [(hit.id, hit.text) for hit in hits] == [
+            ("fake-app-1", "Fries")]
+        assert provider.search_mind_map_leaves(query="!") == []
+
+    def test_search_mind_map_leaves_rebuild(self, provider):
+        conn = sqlite3.connect(provider.path)
+        conn.execute("DROP TRIGGER leaves_search_insert")
+        conn.execute("DROP TABLE leaves_search")
+        conn.commit()
+        conn.close()
+
+        reopened = MindMapSQLiteDBProvider(path=provider.path)
+        assert len(reopened.search_mind_map_leaves(query="potatoes")) == 2
+        reopened.close()
+
+    def test_dump_mind_map_apps(self, provider):
+        provider.create_mind_map_app(mind_map_app=MindMapApp(id="empty"))
+        apps = [app.dict() for app in provider.read_mind_map_apps()]
+        assert provider.dump_mind_map_apps() == apps
+        assert provider.dump_mind_map_app(id="empty") == apps[-1]
+        assert provider.dump_mind_map_app(id="foo") is None
+        assert provider.dump_mind_map_apps_page(
+            limit=5, after="fake-app-0") == apps[1:]
+
+    def test_concurrent_writes(self, provider):
+        def add_leaves(n):
+            for i in range(20):
+                provider.add_mind_map_leaf(
+                    id="fake-app-1",
+                    mind_map_leaf=MindMapLeaf(path=f"{n}/{i}", text="t"))
+
+        threads = [
+            threading.Thread(target=add_leaves, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mind_map_app = provider.read_mind_map_app(id="fake-app-1")
+        assert len(mind_map_app.data) == 2 + 8 * 20
+        assert provider._opened <= provider.pool_size
+
+    def test_get_db_provider(self, tmp_path):
+        assert isinstance(
+            get_db_provider(settings=Settings(db_provider="memory")),
+            MindMapIndexedDBProvider)
+        assert isinstance(
+            get_db_provider(settings=Settings(db_provider="compact")),
+            MindMapCompactDBProvider)
+        provider = get_db_provider(settings=Settings(
+            db_provider="sqlite", db_path=str(tmp_path / "settings.db")))
+        assert isinstance(provider, MindMapSQLiteDBProvider)
+        provider.close()
+        with pytest.raises(ValueError):
+            get_db_provider(settings=Settings(db_provider="foo"))
+
+
+class CountingDBProvider(MindMapTimedDBProvider):
+    """Record the methods called."""
+
+    def __init__(self, db_provider):
+        super().__init__(
+            db_provider=db_provider,
+            histogram=MindMapHistogram("seconds", "", labels=("method",)),
+            errors=MindMapCounter("errors", "", labels=("method",)))
+        self.calls = []
+
+    def _call(self, method, **kwargs):
+        self.calls.append(method)
+        return super()._call(method, **kwargs)
+
+
+class TestMindMapCachedProviders:
+    sample = TestMindMapIndexedProviders.sample
+
+    @pytest.fixture
+    def backend(self, tmp_path):
+        backend = MindMapSQLiteDBProvider(path=str(tmp_path / "mind_map.db"))
+        for item in self.sample:
+            backend.create_mind_map_app(mind_map_app=MindMapApp(**item))
+        yield CountingDBProvider(db_provider=backend)
+        backend.close()
+
+    def test_reads_cached(self, backend):
+        provider = MindMapCachedDBProvider(db_provider=backend)
+        for _ in range(3):
+            assert provider.read_mind_map_app(id="fake-app-0") == \
+                MindMapApp(**self.sample[0])
+            assert provider.read_mind_map_apps() == \
+                [MindMapApp(**item) for item in self.sample]
+            assert provider.dump_mind_map_app(id="fake-app-1") == \
+                self.sample[1]
+            assert provider.dump_mind_map_apps() == self.sample
+        assert sorted(backend.calls) == [
+            "dump_mind_map_app", "dump_mind_map_apps",
+            "read_mind_map_app", "read_mind_map_apps"]
+        stats = provider.cache.stats()
+        assert (stats["hits"], stats["misses"], stats["size"]) == (8, 4, 4)
+        assert stats["bytes"] > 0
+
+    def test_writes_invalidate(self, backend):
+        provider = MindMapCachedDBProvider(db_provider=backend)
+        provider.read_mind_map_app(id="fake-app-0")
+        provider.read_mind_map_app(id="fake-app-1")
+        provider.read_mind_map_apps()
+        assert provider.read_mind_map_app(id="new") is None
+        backend.calls = []
+
+        leaf = MindMapLeaf(path="a/b", text="c")
+        provider.add_mind_map_leaf(id="fake-app-0", mind_map_leaf=leaf)
+        assert provider.read_mind_map_app(id="fake-app-0").data[-1] == leaf
+        assert provider.read_mind_map_app(id="fake-app-1") == \
+            MindMapApp(**self.sample[1])
+        assert len(provider.read_mind_map_apps()[0].data) == 3
+        assert backend.calls == [
+            "add_mind_map_leaf", "read_mind_map_app", "read_mind_map_apps"]
+
+        provider.add_mind_map_leaves(id="fake-app-1", mind_map_leaves=[leaf])
+        assert provider.read_mind_map_app(id="fake-app-1").data[-1] == leaf
+        provider.create_mind_map_app(mind_map_app=MindMapApp(id="new"))
+        assert provider.read_mind_map_app(id="new") == MindMapApp(id="new")
+        assert len(provider.read_mind_map_apps()) == 3
+
+    def test_bounds(self, backend):
+        provider = MindMapCachedDBProvider(db_provider=backend, max_size=1)
+        provider.read_mind_map_app(id="fake-app-0")
+        provider.read_mind_map_app(id="fake-app-1")
+        assert provider.cache.stats()["evictions"] == 1
+        provider = MindMapCachedDBProvider(db_provider=backend, max_bytes=10)
+        provider.read_mind_map_app(id="fake-app-0")
+        assert provider.cache.stats()["size"] == 0
+
+    def test_concurrent_misses_coalesced(self, backend):
+        provider = MindMapCachedDBProvider(db_provider=backend)
+        read = backend.db_provider.read_mind_map_app
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_read(**kwargs):
+            started.set()
+            release.wait(5)
+            return read(**kwargs)
+
+        backend.db_provider.read_mind_map_app = slow_read
+        threads = [
+            threading.Thread(
+                target=provider.read_mind_map_app, kwargs={"id": "fake-app-0"})
+            for _ in range(4)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while provider.cache.coalesced < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert backend.calls.count("read_mind_map_app") == 1
+        assert provider.cache.stats()["coalesced"] == 3
+
+    def test_get_db_provider(self, tmp_path):
+        db_provider = get_db_provider(settings=Settings(db_cache_size=10))
+        assert isinstance(db_provider, MindMapCachedDBProvider)
+        assert isinstance(db_provider.db_provider, MindMapIndexedDBProvider)
+        assert db_provider.cache.cache.max_size == 10
+        db_provider = get_db_provider(
+            settings=Settings(
+                db_provider="remote", db_authkey="test", db_cache_size=10))
+        assert not isinstance(db_provider, MindMapCachedDBProvider)
+
+
+class TestMindMapChanges:
+    sample = TestMindMapIndexedProviders.sample
+
+    def test_change_feed(self):
+        feed = MindMapChangeFeed(retain=2)
+        assert feed.seq("app") == 0
+        assert feed.since("app", 0) == []
+        assert feed.since("app", 1) is None
+
+        leaves = [MindMapLeaf(path=f"a/{i}", text=str(i)) for i in range(3)]
+        for leaf in leaves:
+            feed.publish("app", "added", [leaf])
+        assert feed.seq("app") == 3
+        changes = feed.since("app", 1)
+        assert [change.seq for change, _ in changes] == [2, 3]
+        assert json.loads(changes[0][1]) == {
+            "seq": 2, "type": "added", "data": [leaves[1].dict()]}
+        assert [change.seq for change, _ in feed.since("app", 1, limit=1)] \
+            == [2]
+        assert feed.since("app", 3) == []
+        # Older than the retained window, or not published yet
+        assert feed.since("app", 0) is None
+        assert feed.since("app", 4) is None
+        # A change is shared by readers
+        assert feed.since("app", 2)[0] is feed.since("app", 2)[0]
+
+    def test_change_feed_wait(self):
+        feed = MindMapChangeFeed()
+
+        async def wait():
+            assert not await feed.wait("app", 0, timeout=0.01)
+            waiters = [
+                asyncio.ensure_future(feed.wait("app", 0, timeout=5))
+                for _ in range(3)]
+            await asyncio.sleep(0)
+            thread = threading.Thread(
+                target=feed.publish, args=("app", "added", []))
+            thread.start()
+            assert await asyncio.gather(*waiters) == [True] * 3
+            thread.join()
+            assert await feed.wait("app", 0, timeout=5)
+            assert not feed._waiters
+
+        asyncio.run(wait())
+
+    def test_changes_provider(self):
+        feed = MindMapChangeFeed(retain=2)
+        provider = MindMapChangesDBProvider(
+            db_provider=MindMapIndexedDBProvider(data=self.sample),
+            feed=feed)
+        leaf = MindMapLeaf(path="a/b", text="c")
+
+        changes = provider.read_mind_map_changes(id="fake-app-0")
+        assert (changes.seq, changes.resync) == (0, True)
+        assert changes.data == MindMapApp(**self.sample[0]).data
+        assert provider.read_mind_map_changes(id="fake-app-0", since=0) == \
+            MindMapChanges(id="fake-app-0")
+
+        provider.add_mind_map_leaf(id="fake-app-0", mind_map_leaf=leaf)
+        provider.add_mind_map_leaves(
+            id="fake-app-0", mind_map_leaves=[leaf, leaf])
+        changes = provider.read_mind_map_changes(id="fake-app-0", since=1)
+        assert (changes.seq, changes.resync, changes.data) == (2, False, [])
+        assert [(change.seq, change.type, len(change.data))
+                for change in changes.changes] == [(2, "added", 2)]
+
+        # The first change is no longer kept
+        provider.add_mind_map_leaf(id="fake-app-0", mind_map_leaf=leaf)
+        changes = provider.read_mind_map_changes(
+            id="fake-app-0", since=1, limit=1)
+        assert [change.seq for change in changes.changes] == [2]
+        assert changes.seq == 2
+        changes = provider.read_mind_map_changes(id="fake-app-0", since=0)
+        assert (changes.seq, changes.resync, len(changes.data)) == \
+            (3, True, 6)
+
+        provider.create_mind_map_app(mind_map_app=MindMapApp(
+            id="new", data=[leaf]))
+        changes = provider.read_mind_map_changes(id="new", since=0)
+        assert changes.changes == [
+            MindMapChange(seq=1, type="created", data=[leaf])]
+        with pytest.raises(MindMapAppCreateError):
+            provider.create_mind_map_app(mind_map_app=MindMapApp(id="new"))
+        with pytest.raises(MindMapAppAddError):
+            provider.add_mind_map_leaf(id="nope", mind_map_leaf=leaf)
+        assert feed.seq("new") == 1
+        assert feed.seq("nope") == 0
+
+        assert provider.read_mind_map_changes(id="nope") is None
+        assert provider.read_mind_map_changes(id="nope", since=0) is None
+
+    def test_changes_provider_updates(self):
+        provider = MindMapChangesDBProvider(
+            db_provider=MindMapIndexedDBProvider(data=self.sample),
+            feed=MindMapChangeFeed())
+        leaf = MindMapLeaf(path="a/b", text="c")
+
+        provider.upsert_mind_map_leaf(id="fake-app-0", mind_map_leaf=leaf)
+        provider.upsert_mind_map_leaf(id="fake-app-0", mind_map_leaf=leaf)
+        provider.add_mind_map_leaf(id="fake-app-0", mind_map_leaf=leaf)
+        provider.dedup_mind_map_app(id="fake-app-0")
+        provider.delete_mind_map_leaves(id="fake-app-0", path="/a/b")
+        provider.delete_mind_map_leaves(id="fake-app-0", path="/a/b")
+        provider.dedup_mind_map_app(id="fake-app-0")
+        changes = provider.read_mind_map_changes(id="fake-app-0", since=0)
+        assert [(change.type, change.data) for change in changes.changes] == [
+            ("upserted", [leaf]),
+            ("upserted", [leaf]),
+            ("added", [leaf]),
+            ("deduped", []),
+            ("deleted", [MindMapLeaf(path="/a/b")])]
+
+    def test_changes_default(self):
+        provider = MindMapDBProvider()
+        provider.db = copy.deepcopy(self.sample)
+        changes = provider.read_mind_map_changes(id="fake-app-0", since=3)
+        assert changes == MindMapChanges(
+            id="fake-app-0",
+            resync=True,
+            data=MindMapApp(**self.sample[0]).data)
+        assert provider.read_mind_map_changes(id="nope") is None
+
+
+def brute_force_stats(leaves):
+    """Stats of all branches, from leaf paths and versions."""
+    stats = {(): [0, 0, 0]}
+    for path, version in leaves:
+        segments = tuple(split_path(path))
+        for level in range(len(segments) + 1):
+            branch = stats.setdefault(segments[:level], [0, 0, 0])
+            branch[0] += 1
+            branch[1] = max(branch[1], len(segments) - level)
+            branch[2] = max(branch[2], version)
+    return {key: tuple(value) for key, value in stats.items()}
+
+
+def flatten_stats(node, segments=()):
+    """Stats of all branches of a MindMapBranchStats."""
+    assert node.has_children == (node.max_depth > 0)
+    assert node.path == "/".join(segments)
+    stats = {segments: (node.leaves, node.max_depth, node.version)}
+    for child in node.children:
+        stats.update(flatten_stats(child, segments + (child.name,)))
+    return stats
+
+
+def flatten_tree(node):
+    """Texts of all branches of a MindMapTreeNode."""
+    texts = {node.path: node.texts}
+    for child in node.children:
+        texts.update(flatten_tree(child))
+    return texts
+
+
+class TestMindMapBranchStats:
+    paths = ["a/b/c", "a/b", "/a/d", "a", "x/y/z/w", "", None, "/",
+             "a//b", "x/", "a/b/c"]
+
+    @pytest.fixture(params=["memory", "compact", "sqlite", "log"])
+    def provider(self, request, tmp_path):
+        provider = get_db_provider(settings=Settings(
+            db_provider=request.param,
+            db_path=str(tmp_path / "mind_map.db"),
+            db_log_path=str(tmp_path / "log")))
+        yield provider
+        provider.close()
+
+    def write(self, provider, seed=0):
+        """Write random leaves, return their paths and versions."""
+        rng = random.Random(seed)
+        provider.create_mind_map_app(mind_map_app=MindMapApp(
+            id="stats", data=[{"path": "a/b", "text": "0"}]))
+        leaves = [("a/b", provider.read_mind_map_app_version(id="stats"))]
+        for i in range(60):
+            paths = [rng.choice(self.paths) for _ in range(rng.randint(1, 3))]
+            if len(paths) == 1:
+                provider.add_mind_map_leaf(
+                    id="stats", mind_map_leaf=MindMapLeaf(path=paths[0]))
+            else:
+                provider.add_mind_map_leaves(
+                    id="stats",
+                    mind_map_leaves=[MindMapLeaf(path=path) for path in paths])
+            version = provider.read_mind_map_app_version(id="stats")
+            leaves.extend((path, version) for path in paths)
+        return leaves
+
+    def test_same_as_brute_force(self, provider):
+        leaves = self.write(provider)
+        expected = brute_force_stats(leaves)
+        assert flatten_stats(provider.read_mind_map_stats(id="stats")) == \
+            expected
+
+        for prefix, depth in [("", 0), ("", 1), ("a", None), ("/a/b", 1),
+                              ("x/y", 0), ("a/", None), ("/", None)]:
+            segments = tuple(split_path(prefix))
+            stats = provider.read_mind_map_stats(
+                id="stats", prefix=prefix, depth=depth)
+            if segments not in expected:
+                assert stats is None
+                continue
+            assert flatten_stats(stats, segments) == {
+                key: value for key, value in expected.items()
+                if key[:len(segments)] == segments and (
+                    depth is None or len(key) <= len(segments) + depth)}
+
+        assert provider.read_mind_map_stats(id="stats", prefix="nope") is None
+        assert provider.read_mind_map_stats(id="nope") is None
+
+    def test_read_without_leaves(self, tmp_path):
+        provider = MindMapIndexedDBProvider(data=[])
+        expected = self.write(provider)
+        unscanned(provider)
+        # Stats are kept by the path trie
+        assert flatten_stats(provider.read_mind_map_stats(id="stats")) == \
+            brute_force_stats(expected)
+
+        path = str(tmp_path / "mind_map.db")
+        sqlite = MindMapSQLiteDBProvider(path=path)
+        self.write(sqlite)
+        stats = sqlite.read_mind_map_stats(id="stats", depth=2)
+        with sqlite3.connect(path) as conn:
+            conn.execute("DELETE FROM leaves")
+        # And by the branches table
+        assert sqlite.read_mind_map_stats(id="stats", depth=2) == stats
+        sqlite.close()
+
+    def test_empty_app(self, provider):
+        provider.create_mind_map_app(mind_map_app=MindMapApp(id="empty"))
+        version = provider.read_mind_map_app_version(id="empty")
+        assert provider.read_mind_map_stats(id="empty") == \
+            MindMapBranchStats(version=version)
+
+    def test_default(self):
+        provider = MindMapDBProvider()
+        provider.db = []
+        leaves = self.write(provider)
+        stats = flatten_stats(provider.read_mind_map_stats(id="stats"))
+        version = provider.read_mind_map_app_version(id="stats")
+        assert stats == {
+            key: (count, max_depth, version)
+            for key, (count, max_depth, _)
+            in brute_force_stats(leaves).items()}
+
+    def test_sqlite_migration(self, tmp_path):
+        path = str(tmp_path / "mind_map.db")
+        provider = MindMapSQLiteDBProvider(path=path)
+        self.write(provider)
+        expected = flatten_stats(provider.read_mind_map_stats(id="stats"))
+        provider.close()
+        with sqlite3.connect(path) as conn:
+            conn.execute("DELETE FROM branches")
+
+        provider = MindMapSQLiteDBProvider(path=path)
+        version = provider.read_mind_map_app_version(id="stats")
+        assert flatten_stats(provider.read_mind_map_stats(id="stats")) == {
+            key: (count, max_depth, version)
+            for key, (count, max_depth, _) in expected.items()}
+        provider.close()
+
+
+class TestMindMapUpdates:
+    paths = ["a/b", "/a/b", "a/b/c", "a", "x/y/z", "", None, "/", "a//b"]
+
+    @pytest.fixture(params=["memory", "compact", "sqlite", "log"])
+    def settings(self, request, tmp_path):
+        return Settings(
+            db_provider=request.param,
+            db_path=str(tmp_path / "mind_map.db"),
+            db_log_path=str(tmp_path / "log"))
+
+    @pytest.fixture
+    def provider(self, settings):
+        provider = get_db_provider(settings=settings)
+        yield provider
+        provider.close()
+
+    @staticmethod
+    def leaves(provider, id="app"):
+        return [(leaf["path"], leaf["text"])
+                for leaf in provider.dump_mind_map_app(id=id)["data"]]
+
+    def test_upsert_and_delete(self, provider):
+        provider.create_mind_map_app(mind_map_app=MindMapApp(id="app", data=[
+            {"path": "a/b", "text": "1"},
+            {"path": "c", "text": "2"},
+            {"path": "/a/b", "text": "3"}]))
+
+        summary = provider.upsert_mind_map_leaf(
+            id="app", mind_map_leaf=MindMapLeaf(path="a/b/", text="4"))
+        assert summary.dict() == {
+            "id": "app", "added": 1, "removed": 0, "total": 4}
+        version = provider.read_mind_map_app_version(id="app")
+        summary = provider.upsert_mind_map_leaf(
+            id="app", mind_map_leaf=MindMapLeaf(path="a/b", text="5"))
+        assert summary.dict() == {
+            "id": "app", "added": 1, "removed": 2, "total": 3}
+        assert self.leaves(provider) == [
+            ("c", "2"), ("a/b/", "4"), ("a/b", "5")]
+        assert provider.read_mind_map_app_version(id="app") > version
+
+        summary = provider.delete_mind_map_leaves(id="app", path="/c")
+        assert (summary.removed, summary.total) == (1, 2)
+        version = provider.read_mind_map_app_version(id="app")
+        summary = provider.delete_mind_map_leaves(id="app", path="c")
+        assert (summary.removed, summary.total) == (0, 2)
+        assert provider.read_mind_map_app_version(id="app") == version
+        assert provider.count_mind_map_apps().leaves == \
+            sum(len(app["data"]) for app in provider.dump_mind_map_apps())
+
+        for call in (
+                lambda: provider.upsert_mind_map_leaf(
+                    id="nope", mind_map_leaf=MindMapLeaf(path="a")),
+                lambda: provider.delete_mind_map_leaves(id="nope", path="a"),
+                lambda: provider.dedup_mind_map_app(id="nope")):
+            with pytest.raises(MindMapAppUpdateError):
+                call()
+
+    def test_same_as_list_provider(self, settings, provider):
+        expected = MindMapDBProvider()
+        expected.db = []
+        rng = random.Random(0)
+        for target in (provider, expected):
+            target.create_mind_map_app(mind_map_app=MindMapApp(
+                id="app", data=[{"path": "a/b", "text": "t0"}]))
+        for i in range(1, 200):
+            leaf = MindMapLeaf(path=rng.choice(self.paths), text=f"t{i}")
+            op = rng.choice(["add", "add", "upsert", "delete", "dedup"])
+            summaries = []
+            for target in (provider, expected):
+                if op == "add":
+                    target.add_mind_map_leaf(id="app", mind_map_leaf=leaf)
+                elif op == "upsert":
+                    summaries.append(target.upsert_mind_map_leaf(
+                        id="app", mind_map_leaf=leaf))
+                elif op == "delete":
+                    summaries.append(target.delete_mind_map_leaves(
+                        id="app", path=leaf.path))
+                else:
+                    summaries.append(target.dedup_mind_map_app(id="app"))
+            assert summaries[:1] == summaries[1:]
+
+        leaves = self.leaves(provider)
+        assert leaves == self.leaves(expected)
+        stats = flatten_stats(provider.read_mind_map_stats(id="app"))
+        assert {key: value[:2] for key, value in stats.items()} == {
+            key: value[:2] for key, value in brute_force_stats(
+                (path, 0) for path, _ in leaves).items()}
+        assert stats[()][2] == provider.read_mind_map_app_version(id="app")
+        # Branches keep their place when their first leaf is removed
+        assert flatten_tree(provider.read_mind_map_tree(id="app")) == \
+            flatten_tree(expected.read_mind_map_tree(id="app"))
+
+        texts = {text for _, text in leaves}
+        for i in range(200):
+            hits = provider.search_mind_map_leaves(query=f"t{i}", id="app")
+            assert [hit.text for hit in hits] == (
+                [f"t{i}"] if f"t{i}" in texts else [])
+
+        # Updates are kept by a restart
+        if settings.db_provider in ("sqlite", "log"):
+            provider.close()
+            restarted = get_db_provider(settings=settings)
+            assert self.leaves(restarted) == leaves
+            # Versions are those of the restart, e.g. from a snapshot
+            restarted_stats = flatten_stats(
+                restarted.read_mind_map_stats(id="app"))
+            assert {key: value[:2] for key, value in restarted_stats.items()} \
+                == {key: value[:2] for key, value in stats.items()}
+            restarted.close()
+
+    def test_interface_defaults(self):
+        class AppendOnlyProvider(MindMapAppDBInterface):
+            """A provider with only the methods it must implement."""
+
+            def __init__(self):
+                self.apps = {}
+
+            def read_mind_map_apps(self):
+                return list(self.apps.values())
+
+            def read_mind_map_app(self, id):
+                return self.apps.get(id)
+
+            def create_mind_map_app(self, mind_map_app):
+                self.apps[mind_map_app.id] = mind_map_app.copy(deep=True)
+                return mind_map_app
+
+            def add_mind_map_leaf(self, id, mind_map_leaf):
+                self.apps[id].data.append(mind_map_leaf)
+                return self.apps[id]
+
+            def read_mind_map_apps_version(self):
+                return 0
+
+        provider = AppendOnlyProvider()
+        provider.create_mind_map_app(mind_map_app=MindMapApp(id="app", data=[
+            {"path": "a/b", "text": "1"}, {"path": "c", "text": "2"}]))
+        summary = provider.upsert_mind_map_leaf(
+            id="app", mind_map_leaf=MindMapLeaf(path="d", text="3"))
+        assert summary.dict() == {
+            "id": "app", "added": 1, "removed": 0, "total": 3}
+        assert provider.delete_mind_map_leaves(id="app", path="x").removed \
+            == 0
+        assert provider.dedup_mind_map_app(id="app").removed == 0
+        # Removals need a provider able to replace the leaves
+        with pytest.raises(NotImplementedError):
+            provider.delete_mind_map_leaves(id="app", path="c")
+        with pytest.raises(MindMapAppUpdateError):
+            provider.dedup_mind_map_app(id="nope")
+
+        provider.replace_mind_map_leaves = lambda id, mind_map_leaves: \
+            provider.apps[id].copy(update={"data": mind_map_leaves})
+        summary = provider.upsert_mind_map_leaf(
+            id="app", mind_map_leaf=MindMapLeaf(path="/a/b", text="4"))
+        assert summary.dict() == {
+            "id": "app", "added": 1, "removed": 1, "total": 3}
+
+    def test_path_index(self):
+        provider = MindMapIndexedDBProvider(data=[{"id": "app", "data": [
+            {"path": f"a/{i}", "text": str(i)} for i in range(100)]}])
+        # The path index is built by the first update
+        provider.dedup_mind_map_app(id="app")
+        unscanned(provider)
+        for i in range(0, 100, 10):
+            provider.upsert_mind_map_leaf(
+                id="app", mind_map_leaf=MindMapLeaf(path=f"/a/{i}"))
+        summary = provider.delete_mind_map_leaves(id="app", path="a/1")
+        assert (summary.removed, summary.total) == (1, 99)
+
+    def test_dedup(self, provider):
+        rng = random.Random(1)
+        data = [{"path": rng.choice(self.paths), "text": str(i)}
+                for i in range(50)]
+        provider.create_mind_map_app(
+            mind_map_app=MindMapApp(id="app", data=data))
+        upserted = MindMapIndexedDBProvider(data=[{"id": "app"}])
+        for leaf in data:
+            upserted.upsert_mind_map_leaf(
+                id="app", mind_map_leaf=MindMapLeaf(**leaf))
+
+        summary = provider.dedup_mind_map_app(id="app")
+        assert self.leaves(provider) == self.leaves(upserted)
+        assert (summary.removed, summary.total) == (
+            50 - len({norm_path(leaf["path"]) for leaf in data}),
+            len(self.leaves(upserted)))
+        assert provider.dedup_mind_map_app(id="app").removed == 0
+
+    def test_snapshot_reads(self):
+        provider = MindMapIndexedDBProvider(data=[{"id": "app", "data": [
+            {"path": "a", "text": "1"}, {"path": "b", "text": "2"}]}])
+        snapshot = provider._snapshot(ids=["app"])
+        provider.delete_mind_map_leaves(id="app", path="a")
+        provider.upsert_mind_map_leaf(
+            id="app", mind_map_leaf=MindMapLeaf(path="b", text="3"))
+
+        record, size, version = snapshot[0]
+        assert record.dump(size, version)["data"] == [
+            {"path": "a", "text": "1"}, {"path": "b", "text": "2"}]
+        assert record.count(version) == 2
+        assert provider.dump_mind_map_app(id="app")["data"] == [
+            {"path": "b", "text": "3"}]
+        assert record.count() == 1
+
+    @pytest.mark.parametrize(
+        "provider_class", [MindMapIndexedDBProvider, MindMapCompactDBProvider])
+    def test_rebuild(self, provider_class):
+        provider = provider_class(data=[{"id": "app", "data": [
+            {"path": "kept", "text": "kept"}]}])
+        snapshot = provider._snapshot(ids=["app"])
+        for i in range(1000):
+            provider.upsert_mind_map_leaf(
+                id="app", mind_map_leaf=MindMapLeaf(path="a", text=f"t{i}"))
+
+        # Removed leaves are reclaimed once they are the majority
+        record = provider._apps["app"]
+        assert record is not snapshot[0][0]
+        assert record.size() <= 4
+        assert len(record.removed) <= record.size() // 2
+        assert provider.dump_mind_map_app(id="app")["data"] == [
+            {"path": "kept", "text": "kept"}, {"path": "a", "text": "t999"}]
+        assert provider._search.leaves == 2
+        assert len(provider._search._removed) <= 1
+        assert sorted(hit.text for hit in provider.search_mind_map_leaves(
+            query="t999 t998 kept")) == ["kept", "t999"]
+        assert provider.count_mind_map_apps().leaves == 2
+
+        # A snapshot before the rebuild still reads its version
+        old, size, version = snapshot[0]
+        assert old.dump(size, version)["data"] == [
+            {"path": "kept", "text": "kept"}]
+        # And a read of an older version reads the rebuilt record again
+        record.rebuilt = provider._version + 1
+        provider._version += 1
+        assert provider._snapshot(ids=["app"])[0][0] is record
+
+
+class TestMindMapIndexes:
+
+    def test_split_path(self):
+        assert split_path("/this/is/a/path/1") == [
+            "this", "is", "a", "path", "1"]
+        assert split_path("i/like/potatoes") == ["i", "like", "potatoes"]
+        assert split_path("") == []
+        assert split_path(None) == []
+
+    def test_path_trie(self):
+        trie = MindMapPathTrie()
+        trie.add(path="i/like/potatoes", text="Because reasons")
+        trie.add(path="/i/like/apples", text="Because")
+        trie.add(path="i/like", text="Everything")
+
+        tree = trie.read(prefix="i/like")
+        assert tree.texts == ["Everything"]
+        assert [child.path for child in tree.children] == [
+            "i/like/potatoes", "i/like/apples"]
+        assert tree.children[0].texts == ["Because reasons"]
+        assert trie.read(prefix="i", depth=0).children == []
+        assert trie.read(prefix="i", depth=0).has_children
+        assert trie.read(prefix="i/hate") is None
+        assert trie.read().name == ""
+
+    def test_path_trie_remove(self):
+        trie = MindMapPathTrie()
+        trie.add(path="i/like/potatoes", text="Because reasons", version=1)
+        trie.add(path="i/like", text="Everything", version=2)
+        trie.add(path="i/like", text="Everything", version=3)
+
+        trie.remove(path="/i/like/potatoes", text="Because reasons", version=4)
+        stats = trie.stats(prefix="i")
+        assert (stats.leaves, stats.max_depth, stats.version) == (2, 1, 4)
+        assert trie.read(prefix="i/like/potatoes") is None
+        assert not trie.read(prefix="i/like").has_children
+
+        trie.remove(path="i/like", text="Everything", version=5)
+        trie.remove(path="i/like", text="unknown", version=6)
+        trie.remove(path="i/hate", text="Everything", version=6)
+        assert trie.read(prefix="i/like").texts == ["Everything"]
+        trie.remove(path="i/like", text="Everything", version=7)
+        assert trie.read(prefix="i") is None
+        assert (trie.root.leaves, trie.root.max_depth) == (0, 0)
+
+    def test_tokenize(self):
+        assert tokenize("/This/is/a/path_1") == ["this", "is", "a", "path_1"]
+        assert tokenize("Because, fake reasons!") == [
+            "because", "fake", "reasons"]
+        assert tokenize(None) == []
+
+    def test_inverted_index(self):
+        index = MindMapInvertedIndex()
+        index.add("a", 0, "fruits/apple", "An apple a day")
+        index.add("a", 1, "fruits/pear", "Pears")
+        index.add("b", 0, "vegetables/potato", "Potatoes, not apples")
+        index.add("b", 1, None, None)
+
+        assert index.search("apple") == [
+            (index.search("apple")[0][0], "a", 0)]
+        assert [hit[1:] for hit in index.search("apple fruits")] == [
+            ("a", 0), ("a", 1)]
+        assert [hit[1:] for hit in index.search("fruits", id="a")] == [
+            ("a", 0), ("a", 1)]
+        assert index.search("fruits", id="b") == []
+        assert index.search("fruits", limit=1)[0][1:] == ("a", 0)
+        assert index.search("unknown words") == []
+        assert index.search("") == []
+
+    def test_inverted_index_remove(self):
+        index = MindMapInvertedIndex()
+        index.add("a", 0, "fruits/apple", "An apple a day")
+        index.add("a", 1, "fruits/pear", "Pears")
+        index.remove("a", 0, "fruits/apple", "An apple a day")
+
+        assert index.search("apple") == []
+        assert [hit[1:] for hit in index.search("fruits", limit=1)] == [
+            ("a", 1)]
+        assert index.leaves == 1
+        index.add("a", 2, "fruits/apple", None)
+        assert [hit[1:] for hit in index.search("apple")] == [("a", 2)]
+
+    def test_inverted_index_drop(self):
+        index = MindMapInvertedIndex()
+        leaves = [("fruits/apple", "An apple"), ("fruits/pear", None)]
+        for position, (path, text) in enumerate(leaves):
+            index.add("a", position, path, text)
+        index.add("b", 0, "fruits", None)
+        index.remove("a", 0, *leaves[0])
+
+        index.drop("a", leaves)
+        assert index.leaves == 1
+        assert [hit[1:] for hit in index.search("fruits apple pear")] == [
+            ("b", 0)]
+        assert "apple" not in index._postings
+        assert "a" not in index._removed
+
+    def test_inverted_index_rare_words_first(self):
+        index = MindMapInvertedIndex()
+        for i in range(10):
+            index.add("a", i, "common", f"leaf {i}")
+        index.add("a", 10, "rare", None)
+        index.add("a", 11, "common", None)
+        assert index.search("common rare")[0][1:] == ("a", 10)
+
+
+class TestMindMapColumns:
+    leaves = [
+        {"path": "this/is/a/path/1", "text": "a"},
+        {"path": "/this/is/a/path/2", "text": None},
+        {"path": None, "text": "b"},
+        {"path": "", "text": ""},
+        {"path": "a//b/", "text": "c"},
+        {"path": "été/是", "text": "d"},
+    ]
+
+    def test_segment_table(self):
+        table = MindMapSegmentTable()
+        ids = table.encode("this/is/a/path")
+        assert table.encode("/this/is/b") == [len(table) - 2] + ids[:2] + [
+            len(table) - 1]
+        assert table.decode(ids) == "this/is/a/path"
+        assert len(table) == 6
+
+    def test_leaf_columns(self):
+        columns = MindMapLeafColumns(
+            table=MindMapSegmentTable(), leaves=self.leaves[:3])
+        columns.extend(self.leaves[3:])
+        assert len(columns) == len(self.leaves)
+        assert list(columns) == self.leaves
+        assert columns[0] == self.leaves[0]
+        assert columns[-1] == self.leaves[-1]
+        assert columns[1:3] == self.leaves[1:3]
+        assert columns[:100] == self.leaves
+        with pytest.raises(IndexError):
+            columns[len(self.leaves)]
+
+    def test_leaf_columns_share_segments(self):
+        table = MindMapSegmentTable()
+        MindMapLeafColumns(table=table, leaves=self.leaves)
+        size = len(table)
+        MindMapLeafColumns(table=table, leaves=self.leaves)
+        assert len(table) == size
+
+    def test_same_behavior_as_indexed_provider(self):
+        sample = TestMindMapIndexedProviders.sample
+        indexed_provider = MindMapIndexedDBProvider(data=sample)
+        compact_provider = MindMapCompactDBProvider(data=sample)
+
+        for provider in (indexed_provider, compact_provider):
+            provider.create_mind_map_app(mind_map_app=MindMapApp(
+                id="new", data=[MindMapLeaf(**leaf) for leaf in self.leaves]))
+            provider.add_mind_map_leaf(
+                id="fake-app-0",
+                mind_map_leaf=MindMapLeaf(path="d/e", text="f"))
+            provider.add_mind_map_leaves(
+                id="new", mind_map_leaves=[MindMapLeaf(path="x/y")])
+            with pytest.raises(MindMapAppAddError):
+                provider.add_mind_map_leaf(
+                    id="foo", mind_map_leaf=MindMapLeaf())
+
+        assert compact_provider.read_mind_map_apps() == \
+            indexed_provider.read_mind_map_apps()
+        assert compact_provider.dump_mind_map_apps() == \
+            indexed_provider.dump_mind_map_apps()
+        assert compact_provider.dump_mind_map_apps_page(
+            limit=1, after="fake-app-1") == \
+            indexed_provider.dump_mind_map_apps_page(
+                limit=1, after="fake-app-1")
+        assert compact_provider.read_mind_map_tree(id="new", prefix="a") == \
+            indexed_provider.read_mind_map_tree(id="new", prefix="a")
+
+
+class TestMindMapCaches:
+
+    def test_lru_cache(self):
+        cache = LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+        assert cache.stats() == {
+            "size": 2,
+            "max_size": 2,
+            "bytes": 0,
+            "max_bytes": 0,
+            "hits": 3,
+            "misses": 1,
+            "evictions": 1,
+        }
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_lru_cache_bytes(self):
+        cache = LRUCache(max_size=10, max_bytes=10)
+        cache.set("a", 1, size=4)
+        cache.set("b", 2, size=4)
+        cache.set("a", 3, size=5)
+        assert cache.bytes == 9
+        cache.set("c", 4, size=4)
+        assert cache.get("b") is None
+        assert (len(cache), cache.bytes, cache.evictions) == (2, 9, 1)
+        cache.delete("a")
+        cache.delete("a")
+        assert (len(cache), cache.bytes) == (1, 4)
+        cache.set("d", 5, size=11)
+        assert (len(cache), cache.bytes, cache.evictions) == (1, 4, 1)
+        assert cache.get("d") is None and cache.get("c") == 4
+
+    def test_lru_cache_entry_too_big(self):
+        cache = LRUCache(max_size=10, max_bytes=100)
+        for i in range(5):
+            cache.set(i, i, size=10)
+        cache.set("big", "big", size=500)
+        assert (len(cache), cache.bytes, cache.evictions) == (5, 50, 0)
+        assert cache.get("big") is None
+
+        # A previous entry of the key is dropped
+        cache.set(0, "big", size=500)
+        assert (len(cache), cache.bytes) == (4, 40)
+        assert cache.get(0) is None
+
+    def test_read_through_cache(self):
+        cache = ReadThroughCache(max_size=2)
+        loads = []
+
+        def load(value):
+            loads.append(value)
+            return value
+
+        assert cache.get("a", lambda: load(1)) == 1
+        assert cache.get("a", lambda: load(2)) == 1
+        assert cache.get("b", lambda: load(None)) is None
+        assert cache.get("b", lambda: load(3)) == 3
+        assert loads == [1, None, 3]
+        cache.invalidate("a", "c")
+        assert cache.get("a", lambda: load(4)) == 4
+
+        def fail():
+            raise ValueError("load")
+
+        with pytest.raises(ValueError):
+            cache.get("e", fail)
+        assert cache.get("e", lambda: load(5)) == 5
+
+    def test_read_through_cache_invalidate_running_load(self):
+        cache = ReadThroughCache()
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def load():
+            started.set()
+            release.wait(5)
+            return "outdated"
+
+        thread = threading.Thread(
+            target=lambda: results.append(cache.get("a", load)))
+        thread.start()
+        started.wait(5)
+        cache.invalidate("a")
+        release.set()
+        thread.join()
+        assert results == ["outdated"]
+        assert cache.get("a", lambda: "fresh") == "fresh"
+
+
+class TestMindMapMetrics:
+
+    def test_histogram(self):
+        histogram = MindMapHistogram(
+            "seconds", "Durations.", labels=("method",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, "get")
+        histogram.observe(0.1, "get")
+        histogram.observe(0.5, "get")
+        histogram.observe(2.0, "get")
+        assert histogram.render() == (
+            '# HELP seconds Durations.\n'
+            '# TYPE seconds histogram\n'
+            'seconds_bucket{method="get",le="0.1"} 2\n'
+            'seconds_bucket{method="get",le="1"} 3\n'
+            'seconds_bucket{method="get",le="+Inf"} 4\n'
+            'seconds_sum{method="get"} 2.65\n'
+            'seconds_count{method="get"} 4\n')
+
+    def test_counter_and_gauge(self):
+        registry = MindMapMetricsRegistry()
+        counter = registry.register(
+            MindMapCounter("errors_total", "Errors.", labels=("name",)))
+        gauge = registry.register(MindMapGauge("size", "Size."))
+        counter.inc('a"b\\c')
+        counter.inc('a"b\\c', amount=2)
+        gauge.set(3)
+        gauge.set(1.5)
+        assert registry.render() == (
+            '# HELP errors_total Errors.\n'
+            '# TYPE errors_total counter\n'
+            'errors_total{name="a\\"b\\\\c"} 3\n'
+            '# HELP size Size.\n'
+            '# TYPE size gauge\n'
+            'size 1.5\n')
+
+    def test_profile_requested(self):
+        def scope(headers=(), query=b""):
+            return {"headers": list(headers), "query_string": query}
+
+        assert profile_requested(scope([(b"x-profile", b"1")]))
+        assert not profile_requested(scope([(b"x-profile", b"0")]))
+        assert profile_requested(scope(query=b"a=b&profile=true"))
+        assert not profile_requested(scope(query=b"profile=0"))
+        assert not profile_requested(scope(query=b"profiles=1"))
+        assert not profile_requested(scope())
+
+    def test_timed_provider(self):
+        histogram = MindMapHistogram("seconds", "", labels=("method",))
+        errors = MindMapCounter("errors", "", labels=("method",))
+        db_provider = MindMapTimedDBProvider(
+            db_provider=MindMapIndexedDBProvider(
+                data=[{"id": "a", "data": []}]),
+            histogram=histogram,
+            errors=errors)
+        assert db_provider.read_mind_map_app(id="a") == MindMapApp(id="a")
+        assert list(db_provider.iter_mind_map_apps()) == [MindMapApp(id="a")]
+        with pytest.raises(MindMapAppAddError):
+            db_provider.add_mind_map_leaf(
+                id="foo", mind_map_leaf=MindMapLeaf())
+        assert histogram.render().count("_count") == 3
+        assert 'seconds_count{method="read_mind_map_app"} 1' in \
+            histogram.render()
+        assert 'seconds_count{method="read_mind_map_apps_page"} 1' in \
+            histogram.render()
+        assert 'errors{method="add_mind_map_leaf"} 1' in errors.render()
+
+    def test_forwarded_methods(self):
+        backend = MindMapIndexedDBProvider(data=[{"id": "a", "data": []}])
+        db_provider = CountingDBProvider(db_provider=backend)
+        for method in STORE_METHODS:
+            forwarded = getattr(MindMapTimedDBProvider, method)
+            interface = getattr(MindMapAppDBInterface, method)
+            assert forwarded.__doc__ == interface.__doc__
+            assert inspect.signature(forwarded) == \
+                inspect.signature(interface)
+        # Positional arguments are passed by name
+        assert db_provider.read_mind_map_app("a") == MindMapApp(id="a")
+        assert db_provider.read_mind_map_tree("a", "", 1).name == ""
+        assert db_provider.calls == ["read_mind_map_app", "read_mind_map_tree"]
+
+        async def run():
+            async_provider = MindMapAsyncDBProvider(db_provider=db_provider)
+            try:
+                return await async_provider.read_mind_map_app("a")
+            finally:
+                async_provider.close()
+
+        assert inspect.iscoroutinefunction(
+            MindMapAsyncDBProvider.read_mind_map_app)
+        assert asyncio.run(run()) == MindMapApp(id="a")
+        assert db_provider.calls[-1] == "read_mind_map_app"
+
+    def test_metrics_middleware(self):
+        histogram = MindMapHistogram(
+            "seconds", "", labels=("method", "route", "status"))
+        route = next(
+            route for route in app.routes if route.path == "/apps/{app_id}")
+
+        async def endpoint(scope, receive, send):
+            if scope["path"] == "/error":
+                raise ValueError(scope["path"])
+            await send({"type": "http.response.start", "status": 200})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def nothing(message):
+            pass
+
+        async def run():
+            middleware = MindMapMetricsMiddleware(endpoint, histogram)
+            for i in range(10):
+                await middleware({
+                    "type": "http", "method": "GET", "app": app,
+                    "path": f"/apps/{i}", "endpoint": route.endpoint,
+                }, None, nothing)
+            await middleware(
+                {"type": "http", "method": "GET", "path": "/nowhere"},
+                None, nothing)
+            with pytest.raises(ValueError):
+                await middleware(
+                    {"type": "http", "method": "GET", "path": "/error"},
+                    None, nothing)
+            await middleware({"type": "lifespan", "path": ""}, None, nothing)
+
+        asyncio.run(run())
+        # Labels are bounded by routes, not URLs
+        text = histogram.render()
+        assert text.count("_count") == 3
+        assert 'seconds_count{method="GET",route="/apps/{app_id}",' \
+               'status="200"} 10' in text
+        assert 'route="unmatched",status="200"} 1' in text
+        assert 'route="unmatched",status="500"} 1' in text
+
+    def test_count_mind_map_apps(self, tmp_path):
+        sample = [
+            {"id": "a", "data": [{"path": "x", "text": "y"}] * 3},
+            {"id": "b", "data": []},
+        ]
+        default = MindMapDBProvider()
+        default.db = copy.deepcopy(sample)
+        sqlite = MindMapSQLiteDBProvider(path=str(tmp_path / "db.sqlite"))
+        for item in sample:
+            sqlite.create_mind_map_app(mind_map_app=MindMapApp(**item))
+        for db_provider in (
+                default,
+                MindMapIndexedDBProvider(data=sample),
+                MindMapCompactDBProvider(data=sample),
+                sqlite):
+            assert db_provider.count_mind_map_apps() == \
+                MindMapAppsCount(apps=2, leaves=3)
+        sqlite.close()
+
+
+class TestMindMapResponses:
+
+    def test_json_response(self):
+        content = [{"id": "é", "data": [{"path": None, "text": "a"}]}]
+        assert MindMapJSONResponse(content).body == \
+            JSONResponse(content).body
+
+    def test_json_response_orjson(self, monkeypatch):
+        orjson = pytest.importorskip("orjson")
+        from src import responses
+        monkeypatch.setattr(responses, "orjson", orjson)
+        content = {"id": "a", "data": []}
+        assert json.loads(MindMapJSONResponse(content).body) == content
+
+
+class TestMindMapTransfers:
+    sample = TestMindMapIndexedProviders.sample
+
+    def test_record_reader(self):
+        reader = MindMapRecordReader()
+        assert reader.feed(b'{"type": "app", "id": "a"}\n{"ty') == [
+            (1, {"type": "app", "id": "a"})]
+        assert reader.feed(b'pe": "app", "id": "b"}\n\n') == [
+            (2, {"type": "app", "id": "b"})]
+        assert reader.feed(b'{"type": "app", "id": "c"}') == []
+        assert reader.close() == [(4, {"type": "app", "id": "c"})]
+
+    @pytest.mark.parametrize("chunk", [b"{not json}\n", b"[1, 2]\n"])
+    def test_record_reader_invalid(self, chunk):
+        reader = MindMapRecordReader()
+        reader.feed(b'{"type": "app", "id": "a"}\n')
+        with pytest.raises(MindMapImportError, match="Line 2"):
+            reader.feed(chunk)
+
+    def test_importer(self):
+        importer = MindMapImporter(chunk_size=2)
+        assert importer.feed({"type": "app", "id": "a"}) == [
+            ("create", MindMapApp(id="a"))]
+        leaves = [MindMapLeaf(path=str(i), text=None) for i in range(3)]
+        operations = []
+        for leaf in leaves:
+            operations += importer.feed(
+                {"type": "leaf", "id": "a", **leaf.dict()})
+        operations += importer.feed({"type": "leaf", "id": "b"})
+        operations += importer.flush()
+
+        assert operations == [
+            ("add", "a", leaves[:2]),
+            ("add", "a", leaves[2:]),
+            ("add", "b", [MindMapLeaf()])]
+        assert (importer.apps, importer.leaves, importer.records) == (1, 4, 5)
+
+    @pytest.mark.parametrize("record", [
+        {"type": "foo", "id": "a"},
+        {"type": "app"},
+        {"type": "leaf", "id": "a", "path": ["not", "a", "path"]}])
+    def test_importer_invalid(self, record):
+        with pytest.raises(MindMapImportError, match="Line 7"):
+            MindMapImporter().feed(record, line=7)
+
+    def test_export_import(self):
+        source = MindMapIndexedDBProvider(data=self.sample)
+        lines = "".join(ExportMindMapApps(db_provider=source)())
+        assert len(lines.splitlines()) == 6
+
+        target = MindMapIndexedDBProvider(data=[])
+        # Chunks do not match lines
+        body = lines.encode()
+        chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+        summary = ImportMindMapApps(db_provider=target, chunk_size=1)(chunks)
+
+        assert target.read_mind_map_apps() == source.read_mind_map_apps()
+        assert (summary.apps, summary.leaves, summary.records) == (2, 4, 6)
+        assert summary.records_per_second > 0
+
+    @pytest.mark.parametrize(
+        "kind", ["list", "indexed", "compact", "sqlite"])
+    def test_dump_mind_map_leaves_page(self, kind, tmp_path):
+        data = [{"path": f"a/{i}", "text": str(i)} for i in range(7)]
+        if kind == "list":
+            provider = MindMapDBProvider()
+            provider.db = [{"id": "a", "data": data}]
+        elif kind == "sqlite":
+            provider = MindMapSQLiteDBProvider(path=str(tmp_path / "a.db"))
+            provider.create_mind_map_app(
+                mind_map_app=MindMapApp(id="a", data=data))
+        else:
+            provider_class = {
+                "indexed": MindMapIndexedDBProvider,
+                "compact": MindMapCompactDBProvider}[kind]
+            provider = provider_class(data=[{"id": "a", "data": data}])
+        provider.delete_mind_map_leaves(id="a", path="a/2")
+
+        leaves = []
+        cursor = None
+        while True:
+            page = provider.dump_mind_map_leaves_page(
+                id="a", limit=3, after=cursor)
+            assert len(page["data"]) <= 3
+            leaves += page["data"]
+            cursor = page["next"]
+            if cursor is None:
+                break
+        assert leaves == provider.dump_mind_map_app(id="a")["data"]
+        assert provider.dump_mind_map_leaves_page(id="foo", limit=3) is None
+        provider.close()
+
+    def test_export_pages(self):
+        source = MindMapIndexedDBProvider(data=self.sample)
+        lines = "".join(ExportMindMapApps(db_provider=source)())
+        # Apps are never read whole
+        source.dump_mind_map_app = source.iter_mind_map_apps = None
+        chunks = list(ExportMindMapApps(db_provider=source)(
+            page_size=1, leaves_page_size=1))
+        assert len(chunks) == 4
+        assert "".join(chunks) == lines
+
+        async def run():
+            db_provider = MindMapAsyncDBProvider(db_provider=source)
+            try:
+                return [chunk async for chunk in AsyncExportMindMapApps(
+                    db_provider=db_provider)(page_size=1, leaves_page_size=1)]
+            finally:
+                db_provider.close()
+
+        assert asyncio.run(run()) == chunks
+
+    def test_import_existing_app(self):
+        provider = MindMapIndexedDBProvider(data=[])
+        chunks = [b'{"type": "app", "id": "a"}\n',
+                  b'{"type": "leaf", "id": "a", "path": "b"}\n',
+                  b'{"type": "app", "id": "a"}\n']
+        with pytest.raises(MindMapAppCreateError):
+            ImportMindMapApps(db_provider=provider)(chunks)
+        assert provider.read_mind_map_app(id="a").data == [
+            MindMapLeaf(path="b")]
+
+
 class TestMindMapApplications:
     DB = MindMapDBProvider()
     sample = [
@@ -210,6 +2130,46 @@ class TestMindMapApplications:
             ]
         }
 
+    def test_apps_read_mind_map_apps_pretty_format_cache(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        cache = LRUCache()
+        read_pretty_format = ReadMindMapAppsPrettyFormat(
+            db_provider=provider, cache=cache)
+
+        apps_tree = read_pretty_format()
+        assert read_pretty_format() is apps_tree
+        assert cache.stats()["hits"] == 1
+
+        provider.add_mind_map_leaf(
+            id="fake-app-0", mind_map_leaf=MindMapLeaf(path="a", text="b"))
+        assert read_pretty_format()[0]["data"][-1] == {
+            "path": ["a"], "text": "b"}
+        assert cache.stats()["misses"] == 2
+
+    def test_apps_iter_mind_map_app_trees(self):
+        provider = MindMapIndexedDBProvider(data=[
+            {"id": f"app-{i}", "data": [
+                {"path": "a/b", "text": "1"},
+                {"path": "/a/b", "text": "2"},
+                {"path": "a/c", "text": "3"}]}
+            for i in range(3)])
+        trees = list(IterMindMapAppTrees(db_provider=provider)(page_size=2))
+        assert [tree["id"] for tree in trees] == ["app-0", "app-1", "app-2"]
+        root = trees[0]["tree"]
+        assert [child.name for child in root.children] == ["a"]
+        assert [child.name for child in root.children[0].children] == [
+            "b", "c"]
+        assert root.children[0].children[0].texts == ["1", "2"]
+
+        trees = list(IterMindMapAppTrees(db_provider=provider)(depth=1))
+        assert trees[0]["tree"].children[0].has_children
+        assert trees[0]["tree"].children[0].children == []
+
+    def test_apps_read_mind_map_apps_pretty_format_unchanged(self):
+        provider = MindMapIndexedDBProvider(data=self.sample)
+        ReadMindMapAppsPrettyFormat(db_provider=provider)()
+        assert provider.dump_mind_map_apps() == self.sample
+
     def test_apps_read_mind_map_apps(self):
         mind_map_apps = ReadMindMapApps(db_provider=self.DB)()
         assert mind_map_apps[0].dict() == {
@@ -237,6 +2197,12 @@ class TestMindMapApplications:
         assert mind_map_app_ok.dict() == self.sample[0]
         assert mind_map_app_none is None
 
+    def test_apps_read_mind_map_app_tree(self):
+        mind_map_tree = ReadMindMapAppTree(db_provider=self.DB)(
+            id="fake-app-1", prefix="fake/i", depth=1)
+        assert mind_map_tree.path == "fake/i"
+        assert [child.name for child in mind_map_tree.children] == ["like"]
+
     def test_apps_create_mind_map_app(self):
         data = {
             "id": "app-3",
@@ -260,6 +2226,146 @@ class TestMindMapApplications:
                 mind_map_app=new_mind_map_app)
 
 
+class SlowMindMapDBProvider(MindMapIndexedDBProvider):
+    """A provider taking time to read the app with id slow."""
+
+    def read_mind_map_app(self, id):
+        if id == "slow":
+            time.sleep(0.5)
+        return super().read_mind_map_app(id=id)
+
+    def dump_mind_map_app(self, id):
+        if id == "slow":
+            time.sleep(0.5)
+        return super().dump_mind_map_app(id=id)
+
+    def read_mind_map_app_version(self, id):
+        if id == "slow":
+            time.sleep(0.5)
+        return super().read_mind_map_app_version(id=id)
+
+
+async def asgi_get(asgi_app, path):
+    """Send a GET request to an ASGI app, in the running event loop."""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(scope, receive, send)
+    return messages[0]["status"]
+
+
+class TestMindMapAsyncApplications:
+    sample = TestMindMapIndexedProviders.sample
+
+    def test_async_applications(self):
+        async def run():
+            db_provider = MindMapAsyncDBProvider(
+                db_provider=MindMapIndexedDBProvider(data=self.sample))
+            apps = await AsyncReadMindMapApps(db_provider=db_provider)()
+            mind_map_app = await AsyncReadMindMapApp(
+                db_provider=db_provider)(id="fake-app-0")
+            created = await AsyncCreateMindMapApp(db_provider=db_provider)(
+                mind_map_app=MindMapApp(id="new"))
+            added = await AsyncAddMindMapLeaf(db_provider=db_provider)(
+                id="new",
+                mind_map_leaf=MindMapLeaf(path="a/b", text="c"))
+            tree = await AsyncReadMindMapAppTree(db_provider=db_provider)(
+                id="new", prefix="a")
+            pretty = await AsyncReadMindMapAppsPrettyFormat(
+                db_provider=db_provider)()
+            trees = [
+                app_tree async for app_tree in AsyncIterMindMapAppTrees(
+                    db_provider=db_provider)(page_size=1)]
+            db_provider.close()
+            return apps, mind_map_app, created, added, tree, pretty, trees
+
+        apps, mind_map_app, created, added, tree, pretty, trees = \
+            asyncio.run(run())
+        assert [app.dict() for app in apps] == self.sample
+        assert mind_map_app.dict() == self.sample[0]
+        assert created.dict() == {"id": "new", "data": []}
+        assert added.data == [MindMapLeaf(path="a/b", text="c")]
+        assert tree.children[0].texts == ["c"]
+        assert pretty[-1]["data"][0]["path"] == ["a", "b"]
+        assert [app_tree["id"] for app_tree in trees] == [
+            app["id"] for app in self.sample] + ["new"]
+        assert trees[-1]["tree"].children[0].children[0].texts == ["c"]
+
+    def test_async_errors(self):
+        db_provider = MindMapAsyncDBProvider(
+            db_provider=MindMapIndexedDBProvider(data=self.sample))
+        with pytest.raises(MindMapAppCreateError):
+            asyncio.run(AsyncCreateMindMapApp(db_provider=db_provider)(
+                mind_map_app=MindMapApp(id="fake-app-0")))
+        with pytest.raises(MindMapAppAddError):
+            asyncio.run(AsyncAddMindMapLeaf(db_provider=db_provider)(
+                id="foo", mind_map_leaf=MindMapLeaf()))
+        db_provider.close()
+
+    def test_slow_call_does_not_block_others(self):
+        async def run():
+            db_provider = MindMapAsyncDBProvider(
+                db_provider=SlowMindMapDBProvider(data=self.sample),
+                max_workers=4)
+            done = []
+
+            async def read(id):
+                await AsyncReadMindMapApp(db_provider=db_provider)(id=id)
+                done.append(id)
+
+            start = time.perf_counter()
+            slow = asyncio.ensure_future(read("slow"))
+            await asyncio.sleep(0)
+            await asyncio.gather(*(read("fake-app-0") for _ in range(20)))
+            elapsed = time.perf_counter() - start
+            await slow
+            db_provider.close()
+            return done, elapsed
+
+        done, elapsed = asyncio.run(run())
+        assert done[-1] == "slow"
+        assert elapsed < 0.4
+
+    def test_slow_request_does_not_block_others(self, monkeypatch):
+        async def run():
+            db_provider = MindMapAsyncDBProvider(
+                db_provider=SlowMindMapDBProvider(data=self.sample))
+            monkeypatch.setattr(main, "ASYNC_DB_PROVIDER", db_provider)
+
+            slow = asyncio.ensure_future(asgi_get(app, "/apps/slow"))
+            await asyncio.sleep(0.05)
+            start = time.perf_counter()
+            statuses = await asyncio.gather(
+                *(asgi_get(app, "/apps/fake-app-0") for _ in range(10)))
+            elapsed = time.perf_counter() - start
+            assert not slow.done()
+            await slow
+            db_provider.close()
+            return statuses, elapsed
+
+        statuses, elapsed = asyncio.run(run())
+        assert statuses == [200] * 10
+        assert elapsed < 0.4
+
+
 class TestMindMapAPI:
     sample = [
         {
@@ -367,3 +2473,488 @@ class TestMindMapAPI:
             },
         )
         assert response.status_code == 400
+
+    def test_read_app_tree(self):
+        response = self.client.get(
+            "/apps/fake-app-0/tree",
+            params={"prefix": "this/is/a", "depth": 1})
+        assert response.status_code == 200
+        assert response.json() == {
+            "name": "a",
+            "path": "this/is/a",
+            "texts": [],
+            "has_children": True,
+            "children": [
+                {
+                    "name": "path",
+                    "path": "this/is/a/path",
+                    "texts": [],
+                    "has_children": True,
+                    "children": [],
+                }
+            ],
+        }
+
+    def test_read_app_tree_not_found(self):
+        response = self.client.get(
+            "/apps/fake-app-0/tree", params={"prefix": "no/such/path"})
+        assert response.status_code == 404
+        response = self.client.get("/apps/fake-app-999/tree")
+        assert response.status_code == 404
+
+    def test_read_app_stats(self):
+        self.client.post("/apps/", json={"id": "stats-app", "data": [
+            {"path": "a/b", "text": "1"}, {"path": "a/c/d", "text": "2"}]})
+        self.client.put("/apps/stats-app", json={"path": "e", "text": "3"})
+        version = DB_PROVIDER.read_mind_map_app_version(id="stats-app")
+
+        response = self.client.get(
+            "/apps/stats-app/stats", params={"depth": 1})
+        assert response.status_code == 200
+        stats = response.json()
+        assert (stats["leaves"], stats["max_depth"], stats["version"]) == \
+            (3, 3, version)
+        assert [(child["path"], child["leaves"], child["max_depth"],
+                 child["has_children"], child["children"])
+                for child in stats["children"]] == [
+            ("a", 2, 2, True, []), ("e", 1, 0, False, [])]
+        response = self.client.get(
+            "/apps/stats-app/stats", params={"prefix": "a/c"})
+        assert response.json()["children"][0]["path"] == "a/c/d"
+
+        # The version is not a date, conditional reads use the ETag
+        assert "last-modified" not in response.headers
+        etag = response.headers["etag"]
+        assert self.client.get(
+            "/apps/stats-app/stats", params={"prefix": "a/c"},
+            headers={"If-None-Match": etag}).status_code == 304
+        self.client.put("/apps/stats-app", json={"path": "f", "text": "4"})
+        response = self.client.get(
+            "/apps/stats-app/stats", params={"prefix": "a/c"},
+            headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+        assert self.client.get(
+            "/apps/stats-app/stats", params={"prefix": "x"}).status_code == 404
+        assert self.client.get("/apps/nope/stats").status_code == 404
+
+    def test_read_apps_page(self):
+        apps = self.client.get("/apps").json()
+        response = self.client.get("/apps", params={"limit": 1})
+        assert response.status_code == 200
+        assert response.json() == apps[:1]
+        assert response.headers["link"] == (
+            '<http://testserver/apps?limit=1&after=fake-app-0>; rel="next"')
+
+        response = self.client.get(
+            "/apps", params={"limit": len(apps), "after": "fake-app-0"})
+        assert response.json() == apps[1:]
+        assert "link" not in response.headers
+        assert self.client.get("/apps", params={"limit": 0}).status_code \
+            == 422
+
+    def test_read_apps_ndjson(self, monkeypatch):
+        apps = self.client.get("/apps").json()
+        response = self.client.get(
+            "/apps", headers={"Accept": "application/x-ndjson"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line) for line in response.iter_lines()] == apps
+
+        response = self.client.get(
+            "/apps",
+            params={"limit": 1, "after": "fake-app-0"},
+            headers={"Accept": "application/x-ndjson"})
+        assert response.text == json.dumps(
+            apps[1], separators=(", ", ": ")) + "\n"
+        assert 'after=fake-app-1' in response.headers["link"]
+
+        # Only the apps of the page are read from the provider
+        read_pages = []
+        read_mind_map_apps_page = main.DB_PROVIDER.read_mind_map_apps_page
+        monkeypatch.setattr(
+            main.DB_PROVIDER, "read_mind_map_apps_page",
+            lambda **kwargs: read_pages.append(kwargs)
+            or read_mind_map_apps_page(**kwargs))
+        response = self.client.get(
+            "/apps",
+            params={"limit": len(apps)},
+            headers={"Accept": "application/x-ndjson"})
+        assert [json.loads(line) for line in response.iter_lines()] == apps
+        assert read_pages == [{"limit": len(apps), "after": None}]
+        assert "link" in response.headers
+
+    def test_read_root_tree(self, monkeypatch):
+        self.client.post("/apps/", json={"id": "tree-<app>", "data": [
+            {"path": "shared/prefix/a", "text": "<a>"},
+            {"path": "shared/prefix/b", "text": "b"}]})
+        response = self.client.get("/")
+        assert response.status_code == 200
+        # Only the first level branches, to expand
+        assert response.text.count(
+            '<details data-app="tree-&lt;app&gt;" data-prefix="shared">') == 1
+        assert 'data-prefix="shared/prefix"' not in response.text
+        assert "&lt;a&gt;" not in response.text
+
+        # A page bigger than the cache limit is streamed again
+        monkeypatch.setattr(main, "RENDER_CHUNK_SIZE", 64)
+        monkeypatch.setattr(main.SETTINGS, "render_cache_page_size", 256)
+        self.client.put("/apps/tree-<app>", json={"path": "c", "text": "c"})
+        stats = self.client.get("/caches").json()["render"]
+        assert self.client.get("/").text.replace("\n", "") == \
+            self.client.get("/").text.replace("\n", "")
+        assert self.client.get("/caches").json()["render"]["misses"] == \
+            stats["misses"] + 2
+
+    def test_read_app_fragment(self):
+        self.client.post("/apps/", json={"id": "fragment-app", "data": [
+            {"path": "shared/prefix/a", "text": "<a>"},
+            {"path": "shared/prefix/a/b", "text": "b"},
+            {"path": "shared/c", "text": "c"}]})
+        response = self.client.get(
+            "/apps/fragment-app/fragment", params={"prefix": "shared"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "text/html; charset=utf-8"
+        assert 'data-prefix="shared/prefix"' in response.text
+        assert '<li class="text">c</li>' in response.text
+        assert "&lt;a&gt;" not in response.text
+
+        text = self.client.get(
+            "/apps/fragment-app/fragment",
+            params={"prefix": "shared/prefix"}).text
+        assert 'data-prefix="shared/prefix/a"' in text
+        text = self.client.get(
+            "/apps/fragment-app/fragment",
+            params={"prefix": "shared/prefix/a"}).text
+        assert '<li class="text">&lt;a&gt;</li>' in text
+        assert '<li class="text">b</li>' in text
+
+        assert self.client.get(
+            "/apps/fragment-app/fragment",
+            params={"prefix": "nope"}).status_code == 404
+        assert self.client.get("/apps/nope/fragment").status_code == 404
+
+    def test_read_root_cache(self):
+        stats = self.client.get("/caches").json()["render"]
+        first = self.client.get("/")
+        second = self.client.get("/")
+        assert first.text == second.text
+        assert self.client.get("/caches").json()["render"]["hits"] >= \
+            stats["hits"] + 1
+
+        self.client.put(
+            "/apps/fake-app-1", json={"path": "cache/me", "text": "cached"})
+        stats = self.client.get("/caches").json()["render"]
+        third = self.client.get("/")
+        assert 'data-app="fake-app-1" data-prefix="cache"' in third.text
+        assert self.client.get("/caches").json()["render"]["misses"] == \
+            stats["misses"] + 1
+
+    def test_add_leaves(self):
+        total = len(DB_PROVIDER.read_mind_map_app(id="fake-app-1").data)
+        response = self.client.post(
+            "/apps/fake-app-1/leaves:batch",
+            json=[
+                {"path": "a/batch/path", "text": "a batch text"},
+                {"path": "a/batch/other", "text": None},
+            ],
+        )
+        assert response.status_code == 200
+        assert response.json() == {
+            "id": "fake-app-1",
+            "added": 2,
+            "total": total + 2,
+            "removed": 0,
+        }
+        assert DB_PROVIDER.read_mind_map_app(id="fake-app-1").data[-1] == \
+            MindMapLeaf(path="a/batch/other", text=None)
+
+    def test_add_leaves_invalid(self):
+        total = len(DB_PROVIDER.read_mind_map_app(id="fake-app-1").data)
+        response = self.client.post(
+            "/apps/fake-app-999/leaves:batch",
+            json=[{"path": "a/new/path", "text": "a new text"}],
+        )
+        assert response.status_code == 400
+        response = self.client.post(
+            "/apps/fake-app-1/leaves:batch",
+            json=[{"path": "a/new/path"}, {"path": {"not": "a path"}}],
+        )
+        assert response.status_code == 422
+        assert len(DB_PROVIDER.read_mind_map_app(id="fake-app-1").data) == \
+            total
+
+    def test_upsert_leaf(self):
+        self.client.post("/apps/", json={"id": "upsert-app", "data": [
+            {"path": "a/b", "text": "1"}, {"path": "c", "text": "2"}]})
+
+        response = self.client.put(
+            "/apps/upsert-app/leaves", json={"path": "/a/b", "text": "3"})
+        assert response.status_code == 200
+        assert response.json() == {
+            "id": "upsert-app", "added": 1, "removed": 1, "total": 2}
+        assert DB_PROVIDER.read_mind_map_app(id="upsert-app").data == [
+            MindMapLeaf(path="c", text="2"),
+            MindMapLeaf(path="/a/b", text="3")]
+
+        response = self.client.put(
+            "/apps/nope/leaves", json={"path": "a", "text": "1"})
+        assert response.status_code == 400
+
+    def test_delete_leaves(self):
+        self.client.post("/apps/", json={"id": "delete-app", "data": [
+            {"path": "a/b", "text": "1"}, {"path": "/a/b", "text": "2"},
+            {"path": "c", "text": "3"}]})
+
+        response = self.client.delete(
+            "/apps/delete-app/leaves", params={"path": "a/b"})
+        assert response.status_code == 200
+        assert response.json() == {
+            "id": "delete-app", "added": 0, "removed": 2, "total": 1}
+        assert self.client.delete(
+            "/apps/delete-app/leaves",
+            params={"path": "a/b"}).status_code == 404
+        assert self.client.delete(
+            "/apps/nope/leaves", params={"path": "a"}).status_code == 400
+        assert self.client.delete(
+            "/apps/delete-app/leaves").status_code == 422
+
+    def test_dedup_app(self):
+        self.client.post("/apps/", json={"id": "dedup-app", "data": [
+            {"path": "a", "text": "1"}, {"path": "b", "text": "2"},
+            {"path": "a", "text": "3"}]})
+
+        response = self.client.post("/apps/dedup-app/leaves:dedup")
+        assert response.status_code == 200
+        assert response.json() == {
+            "id": "dedup-app", "added": 0, "removed": 1, "total": 2}
+        assert DB_PROVIDER.read_mind_map_app(id="dedup-app").data == [
+            MindMapLeaf(path="b", text="2"), MindMapLeaf(path="a", text="3")]
+        assert self.client.post(
+            "/apps/nope/leaves:dedup").status_code == 400
+
+    def test_export_import(self):
+        response = self.client.get("/export")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert records[0] == {"type": "app", "id": "fake-app-0"}
+        assert len(records) == len(DB_PROVIDER.read_mind_map_apps()) + sum(
+            len(app.data) for app in DB_PROVIDER.read_mind_map_apps())
+
+        body = "".join(
+            json.dumps({**record, "id": f"imported-{record['id']}"}) + "\n"
+            for record in records)
+        response = self.client.post("/import", data=body)
+        assert response.status_code == 200
+        assert response.json()["records"] == len(records)
+        assert DB_PROVIDER.read_mind_map_app(id="imported-fake-app-0").data \
+            == DB_PROVIDER.read_mind_map_app(id="fake-app-0").data
+
+    def test_import_invalid(self):
+        response = self.client.post(
+            "/import",
+            data='{"type": "app", "id": "fake-app-0"}\n')
+        assert response.status_code == 400
+        response = self.client.post("/import", data='\n{"type": "bad"}\n')
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("Line 2")
+
+    def test_read_app_etag(self):
+        response = self.client.get("/apps/fake-app-1")
+        etag = response.headers["etag"]
+        assert etag.startswith('"') and etag.endswith('"')
+
+        for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            response = self.client.get(
+                "/apps/fake-app-1", headers={"If-None-Match": header})
+            assert response.status_code == 304
+            assert response.headers["etag"] == etag
+            assert response.content == b""
+
+        self.client.put("/apps/fake-app-0", json={"path": "a", "text": "b"})
+        response = self.client.get(
+            "/apps/fake-app-1", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+        self.client.put("/apps/fake-app-1", json={"path": "a", "text": "b"})
+        response = self.client.get(
+            "/apps/fake-app-1", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()["data"][-1] == {"path": "a", "text": "b"}
+
+    def test_read_app_etag_not_found(self):
+        response = self.client.get(
+            "/apps/fake-app-999", headers={"If-None-Match": "*"})
+        assert response.status_code == 200
+        assert "etag" not in response.headers
+
+    def test_read_app_etag_before_read(self, monkeypatch):
+        etag = self.client.get("/apps/fake-app-0").headers["etag"]
+        apps_etag = self.client.get("/apps").headers["etag"]
+
+        def fail(*args, **kwargs):
+            raise AssertionError("app read on a matching ETag")
+
+        monkeypatch.setattr(DB_PROVIDER, "dump_mind_map_app", fail)
+        monkeypatch.setattr(DB_PROVIDER, "dump_mind_map_apps", fail)
+        response = self.client.get(
+            "/apps/fake-app-0", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+        response = self.client.get(
+            "/apps", headers={"If-None-Match": apps_etag})
+        assert response.status_code == 304
+
+    def test_read_apps_etag(self):
+        response = self.client.get("/apps")
+        etag = response.headers["etag"]
+        assert response.headers["vary"] == "Accept"
+        ndjson = self.client.get(
+            "/apps", headers={"Accept": "application/x-ndjson"})
+        assert ndjson.headers["etag"] != etag
+
+        self.client.put("/apps/fake-app-1", json={"path": "c", "text": "d"})
+        response = self.client.get("/apps", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    def test_search(self):
+        response = self.client.get("/search", params={"q": "sample topic"})
+        assert response.status_code == 200
+        hits = response.json()
+        assert hits[0]["path"] == "/this/is/a/path/1"
+        assert hits[0]["text"] == "This is a sample topic 1"
+        assert hits[0]["score"] > 0
+
+        response = self.client.get(
+            "/search",
+            params={"q": "potatoes", "app_id": "fake-app-1", "limit": 1})
+        assert [hit["id"] for hit in response.json()] == ["fake-app-1"]
+        assert self.client.get("/search").status_code == 422
+        assert self.client.get(
+            "/search", params={"q": "a", "limit": 0}).status_code == 422
+
+    def test_metrics(self):
+        self.client.get("/")
+        self.client.get("/apps/fake-app-0")
+        self.client.get("/nowhere")
+        response = self.client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith(
+            "text/plain; version=0.0.4")
+        text = response.text
+        assert 'mind_map_http_request_duration_seconds_count{method="GET",' \
+               'route="/apps/{app_id}",status="200"}' in text
+        assert 'route="unmatched",status="404"' in text
+        assert 'mind_map_provider_call_duration_seconds_count{' \
+               'method="dump_mind_map_app"}' in text
+        assert "mind_map_template_render_duration_seconds_count" \
+               '{template="index.html"}' in text
+        count = DB_PROVIDER.count_mind_map_apps()
+        assert f"mind_map_store_apps {count.apps}\n" in text
+        assert f"mind_map_store_leaves {count.leaves}\n" in text
+        assert 'mind_map_cache_hit_ratio{cache="render"}' in text
+
+    def test_read_app_changes(self):
+        self.client.post("/apps/", json={"id": "changes-app", "data": []})
+        response = self.client.get("/apps/changes-app/changes")
+        assert response.json() == {
+            "id": "changes-app", "seq": 1, "resync": True,
+            "data": [], "changes": []}
+
+        leaf = {"path": "a/b", "text": "c"}
+        self.client.put("/apps/changes-app", json=leaf)
+        self.client.post("/apps/changes-app/leaves:batch", json=[leaf, leaf])
+        response = self.client.get(
+            "/apps/changes-app/changes", params={"since": 1})
+        assert response.status_code == 200
+        assert response.json() == {
+            "id": "changes-app", "seq": 3, "resync": False, "data": [],
+            "changes": [
+                {"seq": 2, "type": "added", "data": [leaf]},
+                {"seq": 3, "type": "added", "data": [leaf, leaf]}]}
+        response = self.client.get(
+            "/apps/changes-app/changes", params={"since": 0, "limit": 1})
+        assert response.json()["changes"] == [
+            {"seq": 1, "type": "created", "data": []}]
+
+        assert self.client.get(
+            "/apps/nope/changes").status_code == 404
+        assert self.client.get(
+            "/apps/nope/changes/stream").status_code == 404
+
+    def test_stream_app_changes(self):
+        self.client.post("/apps/", json={"id": "stream-app", "data": []})
+        leaf = MindMapLeaf(path="a/b", text="c")
+
+        async def stream():
+            events = main.change_events(app_id="stream-app")
+            event = await asyncio.wait_for(events.__anext__(), 5)
+            assert event.startswith("id: 1\nevent: resync\ndata: ")
+            next_event = asyncio.ensure_future(events.__anext__())
+            await asyncio.sleep(0.01)
+            await main.ASYNC_DB_PROVIDER.add_mind_map_leaf(
+                id="stream-app", mind_map_leaf=leaf)
+            event = await asyncio.wait_for(next_event, 5)
+            assert event == (
+                'id: 2\nevent: change\ndata: {"seq":2,"type":"added",'
+                '"data":[{"path":"a/b","text":"c"}]}\n\n')
+            await events.aclose()
+
+            events = main.change_events(app_id="stream-app", since=1)
+            assert await asyncio.wait_for(events.__anext__(), 5) == event
+            await events.aclose()
+
+        asyncio.run(stream())
+        assert not main.CHANGES._waiters
+
+    def test_profiles_disabled(self):
+        assert self.client.get("/debug/profiles").status_code == 404
+        response = self.client.get("/apps", headers={"X-Profile": "1"})
+        assert "x-profile-id" not in response.headers
+
+    def test_profiles(self, monkeypatch):
+        profiles = MindMapProfileStore(max_size=2)
+        monkeypatch.setattr(main, "PROFILES", profiles)
+        monkeypatch.setattr(main.SETTINGS, "profile_hosts", ["testclient"])
+        monkeypatch.setattr(main, "ASYNC_DB_PROVIDER",
+                            MindMapProfiledAsyncDBProvider(
+                                db_provider=DB_PROVIDER, max_workers=2))
+        main.RENDER_CACHE.clear()
+        client = TestClient(MindMapProfilingMiddleware(
+            app, profiles=profiles, hosts=["testclient"]))
+
+        response = client.get("/apps")
+        assert "x-profile-id" not in response.headers
+        response = client.get("/", headers={"X-Profile": "1"})
+        assert response.status_code == 200
+        root_id = response.headers["x-profile-id"]
+        response = client.get("/apps/fake-app-0", params={"profile": "1"})
+        assert response.json()["id"] == "fake-app-0"
+        app_id = response.headers["x-profile-id"]
+
+        summaries = client.get("/debug/profiles").json()
+        assert [summary["id"] for summary in summaries] == [app_id, root_id]
+        assert summaries[1]["path"] == "/"
+        assert summaries[1]["status"] == 200
+
+        stats = client.get(
+            f"/debug/profiles/{root_id}", params={"limit": 1000}).text
+        # Provider calls in worker threads, formatting and rendering
+        for name in ("read_mind_map_app_ids_page", "read_mind_map_tree",
+                     "render"):
+            assert name in stats
+        stats = client.get(
+            f"/debug/profiles/{app_id}",
+            params={"sort": "tottime", "limit": 1000}).text
+        assert "dump_mind_map_app" in stats
+        assert client.get(
+            f"/debug/profiles/{app_id}",
+            params={"sort": "nope"}).status_code == 422
+        assert client.get("/debug/profiles/nope").status_code == 404
+
+        monkeypatch.setattr(main.SETTINGS, "profile_hosts", [])
+        assert client.get("/debug/profiles").status_code == 403
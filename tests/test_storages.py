@@ -0,0 +1,357 @@
+import os
+
+import pytest
+
+from src import storages
+from src.models import MindMapApp, MindMapLeaf, MindMapAppCreateError, \
+    MindMapAppAddError
+from src.providers import MindMapLogDBProvider, MindMapIndexedDBProvider
+from src.storages import MindMapLog, MindMapSnapshot, encode_record, \
+    decode_records, iter_records, write_binary_snapshot, write_snapshot, \
+    is_binary_snapshot
+
+
+class TestMindMapStorages:
+
+    def test_decode_records(self):
+        records = [{"op": "create", "id": "a"}, {"op": "add", "id": "a"}]
+        buffer = b"".join(encode_record(record) for record in records)
+        assert [record for record, _ in decode_records(buffer)] == records
+        assert [offset for _, offset in decode_records(buffer)][-1] == \
+            len(buffer)
+
+    def test_decode_records_truncated(self):
+        first = encode_record({"id": "a"})
+        second = encode_record({"id": "b"})
+        for cut in range(1, len(second)):
+            buffer = first + second[:-cut]
+            assert list(decode_records(buffer)) == [({"id": "a"}, len(first))]
+
+    def test_decode_records_corrupted(self):
+        first = encode_record({"id": "a"})
+        second = bytearray(encode_record({"id": "b"}))
+        second[-1] ^= 0xFF
+        assert list(decode_records(first + bytes(second))) == [
+            ({"id": "a"}, len(first))]
+
+    def test_iter_records_missing_or_empty(self, tmp_path):
+        assert list(iter_records(str(tmp_path / "missing"))) == []
+        (tmp_path / "empty").write_bytes(b"")
+        assert list(iter_records(str(tmp_path / "empty"))) == []
+
+    def test_log_fsync_batch(self, tmp_path, monkeypatch):
+        calls = []
+        fsync = os.fsync
+        monkeypatch.setattr(
+            storages.os, "fsync", lambda fd: calls.append(fd) or fsync(fd))
+
+        log = MindMapLog(
+            path=str(tmp_path / "log"), fsync_batch=4, fsync_interval=60)
+        calls.clear()
+        for i in range(10):
+            log.append({"i": i})
+        assert len(calls) == 2
+        log.close()
+        assert len(calls) == 3
+        assert [r for r, _ in iter_records(log.path)] == [
+            {"i": i} for i in range(10)]
+
+
+class TestMindMapSnapshots:
+
+    leaves = [
+        {"path": None, "text": None},
+        {"path": "", "text": ""},
+        {"path": "/a/b", "text": "t"},
+        {"path": "a//b/", "text": "caf\u00e9 \U0001f954"},
+        {"path": "a/b", "text": "\ud800"},
+    ]
+
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / "snapshot")
+        write_binary_snapshot(path, [
+            ("app-0", self.leaves), ("\u00e9", []), ("app-2", self.leaves)])
+        assert is_binary_snapshot(path)
+        snapshot = MindMapSnapshot(path)
+        assert snapshot.apps == [("app-0", 5), ("\u00e9", 0), ("app-2", 5)]
+        assert snapshot.leaves("app-2") == self.leaves
+        assert snapshot.leaves("\u00e9") == []
+        assert sorted(snapshot.segments) == ["", "a", "b"]
+        snapshot.close()
+
+    def test_not_binary(self, tmp_path):
+        path = str(tmp_path / "snapshot")
+        write_snapshot(path, [{"op": "create", "id": "a", "data": []}])
+        assert not is_binary_snapshot(path)
+        assert not is_binary_snapshot(str(tmp_path / "missing"))
+        with pytest.raises(ValueError):
+            MindMapSnapshot(path)
+
+    def test_corrupted(self, tmp_path):
+        path = str(tmp_path / "snapshot")
+        write_binary_snapshot(path, [("app-0", self.leaves)])
+        with open(path, "r+b") as file:
+            file.seek(storages.SNAPSHOT_HEADER.size +
+                      storages.RECORD_HEADER.size + 2)
+            file.write(b"\xff")
+        snapshot = MindMapSnapshot(path)
+        with pytest.raises(ValueError):
+            snapshot.leaves("app-0")
+        snapshot.close()
+
+        with open(path, "r+b") as file:
+            file.truncate(os.path.getsize(path) - 1)
+        with pytest.raises(ValueError):
+            MindMapSnapshot(path)
+
+
+class TestMindMapLogProviders:
+
+    @staticmethod
+    def fill(provider):
+        provider.create_mind_map_app(mind_map_app=MindMapApp(
+            id="app-0", data=[MindMapLeaf(path="a/b", text="c")]))
+        provider.create_mind_map_app(mind_map_app=MindMapApp(id="app-1"))
+        for i in range(5):
+            provider.add_mind_map_leaf(
+                id="app-1",
+                mind_map_leaf=MindMapLeaf(path=f"x/{i}", text=str(i)))
+
+    @staticmethod
+    def log_file(path):
+        logs = sorted(name for name in os.listdir(path)
+                      if name.startswith("log-"))
+        return os.path.join(path, logs[-1])
+
+    def test_reopen(self, tmp_path):
+        provider = MindMapLogDBProvider(path=str(tmp_path))
+        assert provider.read_mind_map_apps() == []
+        self.fill(provider)
+        apps = provider.read_mind_map_apps()
+        provider.close()
+
+        reopened = MindMapLogDBProvider(path=str(tmp_path))
+        assert reopened.read_mind_map_apps() == apps
+        assert reopened.read_mind_map_tree(id="app-1", prefix="x").dict() \
+            == provider.read_mind_map_tree(id="app-1", prefix="x").dict()
+        reopened.close()
+
+    def test_reopen_add_mind_map_leaves(self, tmp_path):
+        provider = MindMapLogDBProvider(path=str(tmp_path))
+        self.fill(provider)
+        provider.add_mind_map_leaves(
+            id="app-0",
+            mind_map_leaves=[MindMapLeaf(path="a/c", text=str(i))
+                             for i in range(3)])
+        with pytest.raises(MindMapAppAddError):
+            provider.add_mind_map_leaves(
+                id="foo", mind_map_leaves=[MindMapLeaf(path="a", text="b")])
+        apps = provider.read_mind_map_apps()
+        provider.close()
+
+        reopened = MindMapLogDBProvider(path=str(tmp_path))
+        assert reopened.read_mind_map_apps() == apps
+        assert len(reopened.read_mind_map_app(id="app-0").data) == 4
+        reopened.close()
+
+    def test_errors_are_not_logged(self, tmp_path):
+        provider = MindMapLogDBProvider(path=str(tmp_path))
+        self.fill(provider)
+        size = os.path.getsize(self.log_file(str(tmp_path)))
+        with pytest.raises(MindMapAppCreateError):
+            provider.create_mind_map_app(mind_map_app=MindMapApp(id="app-0"))
+        with pytest.raises(MindMapAppAddError):
+            provider.add_mind_map_leaf(
+                id="foo", mind_map_leaf=MindMapLeaf(path="a", text="b"))
+        provider.close()
+        assert os.path.getsize(self.log_file(str(tmp_path))) == size
+
+    @pytest.mark.parametrize("cut", [1, 5, 8, 9])
+    def test_truncated_final_record(self, tmp_path, cut):
+        provider = MindMapLogDBProvider(path=str(tmp_path))
+        self.fill(provider)
+        provider.close()
+        expected = provider.read_mind_map_apps()
+        expected[1].data.pop()
+
+        log_file = self.log_file(str(tmp_path))
+        with open(log_file, "r+b") as file:
+            file.truncate(os.path.getsize(log_file) - cut)
+
+        recovered = MindMapLogDBProvider(path=str(tmp_path))
+        assert recovered.read_mind_map_apps() == expected
+
+        # New records are appended after the last valid record
+        recovered.add_mind_map_leaf(
+            id="app-1", mind_map_leaf=MindMapLeaf(path="y", text="z"))
+        recovered.close()
+        expected[1].data.append(MindMapLeaf(path="y", text="z"))
+        reopened = MindMapLogDBProvider(path=str(tmp_path))
+        assert reopened.read_mind_map_apps() == expected
+        reopened.close()
+
+    def test_compact(self, tmp_path):
+        provider = MindMapLogDBProvider(path=str(tmp_path))
+        self.fill(provider)
+        provider.compact()
+        provider.add_mind_map_leaf(
+            id="app-0", mind_map_leaf=MindMapLeaf(path="after", text="c"))
+        apps = provider.read_mind_map_apps()
+        provider.close()
+
+        assert sorted(os.listdir(str(tmp_path))) == [
+            "log-0000000001", "snapshot-0000000001"]
+        reopened = MindMapLogDBProvider(path=str(tmp_path))
+        assert reopened.read_mind_map_apps() == apps
+        reopened.close()
+
+    def test_compact_removed_leaves(self, tmp_path):
+        provider = MindMapLogDBProvider(path=str(tmp_path))
+        self.fill(provider)
+        provider.delete_mind_map_leaves(id="app-1", path="x/0")
+        assert len(provider._apps["app-1"].removed) == 1
+
+        # Apps are rebuilt without their removed leaves
+        provider.compact()
+        record = provider._apps["app-1"]
+        assert (record.size(), len(record.removed)) == (4, 0)
+        provider.upsert_mind_map_leaf(
+            id="app-1", mind_map_leaf=MindMapLeaf(path="x/1", text="new"))
+        apps = provider.dump_mind_map_apps()
+        assert [leaf["text"] for leaf in apps[1]["data"]] == [
+            "2", "3", "4", "new"]
+        provider.close()
+
+        reopened = MindMapLogDBProvider(path=str(tmp_path))
+        assert reopened.dump_mind_map_apps() == apps
+        reopened.close()
+
+    def test_crash_before_snapshot(self, tmp_path):
+        provider = MindMapLogDBProvider(path=str(tmp_path))
+        self.fill(provider)
+        provider.compact()
+        provider.add_mind_map_leaf(
+            id="app-0", mind_map_leaf=MindMapLeaf(path="after", text="c"))
+        apps = provider.read_mind_map_apps()
+        provider.close()
+
+        # A new generation was started but its snapshot never written
+        open(os.path.join(str(tmp_path), "log-0000000002"), "wb").close()
+        reopened = MindMapLogDBProvider(path=str(tmp_path))
+        assert reopened.read_mind_map_apps() == apps
+        reopened.close()
+
+    def test_background_compaction(self, tmp_path):
+        provider = MindMapLogDBProvider(path=str(tmp_path), compact_size=512)
+        expected = MindMapIndexedDBProvider(data=[])
+        for target in (provider, expected):
+            self.fill(target)
+            for i in range(50):
+                target.add_mind_map_leaf(
+                    id="app-0",
+                    mind_map_leaf=MindMapLeaf(path=f"p/{i}", text="t"))
+        provider.close()
+
+        assert provider._generation > 0
+        snapshots = [name for name in os.listdir(str(tmp_path))
+                     if name.startswith("snapshot-")]
+        assert snapshots == [f"snapshot-{provider._generation:010d}"]
+        reopened = MindMapLogDBProvider(path=str(tmp_path))
+        assert reopened.read_mind_map_apps() == expected.read_mind_map_apps()
+        reopened.close()
+
+    def test_lazy_restore(self, tmp_path):
+        provider = MindMapLogDBProvider(path=str(tmp_path))
+        self.fill(provider)
+        provider.compact()
+        apps = provider.read_mind_map_apps()
+        provider.close()
+
+        reopened = MindMapLogDBProvider(path=str(tmp_path))
+        records = reopened._apps
+        assert all(record.loader is not None for record in records.values())
+        assert reopened.count_mind_map_apps().leaves == sum(
+            len(app.data) for app in apps)
+        assert reopened.read_mind_map_tree(id="app-0") is not None
+        assert records["app-0"].loader is None
+        assert records["app-1"].loader is not None
+        hits = reopened.search_mind_map_leaves(query="c 0")
+        assert {hit.id for hit in hits} == {"app-0", "app-1"}
+        assert reopened.read_mind_map_apps() == apps
+        reopened.close()
+
+    def test_compact_lazy_apps(self, tmp_path):
+        provider = MindMapLogDBProvider(path=str(tmp_path))
+        self.fill(provider)
+        apps = provider.read_mind_map_apps()
+        provider.compact()
+        provider.close()
+
+        # Apps never accessed are copied to the next snapshot
+        reopened = MindMapLogDBProvider(path=str(tmp_path))
+        old = reopened._snapshots[0]
+        reopened.compact()
+        # They then load from it, the old snapshot is closed then removed
+        assert reopened._snapshots[0] is not old
+        assert not os.path.exists(old.path)
+        assert all(record.loader is not None
+                   for record in reopened._apps.values())
+        assert reopened.read_mind_map_apps() == apps
+        reopened.close()
+        reopened = MindMapLogDBProvider(path=str(tmp_path))
+        assert reopened.read_mind_map_apps() == apps
+        reopened.close()
+
+    def test_compact_snapshot_in_use(self, tmp_path):
+        provider = MindMapLogDBProvider(path=str(tmp_path))
+        self.fill(provider)
+        provider.compact()
+        provider.close()
+
+        reopened = MindMapLogDBProvider(path=str(tmp_path))
+        old = reopened._snapshots[0]
+        # As a dump decoding leaves during the compaction
+        payload = old._view[:1]
+        reopened.compact()
+        assert reopened._snapshots[0] is old
+        assert os.path.exists(old.path)
+
+        payload.release()
+        reopened.add_mind_map_leaf(
+            id="app-0", mind_map_leaf=MindMapLeaf(path="d"))
+        reopened.compact()
+        assert old not in reopened._snapshots
+        assert not os.path.exists(old.path)
+        assert len(reopened._snapshots) == 1
+        reopened.close()
+
+    def test_json_snapshot(self, tmp_path):
+        expected = MindMapIndexedDBProvider(data=[])
+        self.fill(expected)
+        write_snapshot(
+            str(tmp_path / "snapshot-0000000001"),
+            ({"op": "create", **app} for app in expected.dump_mind_map_apps()))
+
+        provider = MindMapLogDBProvider(path=str(tmp_path))
+        assert provider.read_mind_map_apps() == expected.read_mind_map_apps()
+        provider.compact()
+        provider.close()
+        assert is_binary_snapshot(str(tmp_path / "snapshot-0000000002"))
+
+    def test_snapshot_on_close(self, tmp_path):
+        provider = MindMapLogDBProvider(
+            path=str(tmp_path), snapshot_on_close=True)
+        self.fill(provider)
+        apps = provider.read_mind_map_apps()
+        provider.close()
+        assert sorted(os.listdir(str(tmp_path))) == [
+            "log-0000000001", "snapshot-0000000001"]
+        assert os.path.getsize(self.log_file(tmp_path)) == 0
+
+        # Nothing to fold when the log is empty
+        reopened = MindMapLogDBProvider(
+            path=str(tmp_path), snapshot_on_close=True)
+        assert reopened.read_mind_map_apps() == apps
+        reopened.close()
+        assert sorted(os.listdir(str(tmp_path))) == [
+            "log-0000000001", "snapshot-0000000001"]
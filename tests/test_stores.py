@@ -0,0 +1,225 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from src.models import MindMapApp, MindMapLeaf, MindMapAppCreateError, \
+    MindMapAppAddError
+from src.providers import MindMapIndexedDBProvider, MindMapRemoteDBProvider
+from src.stores import MindMapStoreServer, parse_address
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sample = [
+    {"id": "app-0", "data": [{"path": "a/b", "text": "c"}]},
+    {"id": "app-1", "data": []},
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, process, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        assert process.poll() is None, process.stdout.read()
+        try:
+            return requests.get(url, timeout=1)
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise TimeoutError(url)
+
+
+class TestMindMapStores:
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        server = MindMapStoreServer(
+            db_provider=MindMapIndexedDBProvider(data=sample),
+            address=str(tmp_path / "store.sock"),
+            authkey="test")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield server
+        server.close()
+
+    @pytest.fixture
+    def provider(self, store):
+        provider = MindMapRemoteDBProvider(
+            address=store.address, authkey="test", pool_size=2)
+        yield provider
+        provider.close()
+
+    def test_authkey_required(self, tmp_path):
+        with pytest.raises(ValueError):
+            MindMapStoreServer(
+                db_provider=MindMapIndexedDBProvider(data=sample),
+                address=str(tmp_path / "store.sock"),
+                authkey="")
+        with pytest.raises(ValueError):
+            MindMapRemoteDBProvider(address="127.0.0.1:8765", authkey="")
+
+        env = {**os.environ, "MIND_MAP_DB_ADDRESS": str(tmp_path / "s.sock")}
+        env.pop("MIND_MAP_DB_AUTHKEY", None)
+        process = subprocess.run(
+            [sys.executable, "-m", "src.stores"], cwd=ROOT, env=env,
+            capture_output=True, text=True, timeout=20)
+        assert process.returncode != 0
+        assert "MIND_MAP_DB_AUTHKEY" in process.stderr
+
+    def test_parse_address(self):
+        assert parse_address("127.0.0.1:8765") == ("127.0.0.1", 8765)
+        assert parse_address("/tmp/store.sock") == "/tmp/store.sock"
+
+    def test_same_behavior_as_store_provider(self, store, provider):
+        created = provider.create_mind_map_app(
+            mind_map_app=MindMapApp(id="new"))
+        added = provider.add_mind_map_leaf(
+            id="new", mind_map_leaf=MindMapLeaf(path="x/y", text="z"))
+        summary = provider.add_mind_map_leaves(
+            id="new", mind_map_leaves=[MindMapLeaf(path="x/w")])
+        assert created == MindMapApp(id="new")
+        assert added.data == [MindMapLeaf(path="x/y", text="z")]
+        assert summary.total == 2
+
+        local = store.db_provider
+        assert provider.read_mind_map_apps() == local.read_mind_map_apps()
+        assert provider.read_mind_map_app(id="new") == \
+            local.read_mind_map_app(id="new")
+        assert provider.dump_mind_map_apps() == local.dump_mind_map_apps()
+        assert provider.dump_mind_map_apps_page(limit=1, after="app-0") == \
+            local.dump_mind_map_apps_page(limit=1, after="app-0")
+        assert provider.read_mind_map_app_ids_page(limit=1, after="app-0") \
+            == local.read_mind_map_app_ids_page(limit=1, after="app-0")
+        assert list(provider.iter_mind_map_apps(page_size=1)) == \
+            local.read_mind_map_apps()
+        assert provider.read_mind_map_apps_version() == \
+            local.read_mind_map_apps_version()
+        assert provider.read_mind_map_app_version(id="new") == \
+            local.read_mind_map_app_version(id="new")
+        assert provider.read_mind_map_tree(id="new", prefix="x") == \
+            local.read_mind_map_tree(id="new", prefix="x")
+        assert provider.search_mind_map_leaves(query="z") == \
+            local.search_mind_map_leaves(query="z")
+
+    def test_errors(self, provider):
+        with pytest.raises(MindMapAppCreateError):
+            provider.create_mind_map_app(mind_map_app=MindMapApp(id="app-0"))
+        with pytest.raises(MindMapAppAddError):
+            provider.add_mind_map_leaf(
+                id="foo", mind_map_leaf=MindMapLeaf())
+        with pytest.raises(AttributeError):
+            provider._call("close")
+        assert provider.read_mind_map_app(id="app-0").id == "app-0"
+
+    def test_concurrent_calls(self, provider):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(
+                lambda i: provider.add_mind_map_leaf(
+                    id="app-1", mind_map_leaf=MindMapLeaf(text=str(i))),
+                range(100)))
+        assert sorted(
+            int(leaf.text)
+            for leaf in provider.read_mind_map_app(id="app-1").data) == \
+            list(range(100))
+        assert provider._pool.qsize() <= 2
+
+    def test_store_restart(self):
+        """Pooled TCP connections are replaced after a store restart."""
+        address = f"127.0.0.1:{free_port()}"
+        env = {
+            **os.environ,
+            "MIND_MAP_DB_ADDRESS": address,
+            "MIND_MAP_DB_AUTHKEY": "test",
+        }
+
+        def start():
+            process = subprocess.Popen(
+                [sys.executable, "-m", "src.stores"], cwd=ROOT, env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            assert "listening" in process.stdout.readline()
+            return process
+
+        def stop(process):
+            process.terminate()
+            process.wait(timeout=10)
+            process.stdout.close()
+
+        provider = MindMapRemoteDBProvider(
+            address=address, authkey="test", pool_size=4)
+        process = start()
+        try:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(
+                    lambda _: provider.read_mind_map_apps(), range(20)))
+            assert provider._pool.qsize() > 1
+            epoch = provider.read_mind_map_apps_epoch()
+            assert provider.read_mind_map_apps_epoch() == epoch
+            stop(process)
+            process = start()
+
+            # Every stale connection is dropped, none fails a call
+            for _ in range(4):
+                assert provider.read_mind_map_app(id="app-0") is not None
+            provider.create_mind_map_app(mind_map_app=MindMapApp(id="new"))
+            assert provider.read_mind_map_app(id="new") == \
+                MindMapApp(id="new")
+            # The versions of the new store are counted from zero
+            assert provider.read_mind_map_apps_epoch() != epoch
+        finally:
+            provider.close()
+            stop(process)
+
+    def test_workers(self, tmp_path):
+        """Spawn a store process and API workers sharing it."""
+        env = {
+            **os.environ,
+            "MIND_MAP_DB_PROVIDER": "remote",
+            "MIND_MAP_DB_ADDRESS": str(tmp_path / "store.sock"),
+            "MIND_MAP_DB_AUTHKEY": "test",
+        }
+        processes = [subprocess.Popen(
+            [sys.executable, "-m", "src.stores"], cwd=ROOT, env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)]
+        assert "listening" in processes[0].stdout.readline()
+
+        urls = []
+        try:
+            for _ in range(2):
+                port = free_port()
+                processes.append(subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", "main:app",
+                     "--port", str(port)],
+                    cwd=ROOT, env=env,
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                    text=True))
+                urls.append(f"http://127.0.0.1:{port}")
+            for url, process in zip(urls, processes[1:]):
+                wait_for(f"{url}/apps", process)
+
+            response = requests.post(f"{urls[0]}/apps/", json={"id": "new"})
+            assert response.status_code == 200
+            response = requests.put(
+                f"{urls[0]}/apps/new", json={"path": "a", "text": "b"})
+            assert response.status_code == 200
+            for url in urls:
+                assert requests.get(f"{url}/apps/new").json() == {
+                    "id": "new", "data": [{"path": "a", "text": "b"}]}
+            # Workers tag the shared versions with the store epoch
+            etag = requests.get(f"{urls[0]}/apps/new").headers["etag"]
+            for url in urls:
+                response = requests.get(
+                    f"{url}/apps/new", headers={"If-None-Match": etag})
+                assert response.status_code == 304
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait(timeout=10)
+                process.stdout.close()